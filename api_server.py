@@ -0,0 +1,380 @@
+import argparse
+import asyncio
+import json
+import re
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from async_service import AsyncBookService
+from change_feed import PublishingBookRepository
+from exceptions import (
+    BookAlreadyAvailableError,
+    BookAlreadyCheckedOutError,
+    BookNotFoundError,
+    DuplicateBookError,
+    EmptyLibraryError,
+    LibraryException,
+)
+from instrumentation import METRICS, InstrumentedBookRepository, MetricsRegistry
+from pagination import DEFAULT_PAGE_SIZE, BookPage
+from replication import FeedServer
+from repository_factory import BACKENDS, create_repository
+
+MAX_BODY_SIZE = 1024 * 1024
+BOOK_PATH = re.compile(r"^/books/(\d+)$")
+STATUS_PATH = re.compile(r"^/books/(\d+)/status$")
+
+ERROR_STATUSES = {
+    BookNotFoundError: HTTPStatus.NOT_FOUND,
+    EmptyLibraryError: HTTPStatus.NOT_FOUND,
+    DuplicateBookError: HTTPStatus.CONFLICT,
+    BookAlreadyAvailableError: HTTPStatus.CONFLICT,
+    BookAlreadyCheckedOutError: HTTPStatus.CONFLICT,
+}
+
+
+class HttpError(Exception):
+    """
+    Raised by request handlers to answer with an HTTP error.
+    """
+
+    def __init__(self, status: HTTPStatus, message: str):
+        """
+        Initialize the error.
+        :param status: HTTP status to answer with.
+        :param message: Error message for the response body.
+        """
+        super().__init__(message)
+        self.status = status
+
+
+def error_status(error: Exception) -> HTTPStatus:
+    """
+    Map an exception raised by the service to an HTTP status.
+    :param error: The exception.
+    :return: HTTP status for the response.
+    """
+    if isinstance(error, HttpError):
+        return error.status
+    for error_class, status in ERROR_STATUSES.items():
+        if isinstance(error, error_class):
+            return status
+    if isinstance(error, (LibraryException, ValueError, KeyError, TypeError)):
+        return HTTPStatus.BAD_REQUEST
+    return HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+def require_text(data: Dict[str, Any], field: str) -> str:
+    """
+    Read a required non-empty string field from a request body.
+    :param data: Decoded request body.
+    :param field: Name of the field.
+    :return: The stripped value.
+    :raises HttpError: If the field is missing, empty or not a string.
+    """
+    value = data.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise HttpError(HTTPStatus.BAD_REQUEST, f"Field '{field}' must be a non-empty string.")
+    return value.strip()
+
+
+def page_to_dict(page: BookPage) -> Dict[str, Any]:
+    """
+    Convert a page of books to a JSON-serializable dictionary.
+    :param page: The page.
+    :return: Dictionary with "books" and "next_cursor".
+    """
+    return {
+        "books": [book.to_dict() for book in page],
+        "next_cursor": list(page.next_cursor) if page.next_cursor is not None else None,
+    }
+
+
+def parse_page_arguments(query: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Read paging arguments from the query string.
+    The cursor is passed back as the JSON array returned in "next_cursor".
+    :param query: Query string parameters.
+    :return: Keyword arguments for the paging methods.
+    :raises ValueError: If an argument is malformed.
+    """
+    after = query.get("after")
+    return {
+        "order_by": query.get("order_by", "id"),
+        "limit": int(query.get("limit", DEFAULT_PAGE_SIZE)),
+        "offset": int(query.get("offset", 0)),
+        "after": json.loads(after) if after else None,
+    }
+
+
+class BookApiServer:
+    """
+    Minimal HTTP/1.1 JSON API over AsyncBookService.
+
+    Endpoints:
+        GET    /books                 list books (order_by, limit, offset, after)
+        GET    /books/search          search by title, author and/or year (same paging)
+        GET    /books/{id}            get one book
+        POST   /books                 add a book from {"title", "author", "year"}
+        DELETE /books/{id}            delete a book
+        PUT    /books/{id}/status     set the status from {"status"}
+        GET    /metrics               metrics in the Prometheus text format (?format=json for JSON)
+    """
+
+    def __init__(self, service: AsyncBookService, metrics: Optional[MetricsRegistry] = None):
+        """
+        Initialize the server.
+        :param service: AsyncBookService instance for managing books.
+        :param metrics: Registry to expose on /metrics (optional).
+        """
+        self.service = service
+        self.metrics = metrics
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Serve requests on one connection until the client closes it.
+        :param reader: Stream to read requests from.
+        :param writer: Stream to write responses to.
+        """
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload = await self._dispatch(method, target, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HttpError as e:
+            self._write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+        finally:
+            writer.close()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """
+        Read one request from the connection.
+        :param reader: Stream to read from.
+        :return: Tuple of (method, target, headers, body), or None at end of stream.
+        :raises HttpError: If the request is malformed or too large.
+        """
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed request line.")
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed Content-Length header.")
+        if length < 0 or length > MAX_BODY_SIZE:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body is too large.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    @staticmethod
+    def _write_response(
+        writer: asyncio.StreamWriter, status: HTTPStatus, payload: Any, keep_alive: bool
+    ) -> None:
+        """
+        Write a JSON response.
+        :param writer: Stream to write to.
+        :param status: HTTP status.
+        :param payload: JSON-serializable body, text for a plain-text body, or None for
+            an empty body.
+        :param keep_alive: Keep the connection open after the response.
+        """
+        if isinstance(payload, str):
+            content_type = "text/plain; version=0.0.4"
+            body = payload.encode("utf-8")
+        else:
+            content_type = "application/json"
+            body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> Tuple[HTTPStatus, Any]:
+        """
+        Route a request to its handler and turn errors into responses.
+        :param method: HTTP method.
+        :param target: Request target (path and query string).
+        :param body: Request body.
+        :return: Tuple of (HTTP status, JSON-serializable payload or None).
+        """
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        query = dict(parse_qsl(url.query))
+        try:
+            return await self._route(method, path, query, body)
+        except Exception as e:
+            status = error_status(e)
+            message = str(e) if status != HTTPStatus.INTERNAL_SERVER_ERROR else "Internal error."
+            return status, {"error": message}
+
+    async def _route(
+        self, method: str, path: str, query: Dict[str, str], body: bytes
+    ) -> Tuple[HTTPStatus, Any]:
+        """
+        Call the handler for a request.
+        :param method: HTTP method.
+        :param path: Request path without the trailing slash.
+        :param query: Query string parameters.
+        :param body: Request body.
+        :return: Tuple of (HTTP status, JSON-serializable payload or None).
+        :raises HttpError: If no endpoint matches.
+        """
+        if path == "/books":
+            if method == "GET":
+                page = await self.service.list_books_page(**parse_page_arguments(query))
+                return HTTPStatus.OK, page_to_dict(page)
+            if method == "POST":
+                data = self._parse_json(body)
+                book = await self.service.add_book(
+                    require_text(data, "title"), require_text(data, "author"), int(data["year"])
+                )
+                return HTTPStatus.CREATED, book.to_dict()
+            raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f"Method {method} is not allowed.")
+
+        if path == "/books/search":
+            if method != "GET":
+                raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f"Method {method} is not allowed.")
+            page = await self.service.search_books_page(
+                title=query.get("title") or None,
+                author=query.get("author") or None,
+                year=int(query["year"]) if query.get("year") else None,
+                **parse_page_arguments(query),
+            )
+            return HTTPStatus.OK, page_to_dict(page)
+
+        match = BOOK_PATH.match(path)
+        if match:
+            book_id = int(match.group(1))
+            if method == "GET":
+                book = await self.service.get_book(book_id)
+                if book is None:
+                    raise BookNotFoundError(f"ID {book_id}")
+                return HTTPStatus.OK, book.to_dict()
+            if method == "DELETE":
+                await self.service.delete_book(book_id)
+                return HTTPStatus.NO_CONTENT, None
+            raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f"Method {method} is not allowed.")
+
+        match = STATUS_PATH.match(path)
+        if match:
+            if method not in ("PUT", "PATCH"):
+                raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f"Method {method} is not allowed.")
+            book_id = int(match.group(1))
+            status = self._parse_json(body)["status"]
+            await self.service.update_book_status(book_id, status)
+            return HTTPStatus.OK, {"id": book_id, "status": status}
+
+        if path == "/metrics" and self.metrics is not None:
+            if method != "GET":
+                raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f"Method {method} is not allowed.")
+            if query.get("format") == "json":
+                return HTTPStatus.OK, self.metrics.to_dict()
+            return HTTPStatus.OK, self.metrics.to_prometheus()
+
+        raise HttpError(HTTPStatus.NOT_FOUND, f"No endpoint for {path}.")
+
+    @staticmethod
+    def _parse_json(body: bytes) -> Dict[str, Any]:
+        """
+        Decode a JSON object request body.
+        :param body: Request body.
+        :return: Decoded object.
+        :raises HttpError: If the body is not a JSON object.
+        """
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Request body must be valid JSON.")
+        if not isinstance(data, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object.")
+        return data
+
+
+async def serve(
+    service: AsyncBookService, host: str, port: int, metrics: Optional[MetricsRegistry] = None
+) -> None:
+    """
+    Run the API server until it is cancelled.
+    :param service: AsyncBookService instance for managing books.
+    :param host: Address to listen on.
+    :param port: Port to listen on.
+    :param metrics: Registry to expose on /metrics (optional).
+    """
+    api = BookApiServer(service, metrics)
+    async with service:
+        server = await asyncio.start_server(api.handle_connection, host, port, backlog=1024)
+        print(f"Serving the library API on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Entry point for the HTTP API server.
+    """
+    parser = argparse.ArgumentParser(description="HTTP/JSON API for the library.")
+    parser.add_argument("--data", default="data.json", help="Path to the library data file.")
+    parser.add_argument("--backend", default="concurrent", choices=sorted(BACKENDS))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--metrics", action="store_true", help="Record metrics and expose them on /metrics."
+    )
+    parser.add_argument(
+        "--feed-socket",
+        help="Publish changes to DATA.changes and serve them to replicas on this Unix socket.",
+    )
+    args = parser.parse_args(argv)
+
+    repository = create_repository(args.backend, args.data)
+    feed_server = None
+    if args.feed_socket:
+        repository = PublishingBookRepository(repository)
+        feed_server = FeedServer(repository, args.feed_socket)
+        feed_server.start()
+    metrics = None
+    if args.metrics:
+        metrics = METRICS
+        metrics.watch_file_io()
+        repository = InstrumentedBookRepository(repository, metrics)
+    service = AsyncBookService(repository)
+    try:
+        asyncio.run(serve(service, args.host, args.port, metrics))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if feed_server is not None:
+            feed_server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from book_models import Book, Loan
+from book_repository import BookRepositoryInterface, CachedBookRepository, matches_criteria
+from book_service import BookService
+from book_versions import BookVersion
+from exceptions import ReadOnlySnapshotError
+from group_commit import StatusChange, commit_status_changes
+from pagination import DEFAULT_PAGE_SIZE, BookPage, check_page_arguments, get_sort_key
+
+
+class SnapshotBookRepository(BookRepositoryInterface):
+    """
+    Read-only repository over an immutable copy of the catalog.
+    Lookups by ID, listings and pages in ID order read the copy; a version
+    published by CachedBookRepository.snapshot() is paged by seeking to the
+    cursor. Given the repository the version came from, searches and other
+    filtered reads are answered by its indexes instead of a scan of the copy;
+    they see the repository's latest version, which is never older than the copy.
+    """
+
+    def __init__(
+        self,
+        books: Union[Iterable[Book], Mapping[int, Book]],
+        repository: Optional[CachedBookRepository] = None,
+    ):
+        """
+        Initialize the snapshot.
+        :param books: Books to include, or an immutable mapping of ID to book (such as
+            CachedBookRepository.snapshot()) to use as is; they must not be modified afterwards.
+        :param repository: Repository whose indexes answer filtered reads (optional).
+        """
+        if isinstance(books, Mapping):
+            self._books: Mapping[int, Book] = books
+        else:
+            self._books = {book.id: book for book in books}
+        self._repository = repository
+
+    def get_all_books(self) -> List[Book]:
+        """
+        Retrieve all books from the snapshot.
+        :return: List of books.
+        """
+        return list(self._books.values())
+
+    def iter_books(self) -> Iterator[Book]:
+        """
+        Iterate over the books in the snapshot.
+        :return: Iterator over books.
+        """
+        return iter(self._books.values())
+
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """
+        Get a book by its ID.
+        :param book_id: ID of the book.
+        :return: The book, or None if it does not exist.
+        """
+        return self._books.get(book_id)
+
+    def count_books(self) -> int:
+        """
+        Count the books in the snapshot.
+        :return: Number of books.
+        """
+        return len(self._books)
+
+    def search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> List[Book]:
+        """
+        Search with the repository's indexes, or by scanning the snapshot without them.
+        :param title: Title of the book (optional).
+        :param author: Author of the book (optional).
+        :param year: Year of publication (optional).
+        :return: List of matching books.
+        """
+        if self._repository is not None:
+            return self._repository.search_books(title, author, year)
+        return [
+            book
+            for book in self._books.values()
+            if matches_criteria(book, title, author, year)
+        ]
+
+    def iter_search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> Iterator[Book]:
+        if self._repository is not None:
+            return self._repository.iter_search_books(title, author, year)
+        return super().iter_search_books(title, author, year)
+
+    def page_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+        order_by: str = "id",
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[Sequence] = None,
+    ) -> BookPage:
+        """
+        Get one page of books matching the search criteria in sort order.
+        Pages of a published version in ID order without criteria start at the
+        cursor instead of scanning the books before it; filtered pages use the
+        repository's indexes when available.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :param order_by: Field to sort by ("id", "year" or "title").
+        :param limit: Maximum number of books on the page.
+        :param offset: Number of books to skip after the cursor.
+        :param after: Cursor returned with the previous page (optional).
+        :return: The requested page.
+        :raises ValueError: If the paging arguments are invalid.
+        """
+        key = get_sort_key(order_by)
+        check_page_arguments(limit, offset)
+        if order_by == "id" and not (title or author or year) and isinstance(
+            self._books, BookVersion
+        ):
+            start = tuple(after)[0] + 1 if after is not None else 0
+            books = list(islice(self._books.values_from(start), offset, offset + limit + 1))
+            page = books[:limit]
+            return BookPage(page, key(page[-1]) if len(books) > limit else None)
+        if self._repository is not None:
+            return self._repository.page_books(
+                title, author, year, order_by, limit, offset, after
+            )
+        return super().page_books(title, author, year, order_by, limit, offset, after)
+
+    def find_book_by_key(self, title: str, author: str, year: int) -> Optional[Book]:
+        if self._repository is not None:
+            return self._repository.find_book_by_key(title, author, year)
+        return super().find_book_by_key(title, author, year)
+
+    def count_by_status(self) -> Dict[str, int]:
+        if self._repository is not None:
+            return self._repository.count_by_status()
+        return super().count_by_status()
+
+    def count_by_author(self) -> Dict[str, int]:
+        if self._repository is not None:
+            return self._repository.count_by_author()
+        return super().count_by_author()
+
+    def count_by_decade(self) -> Dict[int, int]:
+        if self._repository is not None:
+            return self._repository.count_by_decade()
+        return super().count_by_decade()
+
+    def iter_books_by_status(self, status: str) -> Iterator[Book]:
+        if self._repository is not None:
+            return self._repository.iter_books_by_status(status)
+        return super().iter_books_by_status(status)
+
+    def iter_books_by_year_range(
+        self, start_year: Optional[int] = None, end_year: Optional[int] = None
+    ) -> Iterator[Book]:
+        if self._repository is not None:
+            return self._repository.iter_books_by_year_range(start_year, end_year)
+        return super().iter_books_by_year_range(start_year, end_year)
+
+    def iter_books_due(
+        self,
+        after: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Book]:
+        if self._repository is not None:
+            return self._repository.iter_books_due(after, until, limit)
+        return super().iter_books_due(after, until, limit)
+
+    def autocomplete(
+        self, prefix: str, field: Optional[str] = None, limit: int = 10
+    ) -> List[Book]:
+        if self._repository is not None:
+            return self._repository.autocomplete(prefix, field, limit)
+        return super().autocomplete(prefix, field, limit)
+
+    def add_book(self, book: Book) -> None:
+        """
+        Snapshots cannot be modified.
+        :raises ReadOnlySnapshotError: Always.
+        """
+        raise ReadOnlySnapshotError()
+
+    def delete_book(self, book_id: int) -> bool:
+        """
+        Snapshots cannot be modified.
+        :raises ReadOnlySnapshotError: Always.
+        """
+        raise ReadOnlySnapshotError()
+
+    def update_book_status(
+        self, book_id: int, new_status: str, loan: Optional[Loan] = None
+    ) -> bool:
+        """
+        Snapshots cannot be modified.
+        :raises ReadOnlySnapshotError: Always.
+        """
+        raise ReadOnlySnapshotError()
+
+
+class AsyncBookService:
+    """
+    Asyncio front-end for BookService.
+    All writes go through one queue and one writer task, which runs them one at
+    a time on a dedicated thread; status changes that pile up in the queue are
+    group-committed with one repository write. Reads are served concurrently from a shared
+    in-memory snapshot of the catalog that is rebuilt lazily after writes.
+    """
+
+    def __init__(
+        self,
+        repository: BookRepositoryInterface,
+        executor: Optional[Executor] = None,
+        status_batch_size: int = 256,
+    ):
+        """
+        Initialize the service.
+        :param repository: Repository instance for data management.
+        :param executor: Executor for reads and snapshot rebuilds (defaults to the loop's).
+        :param status_batch_size: Maximum number of queued status changes persisted
+            together (1 disables batching).
+        """
+        self.service = BookService(repository)
+        self.status_batch_size = status_batch_size
+        self._executor = executor
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="book-writer")
+        self._queue: Optional["asyncio.Queue"] = None
+        self._writer_task: Optional["asyncio.Task"] = None
+        self._snapshot: Optional[BookService] = None
+        self._snapshot_future: Optional["asyncio.Future"] = None
+        self._version = 0
+
+    async def start(self) -> None:
+        """
+        Start the writer task.
+        """
+        if self._writer_task is None:
+            self._queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._writer_loop())
+
+    async def close(self) -> None:
+        """
+        Finish queued writes and stop the writer task.
+        """
+        if self._writer_task is not None:
+            await self._queue.join()
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        self._write_executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> "AsyncBookService":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def _writer_loop(self) -> None:
+        """
+        Apply queued writes one at a time.
+        """
+        loop = asyncio.get_running_loop()
+        pending = None
+        while True:
+            item, pending = pending or await self._queue.get(), None
+            if isinstance(item[0], StatusChange):
+                batch = [item]
+                while len(batch) < self.status_batch_size and not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    if not isinstance(item[0], StatusChange):
+                        pending = item
+                        break
+                    batch.append(item)
+                await self._commit_status_batch(batch)
+                continue
+
+            func, future = item
+            try:
+                result = await loop.run_in_executor(self._write_executor, func)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            finally:
+                self._written()
+
+    async def _commit_status_batch(self, batch: List[tuple]) -> None:
+        """
+        Apply queued status changes with a single repository write.
+        :param batch: Queue items holding a StatusChange and its future.
+        """
+        changes = [change for change, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._write_executor, commit_status_changes, self.service, changes
+            )
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), error in zip(batch, results):
+            if future.cancelled():
+                pass
+            elif error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+        for _ in batch:
+            self._written()
+
+    def _written(self) -> None:
+        """
+        Mark one queued write as done and drop the outdated snapshot.
+        """
+        self._version += 1
+        self._snapshot = None
+        self._queue.task_done()
+
+    async def _write(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        Queue a write and wait for its result.
+        :param func: BookService method to call.
+        :return: Result of the call.
+        """
+        if self._writer_task is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((partial(func, *args, **kwargs), future))
+        return await future
+
+    async def _read(self, func: Callable[[BookService], Any]) -> Any:
+        """
+        Run a read against the current snapshot in the read executor.
+        :param func: Function receiving a BookService over the snapshot.
+        :return: Result of the call.
+        """
+        snapshot = await self._get_snapshot()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, func, snapshot
+        )
+
+    async def _get_snapshot(self) -> BookService:
+        """
+        Get a BookService over the current snapshot, rebuilding it once after writes.
+        Concurrent readers share a single rebuild.
+        :return: Read-only BookService.
+        """
+        while self._snapshot is None:
+            if self._snapshot_future is None:
+                self._snapshot_future = asyncio.ensure_future(self._build_snapshot())
+            future = self._snapshot_future
+            try:
+                snapshot, version = await asyncio.shield(future)
+            finally:
+                if self._snapshot_future is future and future.done():
+                    self._snapshot_future = None
+            if version == self._version:
+                self._snapshot = snapshot
+            else:
+                return snapshot
+        return self._snapshot
+
+    async def _build_snapshot(self) -> Tuple[BookService, int]:
+        """
+        Take a snapshot of the catalog on the writer thread, so it never sees a
+        half-applied write. The published version of a CachedBookRepository is
+        used as is, with the repository's indexes serving filtered reads; other
+        repositories are copied.
+        :return: Tuple of (snapshot service, catalog version it reflects).
+        """
+        loop = asyncio.get_running_loop()
+        version = self._version
+        repository = self.service.repository
+        if isinstance(repository, CachedBookRepository):
+            books = await loop.run_in_executor(self._write_executor, repository.snapshot)
+            return BookService(SnapshotBookRepository(books, repository)), version
+        books = await loop.run_in_executor(
+            self._write_executor, lambda: list(repository.iter_books())
+        )
+        return BookService(SnapshotBookRepository(books)), version
+
+    async def add_book(self, title: str, author: str, year: int) -> Book:
+        """
+        Add a new book to the library (see BookService.add_book).
+        :return: The added book instance.
+        """
+        return await self._write(self.service.add_book, title, author, year)
+
+    async def delete_book(self, book_id: int) -> None:
+        """
+        Delete a book by its ID (see BookService.delete_book).
+        """
+        await self._write(self.service.delete_book, book_id)
+
+    async def update_book_status(self, book_id: int, new_status: str) -> None:
+        """
+        Update the status of a book (see BookService.update_book_status).
+        Status changes waiting in the queue together are persisted as one batch.
+        """
+        if self._writer_task is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((StatusChange(book_id, new_status), future))
+        await future
+
+    async def bulk_add(
+        self, records: Iterable[Mapping[str, Any]], skip_duplicates: bool = False
+    ) -> List[Book]:
+        """
+        Add many books at once (see BookService.bulk_add).
+        :return: The added book instances.
+        """
+        return await self._write(self.service.bulk_add, list(records), skip_duplicates)
+
+    async def bulk_update_status(self, book_ids: Iterable[int], new_status: str) -> int:
+        """
+        Update the status of many books at once (see BookService.bulk_update_status).
+        :return: Number of updated books.
+        """
+        return await self._write(self.service.bulk_update_status, list(book_ids), new_status)
+
+    async def get_book(self, book_id: int) -> Optional[Book]:
+        """
+        Get a book by its ID from the snapshot.
+        :return: The book, or None if it does not exist.
+        """
+        return await self._read(lambda service: service.repository.get_book(book_id))
+
+    async def list_books_page(
+        self,
+        order_by: str = "id",
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[Sequence] = None,
+    ) -> BookPage:
+        """
+        Get one page of the snapshot (see BookService.list_books_page).
+        :return: The requested page.
+        """
+        return await self._read(
+            lambda service: service.list_books_page(order_by, limit, offset, after)
+        )
+
+    async def search_books_page(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+        order_by: str = "id",
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[Sequence] = None,
+    ) -> BookPage:
+        """
+        Search the snapshot one page at a time (see BookService.search_books_page).
+        :return: The requested page.
+        """
+        return await self._read(
+            lambda service: service.search_books_page(
+                title, author, year, order_by, limit, offset, after
+            )
+        )
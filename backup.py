@@ -0,0 +1,571 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import zlib
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from operator import attrgetter
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from book_models import Book
+from book_repository import BookRepositoryInterface
+from change_feed import (
+    ChangeFeed,
+    PublishingBookRepository,
+    changes_cover,
+    encode_record,
+    stored_signature,
+)
+from exceptions import (
+    BackupCorruptedError,
+    BackupNotFoundError,
+    ChangesUnavailableError,
+    LibraryException,
+)
+from file_utils import atomic_write
+from locks import file_lock
+from repository_factory import BACKENDS, create_repository
+
+BACKUP_FORMAT = "library-backup"
+BACKUP_VERSION = 1
+DEFAULT_CHUNK_SIZE = 1000
+# Backups are named after their UTC creation time, so names sort chronologically.
+NAME_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+
+class ChunkRef(NamedTuple):
+    """
+    Manifest entry for one chunk: the books with IDs from index * chunk_size
+    up to (index + 1) * chunk_size, stored under the SHA-256 digest of their encoding.
+    """
+
+    index: int
+    digest: str
+    count: int
+
+
+class BackupManifest(NamedTuple):
+    """
+    Description of one backup: the chunks that held the catalog when it was taken,
+    and for backups of a publishing repository, the feed sequence number and the
+    stored data signature of the repository at that time.
+    """
+
+    name: str
+    created_at: datetime
+    chunk_size: int
+    chunks: Tuple[ChunkRef, ...]
+    sequence: Optional[int] = None
+    written: int = 0
+    signature: Any = None
+
+    @property
+    def count(self) -> int:
+        """
+        Number of books in the backup.
+        :return: Sum of the chunk counts.
+        """
+        return sum(chunk.count for chunk in self.chunks)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the manifest to a dictionary format.
+        :return: A dictionary representation of the manifest.
+        """
+        return {
+            "format": BACKUP_FORMAT,
+            "version": BACKUP_VERSION,
+            "name": self.name,
+            "created_at": self.created_at.isoformat(),
+            "chunk_size": self.chunk_size,
+            "sequence": self.sequence,
+            "written": self.written,
+            "signature": self.signature,
+            "chunks": [list(chunk) for chunk in self.chunks],
+        }
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "BackupManifest":
+        """
+        Create a manifest from a dictionary.
+        :param data: Dictionary containing manifest data.
+        :return: A BackupManifest instance.
+        :raises ValueError: If the dictionary is not a supported manifest.
+        """
+        if data.get("format") != BACKUP_FORMAT or data.get("version") != BACKUP_VERSION:
+            raise ValueError("Not a supported backup manifest.")
+        return BackupManifest(
+            name=data["name"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+            chunk_size=data["chunk_size"],
+            chunks=tuple(ChunkRef(*chunk) for chunk in data["chunks"]),
+            sequence=data["sequence"],
+            written=data["written"],
+            signature=data.get("signature"),
+        )
+
+
+def encode_chunk(books: Iterable[Book]) -> bytes:
+    """
+    Encode the books of a chunk as JSON lines.
+    The encoding only depends on the books, so an unchanged chunk keeps its digest.
+    :param books: Books of the chunk, ordered by ID.
+    :return: Encoded chunk.
+    """
+    return b"".join(encode_record(book.to_dict()) for book in books)
+
+
+def group_books(books: Iterable[Book], chunk_size: int) -> Dict[int, List[Book]]:
+    """
+    Split books into chunks of consecutive IDs.
+    :param books: Books to split.
+    :param chunk_size: Number of IDs per chunk.
+    :return: Mapping of chunk index to the books of the chunk, ordered by ID.
+    """
+    groups: Dict[int, List[Book]] = {}
+    for book in books:
+        groups.setdefault(book.id // chunk_size, []).append(book)
+    for group in groups.values():
+        group.sort(key=attrgetter("id"))
+    return groups
+
+
+class BackupStore:
+    """
+    Directory of incremental, checksummed catalog backups.
+    The catalog is split into chunks of chunk_size consecutive book IDs. Each
+    chunk is compressed and stored once in chunks/, named after the SHA-256
+    digest of its contents, and each backup is a manifest in manifests/ that
+    lists the digests of its chunks. A backup writes only the chunks that no
+    earlier backup stored, so its I/O grows with the churn rather than the
+    size of the catalog. Backups of a PublishingBookRepository read only the
+    chunks touched by the changes in its feed since the previous backup, as long
+    as the data signatures in the feed show that no write bypassed it.
+    Restores check every chunk against its digest before writing anything.
+    """
+
+    def __init__(self, directory: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Open a backup directory, which is created with the first backup.
+        :param directory: Path to the backup directory.
+        :param chunk_size: Number of book IDs per chunk for new backups.
+        :raises ValueError: If the chunk size is not a positive integer.
+        """
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ValueError("Chunk size must be a positive integer.")
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.chunks_path = os.path.join(directory, "chunks")
+        self.manifests_path = os.path.join(directory, "manifests")
+        self.lock_path = os.path.join(directory, "lock")
+
+    def _chunk_path(self, digest: str) -> str:
+        """
+        Get the path of a chunk file.
+        :param digest: SHA-256 digest of the chunk.
+        :return: Path below chunks/, in a subdirectory per digest prefix.
+        """
+        return os.path.join(self.chunks_path, digest[:2], digest)
+
+    def _manifest_path(self, name: str) -> str:
+        """
+        Get the path of a manifest file.
+        :param name: Name of the backup.
+        :return: Path below manifests/.
+        """
+        return os.path.join(self.manifests_path, f"{name}.json")
+
+    def names(self) -> List[str]:
+        """
+        List the names of the backups, oldest first.
+        :return: List of backup names.
+        """
+        if not os.path.isdir(self.manifests_path):
+            return []
+        return sorted(
+            file_name[:-len(".json")]
+            for file_name in os.listdir(self.manifests_path)
+            if file_name.endswith(".json")
+        )
+
+    def list_backups(self) -> List[BackupManifest]:
+        """
+        Load the manifests of all backups, oldest first.
+        :return: List of manifests.
+        :raises BackupCorruptedError: If a manifest cannot be read.
+        """
+        return [self.load_manifest(name) for name in self.names()]
+
+    def load_manifest(self, name: str) -> BackupManifest:
+        """
+        Load the manifest of a backup.
+        :param name: Name of the backup.
+        :return: The manifest.
+        :raises BackupNotFoundError: If there is no backup with the name.
+        :raises BackupCorruptedError: If the manifest cannot be read.
+        """
+        path = self._manifest_path(name)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return BackupManifest.from_dict(json.load(file))
+        except FileNotFoundError:
+            raise BackupNotFoundError(name)
+        except (ValueError, KeyError, TypeError) as e:
+            raise BackupCorruptedError(path, str(e))
+
+    def find_backup(self, at: Optional[datetime] = None) -> BackupManifest:
+        """
+        Find the backup to restore for a point in time.
+        :param at: Time to restore the catalog as of (defaults to the latest backup).
+        :return: Manifest of the latest backup taken at or before the time.
+        :raises BackupNotFoundError: If no backup was taken by then.
+        """
+        for name in reversed(self.names()):
+            manifest = self.load_manifest(name)
+            if at is None or manifest.created_at <= at:
+                return manifest
+        raise BackupNotFoundError(at.isoformat() if at is not None else self.directory)
+
+    def backup(self, repository: BookRepositoryInterface) -> BackupManifest:
+        """
+        Back up a catalog, writing only the chunks that are not stored yet.
+        :param repository: Repository to back up.
+        :return: Manifest of the new backup.
+        """
+        os.makedirs(self.chunks_path, exist_ok=True)
+        os.makedirs(self.manifests_path, exist_ok=True)
+        with file_lock(self.lock_path):
+            names = self.names()
+            previous = self.load_manifest(names[-1]) if names else None
+            sequence, signature, chunks, groups = self._read_changed(repository, previous)
+            written = 0
+            for index, books in groups.items():
+                if not books:
+                    chunks.pop(index, None)
+                    continue
+                data = encode_chunk(books)
+                digest = hashlib.sha256(data).hexdigest()
+                chunks[index] = ChunkRef(index, digest, len(books))
+                written += self._write_chunk(digest, data)
+            manifest = BackupManifest(
+                name=self._new_name(names),
+                created_at=datetime.now(timezone.utc),
+                chunk_size=self.chunk_size,
+                chunks=tuple(chunks[index] for index in sorted(chunks)),
+                sequence=sequence,
+                written=written,
+                signature=signature,
+            )
+            with atomic_write(self._manifest_path(manifest.name)) as file:
+                json.dump(manifest.to_dict(), file)
+        return manifest
+
+    def _read_changed(
+        self, repository: BookRepositoryInterface, previous: Optional[BackupManifest]
+    ) -> Tuple[Optional[int], Any, Dict[int, ChunkRef], Dict[int, List[Book]]]:
+        """
+        Read the chunks that may have changed since the previous backup.
+        With a change feed that still holds every change since the previous
+        backup, only the chunks of the changed books are read; otherwise all are.
+        :param repository: Repository to back up.
+        :param previous: Manifest of the previous backup, if any.
+        :return: Tuple of (feed sequence number the books reflect, or None without
+            a feed; stored data signature of the repository, or None without a feed;
+            chunks kept from the previous backup; books of the chunks to encode, with
+            an empty list for chunks that no longer hold books).
+        """
+        feed = repository.feed if isinstance(repository, PublishingBookRepository) else None
+        signature = None
+        with repository.transaction() if feed is not None else nullcontext():
+            if feed is not None:
+                sequence = feed.last_sequence
+                signature = stored_signature(repository.data_signature())
+            else:
+                sequence = None
+            changed = self._changed_chunks(feed, previous, signature)
+            if changed is None:
+                books = repository.get_all_books()
+                return sequence, signature, {}, group_books(books, self.chunk_size)
+            book_ids: List[int] = []
+            for index in changed:
+                book_ids.extend(range(index * self.chunk_size, (index + 1) * self.chunk_size))
+            books = repository.get_books(book_ids).values()
+        groups: Dict[int, List[Book]] = {index: [] for index in changed}
+        groups.update(group_books(books, self.chunk_size))
+        return sequence, signature, {chunk.index: chunk for chunk in previous.chunks}, groups
+
+    def _changed_chunks(
+        self, feed: Optional[ChangeFeed], previous: Optional[BackupManifest], signature: Any
+    ) -> Optional[Set[int]]:
+        """
+        Find the chunks changed since the previous backup from the change feed.
+        The feed is only trusted if its changes lead from the data signature
+        stored with the previous backup to the current one, so writes that
+        bypassed the feed (or a backend without signatures) cause a full read.
+        :param feed: Change feed of the repository, if it has one.
+        :param previous: Manifest of the previous backup, if any.
+        :param signature: Current stored data signature of the repository.
+        :return: Indexes of the changed chunks, or None if they cannot be told
+            from the feed and every chunk must be read.
+        """
+        if (
+            feed is None
+            or previous is None
+            or previous.sequence is None
+            or previous.chunk_size != self.chunk_size
+            or previous.sequence > feed.last_sequence
+        ):
+            return None
+        try:
+            changes = feed.read(previous.sequence)
+        except ChangesUnavailableError:
+            return None
+        if not changes_cover(changes, previous.signature, signature):
+            return None
+        return {change.book_id // self.chunk_size for change in changes}
+
+    def _write_chunk(self, digest: str, data: bytes) -> int:
+        """
+        Store a chunk unless a chunk with the same digest is stored already.
+        :param digest: SHA-256 digest of the data.
+        :param data: Encoded chunk.
+        :return: 1 if the chunk was written, 0 if it was stored already.
+        """
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path, binary=True) as file:
+            file.write(zlib.compress(data))
+        return 1
+
+    def _new_name(self, names: List[str]) -> str:
+        """
+        Name a new backup after the current time, later than every existing name.
+        :param names: Names of the existing backups, oldest first.
+        :return: Unused name.
+        """
+        name = datetime.now(timezone.utc).strftime(NAME_FORMAT)
+        while names and name <= names[-1]:
+            name = datetime.now(timezone.utc).strftime(NAME_FORMAT)
+        return name
+
+    def read_chunk(self, manifest: BackupManifest, chunk: ChunkRef) -> List[Book]:
+        """
+        Read a chunk of a backup and check it against its digest.
+        :param manifest: Manifest listing the chunk.
+        :param chunk: Manifest entry of the chunk.
+        :return: Books of the chunk, ordered by ID.
+        :raises BackupCorruptedError: If the chunk is missing or damaged.
+        """
+        path = self._chunk_path(chunk.digest)
+        try:
+            with open(path, "rb") as file:
+                data = zlib.decompress(file.read())
+        except FileNotFoundError:
+            raise BackupCorruptedError(path, "the chunk is missing")
+        except zlib.error as e:
+            raise BackupCorruptedError(path, str(e))
+        if hashlib.sha256(data).hexdigest() != chunk.digest:
+            raise BackupCorruptedError(path, "the checksum does not match")
+        try:
+            books = [Book.from_dict(json.loads(line)) for line in data.splitlines()]
+        except (LibraryException, ValueError, KeyError, TypeError) as e:
+            raise BackupCorruptedError(path, str(e))
+        if len(books) != chunk.count or any(
+            book.id // manifest.chunk_size != chunk.index for book in books
+        ):
+            raise BackupCorruptedError(path, "the chunk does not match the manifest")
+        return books
+
+    def iter_books(self, manifest: BackupManifest) -> Iterator[Book]:
+        """
+        Iterate over the books of a backup, checking each chunk as it is read.
+        :param manifest: Manifest of the backup.
+        :return: Iterator over books, ordered by ID.
+        :raises BackupCorruptedError: If a chunk is missing or damaged.
+        """
+        for chunk in manifest.chunks:
+            yield from self.read_chunk(manifest, chunk)
+
+    def verify(self, name: Optional[str] = None) -> int:
+        """
+        Check the chunks of one or all backups against their digests.
+        :param name: Name of the backup to check (defaults to all backups).
+        :return: Number of distinct chunks checked.
+        :raises BackupNotFoundError: If there is no backup with the name.
+        :raises BackupCorruptedError: If a manifest or chunk is missing or damaged.
+        """
+        manifests = [self.load_manifest(name)] if name is not None else self.list_backups()
+        checked: Set[str] = set()
+        for manifest in manifests:
+            for chunk in manifest.chunks:
+                if chunk.digest not in checked:
+                    self.read_chunk(manifest, chunk)
+                    checked.add(chunk.digest)
+        return len(checked)
+
+    def restore(
+        self,
+        repository: BookRepositoryInterface,
+        name: Optional[str] = None,
+        at: Optional[datetime] = None,
+    ) -> BackupManifest:
+        """
+        Restore a backup into an empty catalog of any backend.
+        Every chunk is read and checked before the books are added with a single write.
+        :param repository: Repository to restore into.
+        :param name: Name of the backup to restore (optional).
+        :param at: Restore the latest backup taken at or before this time instead
+            (defaults to the latest backup).
+        :return: Manifest of the restored backup.
+        :raises BackupNotFoundError: If the backup does not exist.
+        :raises BackupCorruptedError: If a manifest or chunk is missing or damaged.
+        :raises ValueError: If the repository is not empty.
+        """
+        manifest = self.load_manifest(name) if name is not None else self.find_backup(at)
+        books = list(self.iter_books(manifest))
+        with repository.transaction():
+            if repository.count_books():
+                raise ValueError("Backups can only be restored into an empty catalog.")
+            if books:
+                repository.add_books(books)
+        return manifest
+
+    def diff(self, old: BackupManifest, new: BackupManifest) -> Iterator[Dict[str, Any]]:
+        """
+        Compare two backups, reading only the chunks that differ between them.
+        :param old: Manifest of the earlier backup.
+        :param new: Manifest of the later backup.
+        :return: Iterator over records ordered by book ID: {"op": "add", "book": ...}
+            and {"op": "update", "book": ...} with the book as in the later backup,
+            and {"op": "delete", "id": ...}.
+        :raises BackupCorruptedError: If a chunk is missing or damaged.
+        """
+        if old.chunk_size == new.chunk_size:
+            same = set(old.chunks) & set(new.chunks)
+        else:
+            same = set()
+        before = {
+            book.id: book
+            for chunk in old.chunks
+            if chunk not in same
+            for book in self.read_chunk(old, chunk)
+        }
+        after = {
+            book.id: book
+            for chunk in new.chunks
+            if chunk not in same
+            for book in self.read_chunk(new, chunk)
+        }
+        for book_id in sorted(before.keys() | after.keys()):
+            old_book, new_book = before.get(book_id), after.get(book_id)
+            if new_book is None:
+                yield {"op": "delete", "id": book_id}
+            elif old_book is None:
+                yield {"op": "add", "book": new_book.to_dict()}
+            elif old_book.to_dict() != new_book.to_dict():
+                yield {"op": "update", "book": new_book.to_dict()}
+
+    def prune(self, keep: int) -> int:
+        """
+        Delete all but the latest backups, and the chunks only they referenced.
+        :param keep: Number of backups to keep.
+        :return: Number of backups deleted.
+        :raises ValueError: If keep is not a positive integer.
+        """
+        if not isinstance(keep, int) or keep <= 0:
+            raise ValueError("The number of backups to keep must be a positive integer.")
+        if not os.path.isdir(self.manifests_path):
+            return 0
+        with file_lock(self.lock_path):
+            names = self.names()
+            removed = names[:-keep]
+            for name in removed:
+                os.unlink(self._manifest_path(name))
+            referenced = {
+                chunk.digest for manifest in self.list_backups() for chunk in manifest.chunks
+            }
+            for directory, _, file_names in os.walk(self.chunks_path):
+                for file_name in file_names:
+                    if file_name not in referenced:
+                        os.unlink(os.path.join(directory, file_name))
+        return len(removed)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Entry point for backing up and restoring a catalog.
+    """
+    parser = argparse.ArgumentParser(description="Incremental backups of a library catalog.")
+    parser.add_argument("backups", help="Path to the backup directory.")
+    parser.add_argument("--data", default="data.json", help="Path to the library data file.")
+    parser.add_argument("--backend", default="cached", choices=sorted(BACKENDS))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = commands.add_parser("create", help="Back up the catalog.")
+    create_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    create_parser.add_argument(
+        "--feed", help="Change feed of the catalog, to read only the changed chunks."
+    )
+
+    commands.add_parser("list", help="List the backups.")
+
+    verify_parser = commands.add_parser("verify", help="Check backups against their checksums.")
+    verify_parser.add_argument("name", nargs="?", help="Backup to check (defaults to all).")
+
+    restore_parser = commands.add_parser("restore", help="Restore a backup into an empty catalog.")
+    restore_parser.add_argument("name", nargs="?", help="Backup to restore.")
+    restore_parser.add_argument(
+        "--at", type=datetime.fromisoformat, help="Restore the catalog as of this ISO time."
+    )
+
+    diff_parser = commands.add_parser("diff", help="Print the changes between two backups.")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+
+    prune_parser = commands.add_parser("prune", help="Delete all but the latest backups.")
+    prune_parser.add_argument("--keep", type=int, required=True)
+
+    args = parser.parse_args(argv)
+    store = BackupStore(args.backups, getattr(args, "chunk_size", DEFAULT_CHUNK_SIZE))
+    try:
+        if args.command == "create":
+            repository = create_repository(args.backend, args.data)
+            if args.feed:
+                repository = PublishingBookRepository(repository, ChangeFeed(args.feed))
+            manifest = store.backup(repository)
+            print(
+                f"Backed up {manifest.count} books as {manifest.name}, "
+                f"writing {manifest.written} of {len(manifest.chunks)} chunks."
+            )
+        elif args.command == "list":
+            for manifest in store.list_backups():
+                print(
+                    f"{manifest.name}  {manifest.created_at.isoformat()}  "
+                    f"{manifest.count} books  {len(manifest.chunks)} chunks"
+                )
+        elif args.command == "verify":
+            print(f"Checked {store.verify(args.name)} chunks.")
+        elif args.command == "restore":
+            at = args.at
+            if at is not None and at.tzinfo is None:
+                at = at.replace(tzinfo=timezone.utc)
+            manifest = store.restore(create_repository(args.backend, args.data), args.name, at)
+            print(f"Restored {manifest.count} books from {manifest.name} into {args.data}.")
+        elif args.command == "diff":
+            old, new = store.load_manifest(args.old), store.load_manifest(args.new)
+            for record in store.diff(old, new):
+                sys.stdout.buffer.write(encode_record(record))
+        else:
+            print(f"Deleted {store.prune(args.keep)} backups.")
+    except BrokenPipeError:
+        pass
+    except (LibraryException, ValueError, OSError) as e:
+        parser.exit(1, f"Error: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows has no resource module
+    resource = None
+
+from book_io import write_records
+from book_models import Book, BookStatus
+from book_service import BookService
+from exceptions import LibraryException
+from file_utils import load_books, save_books
+from repository_factory import BACKENDS, create_repository
+
+TITLE_WORDS = (
+    "night garden river shadow house winter war peace silent city light dark lost last "
+    "secret road sea stone fire iron glass king queen child road empire star moon sun "
+    "storm forest mountain island memory ghost dream time world journey letter song "
+    "heart blood crown return fall rise edge echo key door bridge tower north south"
+).split()
+FIRST_NAMES = (
+    "Anna Boris Clara David Elena Frank Grace Henry Irene James Karen Leo Maria Nikolai "
+    "Olga Peter Quinn Rosa Samuel Tatiana Ursula Victor Wanda Xavier Yuri Zoe"
+).split()
+LAST_NAMES = (
+    "Smith Ivanov Garcia Muller Rossi Kowalski Novak Johansson Dubois Tanaka Kim Silva "
+    "Petrov Haurylenka Brown Wilson Moreau Fischer Costa Lindqvist Horvat Yilmaz"
+).split()
+
+DEFAULT_SIZES = [10000]
+DEFAULT_SCENARIOS = ["load", "save", "search", "add", "status", "mixed"]
+SAMPLE_SIZE = 1000
+SNAPSHOT_NAME = "catalog.json"
+
+
+def _zipf_weights(count: int, exponent: float = 1.1) -> List[float]:
+    """
+    Zipf weights, so a few values are very common and most are rare.
+    :param count: Number of values.
+    :param exponent: Skew of the distribution.
+    :return: Weight of each rank.
+    """
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def generate_catalog(size: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Generate a reproducible synthetic catalog.
+    Title words and authors follow Zipf distributions (a few prolific authors,
+    many with one book) and years are skewed towards recent decades.
+    Every (title, author, year) combination is unique.
+    :param size: Number of books.
+    :param seed: Random seed.
+    :return: Iterator over book records with "title", "author", "year" and "status".
+    """
+    rng = random.Random(seed)
+    word_weights = _zipf_weights(len(TITLE_WORDS))
+    authors = [f"{first} {last}" for last in LAST_NAMES for first in FIRST_NAMES]
+    rng.shuffle(authors)
+    author_weights = _zipf_weights(len(authors))
+    seen = set()
+    for _ in range(size):
+        words = rng.choices(TITLE_WORDS, word_weights, k=rng.randint(1, 4))
+        title = " ".join(words).capitalize()
+        author = rng.choices(authors, author_weights)[0]
+        year = int(rng.triangular(1800, 2024, 2010))
+        volume = 1
+        key = (title, author, year)
+        while key in seen:
+            volume += 1
+            key = (f"{title}, Volume {volume}", author, year)
+        seen.add(key)
+        yield {
+            "title": key[0],
+            "author": author,
+            "year": year,
+            "status": "checked_out" if rng.random() < 0.2 else "available",
+        }
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile.
+    :param sorted_values: Values in ascending order.
+    :param fraction: Percentile as a fraction between 0 and 1.
+    :return: The percentile, or 0.0 for no values.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Peak resident set size of this process.
+    :return: Peak RSS in MiB, or None where the resource module is missing.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def prepare_catalog(
+    backend: str, directory: str, size: int, seed: int
+) -> Tuple[str, List[Tuple[str, int]]]:
+    """
+    Generate the catalog, write the JSON snapshot and populate the repository.
+    Runs in a separate process, so the generated books never count towards the
+    peak RSS of the process that is measured.
+    :param backend: Name of the storage backend.
+    :param directory: Directory for the data files.
+    :param size: Number of books in the catalog.
+    :param seed: Random seed for the catalog.
+    :return: Path of the data file and a sample of (author, year) pairs for the searches.
+    """
+    books = [
+        Book(book_id, record["title"], record["author"], record["year"], record["status"])
+        for book_id, record in enumerate(generate_catalog(size, seed), start=1)
+    ]
+    save_books(os.path.join(directory, SNAPSHOT_NAME), books)
+    extension = {"sqlite": ".db", "mmap": ".mmap"}.get(backend, ".json")
+    data_path = os.path.join(directory, "data" + extension)
+    repository = create_repository(backend, data_path)
+    try:
+        repository.add_books(books)
+    finally:
+        close = getattr(repository, "close", None)
+        if close is not None:
+            close()
+    step = max(1, size // SAMPLE_SIZE)
+    return data_path, [(book.author, book.year) for book in books[::step]]
+
+
+class Workload:
+    """
+    A populated repository and the state the scenario operations draw from.
+    Only the catalog size and a small sample of authors and years are kept in
+    memory; the books themselves live in the repository.
+    """
+
+    def __init__(self, backend: str, directory: str, size: int, seed: int):
+        """
+        Create and populate the repository in a separate process, then open it.
+        :param backend: Name of the storage backend.
+        :param directory: Directory for the data files.
+        :param size: Number of books in the catalog.
+        :param seed: Random seed for the catalog and the operations.
+        """
+        self.rng = random.Random(seed + 1)
+        self.size = size
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            data_path, self.sample = executor.submit(
+                prepare_catalog, backend, directory, size, seed
+            ).result()
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.service = BookService(create_repository(backend, data_path))
+        self.added = 0
+
+    def random_id(self) -> int:
+        """
+        Pick a random ID of the generated catalog.
+        """
+        return self.rng.randint(1, self.size)
+
+    def random_sample(self) -> Tuple[str, int]:
+        """
+        Pick a random (author, year) pair of the generated catalog.
+        """
+        return self.rng.choice(self.sample)
+
+    def load(self) -> None:
+        """
+        Parse the JSON catalog (file_utils.load_books).
+        """
+        load_books(self.snapshot_path)
+
+    def save(self) -> None:
+        """
+        Serialize the repository's catalog to the JSON snapshot (file_utils.save_books).
+        """
+        save_books(self.snapshot_path, self.service.repository.get_all_books())
+
+    def search_title(self) -> None:
+        """
+        Search by a title word.
+        """
+        self.service.search_books(title=self.rng.choice(TITLE_WORDS))
+
+    def search_author(self) -> None:
+        """
+        Search by an author's last name.
+        """
+        self.service.search_books(author=self.random_sample()[0].split()[-1])
+
+    def search_year(self) -> None:
+        """
+        Search by year.
+        """
+        self.service.search_books(year=self.random_sample()[1])
+
+    def list_page(self) -> None:
+        """
+        Fetch the first page of the catalog in a random order.
+        """
+        self.service.list_books_page(order_by=self.rng.choice(["id", "year", "title"]))
+
+    def add(self) -> None:
+        """
+        Add a new book.
+        """
+        self.added += 1
+        self.service.add_book(f"Benchmark book {self.added}", "Benchmark Author", 2024)
+
+    def update_status(self) -> None:
+        """
+        Check out an available book or return a checked-out one.
+        """
+        book_id = self.random_id()
+        current = self.service.repository.get_book(book_id)
+        if current is None:
+            return
+        checked_out = current.status == BookStatus.CHECKED_OUT
+        self.service.update_book_status(
+            book_id, BookStatus.AVAILABLE.value if checked_out else BookStatus.CHECKED_OUT.value
+        )
+
+    def close(self) -> None:
+        """
+        Release the repository's resources.
+        """
+        close = getattr(self.service.repository, "close", None)
+        if close is not None:
+            close()
+
+
+SCENARIOS: Dict[str, List[Tuple[int, Callable[[Workload], None]]]] = {
+    "load": [(1, Workload.load)],
+    "save": [(1, Workload.save)],
+    "search": [(1, Workload.search_title), (1, Workload.search_author), (1, Workload.search_year)],
+    "list": [(1, Workload.list_page)],
+    "add": [(1, Workload.add)],
+    "status": [(1, Workload.update_status)],
+    "mixed": [
+        (40, Workload.search_title),
+        (15, Workload.search_author),
+        (10, Workload.search_year),
+        (10, Workload.list_page),
+        (20, Workload.update_status),
+        (5, Workload.add),
+    ],
+}
+
+
+def run_scenario(
+    workload: Workload, scenario: str, operations: int, time_limit: float
+) -> Dict[str, Any]:
+    """
+    Run one scenario and summarize its latencies.
+    :param workload: Populated workload.
+    :param scenario: Name of the scenario (one of SCENARIOS).
+    :param operations: Number of operations to run.
+    :param time_limit: Stop early after this many seconds (at least one operation runs).
+    :return: Scenario results.
+    """
+    weights, functions = zip(*SCENARIOS[scenario])
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    deadline = started + time_limit
+    for function in workload.rng.choices(functions, weights, k=operations):
+        begin = time.perf_counter()
+        try:
+            function(workload)
+        except LibraryException:
+            errors += 1
+        end = time.perf_counter()
+        latencies.append(end - begin)
+        if end > deadline:
+            break
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "scenario": scenario,
+        "operations": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 6),
+        "throughput": round(len(latencies) / elapsed, 3) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "max_ms": round(latencies[-1] * 1000, 4),
+    }
+
+
+def run_case(
+    backend: str,
+    size: int,
+    scenarios: List[str],
+    operations: int,
+    time_limit: float,
+    seed: int,
+) -> List[Dict[str, Any]]:
+    """
+    Benchmark one backend with one catalog size.
+    :param backend: Name of the storage backend.
+    :param size: Number of books in the catalog.
+    :param scenarios: Names of the scenarios to run.
+    :param operations: Operations per scenario.
+    :param time_limit: Time limit per scenario in seconds.
+    :param seed: Random seed.
+    :return: One result per scenario.
+    """
+    directory = tempfile.mkdtemp(prefix="library-benchmark-")
+    try:
+        started = time.perf_counter()
+        workload = Workload(backend, directory, size, seed)
+        setup_seconds = round(time.perf_counter() - started, 3)
+        results = []
+        try:
+            for scenario in scenarios:
+                result = run_scenario(workload, scenario, operations, time_limit)
+                result.update(
+                    backend=backend,
+                    size=size,
+                    setup_seconds=setup_seconds,
+                    peak_rss_mb=peak_rss_mb(),
+                )
+                results.append(result)
+        finally:
+            workload.close()
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_benchmarks(
+    backends: List[str],
+    sizes: List[int],
+    scenarios: List[str],
+    operations: int,
+    time_limit: float,
+    seed: int,
+    isolate: bool = True,
+) -> Dict[str, Any]:
+    """
+    Benchmark every backend with every catalog size.
+    :param backends: Names of the storage backends.
+    :param sizes: Catalog sizes.
+    :param scenarios: Names of the scenarios to run.
+    :param operations: Operations per scenario.
+    :param time_limit: Time limit per scenario in seconds.
+    :param seed: Random seed.
+    :param isolate: Run each case in a fresh process, so peak RSS is per case.
+    :return: Machine-readable report with run metadata and results.
+    """
+    results = []
+    for size in sizes:
+        for backend in backends:
+            print(f"Benchmarking {backend} with {size} books...", file=sys.stderr)
+            arguments = (backend, size, scenarios, operations, time_limit, seed)
+            if isolate:
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    results.extend(executor.submit(run_case, *arguments).result())
+            else:
+                results.extend(run_case(*arguments))
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "operations": operations,
+            "time_limit": time_limit,
+            "isolated": isolate,
+        },
+        "results": results,
+    }
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """
+    Compare two reports case by case.
+    :param baseline: Earlier report.
+    :param current: New report.
+    :return: Table lines with the p50 latency and throughput ratios (current / baseline).
+    """
+    def index(report):
+        return {(r["backend"], r["size"], r["scenario"]): r for r in report["results"]}
+
+    old, new = index(baseline), index(current)
+    lines = [
+        f"{'backend':<12}{'size':>9}  {'scenario':<8}{'p50 ms':>12}{'x':>8}{'ops/s':>12}{'x':>8}"
+    ]
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        p50_ratio = after["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float("nan")
+        throughput_ratio = (
+            after["throughput"] / before["throughput"] if before["throughput"] else float("nan")
+        )
+        lines.append(
+            f"{key[0]:<12}{key[1]:>9}  {key[2]:<8}{after['p50_ms']:>12.3f}{p50_ratio:>8.2f}"
+            f"{after['throughput']:>12.1f}{throughput_ratio:>8.2f}"
+        )
+    return lines
+
+
+def format_report(report: Dict[str, Any]) -> List[str]:
+    """
+    Format a report as a table.
+    :param report: Report from run_benchmarks.
+    :return: Table lines.
+    """
+    lines = [
+        f"{'backend':<12}{'size':>9}  {'scenario':<8}{'ops':>7}{'ops/s':>12}"
+        f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'rss MiB':>9}"
+    ]
+    for r in report["results"]:
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        lines.append(
+            f"{r['backend']:<12}{r['size']:>9}  {r['scenario']:<8}{r['operations']:>7}"
+            f"{r['throughput']:>12.1f}{r['p50_ms']:>10.3f}{r['p90_ms']:>10.3f}"
+            f"{r['p99_ms']:>10.3f}{rss:>9}"
+        )
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Entry point for the benchmark harness.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks for the library backends.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run benchmarks.")
+    run_parser.add_argument("--backend", nargs="+", default=["cached"], choices=sorted(BACKENDS))
+    run_parser.add_argument("--size", nargs="+", type=int, default=DEFAULT_SIZES)
+    run_parser.add_argument(
+        "--scenario", nargs="+", default=DEFAULT_SCENARIOS, choices=list(SCENARIOS)
+    )
+    run_parser.add_argument("--operations", type=int, default=200, help="Operations per scenario.")
+    run_parser.add_argument("--time-limit", type=float, default=10.0, help="Seconds per scenario.")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument(
+        "--no-isolate", action="store_true", help="Run all cases in this process."
+    )
+    run_parser.add_argument("--output", help="Write the JSON report to this file.")
+    run_parser.add_argument("--compare", help="Compare with an earlier JSON report.")
+
+    generate_parser = commands.add_parser("generate", help="Write a synthetic catalog.")
+    generate_parser.add_argument("size", type=int)
+    generate_parser.add_argument("file", help="Output .csv or .jsonl file.")
+    generate_parser.add_argument("--seed", type=int, default=0)
+
+    compare_parser = commands.add_parser("compare", help="Compare two JSON reports.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        books = (
+            Book(book_id, record["title"], record["author"], record["year"], record["status"])
+            for book_id, record in enumerate(generate_catalog(args.size, args.seed), start=1)
+        )
+        count = write_records(args.file, books)
+        print(f"Wrote {count} books to {args.file}.")
+        return
+
+    if args.command == "compare":
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        with open(args.current, encoding="utf-8") as file:
+            current = json.load(file)
+        print("\n".join(compare_reports(baseline, current)))
+        return
+
+    report = run_benchmarks(
+        args.backend,
+        args.size,
+        args.scenario,
+        args.operations,
+        args.time_limit,
+        args.seed,
+        isolate=not args.no_isolate,
+    )
+    print("\n".join(format_report(report)))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=4)
+        print(f"Report written to {args.output}.")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            print("\n".join(compare_reports(json.load(file), report)))
+
+
+if __name__ == "__main__":
+    main()
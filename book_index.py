@@ -0,0 +1,709 @@
+import heapq
+import math
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from book_models import Book, BookStatus
+
+AUTOCOMPLETE_FIELDS = ("title", "author")
+# Names of the aggregate views a repository keeps counts for.
+AGGREGATE_VIEWS = ("status", "author", "decade")
+# Width of one slot of the loan index's time wheel.
+SECONDS_PER_DAY = 86400
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Split a string into its overlapping three-character substrings.
+    :param text: Normalized text.
+    :return: Set of trigrams (empty for strings shorter than three characters).
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for prefix matching: lower-cased, with runs of whitespace
+    collapsed to single spaces.
+    :param text: Text to normalize.
+    :return: Normalized text.
+    """
+    return " ".join(text.lower().split())
+
+
+def normalize_prefix(prefix: str) -> str:
+    """
+    Normalize a typed prefix like normalize_text, but keep one trailing space
+    so that "dune " only completes to texts with a word after "dune".
+    :param prefix: Prefix as typed.
+    :return: Normalized prefix (empty for blank input).
+    """
+    normalized = normalize_text(prefix)
+    if normalized and prefix[-1].isspace():
+        normalized += " "
+    return normalized
+
+
+def word_suffixes(text: str) -> List[str]:
+    """
+    Get the suffixes of a normalized text that start at its second and later words.
+    :param text: Normalized text.
+    :return: Suffixes, e.g. ["great gatsby", "gatsby"] for "the great gatsby".
+    """
+    suffixes = []
+    space = text.find(" ")
+    while space != -1:
+        suffixes.append(text[space + 1:])
+        space = text.find(" ", space + 1)
+    return suffixes
+
+
+def autocomplete_key(
+    book: Book, prefix: str, field: Optional[str]
+) -> Optional[Tuple[int, str, int, int]]:
+    """
+    Rank a book as a completion of a prefix.
+    Texts that start with the prefix come first (tier 0), then texts with a
+    later word starting with it (tier 1); within a tier, completions are
+    ordered alphabetically, so shorter and exact matches come first, then by
+    year and ID.
+    :param book: Book to rank.
+    :param prefix: Prefix normalized with normalize_prefix.
+    :param field: "title", "author", or None for both.
+    :return: Sort key, smaller is better, or None if the book does not match.
+    """
+    best: Optional[Tuple[int, str, int, int]] = None
+    for name in AUTOCOMPLETE_FIELDS if field is None else (field,):
+        text = normalize_text(getattr(book, name))
+        if text.startswith(prefix):
+            key = (0, text, book.year, book.id)
+        else:
+            suffix = min((s for s in word_suffixes(text) if s.startswith(prefix)), default=None)
+            if suffix is None:
+                continue
+            key = (1, suffix, book.year, book.id)
+        if best is None or key < best:
+            best = key
+    return best
+
+
+def due_key(book: Book) -> Tuple[datetime, int]:
+    """
+    Sort key ordering checked-out books by the due date of their loans.
+    :param book: Book with a loan.
+    :return: Tuple of (due date, book ID).
+    """
+    return book.loan.due_at, book.id
+
+
+def book_key(title: str, author: str, year: int) -> Tuple[str, str, int]:
+    """
+    Build the key that identifies duplicate books.
+    Title and author are stripped the same way Book stores them.
+    :param title: Title of the book.
+    :param author: Author of the book.
+    :param year: Year of publication.
+    :return: Tuple of (title, author, year).
+    """
+    return title.strip(), author.strip(), year
+
+
+class BookIndex(ABC):
+    """
+    Interface for secondary indexes maintained incrementally by in-memory repositories.
+    """
+
+    @abstractmethod
+    def add(self, book: Book) -> None:
+        pass
+
+    @abstractmethod
+    def remove(self, book: Book) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    def replace(self, old: Book, new: Book) -> None:
+        """
+        Update the index after a book was replaced by a modified copy.
+        :param old: Previous version of the book.
+        :param new: New version of the book.
+        """
+        self.remove(old)
+        self.add(new)
+
+    def rebuild(self, books: Iterable[Book]) -> None:
+        """
+        Rebuild the index from scratch.
+        :param books: All books in the catalog.
+        """
+        self.clear()
+        for book in books:
+            self.add(book)
+
+
+class KeyIndex(BookIndex):
+    """
+    Hash index from (title, author, year) to book ID used for duplicate detection.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        self._ids: Dict[Tuple[str, str, int], int] = {}
+
+    def add(self, book: Book) -> None:
+        self._ids[book_key(book.title, book.author, book.year)] = book.id
+
+    def remove(self, book: Book) -> None:
+        key = book_key(book.title, book.author, book.year)
+        if self._ids.get(key) == book.id:
+            del self._ids[key]
+
+    def replace(self, old: Book, new: Book) -> None:
+        if (old.title, old.author, old.year) != (new.title, new.author, new.year):
+            super().replace(old, new)
+
+    def clear(self) -> None:
+        self._ids.clear()
+
+    def lookup(self, title: str, author: str, year: int) -> Optional[int]:
+        """
+        Find the book with the given title, author and year.
+        :param title: Title of the book.
+        :param author: Author of the book.
+        :param year: Year of publication.
+        :return: ID of the book, or None if there is none.
+        """
+        return self._ids.get(book_key(title, author, year))
+
+
+class StatusCounter(BookIndex):
+    """
+    Number of books per status, for O(1) availability counts.
+    """
+
+    def __init__(self):
+        """
+        Initialize all counters to zero.
+        """
+        self._counts: Dict[BookStatus, int] = dict.fromkeys(BookStatus, 0)
+
+    def add(self, book: Book) -> None:
+        self._counts[book.status] += 1
+
+    def remove(self, book: Book) -> None:
+        self._counts[book.status] -= 1
+
+    def replace(self, old: Book, new: Book) -> None:
+        if old.status != new.status:
+            super().replace(old, new)
+
+    def clear(self) -> None:
+        self._counts = dict.fromkeys(BookStatus, 0)
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Get the number of books per status.
+        :return: Mapping of status value to count, including statuses without books.
+        """
+        return {status.value: count for status, count in self._counts.items()}
+
+
+class StatusIndex(StatusCounter):
+    """
+    Status counters plus the IDs of the books with each status.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        super().__init__()
+        self._ids: Dict[BookStatus, Set[int]] = {status: set() for status in BookStatus}
+
+    def add(self, book: Book) -> None:
+        super().add(book)
+        self._ids[book.status].add(book.id)
+
+    def remove(self, book: Book) -> None:
+        super().remove(book)
+        self._ids[book.status].discard(book.id)
+
+    def clear(self) -> None:
+        super().clear()
+        self._ids = {status: set() for status in BookStatus}
+
+    def lookup(self, status: BookStatus) -> Set[int]:
+        """
+        Find the books with a status.
+        :param status: Status to look up.
+        :return: IDs of the books (the index's own set; do not modify it).
+        """
+        return self._ids[status]
+
+
+def decade_of(year: int) -> int:
+    """
+    Get the decade a year belongs to.
+    :param year: Year of publication.
+    :return: First year of the decade, e.g. 1960 for 1965.
+    """
+    return year - year % 10
+
+
+def _decrement(counts: Dict[Any, int], key: Any) -> None:
+    """
+    Decrease a counter, dropping it when it reaches zero.
+    :param counts: Counters by key.
+    :param key: Key of the counter.
+    """
+    count = counts[key] - 1
+    if count:
+        counts[key] = count
+    else:
+        del counts[key]
+
+
+class AggregateIndex(BookIndex):
+    """
+    Number of books per author and per decade, for reports that do not scan the catalog.
+    Authors and decades without books are dropped, so the counters take memory
+    in proportion to the number of distinct values.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        self._authors: Dict[str, int] = {}
+        self._decades: Dict[int, int] = {}
+
+    def add(self, book: Book) -> None:
+        self._authors[book.author] = self._authors.get(book.author, 0) + 1
+        decade = decade_of(book.year)
+        self._decades[decade] = self._decades.get(decade, 0) + 1
+
+    def remove(self, book: Book) -> None:
+        _decrement(self._authors, book.author)
+        _decrement(self._decades, decade_of(book.year))
+
+    def replace(self, old: Book, new: Book) -> None:
+        if (old.author, old.year) != (new.author, new.year):
+            super().replace(old, new)
+
+    def clear(self) -> None:
+        self._authors = {}
+        self._decades = {}
+
+    def authors(self) -> Dict[str, int]:
+        """
+        Get the number of books per author.
+        :return: Mapping of author to count, for authors with books.
+        """
+        return dict(self._authors)
+
+    def decades(self) -> Dict[int, int]:
+        """
+        Get the number of books per decade of publication.
+        :return: Mapping of the first year of a decade to count, ordered by decade.
+        """
+        return dict(sorted(self._decades.items()))
+
+
+class YearIndex(BookIndex):
+    """
+    Index from publication year to book IDs, with the years kept sorted for range queries.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        self._ids: Dict[int, Set[int]] = {}
+        self._years: List[int] = []
+
+    def add(self, book: Book) -> None:
+        ids = self._ids.get(book.year)
+        if ids is None:
+            ids = self._ids[book.year] = set()
+            insort(self._years, book.year)
+        ids.add(book.id)
+
+    def remove(self, book: Book) -> None:
+        ids = self._ids.get(book.year)
+        if ids is None:
+            return
+        ids.discard(book.id)
+        if not ids:
+            del self._ids[book.year]
+            del self._years[bisect_left(self._years, book.year)]
+
+    def replace(self, old: Book, new: Book) -> None:
+        if old.year != new.year:
+            super().replace(old, new)
+
+    def clear(self) -> None:
+        self._ids.clear()
+        self._years.clear()
+
+    def lookup(self, year: int) -> Set[int]:
+        """
+        Find the books published in a year.
+        :param year: Year of publication.
+        :return: IDs of the books (the index's own set; do not modify it).
+        """
+        return self._ids.get(year, set())
+
+    def between(self, start: Optional[int], end: Optional[int]) -> Iterator[int]:
+        """
+        Find the books published in a range of years.
+        Only the years in the range are visited.
+        :param start: First year, inclusive (optional).
+        :param end: Last year, inclusive (optional).
+        :return: IDs ordered by year, then by ID.
+        """
+        low = 0 if start is None else bisect_left(self._years, start)
+        high = len(self._years) if end is None else bisect_right(self._years, end)
+        for year in self._years[low:high]:
+            yield from sorted(self._ids[year])
+
+
+class LoanIndex(BookIndex):
+    """
+    Time wheel of loans by due date: one slot per day holding the (due time, ID)
+    pairs of the loans due that day in order, with the days kept sorted.
+    Starting or ending a loan touches a single slot, and the loans due in a period
+    are found by visiting only the days in it, so listing overdue loans and
+    processing expired ones costs a binary search plus one step per loan found.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        self._slots: Dict[int, List[Tuple[float, int]]] = {}
+        self._days: List[int] = []
+
+    def add(self, book: Book) -> None:
+        if book.loan is None:
+            return
+        due = book.loan.due_at.timestamp()
+        day = int(due // SECONDS_PER_DAY)
+        slot = self._slots.get(day)
+        if slot is None:
+            slot = self._slots[day] = []
+            insort(self._days, day)
+        insort(slot, (due, book.id))
+
+    def remove(self, book: Book) -> None:
+        if book.loan is None:
+            return
+        due = book.loan.due_at.timestamp()
+        day = int(due // SECONDS_PER_DAY)
+        slot = self._slots.get(day)
+        if slot is None:
+            return
+        position = bisect_left(slot, (due, book.id))
+        if position < len(slot) and slot[position] == (due, book.id):
+            del slot[position]
+        if not slot:
+            del self._slots[day]
+            del self._days[bisect_left(self._days, day)]
+
+    def replace(self, old: Book, new: Book) -> None:
+        if old.loan != new.loan:
+            super().replace(old, new)
+
+    def clear(self) -> None:
+        self._slots.clear()
+        self._days.clear()
+
+    def due_between(
+        self, after: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> Iterator[int]:
+        """
+        Find the books whose loans are due in a period.
+        Only the days in the period are visited.
+        :param after: Start of the period, exclusive (optional).
+        :param until: End of the period, inclusive (optional).
+        :return: IDs ordered by due time, then by ID.
+        """
+        start: Optional[Tuple[float, float]] = None
+        end: Optional[Tuple[float, float]] = None
+        low, high = 0, len(self._days)
+        if after is not None:
+            start = (after.timestamp(), math.inf)
+            low = bisect_left(self._days, start[0] // SECONDS_PER_DAY)
+        if until is not None:
+            end = (until.timestamp(), math.inf)
+            high = bisect_right(self._days, end[0] // SECONDS_PER_DAY)
+        for day in self._days[low:high]:
+            slot = self._slots[day]
+            first = 0 if start is None else bisect_right(slot, start)
+            last = len(slot) if end is None else bisect_right(slot, end)
+            for _, book_id in slot[first:last]:
+                yield book_id
+
+
+class TextIndex:
+    """
+    Trigram inverted index over one lower-cased text field.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        self._texts: Dict[int, str] = {}
+        self._postings: Dict[str, Set[int]] = {}
+
+    def add(self, book_id: int, text: str) -> None:
+        """
+        Index the text of a book.
+        :param book_id: ID of the book.
+        :param text: Field value.
+        """
+        normalized = text.lower()
+        self._texts[book_id] = normalized
+        for gram in trigrams(normalized):
+            self._postings.setdefault(gram, set()).add(book_id)
+
+    def remove(self, book_id: int) -> None:
+        """
+        Remove a book from the index.
+        :param book_id: ID of the book.
+        """
+        normalized = self._texts.pop(book_id, None)
+        if normalized is None:
+            return
+        for gram in trigrams(normalized):
+            ids = self._postings[gram]
+            ids.discard(book_id)
+            if not ids:
+                del self._postings[gram]
+
+    def clear(self) -> None:
+        """
+        Remove all entries from the index.
+        """
+        self._texts.clear()
+        self._postings.clear()
+
+    def lookup(self, query: str) -> Set[int]:
+        """
+        Find books whose field contains the query, ignoring case.
+        Matches exactly what `query.lower() in text.lower()` would return.
+        :param query: Substring to search for.
+        :return: IDs of matching books.
+        """
+        needle = query.lower()
+        grams = trigrams(needle)
+        if not grams:
+            return {book_id for book_id, text in self._texts.items() if needle in text}
+
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            if not candidates:
+                break
+            candidates &= ids
+        return {book_id for book_id in candidates if needle in self._texts[book_id]}
+
+
+class SearchIndex(BookIndex):
+    """
+    Index answering title, author and year search criteria without scanning the catalog.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        self.titles = TextIndex()
+        self.authors = TextIndex()
+        self.years = YearIndex()
+
+    def add(self, book: Book) -> None:
+        self.titles.add(book.id, book.title)
+        self.authors.add(book.id, book.author)
+        self.years.add(book)
+
+    def remove(self, book: Book) -> None:
+        self.titles.remove(book.id)
+        self.authors.remove(book.id)
+        self.years.remove(book)
+
+    def replace(self, old: Book, new: Book) -> None:
+        if (old.title, old.author, old.year) != (new.title, new.author, new.year):
+            super().replace(old, new)
+
+    def clear(self) -> None:
+        self.titles.clear()
+        self.authors.clear()
+        self.years.clear()
+
+    def search(
+        self, title: Optional[str], author: Optional[str], year: Optional[int]
+    ) -> Optional[Set[int]]:
+        """
+        Find books matching the search criteria by intersecting candidate sets.
+        Empty criteria are ignored, as in BookRepository.search_books.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :return: IDs of matching books, or None if no criteria were given.
+        """
+        candidates: Optional[Set[int]] = None
+        if year:
+            candidates = set(self.years.lookup(year))
+        for text, index in ((title, self.titles), (author, self.authors)):
+            if not text or candidates == set():
+                continue
+            ids = index.lookup(text)
+            candidates = ids if candidates is None else candidates & ids
+        return candidates
+
+
+class PrefixList:
+    """
+    Sorted prefix index over one normalized text field.
+    Every book has one entry for the whole text and one for each later word,
+    kept in two sorted lists, so the completions of a prefix form a contiguous
+    run found by binary search and are read in rank order (see autocomplete_key).
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        self._texts: Dict[int, Tuple[str, int]] = {}
+        self._full: List[Tuple[str, int, int]] = []
+        self._words: List[Tuple[str, int, int]] = []
+
+    def add(self, book_id: int, text: str, year: int) -> None:
+        """
+        Index the text of a book.
+        :param book_id: ID of the book.
+        :param text: Field value.
+        :param year: Year of publication, used to order equal texts.
+        """
+        normalized = normalize_text(text)
+        self._texts[book_id] = (normalized, year)
+        insort(self._full, (normalized, year, book_id))
+        for suffix in word_suffixes(normalized):
+            insort(self._words, (suffix, year, book_id))
+
+    def remove(self, book_id: int) -> None:
+        """
+        Remove a book from the index.
+        :param book_id: ID of the book.
+        """
+        entry = self._texts.pop(book_id, None)
+        if entry is None:
+            return
+        normalized, year = entry
+        del self._full[bisect_left(self._full, (normalized, year, book_id))]
+        for suffix in word_suffixes(normalized):
+            del self._words[bisect_left(self._words, (suffix, year, book_id))]
+
+    def clear(self) -> None:
+        """
+        Remove all entries from the index.
+        """
+        self._texts.clear()
+        self._full.clear()
+        self._words.clear()
+
+    def extend(self, entries: Iterable[Tuple[int, str, int]]) -> None:
+        """
+        Index many texts at once, sorting once instead of inserting one by one.
+        :param entries: Tuples of (book ID, field value, year).
+        """
+        for book_id, text, year in entries:
+            normalized = normalize_text(text)
+            self._texts[book_id] = (normalized, year)
+            self._full.append((normalized, year, book_id))
+            self._words.extend((suffix, year, book_id) for suffix in word_suffixes(normalized))
+        self._full.sort()
+        self._words.sort()
+
+    def matches(self, prefix: str) -> Iterator[Tuple[int, str, int, int]]:
+        """
+        Iterate over the entries completing a prefix, best first.
+        A book can appear more than once if several of its words match.
+        :param prefix: Prefix normalized with normalize_prefix.
+        :return: Iterator over (tier, text, year, book ID) tuples in rank order.
+        """
+        for tier, entries in enumerate((self._full, self._words)):
+            for position in range(bisect_left(entries, (prefix,)), len(entries)):
+                text, year, book_id = entries[position]
+                if not text.startswith(prefix):
+                    break
+                yield tier, text, year, book_id
+
+
+class PrefixIndex(BookIndex):
+    """
+    Index of title and author prefixes for autocomplete.
+    Finding the top k completions takes a binary search plus about k steps,
+    however many books match the prefix.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        self.titles = PrefixList()
+        self.authors = PrefixList()
+
+    def add(self, book: Book) -> None:
+        self.titles.add(book.id, book.title, book.year)
+        self.authors.add(book.id, book.author, book.year)
+
+    def remove(self, book: Book) -> None:
+        self.titles.remove(book.id)
+        self.authors.remove(book.id)
+
+    def replace(self, old: Book, new: Book) -> None:
+        if (old.title, old.author, old.year) != (new.title, new.author, new.year):
+            super().replace(old, new)
+
+    def clear(self) -> None:
+        self.titles.clear()
+        self.authors.clear()
+
+    def rebuild(self, books: Iterable[Book]) -> None:
+        books = list(books)
+        self.clear()
+        self.titles.extend((book.id, book.title, book.year) for book in books)
+        self.authors.extend((book.id, book.author, book.year) for book in books)
+
+    def complete(self, prefix: str, field: Optional[str], limit: int) -> List[int]:
+        """
+        Find the best completions of a prefix.
+        :param prefix: Prefix normalized with normalize_prefix.
+        :param field: "title", "author", or None for both.
+        :param limit: Maximum number of results.
+        :return: IDs of the matching books in rank order (see autocomplete_key).
+        """
+        if field == "title":
+            matches = self.titles.matches(prefix)
+        elif field == "author":
+            matches = self.authors.matches(prefix)
+        else:
+            matches = heapq.merge(self.titles.matches(prefix), self.authors.matches(prefix))
+        ids: List[int] = []
+        seen: Set[int] = set()
+        for _, _, _, book_id in matches:
+            if book_id not in seen:
+                seen.add(book_id)
+                ids.append(book_id)
+                if len(ids) == limit:
+                    break
+        return ids
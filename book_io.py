@@ -0,0 +1,111 @@
+import csv
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator
+
+from book_models import Book
+
+CSV_FIELDS = ["id", "title", "author", "year", "status"]
+
+
+def detect_format(file_path: str) -> str:
+    """
+    Detect the record format from the file extension.
+    :param file_path: Path to the file.
+    :return: "csv" or "jsonl".
+    :raises ValueError: If the extension is not supported.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"Unsupported file format '{extension}'. Use .csv, .jsonl or .ndjson.")
+
+
+def iter_jsonl_records(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream book records from a JSON-lines file, one object per line.
+    :param file_path: Path to the file.
+    :return: Iterator over record dictionaries.
+    :raises ValueError: If a line is not valid JSON.
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{file_path}:{line_number}: invalid JSON ({e})")
+
+
+def iter_csv_records(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream book records from a CSV file with a header row.
+    :param file_path: Path to the file.
+    :return: Iterator over record dictionaries with an integer year.
+    :raises ValueError: If a year is not an integer.
+    """
+    with open(file_path, "r", encoding="utf-8", newline="") as file:
+        for line_number, row in enumerate(csv.DictReader(file), 2):
+            try:
+                row["year"] = int(row["year"])
+            except (TypeError, ValueError):
+                raise ValueError(f"{file_path}:{line_number}: invalid year {row.get('year')!r}")
+            yield row
+
+
+def iter_records(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream book records from a CSV or JSON-lines file.
+    :param file_path: Path to the file.
+    :return: Iterator over record dictionaries.
+    """
+    if detect_format(file_path) == "csv":
+        return iter_csv_records(file_path)
+    return iter_jsonl_records(file_path)
+
+
+def write_jsonl(file_path: str, books: Iterable[Book]) -> int:
+    """
+    Write books to a JSON-lines file, one object per line.
+    :param file_path: Path to the file.
+    :param books: Books to write.
+    :return: Number of written books.
+    """
+    count = 0
+    with open(file_path, "w", encoding="utf-8") as file:
+        for book in books:
+            file.write(json.dumps(book.to_dict(), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def write_csv(file_path: str, books: Iterable[Book]) -> int:
+    """
+    Write books to a CSV file with a header row.
+    :param file_path: Path to the file.
+    :param books: Books to write.
+    :return: Number of written books.
+    """
+    count = 0
+    with open(file_path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for book in books:
+            writer.writerow(book.to_dict())
+            count += 1
+    return count
+
+
+def write_records(file_path: str, books: Iterable[Book]) -> int:
+    """
+    Write books to a CSV or JSON-lines file depending on its extension.
+    :param file_path: Path to the file.
+    :param books: Books to write.
+    :return: Number of written books.
+    """
+    if detect_format(file_path) == "csv":
+        return write_csv(file_path, books)
+    return write_jsonl(file_path, books)
@@ -0,0 +1,404 @@
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from typing import BinaryIO, Iterable, Iterator, Optional, Sequence, Tuple
+
+from book_models import Book
+from book_snapshot import SnapshotError
+from book_table import DELETED, STATUS_CODES, STATUSES
+from exceptions import LoansNotSupportedError
+
+MAGIC = b"LIBMMAP1"
+VERSION = 1
+
+# magic, version, used slots, reserved slots, live books, heap bytes in use, last assigned ID
+HEADER = struct.Struct("<8sIQQQQQ12x")
+# id, year, title offset in the heap, title length, author length, status code;
+# the author is stored right after the title
+RECORD = struct.Struct("<qqQIIB7x")
+STATUS_FIELD = struct.calcsize("<qqQII")
+ID_FIELD = struct.Struct("<q")
+
+MIN_CAPACITY = 1024
+SCAN_CHUNK = 4096
+
+# id, year, status code, UTF-8 title, UTF-8 author
+Row = Tuple[int, int, int, bytes, bytes]
+
+
+def heap_start(capacity: int) -> int:
+    """
+    Get the file offset of the string heap.
+    :param capacity: Number of reserved record slots.
+    :return: Offset of the heap.
+    """
+    return HEADER.size + capacity * RECORD.size
+
+
+def encode_book(book: Book) -> Row:
+    """
+    Convert a book to a table row.
+    :param book: Book to convert.
+    :return: Row tuple.
+    :raises LoansNotSupportedError: If the book has a loan record.
+    """
+    if book.loan is not None:
+        raise LoansNotSupportedError("mapped catalog")
+    return (
+        book.id,
+        book.year,
+        STATUS_CODES[book.status],
+        book.title.encode("utf-8"),
+        book.author.encode("utf-8"),
+    )
+
+
+def write_table(
+    file: BinaryIO, rows: Iterable[Row], count: int, capacity: int, last_id: int = 0
+) -> None:
+    """
+    Write a mapped catalog.
+    Rows must come in ascending ID order; deleted rows are not written. Slack
+    is left after the heap so that new strings can be added without growing
+    the file every time.
+    :param file: Seekable binary file opened for writing, positioned at 0.
+    :param rows: Rows to write.
+    :param count: Number of rows.
+    :param capacity: Number of record slots to reserve (at least count).
+    :param last_id: Last ID handed out by the ID sequence.
+    :raises ValueError: If the rows are not in ascending ID order or do not match count.
+    """
+    capacity = max(capacity, count, MIN_CAPACITY)
+    table_position = HEADER.size
+    heap_position = heap_start(capacity)
+    heap_used = 0
+    written = 0
+    previous_id = None
+    table = bytearray()
+    heap = bytearray()
+
+    def flush() -> None:
+        nonlocal table_position, heap_position
+        file.seek(table_position)
+        file.write(table)
+        file.seek(heap_position)
+        file.write(heap)
+        table_position += len(table)
+        heap_position += len(heap)
+        table.clear()
+        heap.clear()
+
+    for book_id, year, status, title, author in rows:
+        if previous_id is not None and book_id <= previous_id:
+            raise ValueError("Rows of a mapped catalog must have ascending IDs.")
+        previous_id = book_id
+        table += RECORD.pack(book_id, year, heap_used, len(title), len(author), status)
+        heap += title
+        heap += author
+        heap_used += len(title) + len(author)
+        written += 1
+        if written % SCAN_CHUNK == 0:
+            flush()
+    flush()
+    if written != count:
+        raise ValueError(f"Expected {count} rows, got {written}.")
+
+    last_id = max(last_id, previous_id or 0)
+    file.seek(0)
+    file.write(HEADER.pack(MAGIC, VERSION, count, capacity, count, heap_used, last_id))
+    file.truncate(heap_start(capacity) + heap_used + max(heap_used // 8, mmap.PAGESIZE))
+
+
+def write_books(books: Sequence[Book], file: BinaryIO) -> None:
+    """
+    Write books as a mapped catalog, sorted by ID.
+    :param books: Books to write.
+    :param file: Seekable binary file opened for writing.
+    :raises ValueError: If two books share an ID.
+    """
+    rows = (encode_book(book) for book in sorted(books, key=lambda book: book.id))
+    write_table(file, rows, len(books), len(books) + len(books) // 4)
+
+
+class MappedCatalog:
+    """
+    Memory-mapped, fixed-layout catalog file.
+    Layout: header, a table of fixed-width records (id, year, status and the
+    position of the title and author in the heap) kept in ascending ID order,
+    then the string heap. Only the records a caller touches are decoded, books
+    are found by binary search over the table, and status changes and deletions
+    (tombstones) rewrite a single byte in place. The header is read on every
+    access, so changes made through another mapping of the file are visible.
+    """
+
+    def __init__(self, file_path: str, writable: bool = False):
+        """
+        Map a catalog file.
+        :param file_path: Path to the file.
+        :param writable: Map the file for in-place updates.
+        :raises SnapshotError: If the file is not a mapped catalog.
+        """
+        self.file_path = file_path
+        self.writable = writable
+        with open(file_path, "r+b" if writable else "rb") as file:
+            stat = os.fstat(file.fileno())
+            self.signature = stat.st_ino, stat.st_size
+            try:
+                self._map = mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+                )
+            except ValueError:
+                raise SnapshotError("Mapped catalog file is empty.")
+        try:
+            self._check()
+        except Exception:
+            self._map.close()
+            raise
+        self._heap = heap_start(self.header()[1])
+
+    def _check(self) -> None:
+        """
+        Validate the header against the size of the file.
+        :raises SnapshotError: If the header is invalid or the file is truncated.
+        """
+        if len(self._map) < HEADER.size:
+            raise SnapshotError("Mapped catalog header is truncated.")
+        magic, version, count, capacity, live, heap_used, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise SnapshotError("Not a mapped catalog.")
+        if version != VERSION:
+            raise SnapshotError(f"Unsupported mapped catalog version {version}.")
+        if live > count or count > capacity or heap_start(capacity) + heap_used > len(self._map):
+            raise SnapshotError("Mapped catalog is truncated.")
+
+    def close(self) -> None:
+        """
+        Unmap the file. Books already decoded stay valid.
+        """
+        self._map.close()
+
+    def __enter__(self) -> "MappedCatalog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def header(self) -> Tuple[int, int, int, int, int]:
+        """
+        Read the header.
+        :return: Tuple of (used slots, reserved slots, live books, heap bytes in use, last ID).
+        """
+        return HEADER.unpack_from(self._map, 0)[2:]
+
+    def __len__(self) -> int:
+        return self.header()[2]
+
+    def __contains__(self, book_id: object) -> bool:
+        if not isinstance(book_id, int):
+            return False
+        slot = self.find_slot(book_id)
+        return slot is not None and self.status_at(slot) != DELETED
+
+    def _record_offset(self, slot: int) -> int:
+        """
+        Get the file offset of a record.
+        :param slot: Record slot.
+        :return: Offset of the record.
+        """
+        return HEADER.size + slot * RECORD.size
+
+    def find_slot(self, book_id: int) -> Optional[int]:
+        """
+        Find the slot holding an ID, including deleted records.
+        :param book_id: ID of the book.
+        :return: Slot number, or None if the ID was never stored.
+        """
+        count = self.header()[0]
+        ids = _IdView(self, count)
+        slot = bisect_left(ids, book_id)
+        return slot if slot < count and ids[slot] == book_id else None
+
+    def first_slot_after(self, book_id: int) -> int:
+        """
+        Find the first slot with a higher ID.
+        :param book_id: ID to start after.
+        :return: Slot number (the used slot count if there is none).
+        """
+        count = self.header()[0]
+        low = bisect_left(_IdView(self, count), book_id)
+        if low < count and self._id_at(low) == book_id:
+            low += 1
+        return low
+
+    def _id_at(self, slot: int) -> int:
+        """
+        Read only the ID of a record.
+        :param slot: Record slot.
+        :return: Book ID.
+        """
+        return ID_FIELD.unpack_from(self._map, self._record_offset(slot))[0]
+
+    def status_at(self, slot: int) -> int:
+        """
+        Read only the status code of a record.
+        :param slot: Record slot.
+        :return: Status code (DELETED for tombstones).
+        """
+        return self._map[self._record_offset(slot) + STATUS_FIELD]
+
+    def records(self, start: int = 0) -> Iterator[Tuple[int, int, int, int, int, int, int]]:
+        """
+        Iterate over raw records, reading the table in chunks.
+        :param start: First slot.
+        :return: Iterator over (slot, id, year, title offset, title length,
+            author length, status code), deleted records included.
+        """
+        count = self.header()[0]
+        slot = start
+        while slot < count:
+            end = min(slot + SCAN_CHUNK, count)
+            chunk = self._map[self._record_offset(slot):self._record_offset(end)]
+            for record in RECORD.iter_unpack(chunk):
+                yield (slot,) + record
+                slot += 1
+
+    def text(self, offset: int, length: int) -> bytes:
+        """
+        Read encoded text from the heap.
+        :param offset: Offset in the heap.
+        :param length: Length in bytes.
+        :return: UTF-8 bytes.
+        """
+        start = self._heap + offset
+        return self._map[start:start + length]
+
+    def book(self, record: Tuple[int, int, int, int, int, int, int]) -> Book:
+        """
+        Decode a record into a Book.
+        :param record: Record as yielded by records().
+        :return: A Book instance.
+        """
+        _, book_id, year, title_offset, title_length, author_length, status = record
+        strings = self.text(title_offset, title_length + author_length)
+        return Book(
+            book_id,
+            strings[:title_length].decode("utf-8"),
+            strings[title_length:].decode("utf-8"),
+            year,
+            STATUSES[status].value,
+        )
+
+    def record(self, slot: int) -> Tuple[int, int, int, int, int, int, int]:
+        """
+        Read one record.
+        :param slot: Record slot.
+        :return: Record in the format of records().
+        """
+        return (slot,) + RECORD.unpack_from(self._map, self._record_offset(slot))
+
+    def get(self, book_id: int) -> Optional[Book]:
+        """
+        Find a live book by ID.
+        :param book_id: ID of the book.
+        :return: The book, or None if it does not exist.
+        """
+        slot = self.find_slot(book_id)
+        if slot is None or self.status_at(slot) == DELETED:
+            return None
+        return self.book(self.record(slot))
+
+    def books(self, start: int = 0) -> Iterator[Book]:
+        """
+        Iterate over live books in ID order, decoding each on demand.
+        :param start: First slot.
+        :return: Iterator over Book instances.
+        """
+        for record in self.records(start):
+            if record[6] != DELETED:
+                yield self.book(record)
+
+    def rows(self) -> Iterator[Row]:
+        """
+        Iterate over the live records as undecoded rows, for rewriting the file.
+        :return: Iterator over rows.
+        """
+        for _, book_id, year, title_offset, title_length, author_length, status in self.records():
+            if status != DELETED:
+                strings = self.text(title_offset, title_length + author_length)
+                yield book_id, year, status, strings[:title_length], strings[title_length:]
+
+    def set_status(self, slot: int, status: int) -> None:
+        """
+        Overwrite the status byte of a record.
+        :param slot: Record slot.
+        :param status: New status code, or DELETED to leave a tombstone.
+        """
+        self._map[self._record_offset(slot) + STATUS_FIELD] = status
+
+    def put(self, slot: int, row: Row, heap_used: int) -> int:
+        """
+        Write a row into a slot, storing its strings at the end of the heap.
+        The header is not updated; call commit() to make a new slot visible.
+        :param slot: Record slot.
+        :param row: Row to store.
+        :param heap_used: Heap bytes currently in use.
+        :return: Heap bytes in use afterwards.
+        """
+        book_id, year, status, title, author = row
+        start = self._heap + heap_used
+        end = start + len(title) + len(author)
+        if end > len(self._map):
+            self._map.resize(end + max(end // 8, mmap.PAGESIZE))
+            self.signature = self.signature[0], len(self._map)
+        self._map[start:end] = title + author
+        self._map[self._record_offset(slot):self._record_offset(slot + 1)] = RECORD.pack(
+            book_id, year, heap_used, len(title), len(author), status
+        )
+        return heap_used + len(title) + len(author)
+
+    def commit(
+        self, count: int, live: int, heap_used: int, last_id: int, fsync: bool = True
+    ) -> None:
+        """
+        Publish new header counters, after the records and strings they cover.
+        :param count: Used slots.
+        :param live: Live books.
+        :param heap_used: Heap bytes in use.
+        :param last_id: Last ID handed out by the ID sequence.
+        :param fsync: Flush the mapping to disk before and after the header is written.
+        """
+        if fsync:
+            self._map.flush()
+        capacity = self.header()[1]
+        self._map[:HEADER.size] = HEADER.pack(
+            MAGIC, VERSION, count, capacity, live, heap_used, last_id
+        )
+        if fsync:
+            self._map.flush(0, min(mmap.PAGESIZE, len(self._map)))
+
+    def sync(self, slots: Iterable[int]) -> None:
+        """
+        Flush the pages holding some records to disk.
+        :param slots: Record slots that were changed.
+        """
+        pages = {self._record_offset(slot) // mmap.PAGESIZE for slot in slots}
+        for page in sorted(pages):
+            start = page * mmap.PAGESIZE
+            self._map.flush(start, min(mmap.PAGESIZE, len(self._map) - start))
+
+
+class _IdView(Sequence[int]):
+    """
+    The IDs of the used slots as a sequence, for bisect.
+    """
+
+    def __init__(self, catalog: MappedCatalog, count: int):
+        self._catalog = catalog
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, slot: int) -> int:  # type: ignore[override]
+        return self._catalog._id_at(slot)
@@ -1,8 +1,30 @@
+from datetime import datetime, timedelta, timezone
 from enum import Enum
-from typing import Any
+from typing import Any, Dict, NamedTuple, Optional
 
 from exceptions import InvalidBookStatusError
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(moment: datetime) -> int:
+    """
+    Convert a timezone-aware time to an integer that sorts like it, for binary formats.
+    :param moment: Time to convert.
+    :return: Microseconds since the Unix epoch.
+    """
+    return (moment - EPOCH) // MICROSECOND
+
+
+def from_micros(micros: int) -> datetime:
+    """
+    Convert microseconds since the Unix epoch back to a time.
+    :param micros: Value returned by to_micros.
+    :return: Time in UTC.
+    """
+    return EPOCH + micros * MICROSECOND
+
 
 class BookStatus(Enum):
     """Enum for book statuses."""
@@ -10,12 +32,66 @@ class BookStatus(Enum):
     CHECKED_OUT = "checked_out"
 
 
+class Loan(NamedTuple):
+    """
+    Loan record of a checked-out book: who borrowed it, when, and when it is due.
+    Times are timezone-aware and stored as ISO 8601 strings.
+    """
+
+    borrower: str
+    checked_out_at: datetime
+    due_at: datetime
+
+    def is_overdue(self, now: datetime) -> bool:
+        """
+        Check whether the loan has reached its due time.
+        :param now: Current time.
+        :return: True if the book was due at or before now.
+        """
+        return self.due_at <= now
+
+    def to_dict(self) -> Dict[str, str]:
+        """
+        Convert the loan to a dictionary format.
+        :return: A dictionary representation of the loan.
+        """
+        return {
+            "borrower": self.borrower,
+            "checked_out_at": self.checked_out_at.isoformat(),
+            "due_at": self.due_at.isoformat(),
+        }
+
+    @staticmethod
+    def from_dict(data: Dict[str, str]) -> "Loan":
+        """
+        Create a loan from a dictionary.
+        :param data: Dictionary containing loan data.
+        :return: A Loan instance.
+        """
+        return Loan(
+            data["borrower"],
+            datetime.fromisoformat(data["checked_out_at"]),
+            datetime.fromisoformat(data["due_at"]),
+        )
+
+
 class Book:
     """
     Class representing a book in the library.
+    Uses __slots__ so large catalogs do not pay for a per-instance __dict__.
     """
 
-    def __init__(self, book_id: int, title: str, author: str, year: int, status: str = "available"):
+    __slots__ = ("id", "title", "author", "year", "status", "loan")
+
+    def __init__(
+        self,
+        book_id: int,
+        title: str,
+        author: str,
+        year: int,
+        status: str = "available",
+        loan: Optional[Loan] = None,
+    ):
         """
         Initialize a new book instance.
         :param book_id: Unique identifier for the book.
@@ -23,16 +99,22 @@ class Book:
         :param author: Author of the book.
         :param year: Year of publication.
         :param status: Status of the book ("available" or "checked_out").
+        :param loan: Loan record of a checked-out book (optional).
+        :raises ValueError: If a book that is not checked out is given a loan.
         """
         self.id = book_id
         self.title = title.strip()
         self.author = author.strip()
         self.year = self.validate_year(year)
+        self.loan: Optional[Loan] = None
         self.set_status(status)
+        if loan is not None:
+            self.set_loan(loan)
 
     def set_status(self, status: str) -> None:
         """
         Set the status of the book, ensuring it's valid.
+        Making the book available ends its loan.
         :param status: New status of the book.
         :raises InvalidBookStatusError: If the status is invalid.
         """
@@ -40,6 +122,27 @@ class Book:
             self.status = BookStatus(status.lower())
         except ValueError:
             raise InvalidBookStatusError(status)
+        if self.status is BookStatus.AVAILABLE:
+            self.loan = None
+
+    def set_loan(self, loan: Optional[Loan]) -> None:
+        """
+        Set or clear the loan record of the book.
+        :param loan: Loan record, or None to clear it.
+        :raises ValueError: If a book that is not checked out is given a loan.
+        """
+        if loan is not None and self.status is not BookStatus.CHECKED_OUT:
+            raise ValueError("Only checked out books can have a loan.")
+        self.loan = loan
+
+    def with_status(self, status: str, loan: Optional[Loan] = None) -> "Book":
+        """
+        Create a copy of the book with another status, leaving this instance unchanged.
+        :param status: Status of the copy.
+        :param loan: Loan record of the copy (optional).
+        :return: A new Book instance.
+        """
+        return Book(self.id, self.title, self.author, self.year, status, loan)
 
     @staticmethod
     def validate_year(year: int) -> int:
@@ -56,15 +159,19 @@ class Book:
     def to_dict(self) -> dict[str, Any]:
         """
         Convert the book instance to a dictionary format.
+        The loan is only included when the book has one.
         :return: A dictionary representation of the book.
         """
-        return {
+        data = {
             "id": self.id,
             "title": self.title,
             "author": self.author,
             "year": self.year,
             "status": self.status.value,
         }
+        if self.loan is not None:
+            data["loan"] = self.loan.to_dict()
+        return data
 
     @staticmethod
     def from_dict(data: dict[str, Any]) -> "Book":
@@ -79,6 +186,7 @@ class Book:
             author=data["author"],
             year=data["year"],
             status=data["status"],
+            loan=Loan.from_dict(data["loan"]) if data.get("loan") else None,
         )
 
 
@@ -1,8 +1,62 @@
+import functools
+import heapq
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, MutableMapping, Optional, Sequence, Set, Tuple
 
-from book_models import Book
-from file_utils import load_books, save_books
+from book_index import (
+    AGGREGATE_VIEWS,
+    AggregateIndex,
+    BookIndex,
+    KeyIndex,
+    LoanIndex,
+    PrefixIndex,
+    SearchIndex,
+    StatusCounter,
+    StatusIndex,
+    YearIndex,
+    autocomplete_key,
+    book_key,
+    due_key,
+    normalize_prefix,
+)
+from book_models import Book, BookStatus, Loan
+from book_table import BookTable
+from book_versions import BookVersion, VersionedBookMap
+from file_utils import (
+    count_books,
+    file_signature,
+    find_book,
+    iter_books,
+    load_books,
+    load_last_id,
+    save_books,
+    save_last_id,
+)
+from locks import ReadWriteLock, file_lock
+from pagination import DEFAULT_PAGE_SIZE, BookPage, paginate
+
+
+def matches_criteria(
+    book: Book, title: Optional[str], author: Optional[str], year: Optional[int]
+) -> bool:
+    """
+    Check whether a book matches the search criteria.
+    Title and author match case-insensitively as substrings, year matches exactly.
+    Empty criteria are ignored.
+    :param book: Book to check.
+    :param title: Title to search for (optional).
+    :param author: Author to search for (optional).
+    :param year: Year to search for (optional).
+    :return: True if the book matches all given criteria.
+    """
+    return (
+        (not title or title.lower() in book.title.lower())
+        and (not author or author.lower() in book.author.lower())
+        and (not year or book.year == year)
+    )
 
 
 class BookRepositoryInterface(ABC):
@@ -29,9 +83,335 @@ class BookRepositoryInterface(ABC):
         pass
 
     @abstractmethod
-    def update_book_status(self, book_id: int, new_status: str) -> bool:
+    def update_book_status(
+        self, book_id: int, new_status: str, loan: Optional[Loan] = None
+    ) -> bool:
         pass
 
+    def transaction(self):
+        """
+        Group reads and writes that must not interleave with other writers,
+        such as a duplicate check followed by an insert.
+        Implementations without concurrency control return a no-op context.
+        :return: Context manager.
+        """
+        return nullcontext()
+
+    def data_signature(self) -> Any:
+        """
+        Get a value that changes whenever the stored catalog changes, including
+        through other processes, so that caches of derived results (see
+        QueryCache) can tell that they are stale.
+        :return: Comparable signature, or None if the backend cannot tell.
+        """
+        return None
+
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """
+        Retrieve a single book by its ID.
+        Implementations with an in-memory index should override this.
+        :param book_id: ID of the book.
+        :return: The book, or None if it does not exist.
+        """
+        return next((book for book in self.get_all_books() if book.id == book_id), None)
+
+    def get_books(self, book_ids: Iterable[int]) -> Dict[int, Book]:
+        """
+        Retrieve several books by ID at once.
+        Implementations with an in-memory index should override this.
+        :param book_ids: IDs of the books.
+        :return: Mapping of ID to book for the books that exist.
+        """
+        wanted = set(book_ids)
+        return {book.id: book for book in self.iter_books() if book.id in wanted}
+
+    def count_books(self) -> int:
+        """
+        Count the books in the repository.
+        :return: Number of books.
+        """
+        return len(self.get_all_books())
+
+    def iter_books(self) -> Iterator[Book]:
+        """
+        Iterate over all books.
+        Streaming implementations should override this so consumers can stop early.
+        :return: Iterator over books.
+        """
+        return iter(self.get_all_books())
+
+    def iter_search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> Iterator[Book]:
+        """
+        Lazily iterate over books matching the search criteria.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :return: Iterator over matching books.
+        """
+        return (
+            book for book in self.iter_books() if matches_criteria(book, title, author, year)
+        )
+
+    def page_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+        order_by: str = "id",
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[Sequence] = None,
+    ) -> BookPage:
+        """
+        Get one page of books matching the search criteria in sort order.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :param order_by: Field to sort by ("id", "year" or "title").
+        :param limit: Maximum number of books on the page.
+        :param offset: Number of books to skip after the cursor.
+        :param after: Cursor returned with the previous page (optional).
+        :return: The requested page.
+        :raises ValueError: If the paging arguments are invalid.
+        """
+        return paginate(
+            self.iter_search_books(title, author, year), order_by, limit, offset, after
+        )
+
+    def count_by_status(self) -> Dict[str, int]:
+        """
+        Count the books per status.
+        Implementations with status counters should override this.
+        :return: Mapping of status value to count, including statuses without books.
+        """
+        counts = dict.fromkeys((status.value for status in BookStatus), 0)
+        for book in self.iter_books():
+            counts[book.status.value] += 1
+        return counts
+
+    def count_by_author(self) -> Dict[str, int]:
+        """
+        Count the books per author.
+        Implementations with aggregate views should override this.
+        :return: Mapping of author to count, for authors with books.
+        """
+        aggregates = AggregateIndex()
+        aggregates.rebuild(self.iter_books())
+        return aggregates.authors()
+
+    def count_by_decade(self) -> Dict[int, int]:
+        """
+        Count the books per decade of publication.
+        Implementations with aggregate views should override this.
+        :return: Mapping of the first year of a decade to count, ordered by decade.
+        """
+        aggregates = AggregateIndex()
+        aggregates.rebuild(self.iter_books())
+        return aggregates.decades()
+
+    def rebuild_aggregates(self) -> None:
+        """
+        Rebuild the aggregate views behind count_by_status, count_by_author and
+        count_by_decade from a full scan of the catalog.
+        Implementations without aggregate views count on every call and have
+        nothing to rebuild.
+        """
+
+    def verify_aggregates(self) -> List[str]:
+        """
+        Check the aggregate views against a full scan of the catalog.
+        :return: Names of the views (see AGGREGATE_VIEWS) whose counts differ from
+            the scan; empty if all of them match.
+        """
+        with self.transaction():
+            statuses, aggregates = StatusCounter(), AggregateIndex()
+            for book in self.iter_books():
+                statuses.add(book)
+                aggregates.add(book)
+            expected = {
+                "status": statuses.counts(),
+                "author": aggregates.authors(),
+                "decade": aggregates.decades(),
+            }
+            actual = {
+                "status": self.count_by_status(),
+                "author": self.count_by_author(),
+                "decade": self.count_by_decade(),
+            }
+        return [view for view in AGGREGATE_VIEWS if actual[view] != expected[view]]
+
+    def iter_books_by_status(self, status: str) -> Iterator[Book]:
+        """
+        Iterate over the books with a status.
+        Implementations with a status index should override this.
+        :param status: Status value ("available" or "checked_out").
+        :return: Iterator over books, ordered by ID.
+        """
+        books = [book for book in self.iter_books() if book.status.value == status]
+        return iter(sorted(books, key=lambda book: book.id))
+
+    def iter_books_by_year_range(
+        self, start_year: Optional[int] = None, end_year: Optional[int] = None
+    ) -> Iterator[Book]:
+        """
+        Iterate over the books published in a range of years.
+        Implementations with a year index should override this.
+        :param start_year: First year, inclusive (optional).
+        :param end_year: Last year, inclusive (optional).
+        :return: Iterator over books, ordered by year, then by ID.
+        """
+        books = [
+            book
+            for book in self.iter_books()
+            if (start_year is None or book.year >= start_year)
+            and (end_year is None or book.year <= end_year)
+        ]
+        return iter(sorted(books, key=lambda book: (book.year, book.id)))
+
+    def iter_books_due(
+        self,
+        after: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Book]:
+        """
+        Iterate over the checked-out books whose loans are due in a period.
+        Implementations with a loan index should override this.
+        :param after: Start of the period, exclusive (optional).
+        :param until: End of the period, inclusive (optional), e.g. now for overdue loans.
+        :param limit: Maximum number of books (optional).
+        :return: Iterator over books, ordered by due date, then by ID.
+        """
+        books = (
+            book
+            for book in self.iter_books()
+            if book.loan is not None
+            and (after is None or book.loan.due_at > after)
+            and (until is None or book.loan.due_at <= until)
+        )
+        if limit is None:
+            return iter(sorted(books, key=due_key))
+        return iter(heapq.nsmallest(limit, books, key=due_key))
+
+    def autocomplete(
+        self, prefix: str, field: Optional[str] = None, limit: int = 10
+    ) -> List[Book]:
+        """
+        Find the best completions of a typed prefix among titles and authors.
+        Implementations with a prefix index should override this.
+        :param prefix: Prefix as typed.
+        :param field: "title", "author", or None for both.
+        :param limit: Maximum number of results.
+        :return: Matching books in rank order (see book_index.autocomplete_key).
+        """
+        prefix = normalize_prefix(prefix)
+        if not prefix:
+            return []
+        keyed = ((autocomplete_key(book, prefix, field), book) for book in self.iter_books())
+        ranked = ((key, book) for key, book in keyed if key is not None)
+        return [book for _, book in heapq.nsmallest(limit, ranked, key=lambda item: item[0])]
+
+    def next_book_id(self) -> int:
+        """
+        Get the ID to assign to the next new book.
+        :return: One more than the highest ID in use.
+        """
+        return max((book.id for book in self.get_all_books()), default=0) + 1
+
+    def find_book_by_key(self, title: str, author: str, year: int) -> Optional[Book]:
+        """
+        Find a book with the same title, author and year.
+        :param title: Title of the book.
+        :param author: Author of the book.
+        :param year: Year of publication.
+        :return: The existing book, or None if there is none.
+        """
+        key = book_key(title, author, year)
+        return next(
+            (
+                book
+                for book in self.get_all_books()
+                if book_key(book.title, book.author, book.year) == key
+            ),
+            None,
+        )
+
+    def find_books_by_keys(
+        self, keys: Iterable[Tuple[str, str, int]]
+    ) -> Dict[Tuple[str, str, int], Book]:
+        """
+        Find the existing books for several (title, author, year) keys at once.
+        Implementations with a key index should override this; the default scans
+        the catalog once for the whole batch.
+        :param keys: Keys of the books as (title, author, year).
+        :return: Mapping of the normalized key (see book_index.book_key) to the
+            existing book, for the keys that have one.
+        """
+        return match_keys(self.iter_books(), keys)
+
+    def add_books(self, books: List[Book]) -> None:
+        """
+        Add several books at once.
+        Implementations should validate the whole batch and persist it once.
+        :param books: Book instances to add.
+        :raises ValueError: If a book ID is already in use.
+        """
+        for book in books:
+            self.add_book(book)
+
+    def update_books_status(self, updates: Mapping[int, str]) -> int:
+        """
+        Update the status of several books at once.
+        Implementations should persist all changes once.
+        Statuses are set without loan records.
+        :param updates: Mapping of book ID to new status.
+        :return: Number of books that were updated.
+        """
+        return sum(
+            self.update_book_status(book_id, new_status)
+            for book_id, new_status in updates.items()
+        )
+
+
+def match_keys(
+    books: Iterable[Book], keys: Iterable[Tuple[str, str, int]]
+) -> Dict[Tuple[str, str, int], Book]:
+    """
+    Find the books matching several (title, author, year) keys in one pass.
+    :param books: Books to scan.
+    :param keys: Keys of the books as (title, author, year).
+    :return: Mapping of the normalized key (see book_index.book_key) to the first
+        matching book, for the keys that have one.
+    """
+    wanted = {book_key(*key) for key in keys}
+    found: Dict[Tuple[str, str, int], Book] = {}
+    if not wanted:
+        return found
+    for book in books:
+        key = book_key(book.title, book.author, book.year)
+        if key in wanted and key not in found:
+            found[key] = book
+    return found
+
+
+def check_new_ids(existing_ids: Iterable[int], books: List[Book]) -> None:
+    """
+    Ensure that a batch of books does not reuse IDs.
+    :param existing_ids: IDs already in the repository (a set for O(1) lookups).
+    :param books: Books about to be added.
+    :raises ValueError: If a book ID is already in use or repeated in the batch.
+    """
+    seen: Set[int] = set()
+    for book in books:
+        if book.id in existing_ids or book.id in seen:
+            raise ValueError(f"Book with ID {book.id} already exists.")
+        seen.add(book.id)
+
 
 class BookRepository(BookRepositoryInterface):
     """
@@ -53,6 +433,36 @@ class BookRepository(BookRepositoryInterface):
         """
         return load_books(self.file_path)
 
+    def iter_books(self) -> Iterator[Book]:
+        """
+        Stream books from the JSON file one at a time.
+        :return: Iterator over books.
+        """
+        return iter_books(self.file_path)
+
+    def data_signature(self) -> Any:
+        """
+        Get the signature of the JSON file, which every save changes.
+        :return: Tuple of (inode, mtime in nanoseconds, size), or None if the file is missing.
+        """
+        return file_signature(self.file_path)
+
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """
+        Retrieve a single book by its ID.
+        Binary snapshots are searched by offset; JSON is streamed until the book is found.
+        :param book_id: ID of the book.
+        :return: The book, or None if it does not exist.
+        """
+        return find_book(self.file_path, book_id)
+
+    def count_books(self) -> int:
+        """
+        Count the books in the repository without keeping them in memory.
+        :return: Number of books.
+        """
+        return count_books(self.file_path)
+
     def add_book(self, book: Book) -> None:
         """
         Add a new book to the repository.
@@ -75,9 +485,22 @@ class BookRepository(BookRepositoryInterface):
         filtered_books = [book for book in books if book.id != book_id]
         if len(filtered_books) == len(books):
             return False
+        last_id = max(book.id for book in books)
+        if last_id > load_last_id(self.file_path):
+            save_last_id(self.file_path, last_id)
         save_books(self.file_path, filtered_books)
         return True
 
+    def next_book_id(self) -> int:
+        """
+        Get the ID to assign to the next new book.
+        The highest ID is saved next to the catalog before deletes, so IDs of
+        deleted books are not reused.
+        :return: One more than the highest ID ever used.
+        """
+        last_id = max((book.id for book in self.iter_books()), default=0)
+        return max(last_id, load_last_id(self.file_path)) + 1
+
     def search_books(
         self,
         title: Optional[str] = None,
@@ -92,25 +515,783 @@ class BookRepository(BookRepositoryInterface):
         :return: List of books matching the criteria.
         """
         books = self.get_all_books()
-        return [
-            book
-            for book in books
-            if (not title or title.lower() in book.title.lower())
-            and (not author or author.lower() in book.author.lower())
-            and (not year or book.year == year)
-        ]
+        return [book for book in books if matches_criteria(book, title, author, year)]
 
-    def update_book_status(self, book_id: int, new_status: str) -> bool:
+    def update_book_status(
+        self, book_id: int, new_status: str, loan: Optional[Loan] = None
+    ) -> bool:
         """
         Update the status of a book by its ID.
         :param book_id: ID of the book to update.
         :param new_status: New status to set.
+        :param loan: Loan record to store with the status, replacing the current one (optional).
         :return: True if the book was updated, False otherwise.
         """
         books = self.get_all_books()
         for book in books:
             if book.id == book_id:
                 book.set_status(new_status)
+                book.set_loan(loan)
                 save_books(self.file_path, books)
                 return True
         return False
+
+    def add_books(self, books: List[Book]) -> None:
+        """
+        Add several books with a single file rewrite.
+        :param books: Book instances to add.
+        :raises ValueError: If a book ID is already in use.
+        """
+        existing = self.get_all_books()
+        check_new_ids({book.id for book in existing}, books)
+        save_books(self.file_path, existing + list(books))
+
+    def update_books_status(self, updates: Mapping[int, str]) -> int:
+        """
+        Update the status of several books with a single file rewrite.
+        Statuses are set without loan records.
+        :param updates: Mapping of book ID to new status.
+        :return: Number of books that were updated.
+        """
+        books = self.get_all_books()
+        updated = 0
+        for book in books:
+            if book.id in updates:
+                book.set_status(updates[book.id])
+                book.set_loan(None)
+                updated += 1
+        if updated:
+            save_books(self.file_path, books)
+        return updated
+
+
+def locked_read(method: Callable) -> Callable:
+    """
+    Run a CachedBookRepository method under the read lock on an up-to-date cache.
+    :param method: Method to wrap.
+    :return: Wrapped method.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: "CachedBookRepository", *args: Any, **kwargs: Any) -> Any:
+        self._ensure_fresh()
+        with self._lock.read_locked():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def locked_write(method: Callable) -> Callable:
+    """
+    Run a CachedBookRepository method under the write lock on an up-to-date cache.
+    :param method: Method to wrap.
+    :return: Wrapped method.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: "CachedBookRepository", *args: Any, **kwargs: Any) -> Any:
+        with self._writing():
+            self._refresh()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._publish()
+
+    return wrapper
+
+
+class CachedBookRepository(BookRepositoryInterface):
+    """
+    Implementation of the BookRepositoryInterface that keeps the catalog in memory.
+    Books are keyed by ID, every mutation is written through to the JSON file,
+    and the file is only re-read when its modification time or size changes.
+    The books are held in a VersionedBookMap: each write publishes a new immutable
+    version once it is persisted, so reads by ID and whole-catalog listings work
+    on the current version without taking the lock and never wait for writers.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        search_index: bool = True,
+        filter_indexes: bool = True,
+        prefix_index: bool = True,
+        key_index: bool = True,
+    ):
+        """
+        Initialize the repository with a file path for storing data.
+        :param file_path: Path to the JSON file.
+        :param search_index: Whether to maintain a trigram index for search_books.
+        :param filter_indexes: Whether to maintain status, year and loan due date indexes for
+            filtering by status, year range and due date (the counts per status, author and
+            decade are always maintained).
+        :param prefix_index: Whether to maintain a title and author prefix index for autocomplete.
+        :param key_index: Whether to maintain a (title, author, year) index for duplicate checks.
+        """
+        self.file_path = file_path
+        self._books: MutableMapping[int, Book] = self._create_store(())
+        self._signature: Optional[Tuple[int, int]] = None
+        self._loaded = False
+        self._lock = ReadWriteLock()
+        self._last_id = 0
+        self._saved_last_id = 0
+        self.key_index = KeyIndex() if key_index else None
+        self.search_index = SearchIndex() if search_index else None
+        self.status_index = StatusIndex() if filter_indexes else StatusCounter()
+        self.aggregate_index = AggregateIndex()
+        self.year_index: Optional[YearIndex] = None
+        self.loan_index = LoanIndex() if filter_indexes else None
+        self._indexes: List[BookIndex] = [self.status_index, self.aggregate_index]
+        if self.key_index:
+            self._indexes.append(self.key_index)
+        if self.loan_index:
+            self._indexes.append(self.loan_index)
+        if self.search_index:
+            self._indexes.append(self.search_index)
+            self.year_index = self.search_index.years
+        elif filter_indexes:
+            self.year_index = YearIndex()
+            self._indexes.append(self.year_index)
+        self.prefix_index = PrefixIndex() if prefix_index else None
+        if self.prefix_index:
+            self._indexes.append(self.prefix_index)
+
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        """
+        Get the inode, modification time and size of the backing file.
+        Atomic replacement gives the file a new inode, so every save changes the signature.
+        :return: Tuple of (inode, mtime in nanoseconds, size), or None if the file is missing.
+        """
+        return file_signature(self.file_path)
+
+    def data_signature(self) -> Any:
+        """
+        Get the signature of the backing files, as used to detect changes made
+        by other processes.
+        :return: Signature, or None for a cache without a backing file.
+        """
+        return self._file_signature()
+
+    def _load(self) -> Iterable[Book]:
+        """
+        Read the full catalog from storage.
+        :return: Books, read exactly once.
+        """
+        return load_books(self.file_path)
+
+    def _create_store(self, books: Iterable[Book]) -> MutableMapping[int, Book]:
+        """
+        Build the in-memory mapping of book ID to Book.
+        :param books: Books to store.
+        :return: Mapping keyed by book ID.
+        """
+        return VersionedBookMap(books)
+
+    def _reset(self, books: Iterable[Book]) -> None:
+        """
+        Replace the in-memory catalog.
+        :param books: Books to keep in memory.
+        """
+        self._books = self._create_store(books)
+        self._saved_last_id = load_last_id(self.file_path)
+        self._last_id = max(self._last_id, self._saved_last_id, max(self._books, default=0))
+        for index in self._indexes:
+            index.rebuild(self._books.values())
+
+    def _refresh(self) -> None:
+        """
+        Reload the catalog if the backing file changed since it was last read.
+        Must be called with the write lock held.
+        """
+        signature = self._file_signature()
+        if self._loaded and signature == self._signature:
+            return
+        self._reset(self._load())
+        self._signature = signature
+        self._loaded = True
+
+    def _ensure_fresh(self) -> None:
+        """
+        Reload the catalog under the write lock if the backing file changed.
+        Nested calls from a thread that already reads are skipped, since a read
+        lock cannot be upgraded.
+        """
+        if self._loaded and self._file_signature() == self._signature:
+            return
+        if self._lock.is_reading():
+            return
+        with self._lock.write_locked():
+            self._refresh()
+
+    def _writing(self):
+        """
+        Get the context manager that serializes writers.
+        :return: Context manager holding the write lock.
+        """
+        return self._lock.write_locked()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Hold the write lock, on an up-to-date cache, for a group of operations.
+        :return: Context manager.
+        """
+        with self._writing():
+            self._refresh()
+            try:
+                yield
+            finally:
+                self._publish()
+
+    def _publish(self) -> None:
+        """
+        Make the writes applied to a versioned store visible to readers, unless a
+        failed write invalidated the cache. Must be called with the write lock held.
+        """
+        if self._loaded and isinstance(self._books, VersionedBookMap):
+            self._books.publish()
+
+    @contextmanager
+    def _reading(self) -> Iterator[Mapping[int, Book]]:
+        """
+        Get the books of an up-to-date cache for reading.
+        A versioned store yields its current version and holds no lock, except to
+        a thread that is writing, which reads its own unpublished writes. While
+        another thread writes, the freshness check is skipped too, since the
+        writer refreshes the cache itself and a save in progress would look like
+        a change to the file. Other stores are read under the read lock.
+        :return: Context manager yielding a mapping of book ID to Book.
+        """
+        if isinstance(self._books, VersionedBookMap) and not self._lock.is_writing():
+            if not self._loaded or not self._lock.is_write_locked():
+                self._ensure_fresh()
+            yield self._books.snapshot()
+            return
+        self._ensure_fresh()
+        with self._lock.read_locked():
+            yield self._books
+
+    def snapshot(self) -> Mapping[int, Book]:
+        """
+        Get an immutable view of the catalog as of the last completed write.
+        With a versioned store this is free and later writes do not affect the
+        view; other stores are copied.
+        :return: Mapping of book ID to Book, ordered by ID for a versioned store.
+        """
+        with self._reading() as books:
+            if isinstance(books, BookVersion):
+                return books
+            return {book.id: book for book in books.values()}
+
+    def _save(self) -> None:
+        """
+        Write the in-memory catalog to the backing file.
+        """
+        save_books(self.file_path, list(self._books.values()))
+        self._signature = self._file_signature()
+
+    def _persist_add(self, book: Book) -> None:
+        """
+        Persist a newly added book.
+        :param book: Added book.
+        """
+        self._save()
+
+    def _persist_delete(self, book: Book) -> None:
+        """
+        Persist the removal of a book.
+        :param book: Deleted book.
+        """
+        self._save()
+
+    def _persist_status(self, book: Book) -> None:
+        """
+        Persist a status change.
+        :param book: Book with its new status.
+        """
+        self._save()
+
+    def _persist_add_many(self, books: List[Book]) -> None:
+        """
+        Persist a batch of newly added books.
+        :param books: Added books.
+        """
+        self._save()
+
+    def _persist_status_many(self, books: List[Book]) -> None:
+        """
+        Persist a batch of status changes.
+        :param books: Books with their new status.
+        """
+        self._save()
+
+    def _invalidate(self) -> None:
+        """
+        Drop the cached state so the next access reloads it from storage.
+        """
+        self._loaded = False
+
+    def get_all_books(self) -> List[Book]:
+        """
+        Retrieve all books from the cache.
+        :return: List of books.
+        """
+        with self._reading() as books:
+            return list(books.values())
+
+    def iter_books(self) -> Iterator[Book]:
+        """
+        Lazily iterate over the books of the current version, so long listings
+        and exports neither copy the catalog nor hold up writers.
+        :return: Iterator over books.
+        """
+        with self._reading() as books:
+            if isinstance(books, BookVersion):
+                return iter(books.values())
+            return iter(list(books.values()))
+
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """
+        Retrieve a single book by its ID.
+        :param book_id: ID of the book.
+        :return: The book, or None if it does not exist.
+        """
+        with self._reading() as books:
+            return books.get(book_id)
+
+    def get_books(self, book_ids: Iterable[int]) -> Dict[int, Book]:
+        """
+        Retrieve several books by ID at once.
+        :param book_ids: IDs of the books.
+        :return: Mapping of ID to book for the books that exist.
+        """
+        found = {}
+        with self._reading() as books:
+            for book_id in book_ids:
+                book = books.get(book_id)
+                if book is not None:
+                    found[book_id] = book
+        return found
+
+    def count_books(self) -> int:
+        """
+        Count the books in the repository.
+        :return: Number of books.
+        """
+        with self._reading() as books:
+            return len(books)
+
+    @locked_read
+    def count_by_status(self) -> Dict[str, int]:
+        """
+        Count the books per status from the status counters.
+        :return: Mapping of status value to count, including statuses without books.
+        """
+        return self.status_index.counts()
+
+    @locked_read
+    def count_by_author(self) -> Dict[str, int]:
+        """
+        Count the books per author from the aggregate views.
+        :return: Mapping of author to count, for authors with books.
+        """
+        return self.aggregate_index.authors()
+
+    @locked_read
+    def count_by_decade(self) -> Dict[int, int]:
+        """
+        Count the books per decade of publication from the aggregate views.
+        :return: Mapping of the first year of a decade to count, ordered by decade.
+        """
+        return self.aggregate_index.decades()
+
+    @locked_write
+    def rebuild_aggregates(self) -> None:
+        """
+        Rebuild the status counters and aggregate views from the cached books.
+        """
+        self.status_index.rebuild(self._books.values())
+        self.aggregate_index.rebuild(self._books.values())
+
+    @locked_read
+    def iter_books_by_status(self, status: str) -> Iterator[Book]:
+        """
+        Iterate over the books with a status, using the status index when available.
+        :param status: Status value ("available" or "checked_out").
+        :return: Iterator over books, ordered by ID.
+        """
+        if not isinstance(self.status_index, StatusIndex):
+            return super().iter_books_by_status(status)
+        ids = sorted(self.status_index.lookup(BookStatus(status)))
+        return iter([self._books[book_id] for book_id in ids])
+
+    @locked_read
+    def iter_books_by_year_range(
+        self, start_year: Optional[int] = None, end_year: Optional[int] = None
+    ) -> Iterator[Book]:
+        """
+        Iterate over the books published in a range of years, using the year
+        index when available.
+        :param start_year: First year, inclusive (optional).
+        :param end_year: Last year, inclusive (optional).
+        :return: Iterator over books, ordered by year, then by ID.
+        """
+        if self.year_index is None:
+            return super().iter_books_by_year_range(start_year, end_year)
+        ids = self.year_index.between(start_year, end_year)
+        return iter([self._books[book_id] for book_id in ids])
+
+    @locked_read
+    def iter_books_due(
+        self,
+        after: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Book]:
+        """
+        Iterate over the checked-out books whose loans are due in a period, using
+        the loan index when available.
+        :param after: Start of the period, exclusive (optional).
+        :param until: End of the period, inclusive (optional), e.g. now for overdue loans.
+        :param limit: Maximum number of books (optional).
+        :return: Iterator over books, ordered by due date, then by ID.
+        """
+        if self.loan_index is None:
+            return super().iter_books_due(after, until, limit)
+        ids = islice(self.loan_index.due_between(after, until), limit)
+        return iter([self._books[book_id] for book_id in ids])
+
+    @locked_read
+    def autocomplete(
+        self, prefix: str, field: Optional[str] = None, limit: int = 10
+    ) -> List[Book]:
+        """
+        Find the best completions of a typed prefix among titles and authors.
+        Uses the prefix index when available and otherwise ranks a scan of the cache.
+        :param prefix: Prefix as typed.
+        :param field: "title", "author", or None for both.
+        :param limit: Maximum number of results.
+        :return: Matching books in rank order (see book_index.autocomplete_key).
+        """
+        if self.prefix_index is None:
+            return super().autocomplete(prefix, field, limit)
+        prefix = normalize_prefix(prefix)
+        if not prefix:
+            return []
+        ids = self.prefix_index.complete(prefix, field, limit)
+        return [self._books[book_id] for book_id in ids]
+
+    @locked_read
+    def next_book_id(self) -> int:
+        """
+        Get the ID to assign to the next new book.
+        IDs come from a sequence that never goes backwards and is saved next to the
+        catalog before deletes, so IDs of deleted books are not reused, even after a restart.
+        :return: Next ID in the sequence.
+        """
+        return self._last_id + 1
+
+    @locked_read
+    def find_book_by_key(self, title: str, author: str, year: int) -> Optional[Book]:
+        """
+        Find a book with the same title, author and year.
+        Uses the key index when available and otherwise scans the cache.
+        :param title: Title of the book.
+        :param author: Author of the book.
+        :param year: Year of publication.
+        :return: The existing book, or None if there is none.
+        """
+        if self.key_index is None:
+            key = book_key(title, author, year)
+            return match_keys(self._books.values(), [key]).get(key)
+        book_id = self.key_index.lookup(title, author, year)
+        return self._books[book_id] if book_id is not None else None
+
+    @locked_read
+    def find_books_by_keys(
+        self, keys: Iterable[Tuple[str, str, int]]
+    ) -> Dict[Tuple[str, str, int], Book]:
+        """
+        Find the existing books for several (title, author, year) keys at once.
+        Uses the key index when available and otherwise scans the cache once.
+        :param keys: Keys of the books as (title, author, year).
+        :return: Mapping of the normalized key to the existing book, for the keys that have one.
+        """
+        if self.key_index is None:
+            return match_keys(self._books.values(), keys)
+        found = {}
+        for key in keys:
+            book_id = self.key_index.lookup(*key)
+            if book_id is not None:
+                found[book_key(*key)] = self._books[book_id]
+        return found
+
+    @locked_write
+    def add_book(self, book: Book) -> None:
+        """
+        Add a new book to the repository.
+        :param book: Book instance to add.
+        :raises ValueError: If a book with the same ID already exists.
+        """
+        if book.id in self._books:
+            raise ValueError(f"Book with ID {book.id} already exists.")
+        self._books[book.id] = book
+        self._last_id = max(self._last_id, book.id)
+        for index in self._indexes:
+            index.add(book)
+        try:
+            self._persist_add(book)
+        except Exception:
+            self._invalidate()
+            raise
+
+    @locked_write
+    def delete_book(self, book_id: int) -> bool:
+        """
+        Delete a book by its ID.
+        :param book_id: ID of the book to delete.
+        :return: True if the book was deleted, False otherwise.
+        """
+        book = self._books.get(book_id)
+        if book is None:
+            return False
+        if self._last_id > self._saved_last_id:
+            save_last_id(self.file_path, self._last_id)
+            self._saved_last_id = self._last_id
+        del self._books[book_id]
+        for index in self._indexes:
+            index.remove(book)
+        try:
+            self._persist_delete(book)
+        except Exception:
+            self._invalidate()
+            raise
+        return True
+
+    @locked_read
+    def search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> List[Book]:
+        """
+        Search for books by title, author, or year.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :return: List of books matching the criteria.
+        """
+        if self.search_index is None:
+            return [
+                book
+                for book in self._books.values()
+                if matches_criteria(book, title, author, year)
+            ]
+        ids = self.search_index.search(title, author, year)
+        if ids is None:
+            return list(self._books.values())
+        return [self._books[book_id] for book_id in sorted(ids)]
+
+    @locked_read
+    def iter_search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> Iterator[Book]:
+        """
+        Lazily iterate over books matching the search criteria.
+        Uses the search index when available and otherwise filters a scan of the cache.
+        With the index, only the sorted candidate IDs are collected up front; the
+        books are read one at a time from the current version.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :return: Iterator over matching books, ordered by ID when the index is used.
+        """
+        if self.search_index is None:
+            return super().iter_search_books(title, author, year)
+        ids = self.search_index.search(title, author, year)
+        if ids is None:
+            return self.iter_books()
+        return self._iter_ids(sorted(ids))
+
+    def _iter_ids(self, ids: List[int]) -> Iterator[Book]:
+        """
+        Iterate over the books with the given IDs. Must be called with a lock held.
+        A versioned store is read lazily from its current version, which later
+        writes do not change; other stores are copied while the lock is held.
+        :param ids: IDs of books in the cache.
+        :return: Iterator over books, in the order of the IDs.
+        """
+        books = self._books
+        if isinstance(books, VersionedBookMap) and not self._lock.is_writing():
+            version = books.snapshot()
+            return (version[book_id] for book_id in ids)
+        return iter([books[book_id] for book_id in ids])
+
+    @locked_write
+    def update_book_status(
+        self, book_id: int, new_status: str, loan: Optional[Loan] = None
+    ) -> bool:
+        """
+        Update the status of a book by its ID.
+        The cached book is replaced rather than modified, so lists returned earlier stay unchanged.
+        :param book_id: ID of the book to update.
+        :param new_status: New status to set.
+        :param loan: Loan record to store with the status, replacing the current one (optional).
+        :return: True if the book was updated, False otherwise.
+        """
+        book = self._books.get(book_id)
+        if book is None:
+            return False
+        updated = book.with_status(new_status, loan)
+        self._books[book_id] = updated
+        for index in self._indexes:
+            index.replace(book, updated)
+        try:
+            self._persist_status(updated)
+        except Exception:
+            self._invalidate()
+            raise
+        return True
+
+    @locked_write
+    def add_books(self, books: List[Book]) -> None:
+        """
+        Add several books with a single write.
+        :param books: Book instances to add.
+        :raises ValueError: If a book ID is already in use.
+        """
+        check_new_ids(self._books, books)
+        for book in books:
+            self._books[book.id] = book
+            self._last_id = max(self._last_id, book.id)
+            for index in self._indexes:
+                index.add(book)
+        try:
+            self._persist_add_many(books)
+        except Exception:
+            self._invalidate()
+            raise
+
+    @locked_write
+    def update_books_status(self, updates: Mapping[int, str]) -> int:
+        """
+        Update the status of several books with a single write.
+        Statuses are set without loan records.
+        :param updates: Mapping of book ID to new status.
+        :return: Number of books that were updated.
+        """
+        changed = []
+        for book_id, new_status in updates.items():
+            book = self._books.get(book_id)
+            if book is None:
+                continue
+            changed.append((book, book.with_status(new_status)))
+        for book, updated in changed:
+            self._books[book.id] = updated
+            for index in self._indexes:
+                index.replace(book, updated)
+        if not changed:
+            return 0
+        try:
+            self._persist_status_many([updated for _, updated in changed])
+        except Exception:
+            self._invalidate()
+            raise
+        return len(changed)
+
+
+class CompactBookRepository(CachedBookRepository):
+    """
+    Cached repository that holds the catalog in a columnar BookTable.
+    Uses a fraction of the memory of one Book object per record and creates
+    Book instances only for the results it returns.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        search_index: bool = False,
+        filter_indexes: bool = False,
+        prefix_index: bool = False,
+        key_index: bool = False,
+    ):
+        """
+        Initialize the repository with a file path for storing data.
+        :param file_path: Path to the JSON file.
+        :param search_index: Whether to maintain a trigram index for search_books
+            (off by default, since the index outweighs the compact table).
+        :param filter_indexes: Whether to maintain status and year indexes (off by
+            default for the same reason; the counts per status, author and decade are
+            always maintained).
+        :param prefix_index: Whether to maintain a prefix index for autocomplete
+            (off by default for the same reason).
+        :param key_index: Whether to maintain a (title, author, year) index for
+            duplicate checks (off by default for the same reason).
+        """
+        super().__init__(file_path, search_index, filter_indexes, prefix_index, key_index)
+
+    def _load(self) -> Iterable[Book]:
+        """
+        Stream the catalog from storage, so the table is filled one book at a
+        time instead of from a list of every Book.
+        :return: Iterator over books.
+        """
+        return iter_books(self.file_path)
+
+    def _create_store(self, books: Iterable[Book]) -> MutableMapping[int, Book]:
+        return BookTable(books)
+
+
+class ConcurrentBookRepository(CachedBookRepository):
+    """
+    Cached repository that several processes can share.
+    Writers take an exclusive fcntl lock on a lock file next to the catalog, so
+    read-modify-write cycles from different processes are serialized. Under that
+    lock the cached version (the file signature) is checked against the file and
+    the cache is reloaded if another process committed first, so no update is lost.
+    Saves replace the file atomically, so readers never need the file lock.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        search_index: bool = True,
+        lock_path: Optional[str] = None,
+        filter_indexes: bool = True,
+        prefix_index: bool = True,
+        key_index: bool = True,
+    ):
+        """
+        Initialize the repository with a file path for storing data.
+        :param file_path: Path to the JSON file.
+        :param search_index: Whether to maintain a trigram index for search_books.
+        :param lock_path: Path to the lock file (defaults to "<file_path>.lock").
+        :param filter_indexes: Whether to maintain status, year and loan due date indexes
+            (see CachedBookRepository).
+        :param prefix_index: Whether to maintain a title and author prefix index for autocomplete.
+        :param key_index: Whether to maintain a (title, author, year) index for duplicate checks.
+        """
+        super().__init__(file_path, search_index, filter_indexes, prefix_index, key_index)
+        self.lock_path = lock_path or f"{file_path}.lock"
+        self._file_lock_depth = 0
+
+    @contextmanager
+    def _writing(self):
+        """
+        Hold the in-process write lock and, at the outermost level, the file lock.
+        :return: Context manager.
+        """
+        with self._lock.write_locked():
+            if self._file_lock_depth:
+                yield
+                return
+            with file_lock(self.lock_path):
+                self._file_lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._file_lock_depth -= 1
@@ -1,6 +1,11 @@
-from typing import List, Optional
+import heapq
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
 
-from book_models import Book, BookStatus
+from book_index import AUTOCOMPLETE_FIELDS, book_key
+from book_models import Book, BookStatus, Loan
 from book_repository import BookRepositoryInterface
 from exceptions import (
     BookAlreadyAvailableError,
@@ -10,6 +15,60 @@ from exceptions import (
     EmptyLibraryError,
     InvalidBookStatusError,
 )
+from pagination import DEFAULT_PAGE_SIZE, BookPage
+from query_cache import QueryCache
+
+# Number of days a book may be kept when no due date is given.
+DEFAULT_LOAN_DAYS = 14
+
+
+def check_limit(limit: Optional[int]) -> None:
+    """
+    Validate a result limit.
+    :param limit: Maximum number of results, or None for no limit.
+    :raises ValueError: If the limit is not a positive integer.
+    """
+    if limit is not None and (not isinstance(limit, int) or limit <= 0):
+        raise ValueError("Limit must be a positive integer.")
+
+
+def check_aware(moment: Optional[datetime], name: str) -> None:
+    """
+    Validate that a time carries a timezone, so it compares with stored loan times.
+    :param moment: Time to check, or None if it was not given.
+    :param name: Name of the argument, for the error message.
+    :raises ValueError: If the time is naive.
+    """
+    if moment is not None and moment.utcoffset() is None:
+        raise ValueError(f"{name} must be timezone-aware.")
+
+
+def check_status_change(book_id: int, current_status: Optional[str], new_status: str) -> None:
+    """
+    Check that a book exists and does not have the requested status yet.
+    :param book_id: ID of the book.
+    :param current_status: Current status of the book, or None if it does not exist.
+    :param new_status: Status to set.
+    :raises BookNotFoundError: If the book does not exist.
+    :raises BookAlreadyAvailableError: If the book is already available.
+    :raises BookAlreadyCheckedOutError: If the book is already checked out.
+    """
+    if current_status is None:
+        raise BookNotFoundError(f"ID {book_id}")
+    if current_status == new_status:
+        if new_status == BookStatus.AVAILABLE.value:
+            raise BookAlreadyAvailableError(book_id)
+        raise BookAlreadyCheckedOutError(book_id)
+
+
+def count_rank(item: Tuple[Any, int]) -> Tuple[int, Any]:
+    """
+    Sort key for counts: the largest count first, ties in order of the value.
+    :param item: Tuple of (value, count).
+    :return: Sort key.
+    """
+    value, count = item
+    return -count, value
 
 
 class BookService:
@@ -17,12 +76,37 @@ class BookService:
     Handles business logic for book operations.
     """
 
-    def __init__(self, repository: BookRepositoryInterface):
+    def __init__(
+        self, repository: BookRepositoryInterface, query_cache: Optional[QueryCache] = None
+    ):
         """
         Initialize the book service with a repository.
         :param repository: Repository instance for data management.
+        :param query_cache: Cache for search_books results (optional). Writes made
+            through this service invalidate the affected entries.
         """
         self.repository = repository
+        self.query_cache = query_cache
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Hold the repository's transaction for a group of writes, keeping the
+        search cache in step with the data file: changes made outside this
+        service since the cache last checked clear it, while the writes made
+        inside only drop the entries they affect (see books_added and books_changed).
+        :return: Context manager.
+        """
+        with self.repository.transaction():
+            cache = self.query_cache
+            if cache is None:
+                yield
+                return
+            cache.validate(self.repository.data_signature())
+            try:
+                yield
+            finally:
+                cache.adopt(self.repository.data_signature())
 
     def add_book(self, title: str, author: str, year: int) -> Book:
         """
@@ -33,16 +117,16 @@ class BookService:
         :return: The added book instance.
         :raises DuplicateBookError: If a book with the same title, author, and year already exists.
         """
-        books = self.repository.get_all_books()
-        if any(
-            book.title == title and book.author == author and book.year == year
-            for book in books
-        ):
-            raise DuplicateBookError(title, author, year)
+        with self.transaction():
+            if self.repository.find_book_by_key(title, author, year) is not None:
+                raise DuplicateBookError(title, author, year)
 
-        book_id = max((book.id for book in books), default=0) + 1
-        new_book = Book(book_id, title, author, year)
-        self.repository.add_book(new_book)
+            book_id = self.repository.next_book_id()
+            new_book = Book(book_id, title, author, year)
+            try:
+                self.repository.add_book(new_book)
+            finally:
+                self.books_added([new_book])
         return new_book
 
     def delete_book(self, book_id: int) -> None:
@@ -52,56 +136,304 @@ class BookService:
         :raises BookNotFoundError: If the book does not exist.
         :raises EmptyLibraryError: If the library is empty.
         """
-        books = self.repository.get_all_books()
-        if not books:
-            raise EmptyLibraryError()
-        if not any(book.id == book_id for book in books):
-            raise BookNotFoundError(f"ID {book_id}")
+        with self.transaction():
+            if not self.repository.count_books():
+                raise EmptyLibraryError()
+            if self.repository.get_book(book_id) is None:
+                raise BookNotFoundError(f"ID {book_id}")
 
-        self.repository.delete_book(book_id)
+            try:
+                self.repository.delete_book(book_id)
+            finally:
+                self.books_changed([book_id])
 
     def search_books(
         self,
         title: Optional[str] = None,
         author: Optional[str] = None,
         year: Optional[int] = None,
+        limit: Optional[int] = None,
     ) -> List[Book]:
         """
         Search for books by title, author, or year.
         :param title: Title of the book (optional).
         :param author: Author of the book (optional).
         :param year: Year of publication (optional).
+        :param limit: Maximum number of results; the search stops once it is reached (optional).
         :return: List of books matching the search criteria.
+        :raises ValueError: If the limit is not positive.
         :raises EmptyLibraryError: If the library is empty.
         :raises BookNotFoundError: If no books match the search criteria.
         """
-        books = self.repository.get_all_books()
-        if not books:
-            raise EmptyLibraryError()
+        check_limit(limit)
+        cache = self.query_cache
+        if cache is not None:
+            key = cache.make_key(title, author, year, limit)
+            results, generation = cache.lookup(key, self.repository.data_signature())
+            if results is None:
+                results = self._search(title, author, year, limit)
+                cache.store(key, results, generation)
+        else:
+            results = self._search(title, author, year, limit)
 
-        results = self.repository.search_books(title, author, year)
         if not results:
-            criteria = []
-            if title:
-                criteria.append(f"title='{title}'")
-            if author:
-                criteria.append(f"author='{author}'")
-            if year:
-                criteria.append(f"year={year}")
-            raise BookNotFoundError(", ".join(criteria))
+            self._raise_no_results(title, author, year)
         return results
 
-    def list_books(self) -> List[Book]:
+    def _search(
+        self,
+        title: Optional[str],
+        author: Optional[str],
+        year: Optional[int],
+        limit: Optional[int],
+    ) -> List[Book]:
+        """
+        Run a search against the repository.
+        :param title: Title of the book (optional).
+        :param author: Author of the book (optional).
+        :param year: Year of publication (optional).
+        :param limit: Maximum number of results (optional).
+        :return: List of matching books.
+        """
+        if limit is None:
+            return self.repository.search_books(title, author, year)
+        return list(islice(self.repository.iter_search_books(title, author, year), limit))
+
+    def books_added(self, books: List[Book]) -> None:
+        """
+        Invalidate the cached searches that new books could appear in.
+        Code that adds books to the repository directly must call this.
+        :param books: Added books.
+        """
+        if self.query_cache is not None:
+            self.query_cache.invalidate_added(books)
+
+    def books_changed(self, book_ids: Iterable[int]) -> None:
+        """
+        Invalidate the cached searches containing books that were deleted or
+        modified. Code that writes to the repository directly must call this.
+        :param book_ids: IDs of the books.
+        """
+        if self.query_cache is not None:
+            self.query_cache.invalidate_ids(book_ids)
+
+    def search_books_page(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+        order_by: str = "id",
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[Sequence] = None,
+    ) -> BookPage:
+        """
+        Get one page of search results.
+        Pass the returned page's next_cursor as `after` to fetch the following page.
+        :param title: Title of the book (optional).
+        :param author: Author of the book (optional).
+        :param year: Year of publication (optional).
+        :param order_by: Field to sort by ("id", "year" or "title").
+        :param limit: Maximum number of books on the page.
+        :param offset: Number of books to skip after the cursor.
+        :param after: Cursor returned with the previous page (optional).
+        :return: The requested page (empty if past the last result).
+        :raises ValueError: If the paging arguments are invalid.
+        :raises EmptyLibraryError: If the library is empty.
+        :raises BookNotFoundError: If no books match the search criteria.
+        """
+        page = self.repository.page_books(title, author, year, order_by, limit, offset, after)
+        if not page.books and after is None and offset == 0:
+            self._raise_no_results(title, author, year)
+        return page
+
+    def _raise_no_results(
+        self, title: Optional[str], author: Optional[str], year: Optional[int]
+    ) -> None:
+        """
+        Raise the error for a search without results.
+        :param title: Title of the book (optional).
+        :param author: Author of the book (optional).
+        :param year: Year of publication (optional).
+        :raises EmptyLibraryError: If the library is empty.
+        :raises BookNotFoundError: Otherwise, describing the search criteria.
+        """
+        criteria = []
+        if title:
+            criteria.append(f"title='{title}'")
+        if author:
+            criteria.append(f"author='{author}'")
+        if year:
+            criteria.append(f"year={year}")
+        self._raise_not_found(criteria)
+
+    def _raise_not_found(self, criteria: List[str]) -> None:
+        """
+        Raise the error for a query without results.
+        :param criteria: Descriptions of the query criteria.
+        :raises EmptyLibraryError: If the library is empty.
+        :raises BookNotFoundError: Otherwise, listing the criteria.
+        """
+        if not self.repository.count_books():
+            raise EmptyLibraryError()
+        raise BookNotFoundError(", ".join(criteria))
+
+    def count_books_by_status(self) -> Dict[str, int]:
+        """
+        Count the books per status, e.g. how many are available.
+        :return: Mapping of status value to count, including statuses without books.
+        """
+        return self.repository.count_by_status()
+
+    def count_books_by_author(self, limit: Optional[int] = None) -> Dict[str, int]:
+        """
+        Count the books per author, e.g. to find the authors with the most books.
+        :param limit: Maximum number of authors (optional).
+        :return: Mapping of author to count, the most books first, ties by author.
+        :raises ValueError: If the limit is not positive.
+        """
+        check_limit(limit)
+        counts = self.repository.count_by_author().items()
+        if limit is None:
+            return dict(sorted(counts, key=count_rank))
+        return dict(heapq.nsmallest(limit, counts, key=count_rank))
+
+    def count_books_by_decade(self) -> Dict[int, int]:
+        """
+        Count the books per decade of publication.
+        :return: Mapping of the first year of a decade to count, ordered by decade.
+        """
+        return self.repository.count_by_decade()
+
+    def catalog_report(self, top_authors: int = 10) -> Dict[str, Any]:
+        """
+        Summarize the catalog for a dashboard from the repository's aggregate views.
+        :param top_authors: Number of authors to list.
+        :return: Dictionary with the number of "books" and the counts per "status",
+            of the authors with the most books ("authors") and per decade ("decades").
+        :raises ValueError: If top_authors is not positive.
+        """
+        statuses = self.count_books_by_status()
+        return {
+            "books": sum(statuses.values()),
+            "status": statuses,
+            "authors": self.count_books_by_author(top_authors),
+            "decades": self.count_books_by_decade(),
+        }
+
+    def list_books_by_status(self, status: str, limit: Optional[int] = None) -> List[Book]:
+        """
+        List the books with a status, ordered by ID.
+        :param status: Status to filter by ("available" or "checked_out").
+        :param limit: Maximum number of books (optional).
+        :return: List of books with the status.
+        :raises InvalidBookStatusError: If the status is invalid.
+        :raises ValueError: If the limit is not positive.
+        :raises EmptyLibraryError: If the library is empty.
+        :raises BookNotFoundError: If no book has the status.
+        """
+        if status not in [status.value for status in BookStatus]:
+            raise InvalidBookStatusError(status)
+        check_limit(limit)
+        books = list(islice(self.repository.iter_books_by_status(status), limit))
+        if not books:
+            self._raise_not_found([f"status='{status}'"])
+        return books
+
+    def search_books_by_year_range(
+        self,
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Book]:
+        """
+        Find the books published in a range of years, ordered by year, then by ID.
+        :param start_year: First year, inclusive (optional).
+        :param end_year: Last year, inclusive (optional).
+        :param limit: Maximum number of books (optional).
+        :return: List of books published in the range.
+        :raises ValueError: If a year is not a positive integer, the range is
+            reversed or the limit is not positive.
+        :raises EmptyLibraryError: If the library is empty.
+        :raises BookNotFoundError: If no book was published in the range.
+        """
+        for year in (start_year, end_year):
+            if year is not None:
+                Book.validate_year(year)
+        if start_year is not None and end_year is not None and start_year > end_year:
+            raise ValueError("Start year must not be after end year.")
+        check_limit(limit)
+        books = list(
+            islice(self.repository.iter_books_by_year_range(start_year, end_year), limit)
+        )
+        if not books:
+            self._raise_not_found([f"year={start_year or ''}..{end_year or ''}"])
+        return books
+
+    def autocomplete(
+        self, prefix: str, field: Optional[str] = None, limit: int = 10
+    ) -> List[Book]:
+        """
+        Suggest books for a partially typed title or author.
+        Books whose title or author starts with the prefix come first, then books
+        with a later word starting with it; ties are broken alphabetically, then
+        by year and ID. Finding no suggestions is not an error.
+        :param prefix: Text typed so far; case and extra whitespace are ignored.
+        :param field: "title" or "author" to complete only that field (optional).
+        :param limit: Maximum number of suggestions.
+        :return: Suggested books, best first (empty for a blank prefix).
+        :raises ValueError: If the field is unknown or the limit is not positive.
+        """
+        if field is not None and field not in AUTOCOMPLETE_FIELDS:
+            raise ValueError(
+                f"Unknown field '{field}'. Valid fields are: {', '.join(AUTOCOMPLETE_FIELDS)}."
+            )
+        check_limit(limit)
+        return self.repository.autocomplete(prefix, field, limit)
+
+    def list_books(self, limit: Optional[int] = None) -> List[Book]:
         """
         List all books in the library.
+        :param limit: Maximum number of books; the catalog is streamed and reading
+            stops once it is reached (optional).
         :return: List of all books.
+        :raises ValueError: If the limit is not positive.
         :raises EmptyLibraryError: If the library is empty.
         """
-        books = self.repository.get_all_books()
+        check_limit(limit)
+        if limit is None:
+            books = self.repository.get_all_books()
+        else:
+            books = list(islice(self.repository.iter_books(), limit))
         if not books:
             raise EmptyLibraryError()
         return books
 
+    def list_books_page(
+        self,
+        order_by: str = "id",
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[Sequence] = None,
+    ) -> BookPage:
+        """
+        Get one page of the catalog.
+        Pass the returned page's next_cursor as `after` to fetch the following page.
+        :param order_by: Field to sort by ("id", "year" or "title").
+        :param limit: Maximum number of books on the page.
+        :param offset: Number of books to skip after the cursor.
+        :param after: Cursor returned with the previous page (optional).
+        :return: The requested page (empty if past the last book).
+        :raises ValueError: If the paging arguments are invalid.
+        :raises EmptyLibraryError: If the library is empty.
+        """
+        page = self.repository.page_books(
+            order_by=order_by, limit=limit, offset=offset, after=after
+        )
+        if not page.books and after is None and offset == 0:
+            raise EmptyLibraryError()
+        return page
+
     def update_book_status(self, book_id: int, new_status: str) -> None:
         """
         Update the status of a book.
@@ -116,19 +448,185 @@ class BookService:
         if new_status not in [status.value for status in BookStatus]:
             raise InvalidBookStatusError(new_status)
 
-        books = self.repository.get_all_books()
-        if not books:
-            raise EmptyLibraryError()
-
-        for book in books:
-            if book.id == book_id:
-                if book.status == new_status:
-                    if new_status == BookStatus.AVAILABLE.value:
-                        raise BookAlreadyAvailableError(book_id)
-                    else:
-                        raise BookAlreadyCheckedOutError(book_id)
+        with self.transaction():
+            if not self.repository.count_books():
+                raise EmptyLibraryError()
 
+            book = self.repository.get_book(book_id)
+            check_status_change(book_id, book.status.value if book else None, new_status)
+            try:
                 self.repository.update_book_status(book_id, new_status)
-                return
+            finally:
+                self.books_changed([book_id])
 
-        raise BookNotFoundError(f"ID {book_id}")
+    def checkout_book(
+        self,
+        book_id: int,
+        borrower: str,
+        loan_days: int = DEFAULT_LOAN_DAYS,
+        now: Optional[datetime] = None,
+    ) -> Loan:
+        """
+        Check out a book and record who borrowed it and when it is due.
+        The loan is stored with the status in a single repository write.
+        :param book_id: ID of the book to check out.
+        :param borrower: Name or card number of the borrower.
+        :param loan_days: Number of days until the book is due.
+        :param now: Time of the checkout, timezone-aware (defaults to the current time).
+        :return: The new loan record.
+        :raises ValueError: If the borrower is blank, the loan period is not positive or
+            now is naive.
+        :raises EmptyLibraryError: If the library is empty.
+        :raises BookNotFoundError: If the book does not exist.
+        :raises BookAlreadyCheckedOutError: If the book is already checked out.
+        """
+        borrower = borrower.strip()
+        if not borrower:
+            raise ValueError("Borrower must not be empty.")
+        if not isinstance(loan_days, int) or loan_days <= 0:
+            raise ValueError("Loan period must be a positive number of days.")
+        check_aware(now, "now")
+        now = now or datetime.now(timezone.utc)
+        loan = Loan(borrower, now, now + timedelta(days=loan_days))
+
+        with self.transaction():
+            if not self.repository.count_books():
+                raise EmptyLibraryError()
+
+            book = self.repository.get_book(book_id)
+            new_status = BookStatus.CHECKED_OUT.value
+            check_status_change(book_id, book.status.value if book else None, new_status)
+            try:
+                self.repository.update_book_status(book_id, new_status, loan)
+            finally:
+                self.books_changed([book_id])
+        return loan
+
+    def return_book(self, book_id: int) -> Optional[Loan]:
+        """
+        Return a checked out book, ending its loan.
+        :param book_id: ID of the book to return.
+        :return: The loan that ended, or None if the book was checked out without one.
+        :raises EmptyLibraryError: If the library is empty.
+        :raises BookNotFoundError: If the book does not exist.
+        :raises BookAlreadyAvailableError: If the book is already available.
+        """
+        with self.transaction():
+            book = self.repository.get_book(book_id)
+            self.update_book_status(book_id, BookStatus.AVAILABLE.value)
+        return book.loan
+
+    def overdue_books(self, limit: int = 10, now: Optional[datetime] = None) -> List[Book]:
+        """
+        Find the books that are due, the longest overdue first.
+        Finding none is not an error.
+        :param limit: Maximum number of books.
+        :param now: Time to compare the due dates with, timezone-aware (defaults to the
+            current time).
+        :return: Books due at or before now, ordered by due time, then by ID.
+        :raises ValueError: If the limit is not positive or now is naive.
+        """
+        check_limit(limit)
+        check_aware(now, "now")
+        return list(self.loans_due(until=now or datetime.now(timezone.utc), limit=limit))
+
+    def loans_due(
+        self,
+        after: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Book]:
+        """
+        Iterate over the books on loan that are due in a period, e.g. to send reminders
+        for the loans that became overdue since the previous run: pass that run's
+        `until` as `after`, and every loan is reported exactly once.
+        :param after: Start of the period, exclusive, timezone-aware (optional).
+        :param until: End of the period, inclusive, timezone-aware (optional).
+        :param limit: Maximum number of books (optional).
+        :return: Iterator over books, ordered by due time, then by ID.
+        :raises ValueError: If the limit is not positive or a time is naive.
+        """
+        check_limit(limit)
+        check_aware(after, "after")
+        check_aware(until, "until")
+        return self.repository.iter_books_due(after, until, limit)
+
+    def bulk_add(
+        self, records: Iterable[Mapping[str, Any]], skip_duplicates: bool = False
+    ) -> List[Book]:
+        """
+        Add many books in one pass and persist them with a single repository write.
+        Every record is validated before anything is stored.
+        :param records: Mappings with "title", "author", "year" and optionally "status".
+        :param skip_duplicates: Skip books that already exist instead of failing.
+        :return: List of added books.
+        :raises DuplicateBookError: If a book already exists and skip_duplicates is False.
+        :raises InvalidBookStatusError: If a record has an invalid status.
+        :raises ValueError: If a record has an invalid year.
+        :raises KeyError: If a record misses a required field.
+        """
+        with self.transaction():
+            records = list(records)
+            existing = self.repository.find_books_by_keys(
+                (record["title"], record["author"], record["year"]) for record in records
+            )
+            next_id = self.repository.next_book_id()
+            seen: Set[Tuple[str, str, int]] = set()
+            books = []
+            for record in records:
+                title, author, year = record["title"], record["author"], record["year"]
+                key = book_key(title, author, year)
+                if key in seen or key in existing:
+                    if skip_duplicates:
+                        continue
+                    raise DuplicateBookError(title, author, year)
+                seen.add(key)
+                books.append(
+                    Book(next_id, title, author, year, record.get("status") or "available")
+                )
+                next_id += 1
+
+            if books:
+                try:
+                    self.repository.add_books(books)
+                finally:
+                    self.books_added(books)
+        return books
+
+    def bulk_update_status(self, book_ids: Iterable[int], new_status: str) -> int:
+        """
+        Update the status of many books with a single repository write.
+        Books that already have the requested status are left unchanged.
+        :param book_ids: IDs of the books to update.
+        :param new_status: New status to set ("available" or "checked_out").
+        :return: Number of books that were updated.
+        :raises InvalidBookStatusError: If the status is invalid.
+        :raises EmptyLibraryError: If the library is empty.
+        :raises BookNotFoundError: If any of the books does not exist.
+        """
+        if new_status not in [status.value for status in BookStatus]:
+            raise InvalidBookStatusError(new_status)
+
+        with self.transaction():
+            if not self.repository.count_books():
+                raise EmptyLibraryError()
+
+            book_ids = list(book_ids)
+            books = self.repository.get_books(book_ids)
+            updates = {}
+            missing = []
+            for book_id in book_ids:
+                book = books.get(book_id)
+                if book is None:
+                    missing.append(str(book_id))
+                elif book.status.value != new_status:
+                    updates[book_id] = new_status
+            if missing:
+                raise BookNotFoundError(f"ID {', '.join(missing)}")
+
+            if not updates:
+                return 0
+            try:
+                return self.repository.update_books_status(updates)
+            finally:
+                self.books_changed(updates)
@@ -0,0 +1,261 @@
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from typing import BinaryIO, Iterable, Iterator, Optional, Sequence, overload
+
+from book_models import Book, Loan, from_micros, to_micros
+from book_table import STATUS_CODES, STATUSES
+
+MAGIC = b"LIBSNAP1"
+VERSION = 2
+FLAG_SORTED = 1
+
+# magic, version, flags, book count, offset of the record offset table
+HEADER = struct.Struct("<8sIIQQ")
+# id, year, status code, title length, author length, loan length; the UTF-8
+# strings and the loan (if its length is not 0) follow
+RECORD = struct.Struct("<qqBIII")
+# Version 1 records had no loans.
+RECORD_V1 = struct.Struct("<qqBII")
+# checkout time and due date in microseconds since the epoch; the UTF-8 borrower follows
+LOAN = struct.Struct("<qq")
+OFFSET = struct.Struct("<Q")
+
+
+class SnapshotError(ValueError):
+    """
+    Raised when a binary snapshot is truncated or malformed.
+    """
+
+
+def write_snapshot(books: Iterable[Book], file: BinaryIO) -> int:
+    """
+    Write books in the binary snapshot format.
+    Layout: header, then one record per book, then a table with the file offset
+    of every record, so a reader can jump to any book without parsing the others.
+    The file must be seekable, since the header is completed last.
+    :param books: Books to write, in the order they should be read back.
+    :param file: Binary file opened for writing.
+    :return: Number of books written.
+    """
+    start = file.tell()
+    file.write(b"\0" * HEADER.size)
+    position = start + HEADER.size
+    offsets = array("Q")
+    previous_id = None
+    ordered = True
+    for book in books:
+        title = book.title.encode("utf-8")
+        author = book.author.encode("utf-8")
+        loan = _encode_loan(book.loan) if book.loan is not None else b""
+        record = RECORD.pack(
+            book.id, book.year, STATUS_CODES[book.status], len(title), len(author), len(loan)
+        )
+        file.write(record)
+        file.write(title)
+        file.write(author)
+        file.write(loan)
+        offsets.append(position)
+        position += len(record) + len(title) + len(author) + len(loan)
+        if previous_id is not None and book.id <= previous_id:
+            ordered = False
+        previous_id = book.id
+
+    if offsets.itemsize != OFFSET.size:  # pragma: no cover - 'Q' is 8 bytes everywhere
+        raise SnapshotError("Unsupported platform: 'Q' arrays are not 64-bit.")
+    table = offsets.tobytes() if _little_endian() else _byteswapped(offsets)
+    file.write(table)
+    end = file.tell()
+    file.seek(start)
+    file.write(HEADER.pack(MAGIC, VERSION, FLAG_SORTED if ordered else 0, len(offsets), position))
+    file.seek(end)
+    return len(offsets)
+
+
+def _encode_loan(loan: Loan) -> bytes:
+    """
+    Encode a loan record.
+    :param loan: Loan to encode.
+    :return: Packed times followed by the UTF-8 borrower.
+    """
+    times = LOAN.pack(to_micros(loan.checked_out_at), to_micros(loan.due_at))
+    return times + loan.borrower.encode("utf-8")
+
+
+def _decode_loan(data: bytes) -> Loan:
+    """
+    Decode a loan record.
+    :param data: Bytes written by _encode_loan.
+    :return: Loan with UTC times.
+    """
+    checked_out_at, due_at = LOAN.unpack_from(data)
+    return Loan(data[LOAN.size:].decode("utf-8"), from_micros(checked_out_at), from_micros(due_at))
+
+
+def _little_endian() -> bool:
+    """
+    Check the byte order of the platform.
+    :return: True on little-endian hosts.
+    """
+    return array("H", [1]).tobytes() == b"\x01\x00"
+
+
+def _byteswapped(values: array) -> bytes:
+    """
+    Get the little-endian bytes of an array on a big-endian host.
+    :param values: Array to convert.
+    :return: Little-endian bytes.
+    """
+    swapped = array(values.typecode, values)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+class BookSnapshot(Sequence[Book]):
+    """
+    Read-only, memory-mapped view of a binary snapshot.
+    Books are decoded only when accessed, by index or (in sorted snapshots) by
+    ID through a binary search over the record offsets, so opening even a very
+    large catalog costs only the mapping.
+    """
+
+    def __init__(self, file_path: str):
+        """
+        Map a snapshot file.
+        :param file_path: Path to the snapshot.
+        :raises SnapshotError: If the file is not a valid snapshot.
+        """
+        with open(file_path, "rb") as file:
+            try:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError("Snapshot file is empty.")
+        try:
+            self._read_header()
+        except Exception:
+            self._map.close()
+            raise
+
+    def _read_header(self) -> None:
+        """
+        Parse and validate the header.
+        :raises SnapshotError: If the header or the offset table is invalid.
+        """
+        if len(self._map) < HEADER.size:
+            raise SnapshotError("Snapshot header is truncated.")
+        magic, version, flags, count, table = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise SnapshotError("Not a book snapshot.")
+        if version not in (1, VERSION):
+            raise SnapshotError(f"Unsupported snapshot version {version}.")
+        if table + count * OFFSET.size != len(self._map):
+            raise SnapshotError("Snapshot is truncated.")
+        self.sorted = bool(flags & FLAG_SORTED)
+        self._count = count
+        self._table = table
+        self._record = RECORD if version == VERSION else RECORD_V1
+
+    def close(self) -> None:
+        """
+        Unmap the file. Books already decoded stay valid.
+        """
+        self._map.close()
+
+    def __enter__(self) -> "BookSnapshot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _offset(self, index: int) -> int:
+        """
+        Get the file offset of a record.
+        :param index: Record number.
+        :return: Offset of the record.
+        """
+        return OFFSET.unpack_from(self._map, self._table + index * OFFSET.size)[0]
+
+    def _id_at(self, index: int) -> int:
+        """
+        Read only the ID of a record.
+        :param index: Record number.
+        :return: Book ID.
+        """
+        return struct.unpack_from("<q", self._map, self._offset(index))[0]
+
+    def _decode(self, offset: int) -> Book:
+        """
+        Decode the record at an offset.
+        :param offset: Offset of the record.
+        :return: A Book instance.
+        :raises SnapshotError: If the record is malformed.
+        """
+        try:
+            fields = self._record.unpack_from(self._map, offset)
+            book_id, year, status, title_length, author_length = fields[:5]
+            loan_length = fields[5] if len(fields) > 5 else 0
+            start = offset + self._record.size
+            title = self._map[start:start + title_length].decode("utf-8")
+            start += title_length
+            author = self._map[start:start + author_length].decode("utf-8")
+            start += author_length
+            loan = None
+            if loan_length:
+                loan = _decode_loan(self._map[start:start + loan_length])
+            return Book(book_id, title, author, year, STATUSES[status].value, loan)
+        except (struct.error, UnicodeDecodeError, IndexError, ValueError) as e:
+            raise SnapshotError(f"Malformed record at offset {offset}: {e}")
+
+    @overload
+    def __getitem__(self, index: int) -> Book: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[Book]: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("Snapshot index out of range.")
+        return self._decode(self._offset(index))
+
+    def __iter__(self) -> Iterator[Book]:
+        for index in range(self._count):
+            yield self._decode(self._offset(index))
+
+    def get(self, book_id: int) -> Optional[Book]:
+        """
+        Find a book by ID.
+        Sorted snapshots use a binary search that decodes a single record;
+        others are scanned.
+        :param book_id: ID of the book.
+        :return: The book, or None if it is not in the snapshot.
+        """
+        if not self.sorted:
+            return next((book for book in self if book.id == book_id), None)
+        ids = _IdView(self)
+        index = bisect_left(ids, book_id)
+        if index < self._count and ids[index] == book_id:
+            return self[index]
+        return None
+
+
+class _IdView(Sequence[int]):
+    """
+    The IDs of a snapshot as a sequence, for bisect.
+    """
+
+    def __init__(self, snapshot: BookSnapshot):
+        self._snapshot = snapshot
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
+
+    def __getitem__(self, index: int) -> int:  # type: ignore[override]
+        return self._snapshot._id_at(index)
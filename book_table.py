@@ -0,0 +1,217 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, MutableMapping, Optional
+
+from book_models import Book, BookStatus, Loan
+
+STATUSES: List[BookStatus] = list(BookStatus)
+STATUS_CODES: Dict[BookStatus, int] = {status: code for code, status in enumerate(STATUSES)}
+DELETED = 255
+
+
+class StringPool:
+    """
+    Interned, reference-counted string storage; equal strings are stored once and
+    referenced by index. A string is dropped when its last reference is released,
+    and its index is reused for the next new string.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty pool.
+        """
+        self._strings: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._refs = array("L")
+        self._free: List[int] = []
+
+    def intern(self, value: str) -> int:
+        """
+        Take a reference to a string, storing it if it is not pooled yet.
+        :param value: String to store.
+        :return: Index of the string in the pool.
+        """
+        code = self._codes.get(value)
+        if code is None:
+            if self._free:
+                code = self._free.pop()
+                self._strings[code] = value
+            else:
+                code = len(self._strings)
+                self._strings.append(value)
+                self._refs.append(0)
+            self._codes[value] = code
+        self._refs[code] += 1
+        return code
+
+    def release(self, code: int) -> None:
+        """
+        Drop a reference taken by intern, freeing the string with its last reference.
+        :param code: Index of the string.
+        """
+        self._refs[code] -= 1
+        if not self._refs[code]:
+            del self._codes[self._strings[code]]
+            self._strings[code] = ""
+            self._free.append(code)
+
+    def __getitem__(self, code: int) -> str:
+        return self._strings[code]
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+
+class BookTable(MutableMapping[int, Book]):
+    """
+    Columnar, memory-compact mapping of book ID to Book.
+    IDs, years and status codes are kept in parallel typed arrays and titles and
+    authors in reference-counted string pools. Book objects are only created when
+    a row is read.
+    Rows are looked up by binary search while IDs are appended in ascending order
+    (as assigned by the ID sequence); a row dictionary is built only otherwise.
+    Deleted rows are marked and reclaimed once they outnumber the live ones.
+    The few loan records are kept in a dictionary by ID.
+    """
+
+    def __init__(self, books: Iterable[Book] = ()):
+        """
+        Initialize the table.
+        :param books: Books to store.
+        """
+        self._ids = array("q")
+        self._years = array("l")
+        self._statuses = array("B")
+        self._titles = array("L")
+        self._authors = array("L")
+        self._title_pool = StringPool()
+        self._author_pool = StringPool()
+        self._rows: Optional[Dict[int, int]] = None
+        self._loans: Dict[int, Loan] = {}
+        self._live = 0
+        for book in books:
+            self[book.id] = book
+
+    def _locate(self, book_id: int) -> Optional[int]:
+        """
+        Find the row holding an ID, including deleted rows.
+        :param book_id: ID of the book.
+        :return: Row number, or None if the ID was never stored.
+        """
+        if self._rows is not None:
+            return self._rows.get(book_id)
+        row = bisect_left(self._ids, book_id)
+        if row < len(self._ids) and self._ids[row] == book_id:
+            return row
+        return None
+
+    def _find_row(self, book_id: int) -> Optional[int]:
+        """
+        Find the row of a live book.
+        :param book_id: ID of the book.
+        :return: Row number, or None if the book does not exist.
+        """
+        row = self._locate(book_id)
+        if row is None or self._statuses[row] == DELETED:
+            return None
+        return row
+
+    def _view(self, row: int) -> Book:
+        """
+        Create a Book for a row.
+        :param row: Row number.
+        :return: A Book instance.
+        """
+        return Book(
+            self._ids[row],
+            self._title_pool[self._titles[row]],
+            self._author_pool[self._authors[row]],
+            self._years[row],
+            STATUSES[self._statuses[row]].value,
+            self._loans.get(self._ids[row]),
+        )
+
+    def _live_rows(self) -> Iterator[int]:
+        """
+        Iterate over the rows of live books.
+        :return: Iterator over row numbers.
+        """
+        statuses = self._statuses
+        return (row for row in range(len(statuses)) if statuses[row] != DELETED)
+
+    def __getitem__(self, book_id: int) -> Book:
+        row = self._find_row(book_id)
+        if row is None:
+            raise KeyError(book_id)
+        return self._view(row)
+
+    def __contains__(self, book_id: object) -> bool:
+        return isinstance(book_id, int) and self._find_row(book_id) is not None
+
+    def __setitem__(self, book_id: int, book: Book) -> None:
+        if book_id != book.id:
+            raise ValueError(f"Key {book_id} does not match book ID {book.id}.")
+        row = self._locate(book_id)
+        if row is None:
+            if self._rows is None and self._ids and book_id < self._ids[-1]:
+                self._rows = {self._ids[i]: i for i in range(len(self._ids))}
+            row = len(self._ids)
+            self._ids.append(book_id)
+            self._years.append(0)
+            self._statuses.append(DELETED)
+            self._titles.append(0)
+            self._authors.append(0)
+            if self._rows is not None:
+                self._rows[book_id] = row
+        title = self._title_pool.intern(book.title)
+        author = self._author_pool.intern(book.author)
+        if self._statuses[row] == DELETED:
+            self._live += 1
+        else:
+            self._title_pool.release(self._titles[row])
+            self._author_pool.release(self._authors[row])
+        self._years[row] = book.year
+        self._statuses[row] = STATUS_CODES[book.status]
+        self._titles[row] = title
+        self._authors[row] = author
+        if book.loan is not None:
+            self._loans[book_id] = book.loan
+        else:
+            self._loans.pop(book_id, None)
+
+    def __delitem__(self, book_id: int) -> None:
+        row = self._find_row(book_id)
+        if row is None:
+            raise KeyError(book_id)
+        self._statuses[row] = DELETED
+        self._title_pool.release(self._titles[row])
+        self._author_pool.release(self._authors[row])
+        self._loans.pop(book_id, None)
+        self._live -= 1
+        if len(self._ids) > 1024 and self._live < len(self._ids) // 2:
+            self._compact()
+
+    def __iter__(self) -> Iterator[int]:
+        ids = self._ids
+        return (ids[row] for row in self._live_rows())
+
+    def __len__(self) -> int:
+        return self._live
+
+    def values(self) -> Iterator[Book]:  # type: ignore[override]
+        """
+        Iterate over the books in row order without looking each ID up.
+        :return: Iterator over Book instances.
+        """
+        return (self._view(row) for row in self._live_rows())
+
+    def _compact(self) -> None:
+        """
+        Rewrite the columns without deleted rows.
+        """
+        rows = list(self._live_rows())
+        for name in ("_ids", "_years", "_statuses", "_titles", "_authors"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[row] for row in rows)))
+        if self._rows is not None:
+            self._rows = {self._ids[row]: row for row in range(len(self._ids))}
@@ -0,0 +1,281 @@
+from itertools import chain
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from book_models import Book
+
+# Each trie level consumes BITS bits of the book ID.
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+# A trie node: WIDTH slots holding child nodes, or books at the bottom level.
+Node = List[Any]
+
+
+def _lookup(root: Node, shift: int, book_id: int) -> Optional[Book]:
+    """
+    Find a book in a trie.
+    :param root: Root node.
+    :param shift: Bit shift of the root level (0 if the root holds books).
+    :param book_id: ID of the book.
+    :return: The book, or None if it is not stored.
+    """
+    if not isinstance(book_id, int) or book_id < 0 or book_id >> (shift + BITS):
+        return None
+    node = root
+    while shift:
+        node = node[(book_id >> shift) & MASK]
+        if node is None:
+            return None
+        shift -= BITS
+    return node[book_id & MASK]
+
+
+def _leaves(node: Node, shift: int) -> Iterator[Node]:
+    """
+    Iterate over the bottom-level nodes below a node in ID order.
+    :param node: Trie node.
+    :param shift: Bit shift of the node's level.
+    :return: Iterator over nodes holding books.
+    """
+    if not shift:
+        yield node
+        return
+    for child in node:
+        if child is not None:
+            yield from _leaves(child, shift - BITS)
+
+
+def _walk(root: Node, shift: int) -> Iterator[Book]:
+    """
+    Iterate over the books in a trie in ID order.
+    :param root: Root node.
+    :param shift: Bit shift of the root level.
+    :return: Iterator over books.
+    """
+    return chain.from_iterable(filter(None, leaf) for leaf in _leaves(root, shift))
+
+
+def _walk_from(node: Node, shift: int, book_id: int) -> Iterator[Book]:
+    """
+    Iterate over the books below a node with an ID of at least book_id in ID
+    order, without visiting the nodes before it.
+    :param node: Trie node.
+    :param shift: Bit shift of the node's level.
+    :param book_id: Smallest ID to include.
+    :return: Iterator over books.
+    """
+    index = (book_id >> shift) & MASK
+    if not shift:
+        yield from filter(None, node[index:])
+        return
+    child = node[index]
+    if child is not None:
+        yield from _walk_from(child, shift - BITS, book_id)
+    for child in node[index + 1:]:
+        if child is not None:
+            yield from _walk(child, shift - BITS)
+
+
+class BookVersion(Mapping[int, Book]):
+    """
+    Immutable version of the catalog: a mapping of book ID to Book in ID order.
+    The books are kept in a trie keyed by the bits of the ID, and a new version
+    shares every node it did not change with the version it was derived from.
+    Taking a version costs nothing and never blocks writers; a version is
+    reclaimed like any other object once nobody references it.
+    """
+
+    __slots__ = ("number", "_root", "_shift", "_count")
+
+    def __init__(self, number: int, root: Node, shift: int, count: int):
+        """
+        Initialize the version; the nodes must never be modified afterwards.
+        :param number: Sequence number of the version.
+        :param root: Root node of the trie.
+        :param shift: Bit shift of the root level.
+        :param count: Number of books.
+        """
+        self.number = number
+        self._root = root
+        self._shift = shift
+        self._count = count
+
+    def __getitem__(self, book_id: int) -> Book:
+        book = _lookup(self._root, self._shift, book_id)
+        if book is None:
+            raise KeyError(book_id)
+        return book
+
+    def get(self, book_id: int, default: Optional[Book] = None) -> Optional[Book]:
+        book = _lookup(self._root, self._shift, book_id)
+        return default if book is None else book
+
+    def __contains__(self, book_id: object) -> bool:
+        return _lookup(self._root, self._shift, book_id) is not None
+
+    def __iter__(self) -> Iterator[int]:
+        return (book.id for book in self.values())
+
+    def __len__(self) -> int:
+        return self._count
+
+    def values(self) -> Iterator[Book]:  # type: ignore[override]
+        """
+        Iterate over the books in ID order without looking each ID up.
+        :return: Iterator over Book instances.
+        """
+        return _walk(self._root, self._shift)
+
+    def values_from(self, book_id: int) -> Iterator[Book]:
+        """
+        Iterate over the books with an ID of at least book_id in ID order, e.g.
+        for a keyset page. Seeking to the first book costs one walk down the trie.
+        :param book_id: Smallest ID to include.
+        :return: Iterator over Book instances.
+        """
+        book_id = max(book_id, 0)
+        if book_id >> (self._shift + BITS):
+            return iter(())
+        return _walk_from(self._root, self._shift, book_id)
+
+    def __repr__(self) -> str:
+        return f"BookVersion(number={self.number}, books={self._count})"
+
+
+class VersionedBookMap(MutableMapping[int, Book]):
+    """
+    Mapping of book ID to Book that publishes immutable BookVersions (multi-version
+    concurrency control). Writers change a private working copy of the trie,
+    copying a node the first time it changes after a publish and updating it in
+    place from then on; publish() then makes the working copy the version
+    returned by snapshot(). Readers of a snapshot therefore see either all or
+    none of the changes made between two publishes. Lookups in the working copy
+    go through a plain dictionary of the current books rather than the trie.
+    The mapping itself must only be changed and read by one thread at a time
+    (e.g. under a write lock); snapshots can be read by any number of threads.
+    """
+
+    def __init__(self, books: Iterable[Book] = ()):
+        """
+        Initialize the mapping and publish its first version.
+        :param books: Books to store.
+        """
+        self._root: Node = [None] * WIDTH
+        self._shift = 0
+        self._books: Dict[int, Book] = {}
+        self._owned: Dict[int, Node] = {id(self._root): self._root}
+        self._published = BookVersion(0, self._root, 0, 0)
+        self.update((book.id, book) for book in books)
+        self.publish()
+
+    def snapshot(self) -> BookVersion:
+        """
+        Get the last published version.
+        :return: Immutable version of the catalog.
+        """
+        return self._published
+
+    def publish(self) -> BookVersion:
+        """
+        Make the changes since the last publish visible to new snapshots.
+        :return: The published version.
+        """
+        if self._owned:
+            self._published = BookVersion(
+                self._published.number + 1, self._root, self._shift, len(self._books)
+            )
+            self._owned = {}
+        return self._published
+
+    def _own(self, node: Optional[Node]) -> Node:
+        """
+        Get a node that may be changed in place: the node itself if it was created
+        since the last publish, otherwise a copy of it (or a new empty node).
+        :param node: Node to change, or None for a missing node.
+        :return: Node owned by the working copy.
+        """
+        if node is not None and id(node) in self._owned:
+            return node
+        node = list(node) if node is not None else [None] * WIDTH
+        self._owned[id(node)] = node
+        return node
+
+    def _store(self, book_id: int, book: Optional[Book]) -> None:
+        """
+        Store a book in the working copy, or remove a stored one.
+        :param book_id: ID of the book.
+        :param book: Book to store, or None to remove the ID.
+        """
+        if not isinstance(book_id, int) or book_id < 0:
+            raise KeyError(book_id)
+        while book_id >> (self._shift + BITS):
+            root = self._own(None)
+            root[0] = self._root
+            self._root = root
+            self._shift += BITS
+        node = self._root = self._own(self._root)
+        shift = self._shift
+        while shift:
+            index = (book_id >> shift) & MASK
+            node[index] = node = self._own(node[index])
+            shift -= BITS
+        node[book_id & MASK] = book
+        if book is None:
+            del self._books[book_id]
+        else:
+            self._books[book_id] = book
+
+    def __getitem__(self, book_id: int) -> Book:
+        return self._books[book_id]
+
+    def get(self, book_id: int, default: Optional[Book] = None) -> Optional[Book]:
+        return self._books.get(book_id, default)
+
+    def __contains__(self, book_id: object) -> bool:
+        return book_id in self._books
+
+    def __setitem__(self, book_id: int, book: Book) -> None:
+        if book_id != book.id:
+            raise ValueError(f"Key {book_id} does not match book ID {book.id}.")
+        self._store(book_id, book)
+
+    def __delitem__(self, book_id: int) -> None:
+        if book_id not in self._books:
+            raise KeyError(book_id)
+        self._store(book_id, None)
+
+    def __iter__(self) -> Iterator[int]:
+        return (book.id for book in self.values())
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    def values(self) -> Iterator[Book]:  # type: ignore[override]
+        """
+        Iterate over the books of the working copy in ID order.
+        :return: Iterator over Book instances.
+        """
+        return _walk(self._root, self._shift)
+
+    def update(  # type: ignore[override]
+        self, books: Union[Mapping[int, Book], Iterable[Tuple[int, Book]]] = ()
+    ) -> None:
+        """
+        Store several books; nodes shared by their IDs are copied only once.
+        :param books: Mapping or pairs of book ID and Book.
+        """
+        pairs = books.items() if isinstance(books, Mapping) else books
+        for book_id, book in pairs:
+            self[book_id] = book
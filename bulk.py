@@ -0,0 +1,130 @@
+import argparse
+from itertools import islice
+from typing import List, Optional
+
+from book_io import iter_records, write_records
+from book_service import BookService
+from change_feed import publish_to_existing_feed
+from exceptions import LibraryException
+from file_utils import CODECS, gc_paused, load_books, save_books
+from repository_factory import BACKENDS, create_repository
+from sharded_repository import DEFAULT_RANGE_SIZE, DEFAULT_SHARDS, PARTITIONS, split_catalog
+
+
+def import_books(
+    service: BookService, file_path: str, batch_size: int, skip_duplicates: bool
+) -> int:
+    """
+    Import books from a CSV or JSON-lines file in batches.
+    Each batch is validated and persisted with a single repository write.
+    :param service: BookService instance for managing books.
+    :param file_path: Path to the file to import.
+    :param batch_size: Number of records per batch.
+    :param skip_duplicates: Skip books that already exist instead of failing.
+    :return: Number of imported books.
+    """
+    records = iter_records(file_path)
+    imported = 0
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        imported += len(service.bulk_add(batch, skip_duplicates=skip_duplicates))
+        print(f"Imported {imported} books...")
+    return imported
+
+
+def export_books(service: BookService, file_path: str) -> int:
+    """
+    Export all books to a CSV or JSON-lines file.
+    Books are streamed from the repository, so the catalog is never copied into a list.
+    :param service: BookService instance for managing books.
+    :param file_path: Path to the file to write.
+    :return: Number of exported books.
+    """
+    return write_records(file_path, service.repository.iter_books())
+
+
+def convert_catalog(file_path: str, codec: str) -> int:
+    """
+    Rewrite a catalog file in another format.
+    Later saves keep the new format, since it is detected from the file.
+    :param file_path: Path to the catalog file.
+    :param codec: Name of the codec to write with.
+    :return: Number of converted books.
+    """
+    books = load_books(file_path)
+    save_books(file_path, books, codec=codec)
+    return len(books)
+
+
+def shard_catalog(file_path: str, partition: str, shards: int, range_size: int) -> int:
+    """
+    Split a catalog file into shards for the sharded backend.
+    The shard files are written next to the catalog, which is then replaced
+    by the manifest describing them.
+    :param file_path: Path to the catalog file.
+    :param partition: "hash" or "range".
+    :param shards: Number of shards for hash partitioning.
+    :param range_size: Number of IDs per shard for range partitioning.
+    :return: Number of shards written.
+    """
+    return split_catalog(file_path, load_books(file_path), partition, shards, range_size)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Entry point for bulk import and export of books.
+    """
+    parser = argparse.ArgumentParser(description="Bulk import and export of library books.")
+    parser.add_argument("--data", default="data.json", help="Path to the library data file.")
+    parser.add_argument("--backend", default="cached", choices=sorted(BACKENDS))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Import books from .csv or .jsonl.")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--batch-size", type=int, default=50000)
+    import_parser.add_argument("--skip-duplicates", action="store_true")
+
+    export_parser = commands.add_parser("export", help="Export books to .csv or .jsonl.")
+    export_parser.add_argument("file")
+
+    convert_parser = commands.add_parser("convert", help="Rewrite the data file in another format.")
+    convert_parser.add_argument("codec", choices=sorted(CODECS))
+
+    shard_parser = commands.add_parser("shard", help="Split the data file into shards.")
+    shard_parser.add_argument("--partition", default="hash", choices=PARTITIONS)
+    shard_parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    shard_parser.add_argument("--range-size", type=int, default=DEFAULT_RANGE_SIZE)
+
+    args = parser.parse_args(argv)
+    if args.command == "convert":
+        try:
+            with gc_paused():
+                count = convert_catalog(args.data, args.codec)
+        except (LibraryException, ValueError, OSError) as e:
+            parser.exit(1, f"Error: {e}\n")
+        print(f"Converted {count} books in {args.data} to {args.codec}.")
+        return
+    if args.command == "shard":
+        try:
+            with gc_paused():
+                count = shard_catalog(args.data, args.partition, args.shards, args.range_size)
+        except (LibraryException, ValueError, OSError) as e:
+            parser.exit(1, f"Error: {e}\n")
+        print(f"Split {args.data} into {count} {args.partition}-partitioned shards.")
+        return
+    service = BookService(publish_to_existing_feed(create_repository(args.backend, args.data)))
+    try:
+        if args.command == "import":
+            count = import_books(service, args.file, args.batch_size, args.skip_duplicates)
+            print(f"Imported {count} books from {args.file}.")
+        else:
+            count = export_books(service, args.file)
+            print(f"Exported {count} books to {args.file}.")
+    except (LibraryException, ValueError, KeyError, OSError) as e:
+        parser.exit(1, f"Error: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
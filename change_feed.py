@@ -0,0 +1,619 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from book_models import Book, Loan
+from book_repository import BookRepositoryInterface
+from exceptions import ChangesUnavailableError
+from file_utils import atomic_write
+from pagination import DEFAULT_PAGE_SIZE, BookPage
+
+# Every INDEX_INTERVAL-th record's file offset is kept in memory to seek to a sequence number.
+INDEX_INTERVAL = 1024
+# How often waiting readers look for records appended by other processes, in seconds.
+POLL_INTERVAL = 0.2
+
+
+class Change(NamedTuple):
+    """
+    One committed change to the catalog.
+    Records use the journal format plus the sequence number, and describe the
+    resulting state, so applying a change twice is harmless. The signature is
+    the pair of stored data signatures of the repository before and after the
+    write that made the change (see changes_cover).
+    """
+
+    sequence: int
+    op: str
+    book_id: int
+    book: Optional[Book] = None
+    status: Optional[str] = None
+    loan: Optional[Loan] = None
+    signature: Optional[Tuple[Any, Any]] = None
+
+    def to_record(self) -> Dict[str, Any]:
+        """
+        Convert the change to its JSON record.
+        :return: Record with "seq", "op" and the operation's fields.
+        """
+        record: Dict[str, Any] = {"seq": self.sequence, "op": self.op}
+        if self.op == "add":
+            record["book"] = self.book.to_dict()
+        else:
+            record["id"] = self.book_id
+        if self.op == "status":
+            record["status"] = self.status
+            if self.loan is not None:
+                record["loan"] = self.loan.to_dict()
+        if self.signature is not None:
+            record["sig"] = list(self.signature)
+        return record
+
+    @staticmethod
+    def from_record(record: Dict[str, Any]) -> "Change":
+        """
+        Create a change from its JSON record.
+        :param record: Record written by to_record.
+        :return: Change instance.
+        :raises ValueError: If the record has an unknown operation.
+        """
+        op = record.get("op")
+        signature = tuple(record["sig"]) if "sig" in record else None
+        if op == "add":
+            book = Book.from_dict(record["book"])
+            return Change(record["seq"], op, book.id, book, signature=signature)
+        if op == "delete":
+            return Change(record["seq"], op, record["id"], signature=signature)
+        if op == "status":
+            loan = Loan.from_dict(record["loan"]) if record.get("loan") else None
+            return Change(
+                record["seq"],
+                op,
+                record["id"],
+                status=record["status"],
+                loan=loan,
+                signature=signature,
+            )
+        raise ValueError(f"Unknown change operation: {op!r}")
+
+
+def stored_signature(signature: Any) -> Any:
+    """
+    Convert a data signature (see BookRepositoryInterface.data_signature) to the
+    JSON value it is stored as, so that stored and current signatures compare equal.
+    :param signature: Signature of a repository.
+    :return: Signature with tuples turned into lists.
+    """
+    return json.loads(json.dumps(signature))
+
+
+def changes_cover(changes: Iterable[Change], start: Any, end: Any) -> bool:
+    """
+    Check that changes account for every write to a repository between two
+    stored data signatures: the first write started at start, every write
+    started where the previous one ended, and the last one ended at end.
+    A write that bypassed the publishing proxy breaks the chain.
+    :param changes: Changes in sequence order.
+    :param start: Stored signature before the first change.
+    :param end: Stored signature after the last change.
+    :return: True if the chain is unbroken, False if it is broken or a signature is unknown.
+    """
+    if start is None or end is None:
+        return False
+    expected, previous = start, None
+    for change in changes:
+        if change.signature is None:
+            return False
+        if change.signature == previous:
+            continue
+        before, after = change.signature
+        if before != expected:
+            return False
+        expected, previous = after, change.signature
+    return expected == end
+
+
+def encode_record(record: Dict[str, Any]) -> bytes:
+    """
+    Encode a record as one line of JSON.
+    :param record: Record to encode.
+    :return: UTF-8 encoded line including the newline.
+    """
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class ChangeFeed:
+    """
+    Append-only log of catalog changes with monotonic sequence numbers,
+    stored as JSON lines (by default "<data file>.changes").
+    Consumers read the changes after the last sequence number they processed,
+    and can wait for new ones. Appends must be serialized across processes,
+    which PublishingBookRepository does by publishing inside the repository's
+    transaction. Readers in other processes pick up appends by polling the file.
+    """
+
+    def __init__(self, file_path: str, fsync: bool = True):
+        """
+        Open a feed, which is created with the first change.
+        A torn record at the end of the file (left by a crash mid-write) is ignored
+        and overwritten by the next append.
+        :param file_path: Path to the feed file.
+        :param fsync: Whether to fsync the feed after every append.
+        """
+        self.file_path = file_path
+        self.fsync = fsync
+        self._condition = threading.Condition()
+        self._reset(None)
+        with self._condition:
+            self._scan()
+
+    def _reset(self, inode: Optional[int]) -> None:
+        """
+        Forget what was read of the file, to read it again from the start.
+        :param inode: Inode of the file to read.
+        """
+        self._inode = inode
+        self._size = 0
+        self._first = 1
+        self._last = 0
+        self._offsets: List[Tuple[int, int]] = []
+
+    def _scan(self) -> None:
+        """
+        Read the records appended since the last scan. Must be called with the lock held.
+        A replaced (pruned) file is read again from the start.
+        """
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            if self._inode is not None:
+                self._reset(None)
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._size:
+            last = self._last
+            self._reset(stat.st_ino)
+            self._first = self._last = last
+        if stat.st_size == self._size:
+            return
+        with open(self.file_path, "rb") as file:
+            file.seek(self._size)
+            offset = self._size
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                sequence = json.loads(line)["seq"]
+                if offset == 0:
+                    self._first = sequence
+                if (sequence - self._first) % INDEX_INTERVAL == 0:
+                    self._offsets.append((sequence, offset))
+                self._last = sequence
+                offset += len(line)
+        self._size = offset
+
+    @property
+    def first_sequence(self) -> int:
+        """
+        Sequence number of the oldest change still in the feed.
+        :return: Sequence number (last_sequence + 1 if the feed is empty).
+        """
+        with self._condition:
+            self._scan()
+            return self._first if self._size else self._last + 1
+
+    @property
+    def last_sequence(self) -> int:
+        """
+        Sequence number of the newest change.
+        :return: Sequence number (0 if nothing was ever published).
+        """
+        with self._condition:
+            self._scan()
+            return self._last
+
+    def publish(self, changes: Iterable[Change]) -> List[Change]:
+        """
+        Append changes to the feed with one write, numbering them consecutively.
+        :param changes: Changes to append; their sequence numbers are ignored.
+        :return: The changes with their assigned sequence numbers.
+        :raises IOError: If there is an issue with writing to the feed.
+        """
+        with self._condition:
+            self._scan()
+            numbered = [
+                change._replace(sequence=self._last + position)
+                for position, change in enumerate(changes, start=1)
+            ]
+            if not numbered:
+                return numbered
+            data = b"".join(encode_record(change.to_record()) for change in numbered)
+            try:
+                with open(self.file_path, "ab") as file:
+                    if file.tell() > self._size:
+                        file.truncate(self._size)
+                    file.write(data)
+                    if self.fsync:
+                        file.flush()
+                        os.fsync(file.fileno())
+            except Exception as e:
+                raise IOError(f"Unexpected error while writing the change feed: {e}")
+            self._scan()
+            self._condition.notify_all()
+        return numbered
+
+    def _open_at(self, sequence: int) -> Tuple[IO[bytes], int, int]:
+        """
+        Open the feed positioned at or before a record. Must be called with the lock held.
+        :param sequence: Sequence number of the record.
+        :return: Tuple of (file, offset it is positioned at, size of the complete records).
+        """
+        position = bisect_right(self._offsets, (sequence, self._size)) - 1
+        offset = self._offsets[position][1] if position >= 0 else 0
+        file = open(self.file_path, "rb")
+        file.seek(offset)
+        return file, offset, self._size
+
+    def read(self, since: int = 0, limit: Optional[int] = None) -> List[Change]:
+        """
+        Read the changes after a sequence number.
+        :param since: Last sequence number already processed (0 to read from the start).
+        :param limit: Maximum number of changes (optional).
+        :return: Changes in sequence order.
+        :raises ChangesUnavailableError: If changes after since were pruned.
+        """
+        with self._condition:
+            self._scan()
+            if since >= self._last:
+                return []
+            if since < self._first - 1:
+                raise ChangesUnavailableError(since, self._first)
+            file, offset, end = self._open_at(since + 1)
+        changes: List[Change] = []
+        with file:
+            while offset < end and (limit is None or len(changes) < limit):
+                line = file.readline()
+                offset += len(line)
+                record = json.loads(line)
+                if record["seq"] > since:
+                    changes.append(Change.from_record(record))
+        return changes
+
+    def wait(self, since: int, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until there are changes after a sequence number.
+        :param since: Last sequence number already processed.
+        :param timeout: Maximum number of seconds to wait (None waits indefinitely).
+        :return: True if there are new changes, False if the timeout expired.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                self._scan()
+                if self._last > since:
+                    return True
+                wait = POLL_INTERVAL
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+                self._condition.wait(wait)
+
+    def follow(self, since: int = 0, batch_size: int = 1000) -> Iterator[Change]:
+        """
+        Iterate over the changes after a sequence number, waiting for new ones forever.
+        :param since: Last sequence number already processed.
+        :param batch_size: Maximum number of changes read at once.
+        :return: Endless iterator over changes in sequence order.
+        :raises ChangesUnavailableError: If changes after since were pruned.
+        """
+        while True:
+            changes = self.read(since, batch_size)
+            if not changes:
+                self.wait(since)
+                continue
+            yield from changes
+            since = changes[-1].sequence
+
+    def prune(self, before: int) -> int:
+        """
+        Drop the changes older than a sequence number, e.g. once every consumer
+        has processed them. The newest change is always kept, so the numbering
+        continues after a restart. Must run in the process that publishes.
+        :param before: Sequence number of the oldest change to keep.
+        :return: Number of dropped changes.
+        """
+        with self._condition:
+            self._scan()
+            keep = min(before, self._last)
+            if not self._size or keep <= self._first:
+                return 0
+            file, offset, end = self._open_at(keep)
+            with file:
+                for line in file:
+                    if json.loads(line)["seq"] >= keep:
+                        break
+                    offset += len(line)
+                file.seek(offset)
+                with atomic_write(self.file_path, binary=True) as target:
+                    target.write(file.read(end - offset))
+            dropped = keep - self._first
+            self._scan()
+            return dropped
+
+
+def default_feed_path(repository: BookRepositoryInterface) -> Optional[str]:
+    """
+    Get the default feed path of a repository, "<data file>.changes".
+    :param repository: Repository with a data file or database.
+    :return: Path to the feed file, or None if the repository has no data file.
+    """
+    data_path = getattr(repository, "file_path", None) or getattr(repository, "db_path", None)
+    return f"{data_path}.changes" if data_path is not None else None
+
+
+def publish_to_existing_feed(repository: BookRepositoryInterface) -> BookRepositoryInterface:
+    """
+    Wrap a repository in a PublishingBookRepository if its default feed file exists,
+    so that writers other than the feed's owner (the CLIs) keep the feed complete.
+    :param repository: Repository about to be written to.
+    :return: The publishing proxy, or the repository itself if it has no feed.
+    """
+    path = default_feed_path(repository)
+    if path is None or not os.path.exists(path):
+        return repository
+    return PublishingBookRepository(repository, ChangeFeed(path))
+
+
+class PublishingBookRepository(BookRepositoryInterface):
+    """
+    Proxy that publishes every add, delete and status change made through it
+    to a ChangeFeed.
+    Each write and its publication happen under one lock and inside the
+    wrapped repository's transaction, so the feed lists changes in commit
+    order. A crash between a write and its publication loses the change from
+    the feed, and writes that bypass the proxy are not published (see
+    publish_to_existing_feed). Each change carries the repository's data
+    signatures from before and after its write, so consumers can tell such gaps
+    (see changes_cover). Batch status updates publish only the books they change.
+    Attributes outside the repository interface (close, compact, ...) are
+    passed through unchanged.
+    """
+
+    def __init__(self, repository: BookRepositoryInterface, feed: Optional[ChangeFeed] = None):
+        """
+        Wrap a repository.
+        :param repository: Repository to publish the changes of.
+        :param feed: Feed to publish to (defaults to "<data file>.changes" next to
+            the repository's data file or database).
+        :raises ValueError: If no feed is given and the repository has no data file.
+        """
+        self.repository = repository
+        if feed is None:
+            path = default_feed_path(repository)
+            if path is None:
+                raise ValueError("A change feed is required for a repository without a data file.")
+            feed = ChangeFeed(path)
+        self.feed = feed
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name: str) -> Any:
+        """
+        Pass attributes outside the interface through to the wrapped repository.
+        """
+        return getattr(self.repository, name)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Hold the publishing lock and the wrapped repository's transaction.
+        :return: Context manager.
+        """
+        with self._lock, self.repository.transaction():
+            yield
+
+    def data_signature(self) -> Any:
+        return self.repository.data_signature()
+
+    def snapshot(self) -> Tuple[int, List[Book]]:
+        """
+        Get all books together with the sequence number they reflect, to start
+        a consumer that then reads the changes after that number.
+        :return: Tuple of (last sequence number, books ordered as the repository returns them).
+        """
+        with self.transaction():
+            return self.feed.last_sequence, self.repository.get_all_books()
+
+    def get_all_books(self) -> List[Book]:
+        return self.repository.get_all_books()
+
+    def search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> List[Book]:
+        return self.repository.search_books(title, author, year)
+
+    def get_book(self, book_id: int) -> Optional[Book]:
+        return self.repository.get_book(book_id)
+
+    def get_books(self, book_ids: Iterable[int]) -> Dict[int, Book]:
+        return self.repository.get_books(book_ids)
+
+    def count_books(self) -> int:
+        return self.repository.count_books()
+
+    def iter_books(self) -> Iterator[Book]:
+        return self.repository.iter_books()
+
+    def iter_search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> Iterator[Book]:
+        return self.repository.iter_search_books(title, author, year)
+
+    def page_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+        order_by: str = "id",
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[Sequence] = None,
+    ) -> BookPage:
+        return self.repository.page_books(title, author, year, order_by, limit, offset, after)
+
+    def count_by_status(self) -> Dict[str, int]:
+        return self.repository.count_by_status()
+
+    def count_by_author(self) -> Dict[str, int]:
+        return self.repository.count_by_author()
+
+    def count_by_decade(self) -> Dict[int, int]:
+        return self.repository.count_by_decade()
+
+    def rebuild_aggregates(self) -> None:
+        self.repository.rebuild_aggregates()
+
+    def verify_aggregates(self) -> List[str]:
+        return self.repository.verify_aggregates()
+
+    def iter_books_by_status(self, status: str) -> Iterator[Book]:
+        return self.repository.iter_books_by_status(status)
+
+    def iter_books_by_year_range(
+        self, start_year: Optional[int] = None, end_year: Optional[int] = None
+    ) -> Iterator[Book]:
+        return self.repository.iter_books_by_year_range(start_year, end_year)
+
+    def iter_books_due(
+        self,
+        after: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Book]:
+        return self.repository.iter_books_due(after, until, limit)
+
+    def autocomplete(
+        self, prefix: str, field: Optional[str] = None, limit: int = 10
+    ) -> List[Book]:
+        return self.repository.autocomplete(prefix, field, limit)
+
+    def next_book_id(self) -> int:
+        return self.repository.next_book_id()
+
+    def find_book_by_key(self, title: str, author: str, year: int) -> Optional[Book]:
+        return self.repository.find_book_by_key(title, author, year)
+
+    def find_books_by_keys(
+        self, keys: Iterable[Tuple[str, str, int]]
+    ) -> Dict[Tuple[str, str, int], Book]:
+        return self.repository.find_books_by_keys(keys)
+
+    def _publish(self, changes: Iterable[Change], before: Any) -> None:
+        """
+        Publish the changes of a write, together with the data signatures of the
+        repository before and after it. Must be called inside the transaction.
+        :param changes: Changes made by the write.
+        :param before: Data signature taken before the write.
+        """
+        signature = (stored_signature(before), stored_signature(self.data_signature()))
+        self.feed.publish(change._replace(signature=signature) for change in changes)
+
+    def add_book(self, book: Book) -> None:
+        with self.transaction():
+            before = self.data_signature()
+            self.repository.add_book(book)
+            self._publish([Change(0, "add", book.id, book)], before)
+
+    def delete_book(self, book_id: int) -> bool:
+        with self.transaction():
+            before = self.data_signature()
+            deleted = self.repository.delete_book(book_id)
+            if deleted:
+                self._publish([Change(0, "delete", book_id)], before)
+            return deleted
+
+    def update_book_status(
+        self, book_id: int, new_status: str, loan: Optional[Loan] = None
+    ) -> bool:
+        with self.transaction():
+            before = self.data_signature()
+            updated = self.repository.update_book_status(book_id, new_status, loan)
+            if updated:
+                self._publish(
+                    [Change(0, "status", book_id, status=new_status.lower(), loan=loan)], before
+                )
+            return updated
+
+    def add_books(self, books: List[Book]) -> None:
+        with self.transaction():
+            before = self.data_signature()
+            self.repository.add_books(books)
+            self._publish((Change(0, "add", book.id, book) for book in books), before)
+
+    def update_books_status(self, updates: Mapping[int, str]) -> int:
+        with self.transaction():
+            before = self.data_signature()
+            existing = self.repository.get_books(updates)
+            updated = self.repository.update_books_status(updates)
+            # Batch updates also drop loan records, so a book whose status stays
+            # the same has still changed if it had a loan.
+            changed = [
+                Change(0, "status", book_id, status=new_status.lower())
+                for book_id, new_status in updates.items()
+                if book_id in existing
+                and (
+                    existing[book_id].status.value != new_status.lower()
+                    or existing[book_id].loan is not None
+                )
+            ]
+            self._publish(changed, before)
+            return updated
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Print the changes of a feed as JSON lines, e.g. to pipe them into a consumer.
+    """
+    parser = argparse.ArgumentParser(description="Print the changes of a catalog change feed.")
+    parser.add_argument("feed", help="Path to the feed file (e.g. data.json.changes).")
+    parser.add_argument("--since", type=int, default=0, help="Last sequence number already seen.")
+    parser.add_argument("--follow", action="store_true", help="Keep waiting for new changes.")
+    args = parser.parse_args(argv)
+
+    feed = ChangeFeed(args.feed)
+    try:
+        for change in feed.follow(args.since) if args.follow else feed.read(args.since):
+            sys.stdout.buffer.write(encode_record(change.to_record()))
+            sys.stdout.buffer.flush()
+    except ChangesUnavailableError as e:
+        parser.exit(1, f"Error: {e}\n")
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -105,3 +105,121 @@ class BookAlreadyCheckedOutError(LibraryException):
         :param book_id: ID of the book.
         """
         super().__init__(f"Book with ID {book_id} is already checked out.")
+
+
+class CatalogCorruptedError(LibraryException):
+    """
+    Raised when the catalog file exists but cannot be decoded.
+    """
+
+    def __init__(self, file_path: str, reason: str):
+        """
+        Initialize the exception for an unreadable catalog.
+        :param file_path: Path to the catalog file.
+        :param reason: Description of the decoding error.
+        """
+        super().__init__(
+            f"The catalog file '{file_path}' is corrupted ({reason}). "
+            "Restore it from a backup; it will not be overwritten."
+        )
+
+
+class ReadOnlyReplicaError(LibraryException):
+    """
+    Raised when a write is sent to a read-only replica.
+    """
+
+    def __init__(self):
+        """
+        Initialize the exception for a write to a replica.
+        """
+        super().__init__("This catalog is a read-only replica. Send writes to the primary.")
+
+
+class ReadOnlySnapshotError(LibraryException):
+    """
+    Raised when a write is sent to a read-only snapshot of the catalog.
+    """
+
+    def __init__(self):
+        """
+        Initialize the exception for a write to a snapshot.
+        """
+        super().__init__("This catalog snapshot is read-only. Send writes to the repository.")
+
+
+class ReplicaOutOfSyncError(LibraryException):
+    """
+    Raised when a replica receives a change it cannot apply in order.
+    """
+
+    def __init__(self, expected: int, received: int):
+        """
+        Initialize the exception for a gap in the change feed.
+        :param expected: Sequence number the replica needs next.
+        :param received: Sequence number it received.
+        """
+        super().__init__(
+            f"Replica expected change {expected} but received {received}; "
+            "it must be reloaded from a snapshot."
+        )
+
+
+class ChangesUnavailableError(LibraryException):
+    """
+    Raised when a consumer asks for changes that were pruned from the change feed.
+    """
+
+    def __init__(self, since: int, first: int):
+        """
+        Initialize the exception for pruned changes.
+        :param since: Last sequence number the consumer processed.
+        :param first: Oldest sequence number still in the feed.
+        """
+        super().__init__(
+            f"Changes after {since} are no longer in the feed, which starts at {first}. "
+            "Reload the catalog and continue from its sequence number."
+        )
+
+
+class LoansNotSupportedError(LibraryException):
+    """
+    Raised when a loan is stored in a catalog format without room for loan records.
+    """
+
+    def __init__(self, storage: str):
+        """
+        Initialize the exception for an unsupported loan.
+        :param storage: Name of the storage format.
+        """
+        super().__init__(
+            f"The {storage} format cannot store loan records; "
+            "convert the catalog to another format to track loans."
+        )
+
+
+class BackupNotFoundError(LibraryException):
+    """
+    Raised when a requested backup does not exist.
+    """
+
+    def __init__(self, details: str):
+        """
+        Initialize the exception for a missing backup.
+        :param details: Name of the backup or the time it was requested for.
+        """
+        super().__init__(f"Backup not found: {details}")
+
+
+class BackupCorruptedError(LibraryException):
+    """
+    Raised when a backup chunk or manifest is missing or fails its checksum.
+    """
+
+    def __init__(self, location: str, reason: str):
+        """
+        Initialize the exception for a damaged backup.
+        :param location: Path of the damaged file.
+        :param reason: Description of the damage.
+        """
+        super().__init__(f"Backup file {location} is damaged: {reason}")
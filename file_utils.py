@@ -1,40 +1,679 @@
+import gc
+import io
 import json
-from typing import List
+import os
+import shutil
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import IO, Any, BinaryIO, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
 
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+from book_mmap import MAGIC as MAPPED_MAGIC
+from book_mmap import MappedCatalog, write_books
 from book_models import Book
+from book_snapshot import MAGIC, BookSnapshot, SnapshotError, write_snapshot
+from exceptions import CatalogCorruptedError
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\r\n"
+DELIMITERS = WHITESPACE + ",]"
+
+# Codec used for new files; existing files keep the format they were written in.
+DEFAULT_CODEC = "json"
+# First byte of a msgpack array (fixarray, array 16 or array 32).
+MSGPACK_ARRAY_MARKERS = frozenset(range(0x90, 0xA0)) | {0xDC, 0xDD}
+
+# Callbacks notified after every catalog read or write, as
+# observer(direction, byte_count, object_count, phase_seconds); see instrumentation.py.
+IO_OBSERVERS: List[Callable[[str, int, int, Dict[str, float]], None]] = []
+
+
+def _notify_io(direction: str, byte_count: int, objects: int, phases: Dict[str, float]) -> None:
+    """
+    Report a catalog read or write to the registered observers.
+    :param direction: "read" or "write".
+    :param byte_count: Size of the file read or written.
+    :param objects: Number of books decoded or encoded.
+    :param phases: Seconds spent per phase (e.g. "parse" and "construct").
+    """
+    for observer in IO_OBSERVERS:
+        observer(direction, byte_count, objects, phases)
+
+
+def iter_json_array(file: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Incrementally decode the elements of a top-level JSON array.
+    Only one chunk and the element being decoded are held in memory.
+    :param file: Text file positioned at the start of the array.
+    :param chunk_size: Number of characters to read at a time.
+    :return: Iterator over the decoded elements.
+    :raises json.JSONDecodeError: If the content is not a valid JSON array or
+        anything but whitespace follows it.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    state = "start"
+    while True:
+        while pos < len(buffer) and buffer[pos] in WHITESPACE:
+            pos += 1
+        if pos == len(buffer):
+            buffer = file.read(chunk_size)
+            pos = 0
+            if not buffer:
+                raise json.JSONDecodeError("Expecting value", buffer, pos)
+            continue
+
+        if state == "start":
+            if buffer[pos] != "[":
+                raise json.JSONDecodeError("Expecting '['", buffer, pos)
+            pos += 1
+            state = "first"
+        elif state == "separator":
+            if buffer[pos] == "]":
+                break
+            if buffer[pos] != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+            pos += 1
+            state = "value"
+        elif state == "first" and buffer[pos] == "]":
+            break
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            # A number cut off at the chunk boundary still decodes, so only accept
+            # a value once the character after it is visible.
+            if end is None or (not eof and (end == len(buffer) or buffer[end] not in DELIMITERS)):
+                chunk = file.read(chunk_size)
+                if chunk:
+                    buffer = buffer[pos:] + chunk
+                    pos = 0
+                else:
+                    eof = True
+                continue
+            yield value
+            pos = end
+            state = "separator"
+
+    # Like json.load, reject anything but whitespace after the closing bracket.
+    pos += 1
+    while True:
+        while pos < len(buffer) and buffer[pos] in WHITESPACE:
+            pos += 1
+        if pos < len(buffer):
+            raise json.JSONDecodeError("Extra data", buffer, pos)
+        buffer = file.read(chunk_size)
+        pos = 0
+        if not buffer:
+            return
+
+
+class CodecError(ValueError):
+    """
+    Raised by a codec when a catalog file cannot be decoded.
+    """
+
+
+class BookCodec(ABC):
+    """
+    A file format for the catalog.
+    Every codec implements records(); codecs that build books directly also
+    override books().
+    """
+
+    name = ""
+    # Format family reported by detect_format() for files written by this codec.
+    format = ""
+
+    @abstractmethod
+    def dump(self, books: List[Book], file: BinaryIO) -> None:
+        """
+        Write books to a file.
+        :param books: Books to write.
+        :param file: Binary file opened for writing.
+        """
+        pass
+
+    @abstractmethod
+    def records(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Decode the book dictionaries of a file.
+        :param file_path: Path to the file.
+        :return: Iterator over dictionaries as produced by Book.to_dict.
+        """
+        pass
+
+    def books(self, file_path: str) -> Iterator[Book]:
+        """
+        Decode the books of a file.
+        :param file_path: Path to the file.
+        :return: Iterator over Book instances.
+        """
+        return (Book.from_dict(data) for data in self.records(file_path))
+
+
+class JsonCodec(BookCodec):
+    """
+    JSON array written with the standard library and read incrementally.
+    """
+
+    format = "json"
+
+    def __init__(self, name: str, indent: Optional[int]):
+        """
+        Initialize the codec.
+        :param name: Codec name.
+        :param indent: Indentation for pretty output, or None for compact output.
+        """
+        self.name = name
+        self.indent = indent
+
+    def dump(self, books: List[Book], file: BinaryIO) -> None:
+        """
+        Write the books as a JSON array.
+        """
+        text = io.TextIOWrapper(file, encoding="utf-8")
+        json.dump(
+            [book.to_dict() for book in books],
+            text,
+            indent=self.indent,
+            separators=None if self.indent is not None else (",", ":"),
+            ensure_ascii=False,
+        )
+        text.flush()
+        text.detach()
+
+    def records(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the dictionaries of the JSON array.
+        """
+        with open(file_path, "r", encoding="utf-8") as file:
+            yield from iter_json_array(file)
+
+
+class OrjsonCodec(BookCodec):
+    """
+    Compact JSON encoded and decoded in one pass by orjson.
+    Faster than JsonCodec, but the whole file is held in memory while decoding.
+    """
+
+    name = "orjson"
+    format = "json"
+
+    def dump(self, books: List[Book], file: BinaryIO) -> None:
+        """
+        Write the books as compact JSON.
+        """
+        file.write(orjson.dumps([book.to_dict() for book in books]))
+
+    def records(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Decode the whole JSON array at once.
+        """
+        with open(file_path, "rb") as file:
+            return iter(orjson.loads(file.read()))
+
+
+class MsgpackCodec(BookCodec):
+    """
+    msgpack array of book maps.
+    """
+
+    name = "msgpack"
+    format = "msgpack"
+
+    def dump(self, books: List[Book], file: BinaryIO) -> None:
+        """
+        Write the books as a msgpack array of maps.
+        """
+        file.write(msgpack.packb([book.to_dict() for book in books], use_bin_type=True))
+
+    def records(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Decode the whole msgpack array at once.
+        """
+        with open(file_path, "rb") as file:
+            data = file.read()
+        try:
+            return iter(msgpack.unpackb(data, raw=False))
+        except Exception as e:
+            raise CodecError(str(e))
+
+
+class BinaryCodec(BookCodec):
+    """
+    Length-prefixed binary snapshot (see book_snapshot), read through mmap.
+    """
+
+    name = "binary"
+    format = "binary"
+
+    def dump(self, books: List[Book], file: BinaryIO) -> None:
+        """
+        Write the books as a binary snapshot.
+        """
+        write_snapshot(books, file)
+
+    def records(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Decode the snapshot records in file order as dictionaries.
+        """
+        return (book.to_dict() for book in self.books(file_path))
+
+    def books(self, file_path: str) -> Iterator[Book]:
+        """
+        Decode the snapshot records in file order.
+        """
+        with BookSnapshot(file_path) as snapshot:
+            yield from snapshot
+
+
+class MappedCodec(BookCodec):
+    """
+    Fixed-layout table with a string heap (see book_mmap), as used by MmapBookRepository.
+    """
+
+    name = "mapped"
+    format = "mapped"
+
+    def dump(self, books: List[Book], file: BinaryIO) -> None:
+        """
+        Write the books as a mapped catalog, sorted by ID.
+        """
+        write_books(books, file)
+
+    def records(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Decode the live records in ID order as dictionaries.
+        """
+        return (book.to_dict() for book in self.books(file_path))
+
+    def books(self, file_path: str) -> Iterator[Book]:
+        """
+        Decode the live records in ID order.
+        """
+        with MappedCatalog(file_path) as catalog:
+            yield from catalog.books()
+
+
+CODECS: Dict[str, BookCodec] = {}
+
+
+def register_codec(codec: BookCodec) -> None:
+    """
+    Make a codec available to save_books.
+    :param codec: Codec instance; replaces a registered codec with the same name.
+    """
+    CODECS[codec.name] = codec
+
+
+register_codec(JsonCodec("json", indent=4))
+register_codec(JsonCodec("json-compact", indent=None))
+register_codec(BinaryCodec())
+register_codec(MappedCodec())
+if orjson is not None:
+    register_codec(OrjsonCodec())
+if msgpack is not None:
+    register_codec(MsgpackCodec())
+
+
+def get_codec(name: str) -> BookCodec:
+    """
+    Get a registered codec.
+    :param name: Codec name.
+    :return: The codec.
+    :raises ValueError: If no codec has this name (optional codecs need their package).
+    """
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown codec '{name}'. Available codecs are: {', '.join(CODECS)}.")
+
+
+def detect_format(file_path: str) -> str:
+    """
+    Detect the format family of a catalog file from its first bytes.
+    :param file_path: Path to the file.
+    :return: "binary", "mapped", "msgpack" or "json" (also for missing and blank files).
+    """
+    try:
+        with open(file_path, "rb") as file:
+            head = file.read(len(MAGIC))
+    except FileNotFoundError:
+        return "json"
+    if head == MAGIC:
+        return "binary"
+    if head == MAPPED_MAGIC:
+        return "mapped"
+    if head and head[0] in MSGPACK_ARRAY_MARKERS:
+        return "msgpack"
+    return "json"
+
+
+def _reading_codec(file_path: str, streaming: bool) -> BookCodec:
+    """
+    Choose the codec to decode a file with.
+    JSON is read by orjson when it is installed, unless the caller wants to
+    stream, since orjson decodes the whole file at once.
+    :param file_path: Path to the file.
+    :param streaming: Prefer a codec that keeps memory flat.
+    :return: The codec.
+    :raises CodecError: If the codec for the file's format is not installed.
+    """
+    family = detect_format(file_path)
+    if family == "json":
+        return CODECS["json"] if streaming or "orjson" not in CODECS else CODECS["orjson"]
+    for codec in CODECS.values():
+        if codec.format == family:
+            return codec
+    raise CodecError(f"The '{family}' format needs an optional package that is not installed.")
+
+
+def _writing_codec(file_path: str) -> BookCodec:
+    """
+    Choose the codec to rewrite a file with: the one matching its current format.
+    :param file_path: Path to the file.
+    :return: The codec; DEFAULT_CODEC for new and blank files.
+    """
+    family = detect_format(file_path)
+    if family == "json":
+        try:
+            with open(file_path, "rb") as file:
+                compact = file.read(2) == b"[{"
+        except FileNotFoundError:
+            compact = False
+        if compact:
+            return CODECS.get("orjson") or CODECS["json-compact"]
+        return get_codec(DEFAULT_CODEC)
+    return _reading_codec(file_path, streaming=False)
+
+
+def _read_books(file_path: str, streaming: bool = True) -> Iterator[Book]:
+    """
+    Decode books from a catalog file in any format, without any error handling.
+    :param file_path: Path to the file.
+    :param streaming: Prefer a codec that keeps memory flat.
+    :return: Iterator over Book instances.
+    """
+    codec = _reading_codec(file_path, streaming)
+    if not IO_OBSERVERS:
+        yield from codec.books(file_path)
+        return
+
+    # Time spent by the consumer between books is not counted.
+    by_records = type(codec).books is BookCodec.books
+    items = codec.records(file_path) if by_records else codec.books(file_path)
+    parse = construct = 0.0
+    count = 0
+    mark = time.perf_counter()
+    try:
+        for item in items:
+            now = time.perf_counter()
+            parse += now - mark
+            book = Book.from_dict(item) if by_records else item
+            mark = time.perf_counter()
+            construct += mark - now
+            count += 1
+            yield book
+            mark = time.perf_counter()
+        parse += time.perf_counter() - mark
+    finally:
+        phases = {"parse": parse, "construct": construct} if by_records else {"decode": parse}
+        _notify_io("read", os.path.getsize(file_path), count, phases)
+
+
+def _is_blank(file_path: str) -> bool:
+    """
+    Check whether a file contains nothing but whitespace.
+    :param file_path: Path to the file.
+    :return: True if the file is empty or whitespace only.
+    """
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            if chunk.strip(WHITESPACE.encode()):
+                return False
+    return True
+
+
+def iter_books(file_path: str) -> Iterator[Book]:
+    """
+    Stream books from a catalog file one at a time.
+    Errors are handled like in load_books, but books decoded before an error
+    have already been yielded.
+    :param file_path: Path to the catalog file.
+    :return: Iterator over Book instances.
+    :raises CatalogCorruptedError: If the file cannot be decoded.
+    :raises IOError: If there is an issue with reading the file.
+    """
+    try:
+        yield from _read_books(file_path)
+    except FileNotFoundError:
+        return
+    except (json.JSONDecodeError, SnapshotError, CodecError) as e:
+        if not _is_blank(file_path):
+            raise CatalogCorruptedError(file_path, str(e))
+    except Exception as e:
+        raise IOError(f"Unexpected error while loading books: {e}")
+
+
+@contextmanager
+def gc_paused() -> Iterator[None]:
+    """
+    Pause the cyclic garbage collector.
+    Decoding a catalog allocates millions of acyclic objects, and every
+    generation-0 overflow would otherwise trigger collections that rescan them.
+    gc.disable() is process-wide, so this is only meant for single-threaded
+    command-line tools (bulk.py convert and shard); servers must not use it.
+    :return: Context manager; the collector is re-enabled on exit if it was enabled.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
 
 
 def load_books(file_path: str) -> List[Book]:
     """
-    Load all books from a JSON file.
-    :param file_path: Path to the JSON file.
+    Load all books from a catalog file.
+    The format (pretty or compact JSON, msgpack or binary snapshot) is detected
+    from the file, and JSON is decoded incrementally unless orjson is installed.
+    A missing or blank file is an empty catalog; an undecodable one is an error,
+    so that the next save cannot silently wipe the catalog.
+    :param file_path: Path to the catalog file.
     :return: List of Book instances.
+    :raises CatalogCorruptedError: If the file cannot be decoded.
     :raises IOError: If there is an issue with reading the file.
     """
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-            return [Book.from_dict(book) for book in data]
+        return list(_read_books(file_path, streaming=False))
     except FileNotFoundError:
         return []
-    except json.JSONDecodeError as e:
-        print(f"Warning: Failed to decode JSON. Reason: {e}")
-        return []
+    except (json.JSONDecodeError, SnapshotError, CodecError) as e:
+        if _is_blank(file_path):
+            return []
+        raise CatalogCorruptedError(file_path, str(e))
     except Exception as e:
         raise IOError(f"Unexpected error while loading books: {e}")
 
 
-def save_books(file_path: str, books: List[Book]) -> None:
+def find_book(file_path: str, book_id: int) -> Optional[Book]:
+    """
+    Find a single book in a catalog file.
+    Sorted binary snapshots are searched by offset without decoding other books;
+    other formats are streamed until the book is found.
+    :param file_path: Path to the catalog file.
+    :param book_id: ID of the book.
+    :return: The book, or None if it does not exist.
+    :raises CatalogCorruptedError: If the file cannot be decoded.
+    :raises IOError: If there is an issue with reading the file.
+    """
+    if detect_format(file_path) == "binary":
+        try:
+            with BookSnapshot(file_path) as snapshot:
+                if snapshot.sorted:
+                    return snapshot.get(book_id)
+        except FileNotFoundError:
+            return None
+        except SnapshotError as e:
+            raise CatalogCorruptedError(file_path, str(e))
+    return next((book for book in iter_books(file_path) if book.id == book_id), None)
+
+
+def count_books(file_path: str) -> int:
+    """
+    Count the books in a catalog file.
+    Binary snapshots store the count in their header; other formats are streamed.
+    :param file_path: Path to the catalog file.
+    :return: Number of books.
+    :raises CatalogCorruptedError: If the file cannot be decoded.
+    :raises IOError: If there is an issue with reading the file.
+    """
+    if detect_format(file_path) == "binary":
+        try:
+            with BookSnapshot(file_path) as snapshot:
+                return len(snapshot)
+        except FileNotFoundError:
+            return 0
+        except SnapshotError as e:
+            raise CatalogCorruptedError(file_path, str(e))
+    return sum(1 for _ in iter_books(file_path))
+
+
+@contextmanager
+def atomic_write(file_path: str, binary: bool = False) -> Iterator[IO]:
+    """
+    Write a file atomically.
+    Content goes to a temporary file in the same directory, which is fsynced and
+    then renamed over the target, so readers see either the old or the new file.
+    :param file_path: Path to the file to replace.
+    :param binary: Open the temporary file in binary instead of text mode.
+    :return: Context manager yielding the temporary file.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f"{os.path.basename(file_path)}.", suffix=".tmp"
+    )
+    try:
+        with (os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", encoding="utf-8")) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def save_books(file_path: str, books: List[Book], codec: Optional[str] = None) -> None:
     """
-    Save all books to a JSON file.
-    :param file_path: Path to the JSON file.
+    Save all books to a catalog file.
+    The file is replaced atomically, so a crash or a concurrent reader never sees
+    a partially written catalog.
+    :param file_path: Path to the catalog file.
     :param books: List of Book instances to save.
+    :param codec: Name of the codec to write with (see CODECS); by default the
+        file keeps its current format, and new files use DEFAULT_CODEC.
+    :raises ValueError: If the codec is unknown.
     :raises IOError: If there is an issue with writing to the file.
     """
+    writer = get_codec(codec) if codec is not None else None
     try:
-        with open(file_path, "w", encoding="utf-8") as file:
-            json.dump(
-                [book.to_dict() for book in books], file, indent=4, ensure_ascii=False
+        if writer is None:
+            writer = _writing_codec(file_path)
+        started = time.perf_counter()
+        with atomic_write(file_path, binary=True) as file:
+            writer.dump(books, file)
+            dumped = time.perf_counter()
+            byte_count = file.tell()
+        if IO_OBSERVERS:
+            _notify_io(
+                "write",
+                byte_count,
+                len(books),
+                {"serialize": dumped - started, "sync": time.perf_counter() - dumped},
             )
     except Exception as e:
         raise IOError(f"Unexpected error while saving books: {e}")
+
+
+def file_signature(file_path: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Get the inode, modification time and size of a file.
+    Atomic replacement gives the file a new inode, so every save changes the signature.
+    :param file_path: Path to the file.
+    :return: Tuple of (inode, mtime in nanoseconds, size), or None if the file is missing.
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def last_id_path(file_path: str) -> str:
+    """
+    Get the path of the file that keeps the highest ID ever used in a catalog.
+    :param file_path: Path to the catalog file.
+    :return: Path of the "<file_path>.seq" file.
+    """
+    return f"{file_path}.seq"
+
+
+def load_last_id(file_path: str) -> int:
+    """
+    Read the highest ID ever used in a catalog, as saved by save_last_id.
+    :param file_path: Path to the catalog file.
+    :return: Highest saved ID, or 0 if none was saved.
+    :raises CatalogCorruptedError: If the saved ID cannot be read.
+    """
+    path = last_id_path(file_path)
+    try:
+        with open(path, encoding="utf-8") as file:
+            content = file.read().strip()
+    except FileNotFoundError:
+        return 0
+    try:
+        return int(content) if content else 0
+    except ValueError:
+        raise CatalogCorruptedError(path, f"invalid ID {content!r}")
+
+
+def save_last_id(file_path: str, last_id: int) -> None:
+    """
+    Save the highest ID ever used in a catalog.
+    Catalog files only hold the books that still exist, so this is saved before
+    a delete that could remove the book with the highest ID, and ID sequences do
+    not reuse the IDs of deleted books after the catalog is reopened.
+    :param file_path: Path to the catalog file.
+    :param last_id: Highest ID used so far.
+    :raises IOError: If there is an issue with writing the file.
+    """
+    try:
+        with atomic_write(last_id_path(file_path)) as file:
+            file.write(f"{last_id}\n")
+    except Exception as e:
+        raise IOError(f"Unexpected error while saving the ID sequence: {e}")
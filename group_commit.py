@@ -0,0 +1,205 @@
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from book_models import BookStatus
+from book_service import BookService, check_status_change
+from exceptions import EmptyLibraryError, InvalidBookStatusError
+
+
+class StatusChange(NamedTuple):
+    """
+    A queued request to change the status of a book.
+    """
+
+    book_id: int
+    new_status: str
+
+
+def commit_status_changes(
+    service: BookService, changes: Sequence[StatusChange]
+) -> List[Optional[Exception]]:
+    """
+    Validate a batch of status changes in order and persist the accepted ones
+    with a single repository write.
+    Each change is validated against the outcome of the earlier changes in the
+    batch, exactly as if they had been applied one by one with
+    BookService.update_book_status.
+    :param service: BookService instance for managing books.
+    :param changes: Status changes in arrival order.
+    :return: For each change, None if it was applied, or the exception rejecting it.
+    :raises Exception: Whatever the repository raises if persisting fails; then
+        none of the changes were applied.
+    """
+    repository = service.repository
+    results: List[Optional[Exception]] = []
+    valid_statuses = [status.value for status in BookStatus]
+    with service.transaction():
+        books = repository.get_books(change.book_id for change in changes)
+        statuses: Dict[int, Optional[str]] = {
+            book_id: book.status.value for book_id, book in books.items()
+        }
+        empty = not books and not repository.count_books()
+        for book_id, new_status in changes:
+            try:
+                if new_status not in valid_statuses:
+                    raise InvalidBookStatusError(new_status)
+                if empty:
+                    raise EmptyLibraryError()
+                check_status_change(book_id, statuses.get(book_id), new_status)
+            except Exception as e:
+                results.append(e)
+            else:
+                statuses[book_id] = new_status
+                results.append(None)
+
+        updates = {
+            change.book_id: change.new_status
+            for change, error in zip(changes, results)
+            if error is None
+        }
+        if updates:
+            try:
+                repository.update_books_status(updates)
+            finally:
+                service.books_changed(updates)
+    return results
+
+
+class GroupCommitter:
+    """
+    Group commit for status updates.
+    Requests are queued and a background thread applies them in batches, each
+    persisted with one repository write. A batch is flushed as soon as it holds
+    max_batch_size requests or its oldest request has waited max_latency seconds.
+    The future of a request completes only after its batch has been persisted.
+    """
+
+    def __init__(
+        self, service: BookService, max_batch_size: int = 256, max_latency: float = 0.005
+    ):
+        """
+        Initialize the committer and start its flush thread.
+        :param service: BookService instance for managing books.
+        :param max_batch_size: Maximum number of requests persisted together.
+        :param max_latency: Maximum time in seconds a request waits for its batch to fill.
+        :raises ValueError: If the batch size is not positive or the latency is negative.
+        """
+        if not isinstance(max_batch_size, int) or max_batch_size <= 0:
+            raise ValueError("Batch size must be a positive integer.")
+        if max_latency < 0:
+            raise ValueError("Latency must not be negative.")
+        self.service = service
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.batches = 0
+        self.committed = 0
+        self._queue: List[tuple] = []
+        self._condition = threading.Condition()
+        self._flush_requested = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, book_id: int, new_status: str) -> "Future[None]":
+        """
+        Queue a status change.
+        :param book_id: ID of the book to update.
+        :param new_status: New status to set ("available" or "checked_out").
+        :return: Future that completes once the change is persisted, or fails with
+            the error BookService.update_book_status would have raised.
+        :raises RuntimeError: If the committer is closed.
+        """
+        future: "Future[None]" = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Group committer is closed.")
+            self._queue.append((StatusChange(book_id, new_status), future, time.monotonic()))
+            if len(self._queue) >= self.max_batch_size or len(self._queue) == 1:
+                self._condition.notify()
+        return future
+
+    def update_book_status(self, book_id: int, new_status: str) -> None:
+        """
+        Change the status of a book and wait until the change is persisted.
+        :param book_id: ID of the book to update.
+        :param new_status: New status to set ("available" or "checked_out").
+        :raises LibraryException: As BookService.update_book_status.
+        """
+        self.submit(book_id, new_status).result()
+
+    def flush(self) -> None:
+        """
+        Persist all queued requests now and wait until they are done.
+        """
+        with self._condition:
+            futures = [future for _, future, _ in self._queue]
+            self._flush_requested = True
+            self._condition.notify()
+        wait(futures)
+
+    def close(self) -> None:
+        """
+        Persist all queued requests and stop the flush thread.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def __enter__(self) -> "GroupCommitter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _next_batch(self) -> Optional[List[tuple]]:
+        """
+        Wait until a batch is due and take it off the queue.
+        :return: The batch, or None once the committer is closed and drained.
+        """
+        with self._condition:
+            while not self._queue:
+                if self._closed:
+                    return None
+                self._flush_requested = False
+                self._condition.wait()
+            deadline = self._queue[0][2] + self.max_latency
+            while (
+                len(self._queue) < self.max_batch_size
+                and not self._closed
+                and not self._flush_requested
+            ):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = self._queue[:self.max_batch_size]
+            del self._queue[:self.max_batch_size]
+            if not self._queue:
+                self._flush_requested = False
+            return batch
+
+    def _run(self) -> None:
+        """
+        Flush batches until the committer is closed.
+        """
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            futures = [future for _, future, _ in batch]
+            try:
+                results = commit_status_changes(self.service, [change for change, _, _ in batch])
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            for future, error in zip(futures, results):
+                if error is None:
+                    self.committed += 1
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
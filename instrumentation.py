@@ -0,0 +1,754 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import file_utils
+from book_models import Book, Loan
+from book_repository import BookRepositoryInterface
+from book_service import BookService
+from pagination import DEFAULT_PAGE_SIZE, BookPage
+from query_cache import QueryCache
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed bucket bounds, as exported to Prometheus.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        """
+        Initialize an empty histogram.
+        :param bounds: Ascending upper bounds of the buckets.
+        """
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Record a value.
+        :param value: Observed value.
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        Cumulative counts per bucket bound, ending with "+Inf".
+        :return: List of (bound, count) pairs.
+        """
+        total = 0
+        buckets = []
+        for bound, count in zip(list(self.bounds) + ["+Inf"], self.counts):
+            total += count
+            buckets.append((str(bound), total))
+        return buckets
+
+
+def _labels(labels: Mapping[str, str]) -> Labels:
+    """
+    Turn label keyword arguments into a hashable key.
+    :param labels: Label names and values.
+    :return: Sorted tuple of (name, value) pairs.
+    """
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    """
+    Format labels for the Prometheus text format.
+    :param labels: Label pairs.
+    :param extra: Additional label pair (such as the bucket bound).
+    :return: "{name="value",...}" or an empty string.
+    """
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    """
+    Escape a label value for the Prometheus text format.
+    :param value: Label value.
+    :return: Escaped value.
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class OperationStats:
+    """
+    Call counts, books returned and latencies of one instrumented operation.
+    """
+
+    __slots__ = ("ok", "errors", "objects", "latency")
+
+    def __init__(self):
+        """
+        Initialize empty statistics.
+        """
+        self.ok = 0
+        self.errors = 0
+        self.objects = 0
+        self.latency = Histogram()
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of counters and latency histograms.
+    Each instrumented operation keeps its statistics in one preallocated record,
+    so a call costs two clock reads, a dictionary lookup and a lock; the
+    registry can stay enabled in production. Profiling is opt-in per operation.
+    """
+
+    def __init__(self, prefix: str = "library"):
+        """
+        Initialize an empty registry.
+        :param prefix: Prefix of the exported metric names.
+        """
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._operations: Dict[Tuple[str, str], OperationStats] = {}
+        self._profiled: Dict[str, str] = {}
+        self._profiles: Dict[str, pstats.Stats] = {}
+        self._local = threading.local()
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        """
+        Increase a counter.
+        :param name: Metric name without prefix.
+        :param amount: Amount to add.
+        :param labels: Label names and values.
+        """
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        Record a value in a histogram.
+        :param name: Metric name without prefix.
+        :param value: Observed value.
+        :param labels: Label names and values.
+        """
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def _stats(self, component: str, operation: str) -> OperationStats:
+        """
+        Get the statistics of an operation, creating them on first use.
+        :param component: Instrumented layer ("service" or "repository").
+        :param operation: Name of the operation.
+        :return: Statistics record.
+        """
+        key = (component, operation)
+        stats = self._operations.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self._operations.setdefault(key, OperationStats())
+        return stats
+
+    def _record(
+        self, stats: OperationStats, elapsed: float, failed: bool, objects: int = 0
+    ) -> None:
+        """
+        Record one finished call.
+        :param stats: Statistics of the operation.
+        :param elapsed: Duration of the call in seconds.
+        :param failed: Whether the call raised.
+        :param objects: Number of books it returned.
+        """
+        with self._lock:
+            if failed:
+                stats.errors += 1
+            else:
+                stats.ok += 1
+            stats.objects += objects
+            stats.latency.observe(elapsed)
+
+    @contextmanager
+    def timed(self, component: str, operation: str) -> Iterator[None]:
+        """
+        Count and time a block of code, profiling it if enabled.
+        :param component: Instrumented layer ("service" or "repository").
+        :param operation: Name of the operation.
+        :return: Context manager.
+        """
+        stats = self._stats(component, operation)
+        name = f"{component}.{operation}"
+        capture = self._start_capture(name) if name in self._profiled else None
+        failed = True
+        started = time.perf_counter()
+        try:
+            yield
+            failed = False
+        finally:
+            elapsed = time.perf_counter() - started
+            if capture is not None:
+                self._stop_capture(name, capture)
+            self._record(stats, elapsed, failed)
+
+    def call(
+        self, component: str, operation: str, func: Callable, *args: Any, **kwargs: Any
+    ) -> Any:
+        """
+        Call a function, time it and count the books it returns.
+        Iterators are wrapped, so books are counted as they are consumed.
+        This is the hot path, so it avoids timed() unless the operation is profiled.
+        :param component: Instrumented layer ("service" or "repository").
+        :param operation: Name of the operation.
+        :param func: Function to call.
+        :return: Result of the call.
+        """
+        if self._profiled and f"{component}.{operation}" in self._profiled:
+            with self.timed(component, operation):
+                result = func(*args, **kwargs)
+            return self._count_result(self._stats(component, operation), result)
+
+        stats = self._operations.get((component, operation)) or self._stats(component, operation)
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            self._record(stats, time.perf_counter() - started, True)
+            raise
+        elapsed = time.perf_counter() - started
+        if result is None or type(result) in (int, bool):
+            self._record(stats, elapsed, False)
+        elif type(result) is Book:
+            self._record(stats, elapsed, False, 1)
+        elif isinstance(result, (list, dict, BookPage)):
+            self._record(stats, elapsed, False, len(result))
+        else:
+            self._record(stats, elapsed, False)
+            return self._count_result(stats, result)
+        return result
+
+    def _count_result(self, stats: OperationStats, result: Any) -> Any:
+        """
+        Count the books in a result that was timed separately.
+        :param stats: Statistics of the operation.
+        :param result: Result of the call.
+        :return: The result, with iterators wrapped to count books as they are consumed.
+        """
+        if isinstance(result, Book):
+            count = 1
+        elif isinstance(result, (list, dict, BookPage)):
+            count = len(result)
+        elif isinstance(result, Iterator):
+            return self._count_iter(stats, result)
+        else:
+            return result
+        with self._lock:
+            stats.objects += count
+        return result
+
+    def _count_iter(self, stats: OperationStats, books: Iterator[Book]) -> Iterator[Book]:
+        """
+        Count books as an iterator is consumed.
+        :param stats: Statistics of the operation.
+        :param books: Iterator to wrap.
+        :return: Iterator over the same books.
+        """
+        count = 0
+        try:
+            for book in books:
+                count += 1
+                yield book
+        finally:
+            with self._lock:
+                stats.objects += count
+
+    def observe_io(
+        self, direction: str, byte_count: int, objects: int, phases: Dict[str, float]
+    ) -> None:
+        """
+        Record a catalog read or write reported by file_utils.
+        :param direction: "read" or "write".
+        :param byte_count: Size of the file read or written.
+        :param objects: Number of books decoded or encoded.
+        :param phases: Seconds spent per phase.
+        """
+        self.inc("io_bytes_total", byte_count, direction=direction)
+        self.inc("io_objects_total", objects, direction=direction)
+        for phase, seconds in phases.items():
+            self.observe("io_seconds", seconds, direction=direction, phase=phase)
+
+    def watch_file_io(self) -> None:
+        """
+        Start recording the catalog reads and writes of file_utils.
+        """
+        if self.observe_io not in file_utils.IO_OBSERVERS:
+            file_utils.IO_OBSERVERS.append(self.observe_io)
+
+    def unwatch_file_io(self) -> None:
+        """
+        Stop recording the catalog reads and writes of file_utils.
+        """
+        if self.observe_io in file_utils.IO_OBSERVERS:
+            file_utils.IO_OBSERVERS.remove(self.observe_io)
+
+    def enable_profiling(self, operation: str, mode: str = "cprofile") -> None:
+        """
+        Profile every call of an operation.
+        With "cprofile" the call statistics accumulate in profile_report(); with
+        "tracemalloc" the peak memory of each call goes to a histogram.
+        :param operation: "component.operation", e.g. "repository.search_books".
+        :param mode: "cprofile" or "tracemalloc".
+        :raises ValueError: If the mode is unknown.
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(
+                f"Invalid profile mode '{mode}'. Valid modes are: {', '.join(PROFILE_MODES)}."
+            )
+        if mode == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._profiled[operation] = mode
+
+    def disable_profiling(self, operation: str) -> None:
+        """
+        Stop profiling an operation; collected statistics are kept.
+        :param operation: "component.operation".
+        """
+        mode = self._profiled.pop(operation, None)
+        if mode == "tracemalloc" and "tracemalloc" not in self._profiled.values():
+            tracemalloc.stop()
+
+    def _start_capture(self, name: str) -> Optional[Any]:
+        """
+        Start profiling a call, unless this thread is already profiling an outer call.
+        :param name: "component.operation".
+        :return: Capture state for _stop_capture, or None.
+        """
+        if getattr(self._local, "capturing", False):
+            return None
+        mode = self._profiled.get(name)
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is active
+                return None
+            self._local.capturing = True
+            return profiler
+        if mode == "tracemalloc" and tracemalloc.is_tracing():
+            self._local.capturing = True
+            tracemalloc.reset_peak()
+            return tracemalloc.get_traced_memory()[0]
+        return None
+
+    def _stop_capture(self, name: str, capture: Any) -> None:
+        """
+        Finish profiling a call and store the result.
+        :param name: "component.operation".
+        :param capture: State returned by _start_capture.
+        """
+        self._local.capturing = False
+        if isinstance(capture, cProfile.Profile):
+            capture.disable()
+            with self._lock:
+                stats = self._profiles.get(name)
+                if stats is None:
+                    self._profiles[name] = pstats.Stats(capture)
+                else:
+                    stats.add(capture)
+        elif tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            self.observe("memory_peak_bytes", max(0, peak - capture), operation=name)
+
+    def profile_report(self, operation: str, limit: int = 20, sort: str = "cumulative") -> str:
+        """
+        Format the collected cProfile statistics of an operation.
+        :param operation: "component.operation".
+        :param limit: Number of functions to list.
+        :param sort: pstats sort key.
+        :return: Report text, or an empty string if nothing was collected.
+        """
+        with self._lock:
+            stats = self._profiles.get(operation)
+            if stats is None:
+                return ""
+            output = io.StringIO()
+            stats.stream = output
+            stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def reset(self) -> None:
+        """
+        Drop all recorded values and profiles.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._operations.clear()
+            self._profiles.clear()
+
+    def _collect(self) -> Tuple[List[tuple], List[tuple]]:
+        """
+        Take a consistent copy of all metrics, including the operation statistics.
+        :return: Sorted counters as (name, labels, value) and histograms as
+            (name, labels, count, sum, cumulative buckets).
+        """
+        with self._lock:
+            counters = [(name, labels, value) for (name, labels), value in self._counters.items()]
+            histograms = [
+                (name, labels, histogram.count, histogram.sum, histogram.cumulative())
+                for (name, labels), histogram in self._histograms.items()
+            ]
+            for (component, operation), stats in self._operations.items():
+                labels = _labels({"component": component, "operation": operation})
+                for outcome, value in (("ok", stats.ok), ("error", stats.errors)):
+                    if value:
+                        counters.append((
+                            "operations_total",
+                            _labels({"component": component, "operation": operation,
+                                     "outcome": outcome}),
+                            value,
+                        ))
+                if stats.objects:
+                    counters.append(("objects_total", labels, stats.objects))
+                histograms.append((
+                    "operation_seconds",
+                    labels,
+                    stats.latency.count,
+                    stats.latency.sum,
+                    stats.latency.cumulative(),
+                ))
+        return sorted(counters), sorted(histograms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Export the metrics as JSON-serializable data.
+        :return: Dictionary with "counters" and "histograms" lists.
+        """
+        counters, histograms = self._collect()
+        return {
+            "counters": [
+                {"name": f"{self.prefix}_{name}", "labels": dict(labels), "value": value}
+                for name, labels, value in counters
+            ],
+            "histograms": [
+                {
+                    "name": f"{self.prefix}_{name}",
+                    "labels": dict(labels),
+                    "count": count,
+                    "sum": total,
+                    "buckets": dict(buckets),
+                }
+                for name, labels, count, total, buckets in histograms
+            ],
+        }
+
+    def to_json(self) -> str:
+        """
+        Export the metrics as a JSON document.
+        :return: JSON text.
+        """
+        return json.dumps(self.to_dict(), indent=4)
+
+    def to_prometheus(self) -> str:
+        """
+        Export the metrics in the Prometheus text exposition format.
+        :return: Exposition text.
+        """
+        counters, histograms = self._collect()
+        lines = []
+        typed = set()
+        for name, labels, value in counters:
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        for name, labels, count, total, buckets in histograms:
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            for bound, cumulative in buckets:
+                lines.append(f"{metric}_bucket{_format_labels(labels, ('le', bound))} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+class InstrumentedBookRepository(BookRepositoryInterface):
+    """
+    Proxy that records metrics for every call to a repository.
+    Attributes outside the repository interface (close, compact, ...) are
+    passed through unchanged.
+    """
+
+    def __init__(self, repository: BookRepositoryInterface, metrics: MetricsRegistry = METRICS):
+        """
+        Wrap a repository.
+        :param repository: Repository to instrument.
+        :param metrics: Registry to record into.
+        """
+        self.repository = repository
+        self.metrics = metrics
+
+    def __getattr__(self, name: str) -> Any:
+        """
+        Pass attributes outside the interface through to the wrapped repository.
+        """
+        return getattr(self.repository, name)
+
+    def _call(self, operation: str, *args: Any, **kwargs: Any) -> Any:
+        """
+        Call a method of the wrapped repository and record it.
+        :param operation: Name of the method.
+        :return: Result of the call.
+        """
+        return self.metrics.call(
+            "repository", operation, getattr(self.repository, operation), *args, **kwargs
+        )
+
+    def transaction(self):
+        """
+        Delegate to the wrapped repository; transactions are not timed.
+        :return: Context manager.
+        """
+        return self.repository.transaction()
+
+    def data_signature(self) -> Any:
+        return self.repository.data_signature()
+
+    def get_all_books(self) -> List[Book]:
+        return self._call("get_all_books")
+
+    def search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> List[Book]:
+        return self._call("search_books", title, author, year)
+
+    def add_book(self, book: Book) -> None:
+        self._call("add_book", book)
+
+    def delete_book(self, book_id: int) -> bool:
+        return self._call("delete_book", book_id)
+
+    def update_book_status(
+        self, book_id: int, new_status: str, loan: Optional[Loan] = None
+    ) -> bool:
+        return self._call("update_book_status", book_id, new_status, loan)
+
+    def get_book(self, book_id: int) -> Optional[Book]:
+        return self._call("get_book", book_id)
+
+    def get_books(self, book_ids: Iterable[int]) -> Dict[int, Book]:
+        return self._call("get_books", book_ids)
+
+    def count_books(self) -> int:
+        return self._call("count_books")
+
+    def iter_books(self) -> Iterator[Book]:
+        return self._call("iter_books")
+
+    def iter_search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> Iterator[Book]:
+        return self._call("iter_search_books", title, author, year)
+
+    def page_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+        order_by: str = "id",
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[Sequence] = None,
+    ) -> BookPage:
+        return self._call("page_books", title, author, year, order_by, limit, offset, after)
+
+    def count_by_status(self) -> Dict[str, int]:
+        return self._call("count_by_status")
+
+    def count_by_author(self) -> Dict[str, int]:
+        return self._call("count_by_author")
+
+    def count_by_decade(self) -> Dict[int, int]:
+        return self._call("count_by_decade")
+
+    def rebuild_aggregates(self) -> None:
+        self._call("rebuild_aggregates")
+
+    def verify_aggregates(self) -> List[str]:
+        return self._call("verify_aggregates")
+
+    def iter_books_by_status(self, status: str) -> Iterator[Book]:
+        return self._call("iter_books_by_status", status)
+
+    def iter_books_by_year_range(
+        self, start_year: Optional[int] = None, end_year: Optional[int] = None
+    ) -> Iterator[Book]:
+        return self._call("iter_books_by_year_range", start_year, end_year)
+
+    def iter_books_due(
+        self,
+        after: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Book]:
+        return self._call("iter_books_due", after, until, limit)
+
+    def autocomplete(
+        self, prefix: str, field: Optional[str] = None, limit: int = 10
+    ) -> List[Book]:
+        return self._call("autocomplete", prefix, field, limit)
+
+    def next_book_id(self) -> int:
+        return self._call("next_book_id")
+
+    def find_book_by_key(self, title: str, author: str, year: int) -> Optional[Book]:
+        return self._call("find_book_by_key", title, author, year)
+
+    def find_books_by_keys(
+        self, keys: Iterable[Tuple[str, str, int]]
+    ) -> Dict[Tuple[str, str, int], Book]:
+        return self._call("find_books_by_keys", keys)
+
+    def add_books(self, books: List[Book]) -> None:
+        self._call("add_books", books)
+
+    def update_books_status(self, updates: Mapping[int, str]) -> int:
+        return self._call("update_books_status", updates)
+
+
+class InstrumentedBookService(BookService):
+    """
+    BookService that records metrics for every public operation.
+    """
+
+    def __init__(
+        self,
+        repository: BookRepositoryInterface,
+        metrics: MetricsRegistry = METRICS,
+        query_cache: Optional[QueryCache] = None,
+    ):
+        """
+        Initialize the service.
+        :param repository: Repository instance for data management.
+        :param metrics: Registry to record into.
+        :param query_cache: Cache for search_books results (optional).
+        """
+        super().__init__(repository, query_cache)
+        self.metrics = metrics
+
+    def add_book(self, title: str, author: str, year: int) -> Book:
+        return self.metrics.call("service", "add_book", super().add_book, title, author, year)
+
+    def delete_book(self, book_id: int) -> None:
+        self.metrics.call("service", "delete_book", super().delete_book, book_id)
+
+    def search_books(self, *args: Any, **kwargs: Any) -> List[Book]:
+        return self.metrics.call("service", "search_books", super().search_books, *args, **kwargs)
+
+    def search_books_page(self, *args: Any, **kwargs: Any) -> BookPage:
+        return self.metrics.call(
+            "service", "search_books_page", super().search_books_page, *args, **kwargs
+        )
+
+    def list_books(self, *args: Any, **kwargs: Any) -> List[Book]:
+        return self.metrics.call("service", "list_books", super().list_books, *args, **kwargs)
+
+    def list_books_page(self, *args: Any, **kwargs: Any) -> BookPage:
+        return self.metrics.call(
+            "service", "list_books_page", super().list_books_page, *args, **kwargs
+        )
+
+    def count_books_by_status(self) -> Dict[str, int]:
+        return self.metrics.call("service", "count_books_by_status", super().count_books_by_status)
+
+    def count_books_by_author(self, *args: Any, **kwargs: Any) -> Dict[str, int]:
+        return self.metrics.call(
+            "service", "count_books_by_author", super().count_books_by_author, *args, **kwargs
+        )
+
+    def count_books_by_decade(self) -> Dict[int, int]:
+        return self.metrics.call("service", "count_books_by_decade", super().count_books_by_decade)
+
+    def catalog_report(self, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        return self.metrics.call(
+            "service", "catalog_report", super().catalog_report, *args, **kwargs
+        )
+
+    def list_books_by_status(self, *args: Any, **kwargs: Any) -> List[Book]:
+        return self.metrics.call(
+            "service", "list_books_by_status", super().list_books_by_status, *args, **kwargs
+        )
+
+    def search_books_by_year_range(self, *args: Any, **kwargs: Any) -> List[Book]:
+        return self.metrics.call(
+            "service",
+            "search_books_by_year_range",
+            super().search_books_by_year_range,
+            *args,
+            **kwargs,
+        )
+
+    def autocomplete(self, *args: Any, **kwargs: Any) -> List[Book]:
+        return self.metrics.call("service", "autocomplete", super().autocomplete, *args, **kwargs)
+
+    def update_book_status(self, book_id: int, new_status: str) -> None:
+        self.metrics.call(
+            "service", "update_book_status", super().update_book_status, book_id, new_status
+        )
+
+    def checkout_book(self, *args: Any, **kwargs: Any) -> Loan:
+        return self.metrics.call(
+            "service", "checkout_book", super().checkout_book, *args, **kwargs
+        )
+
+    def return_book(self, book_id: int) -> Optional[Loan]:
+        return self.metrics.call("service", "return_book", super().return_book, book_id)
+
+    def overdue_books(self, *args: Any, **kwargs: Any) -> List[Book]:
+        return self.metrics.call(
+            "service", "overdue_books", super().overdue_books, *args, **kwargs
+        )
+
+    def bulk_add(self, *args: Any, **kwargs: Any) -> List[Book]:
+        return self.metrics.call("service", "bulk_add", super().bulk_add, *args, **kwargs)
+
+    def bulk_update_status(self, *args: Any, **kwargs: Any) -> int:
+        return self.metrics.call(
+            "service", "bulk_update_status", super().bulk_update_status, *args, **kwargs
+        )
@@ -1,5 +1,8 @@
+from typing import Callable, Optional, Sequence
+
 from book_service import BookService
 from exceptions import LibraryException
+from pagination import DEFAULT_PAGE_SIZE, SORT_KEYS, BookPage
 
 
 def display_menu() -> str:
@@ -17,6 +20,22 @@ def display_menu() -> str:
     return input("Enter your choice: ").strip()
 
 
+def print_pages(fetch_page: Callable[[Optional[Sequence]], BookPage]) -> None:
+    """
+    Print results page by page, asking before fetching the next page.
+    :param fetch_page: Function returning the page after the given cursor.
+    """
+    page = fetch_page(None)
+    while True:
+        for book in page:
+            print(book.to_dict())
+        if page.next_cursor is None:
+            break
+        if input("Press Enter for more results or 'q' to stop: ").strip().lower() == "q":
+            break
+        page = fetch_page(page.next_cursor)
+
+
 def handle_add_book(service: BookService) -> None:
     """
     Handle adding a new book to the library.
@@ -66,10 +85,13 @@ def handle_search_books(service: BookService) -> None:
         author = input("Enter author to search (or leave blank): ").strip()
         year_input = input("Enter year to search (or leave blank): ").strip()
         year = int(year_input) if year_input else None
-        books = service.search_books(title, author, year)
+        first_page = service.search_books_page(title, author, year)
         print("Books found:")
-        for book in books:
-            print(book.to_dict())
+        print_pages(
+            lambda after: first_page
+            if after is None
+            else service.search_books_page(title, author, year, after=after)
+        )
     except ValueError:
         print("Invalid year. Please enter a valid integer.")
     except LibraryException as e:
@@ -81,11 +103,18 @@ def handle_list_books(service: BookService) -> None:
     Handle listing all books in the library.
     :param service: BookService instance for managing books.
     """
+    order_by = input(f"Sort by ({'/'.join(SORT_KEYS)}, default id): ").strip() or "id"
+    if order_by not in SORT_KEYS:
+        print("Invalid sort order.")
+        return
     try:
-        books = service.list_books()
+        first_page = service.list_books_page(order_by, DEFAULT_PAGE_SIZE)
         print("All books:")
-        for book in books:
-            print(book.to_dict())
+        print_pages(
+            lambda after: first_page
+            if after is None
+            else service.list_books_page(order_by, DEFAULT_PAGE_SIZE, after=after)
+        )
     except LibraryException as e:
         print(f"Error: {e}")
 
@@ -0,0 +1,192 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from book_models import Book, Loan
+from book_repository import CachedBookRepository, locked_write
+from exceptions import CatalogCorruptedError, LibraryException
+from file_utils import load_books, save_books
+
+
+def status_record(book: Book) -> Dict[str, Any]:
+    """
+    Create the journal record of a status change.
+    :param book: Book with its new status.
+    :return: Record with the status and, for a book on loan, the loan.
+    """
+    record: Dict[str, Any] = {"op": "status", "id": book.id, "status": book.status.value}
+    if book.loan is not None:
+        record["loan"] = book.loan.to_dict()
+    return record
+
+
+class JournalBookRepository(CachedBookRepository):
+    """
+    Repository that stores the catalog as a snapshot plus an append-only journal.
+    The snapshot uses the regular data.json format, every mutation appends one
+    JSON-lines record to the journal, and compaction folds the journal back into the snapshot.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        journal_path: Optional[str] = None,
+        compact_threshold: Optional[int] = 10000,
+        fsync: bool = True,
+        search_index: bool = True,
+    ):
+        """
+        Initialize the repository with the snapshot and journal paths.
+        :param file_path: Path to the JSON snapshot file.
+        :param journal_path: Path to the journal file (defaults to "<file_path>.journal").
+        :param compact_threshold: Number of journal records after which the journal is compacted
+            automatically (None disables automatic compaction).
+        :param fsync: Whether to fsync the journal after every record.
+        :param search_index: Whether to maintain a trigram index for search_books.
+        """
+        super().__init__(file_path, search_index)
+        self.journal_path = journal_path or f"{file_path}.journal"
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self._journal_records = 0
+        self._discarded_tail = 0
+
+    def _file_signature(self) -> Optional[Tuple[Any, Any]]:
+        """
+        Get the combined signature of the snapshot and the journal.
+        :return: Tuple of both file signatures.
+        """
+        snapshot = super()._file_signature()
+        try:
+            stat = os.stat(self.journal_path)
+            journal = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            journal = None
+        return snapshot, journal
+
+    def _load(self) -> List[Book]:
+        """
+        Load the snapshot and replay the journal on top of it.
+        A final record without its newline was torn by a crash mid-write; it is discarded
+        and its size kept in discarded_tail. Any other unreadable record is corruption.
+        :return: List of books.
+        :raises CatalogCorruptedError: If a complete journal record cannot be replayed.
+        """
+        books: Dict[int, Book] = {book.id: book for book in load_books(self.file_path)}
+        self._journal_records = 0
+        self._discarded_tail = 0
+        try:
+            with open(self.journal_path, "rb") as file:
+                valid_size = 0
+                for number, line in enumerate(file, 1):
+                    if not line.endswith(b"\n"):
+                        self._discarded_tail = len(line)
+                        break
+                    try:
+                        self._apply(books, json.loads(line))
+                    except (
+                        LibraryException, ValueError, LookupError, TypeError, AttributeError
+                    ) as e:
+                        raise CatalogCorruptedError(
+                            self.journal_path, f"record {number} cannot be replayed: {e}"
+                        )
+                    self._journal_records += 1
+                    valid_size += len(line)
+        except FileNotFoundError:
+            return list(books.values())
+
+        if self._discarded_tail:
+            with open(self.journal_path, "r+b") as file:
+                file.truncate(valid_size)
+        return list(books.values())
+
+    @staticmethod
+    def _apply(books: Dict[int, Book], record: Dict[str, Any]) -> None:
+        """
+        Apply a single journal record.
+        Records describe the resulting state, so replaying them more than once is harmless.
+        :param books: Catalog keyed by book ID.
+        :param record: Journal record to apply.
+        :raises ValueError: If the record has an unknown operation.
+        """
+        op = record.get("op")
+        if op == "add":
+            book = Book.from_dict(record["book"])
+            books[book.id] = book
+        elif op == "delete":
+            books.pop(record["id"], None)
+        elif op == "status":
+            book = books.get(record["id"])
+            if book is not None:
+                book.set_status(record["status"])
+                book.set_loan(Loan.from_dict(record["loan"]) if record.get("loan") else None)
+        else:
+            raise ValueError(f"Unknown journal operation: {op!r}")
+
+    def _append(self, *records: Dict[str, Any]) -> None:
+        """
+        Append records to the journal in one write and compact it if the threshold is reached.
+        :param records: Journal records to append.
+        :raises IOError: If there is an issue with writing to the journal.
+        """
+        data = "".join(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for record in records
+        )
+        try:
+            with open(self.journal_path, "a", encoding="utf-8") as file:
+                file.write(data)
+                if self.fsync:
+                    file.flush()
+                    os.fsync(file.fileno())
+        except Exception as e:
+            raise IOError(f"Unexpected error while writing journal: {e}")
+        self._journal_records += len(records)
+        self._signature = self._file_signature()
+
+        if self.compact_threshold is not None and self._journal_records >= self.compact_threshold:
+            self.compact()
+
+    def _persist_add(self, book: Book) -> None:
+        self._append({"op": "add", "book": book.to_dict()})
+
+    def _persist_delete(self, book: Book) -> None:
+        self._append({"op": "delete", "id": book.id})
+
+    def _persist_status(self, book: Book) -> None:
+        self._append(status_record(book))
+
+    def _persist_add_many(self, books: List[Book]) -> None:
+        self._append(*({"op": "add", "book": book.to_dict()} for book in books))
+
+    def _persist_status_many(self, books: List[Book]) -> None:
+        self._append(*(status_record(book) for book in books))
+
+    @locked_write
+    def compact(self) -> None:
+        """
+        Fold the journal into the snapshot and truncate the journal.
+        The snapshot is replaced atomically, so a crash at any point leaves a
+        snapshot and journal that replay to the same catalog.
+        """
+        save_books(self.file_path, list(self._books.values()))
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
+        self._journal_records = 0
+        self._signature = self._file_signature()
+
+    @property
+    def journal_records(self) -> int:
+        """
+        Number of records in the journal since the last compaction.
+        :return: Record count.
+        """
+        return self._journal_records
+
+    @property
+    def discarded_tail(self) -> int:
+        """
+        Size of the torn record discarded from the end of the journal at the last load.
+        :return: Number of bytes, 0 if the journal ended cleanly.
+        """
+        return self._discarded_tail
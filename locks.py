@@ -0,0 +1,129 @@
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no fcntl
+    fcntl = None
+
+
+class ReadWriteLock:
+    """
+    Writer-preferring read/write lock for threads.
+    Any number of readers may hold the lock at once; a writer holds it alone.
+    Both modes are re-entrant, and a thread holding the write lock may also read.
+    """
+
+    def __init__(self):
+        """
+        Initialize an unlocked lock.
+        """
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def is_reading(self) -> bool:
+        """
+        Check whether the current thread holds the lock for reading.
+        :return: True if the thread is inside read_locked().
+        """
+        return bool(getattr(self._local, "reads", 0))
+
+    def is_writing(self) -> bool:
+        """
+        Check whether the current thread holds the lock for writing.
+        :return: True if the thread is inside write_locked().
+        """
+        return self._writer == threading.get_ident()
+
+    def is_write_locked(self) -> bool:
+        """
+        Check whether any thread holds the lock for writing.
+        :return: True if a writer is inside write_locked().
+        """
+        return self._writer is not None
+
+    @contextmanager
+    def read_locked(self) -> Iterator[None]:
+        """
+        Hold the lock for reading.
+        :return: Context manager.
+        """
+        depth = getattr(self._local, "reads", 0)
+        if depth or self._writer == threading.get_ident():
+            self._local.reads = depth + 1
+            try:
+                yield
+            finally:
+                self._local.reads = depth
+            return
+
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        self._local.reads = 1
+        try:
+            yield
+        finally:
+            self._local.reads = 0
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write_locked(self) -> Iterator[None]:
+        """
+        Hold the lock for writing.
+        :return: Context manager.
+        :raises RuntimeError: If the thread only holds the lock for reading.
+        """
+        me = threading.get_ident()
+        if self._writer == me:
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+            return
+        if getattr(self._local, "reads", 0):
+            raise RuntimeError("Cannot upgrade a read lock to a write lock.")
+
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = None
+                self._condition.notify_all()
+
+
+@contextmanager
+def file_lock(path: str, exclusive: bool = True) -> Iterator[None]:
+    """
+    Hold an advisory fcntl lock on a lock file, shared between processes.
+    The lock is per open file, so callers must not nest it within one process.
+    Without fcntl (on Windows) this is a no-op.
+    :param path: Path to the lock file (created if missing).
+    :param exclusive: Take an exclusive lock instead of a shared one.
+    :return: Context manager.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as file:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
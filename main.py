@@ -1,6 +1,8 @@
-from book_repository import BookRepository
+from book_repository import ConcurrentBookRepository
 from book_service import BookService
+from change_feed import publish_to_existing_feed
 from interface import main_menu
+from query_cache import QueryCache
 
 
 def main() -> None:
@@ -11,9 +13,10 @@ def main() -> None:
     # Path to the JSON file for storing book data
     file_path = "data.json"
 
-    # Initialize repository and service
-    repository = BookRepository(file_path)
-    service = BookService(repository)
+    # Initialize repository and service; cached searches are dropped when the file changes,
+    # and changes are published to data.json.changes if a change feed was started
+    repository = publish_to_existing_feed(ConcurrentBookRepository(file_path))
+    service = BookService(repository, query_cache=QueryCache())
 
     # Start the main menu
     main_menu(service)
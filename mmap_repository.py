@@ -0,0 +1,485 @@
+import heapq
+import os
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from book_index import book_key, decade_of
+from book_mmap import MIN_CAPACITY, MappedCatalog, Row, encode_book, write_table
+from book_models import Book, BookStatus, Loan
+from book_repository import BookRepositoryInterface, check_new_ids
+from book_snapshot import SnapshotError
+from book_table import DELETED, STATUS_CODES, STATUSES
+from exceptions import InvalidBookStatusError, LoansNotSupportedError
+from file_utils import atomic_write
+from pagination import DEFAULT_PAGE_SIZE, BookPage, check_page_arguments
+
+
+def _status_code(new_status: str) -> int:
+    """
+    Convert a status name to its code in the table.
+    :param new_status: Status name.
+    :return: Status code.
+    :raises InvalidBookStatusError: If the status is invalid.
+    """
+    try:
+        return STATUS_CODES[BookStatus(new_status.lower())]
+    except ValueError:
+        raise InvalidBookStatusError(new_status)
+
+
+class MmapBookRepository(BookRepositoryInterface):
+    """
+    Read-optimized repository on a memory-mapped, fixed-layout catalog file
+    (see book_mmap.MappedCatalog).
+    Opening a catalog only maps it, and reads decode just the records they
+    touch, so startup time and memory do not grow with the catalog. Status
+    changes and deletions rewrite one byte in place, and books with new,
+    ascending IDs are appended in place; only inserting an ID below the
+    highest one, running out of slots or compacting tombstones rewrites the file.
+    Reads take no lock, since a record becomes visible only once it is
+    complete. Writes are serialized within the process; one process at a time
+    may write to a catalog.
+    """
+
+    def __init__(self, file_path: str, fsync: bool = True):
+        """
+        Open a mapped catalog, creating an empty one if the file is missing or empty.
+        :param file_path: Path to the catalog file.
+        :param fsync: Whether to flush every change to disk before returning.
+        :raises ValueError: If the file holds a catalog in another format.
+        """
+        self.file_path = file_path
+        self.fsync = fsync
+        self._write_lock = threading.RLock()
+        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+            self._rewrite(iter(()), 0, MIN_CAPACITY, 0)
+        else:
+            self._catalog = self._open()
+
+    def _open(self) -> MappedCatalog:
+        """
+        Map the catalog file.
+        :return: Writable mapping.
+        :raises ValueError: If the file is not a mapped catalog.
+        """
+        try:
+            return MappedCatalog(self.file_path, writable=True)
+        except SnapshotError as e:
+            raise ValueError(
+                f"{self.file_path} is not a usable mapped catalog ({e}). Convert a JSON catalog "
+                f"with: python bulk.py --data {self.file_path} convert mapped"
+            )
+
+    def _current(self) -> MappedCatalog:
+        """
+        Get the mapping of the current catalog file, remapping it if the file
+        was replaced or grown by another process.
+        :return: Mapping.
+        """
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return self._catalog
+        if (stat.st_ino, stat.st_size) != self._catalog.signature:
+            self._catalog = self._open()
+        return self._catalog
+
+    def _rewrite(self, rows: Iterable[Row], count: int, capacity: int, last_id: int) -> None:
+        """
+        Replace the catalog file atomically and map the new one.
+        Readers still iterating over the old mapping keep seeing the old catalog.
+        :param rows: Live rows in ascending ID order.
+        :param count: Number of rows.
+        :param capacity: Number of record slots to reserve.
+        :param last_id: Last ID handed out by the ID sequence.
+        """
+        with atomic_write(self.file_path, binary=True) as file:
+            write_table(file, rows, count, capacity, last_id)
+        self._catalog = self._open()
+
+    def close(self) -> None:
+        """
+        Unmap the catalog file.
+        """
+        self._catalog.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Hold the write lock for a group of operations.
+        :return: Context manager.
+        """
+        with self._write_lock:
+            yield
+
+    def get_all_books(self) -> List[Book]:
+        """
+        Retrieve all books ordered by ID.
+        :return: List of books.
+        """
+        return list(self._current().books())
+
+    def iter_books(self) -> Iterator[Book]:
+        """
+        Iterate over all books in ID order, decoding each only when it is reached.
+        :return: Iterator over books.
+        """
+        return self._current().books()
+
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """
+        Retrieve a single book by binary search over the record table.
+        :param book_id: ID of the book.
+        :return: The book, or None if it does not exist.
+        """
+        return self._current().get(book_id)
+
+    def get_books(self, book_ids: Iterable[int]) -> Dict[int, Book]:
+        """
+        Retrieve several books by ID at once.
+        :param book_ids: IDs of the books.
+        :return: Mapping of ID to book for the books that exist.
+        """
+        catalog = self._current()
+        books = {}
+        for book_id in book_ids:
+            book = catalog.get(book_id)
+            if book is not None:
+                books[book_id] = book
+        return books
+
+    def count_books(self) -> int:
+        """
+        Count the books, as stored in the header.
+        :return: Number of books.
+        """
+        return len(self._current())
+
+    def next_book_id(self) -> int:
+        """
+        Get the ID to assign to the next new book.
+        IDs come from a sequence that never goes backwards, so IDs of deleted books are not reused.
+        :return: Next ID in the sequence.
+        """
+        return self._current().header()[4] + 1
+
+    def find_book_by_key(self, title: str, author: str, year: int) -> Optional[Book]:
+        """
+        Find a book with the same title, author and year.
+        Candidates are matched on the fixed-width fields and the raw bytes, so
+        no other record is decoded.
+        :param title: Title of the book.
+        :param author: Author of the book.
+        :param year: Year of publication.
+        :return: The existing book, or None if there is none.
+        """
+        title, author, year = book_key(title, author, year)
+        title_bytes = title.encode("utf-8")
+        author_bytes = author.encode("utf-8")
+        strings = title_bytes + author_bytes
+        catalog = self._current()
+        for record in catalog.records():
+            _, _, record_year, offset, title_length, author_length, status = record
+            if (
+                record_year == year
+                and title_length == len(title_bytes)
+                and author_length == len(author_bytes)
+                and status != DELETED
+                and catalog.text(offset, len(strings)) == strings
+            ):
+                return catalog.book(record)
+        return None
+
+    def find_books_by_keys(
+        self, keys: Iterable[Tuple[str, str, int]]
+    ) -> Dict[Tuple[str, str, int], Book]:
+        """
+        Find the existing books for several (title, author, year) keys in one pass
+        over the table. Like find_book_by_key, records are matched on the
+        fixed-width fields and the raw bytes, so no other record is decoded.
+        :param keys: Keys of the books as (title, author, year).
+        :return: Mapping of the normalized key to the existing book, for the keys that have one.
+        """
+        wanted: Dict[Tuple[int, int, int], Dict[bytes, Tuple[str, str, int]]] = {}
+        for key in keys:
+            title, author, year = key = book_key(*key)
+            title_bytes = title.encode("utf-8")
+            author_bytes = author.encode("utf-8")
+            shape = (year, len(title_bytes), len(author_bytes))
+            wanted.setdefault(shape, {})[title_bytes + author_bytes] = key
+        found: Dict[Tuple[str, str, int], Book] = {}
+        if not wanted:
+            return found
+        catalog = self._current()
+        for record in catalog.records():
+            _, _, year, offset, title_length, author_length, status = record
+            candidates = wanted.get((year, title_length, author_length))
+            if candidates is None or status == DELETED:
+                continue
+            key = candidates.get(catalog.text(offset, title_length + author_length))
+            if key is not None and key not in found:
+                found[key] = catalog.book(record)
+        return found
+
+    def count_by_status(self) -> Dict[str, int]:
+        """
+        Count the books per status from the status bytes of the table, without
+        decoding any strings.
+        :return: Mapping of status value to count, including statuses without books.
+        """
+        counts = [0] * len(STATUSES)
+        for record in self._current().records():
+            if record[6] != DELETED:
+                counts[record[6]] += 1
+        return {status.value: count for status, count in zip(STATUSES, counts)}
+
+    def count_by_author(self) -> Dict[str, int]:
+        """
+        Count the books per author, decoding only the author strings.
+        :return: Mapping of author to count, for authors with books.
+        """
+        catalog = self._current()
+        counts: Dict[str, int] = {}
+        for _, _, _, title_offset, title_length, author_length, status in catalog.records():
+            if status != DELETED:
+                author = catalog.text(title_offset + title_length, author_length).decode("utf-8")
+                counts[author] = counts.get(author, 0) + 1
+        return counts
+
+    def count_by_decade(self) -> Dict[int, int]:
+        """
+        Count the books per decade of publication from the years in the table,
+        without decoding any strings.
+        :return: Mapping of the first year of a decade to count, ordered by decade.
+        """
+        counts: Dict[int, int] = {}
+        for record in self._current().records():
+            if record[6] != DELETED:
+                decade = decade_of(record[2])
+                counts[decade] = counts.get(decade, 0) + 1
+        return dict(sorted(counts.items()))
+
+    def iter_books_by_status(self, status: str) -> Iterator[Book]:
+        """
+        Iterate over the books with a status; only those books are decoded.
+        :param status: Status value ("available" or "checked_out").
+        :return: Iterator over books, ordered by ID.
+        """
+        code = _status_code(status)
+        catalog = self._current()
+        return (catalog.book(record) for record in catalog.records() if record[6] == code)
+
+    def iter_books_by_year_range(
+        self, start_year: Optional[int] = None, end_year: Optional[int] = None
+    ) -> Iterator[Book]:
+        """
+        Iterate over the books published in a range of years.
+        The years are compared on the fixed-width table and only the matching
+        books are decoded.
+        :param start_year: First year, inclusive (optional).
+        :param end_year: Last year, inclusive (optional).
+        :return: Iterator over books, ordered by year, then by ID.
+        """
+        catalog = self._current()
+        records = [
+            record
+            for record in catalog.records()
+            if record[6] != DELETED
+            and (start_year is None or record[2] >= start_year)
+            and (end_year is None or record[2] <= end_year)
+        ]
+        records.sort(key=lambda record: (record[2], record[1]))
+        return (catalog.book(record) for record in records)
+
+    def _matching(
+        self,
+        catalog: MappedCatalog,
+        title: Optional[str],
+        author: Optional[str],
+        year: Optional[int],
+        start: int = 0,
+    ) -> Iterator[Book]:
+        """
+        Iterate over matching books in ID order.
+        The year is compared on the fixed-width table first, and only the
+        strings a criterion needs are decoded.
+        :param catalog: Mapping to scan.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :param start: First slot to scan.
+        :return: Iterator over matching books.
+        """
+        title = title.lower() if title else None
+        author = author.lower() if author else None
+        for record in catalog.records(start):
+            _, _, record_year, offset, title_length, author_length, status = record
+            if status == DELETED or (year and record_year != year):
+                continue
+            if title and title not in catalog.text(offset, title_length).decode("utf-8").lower():
+                continue
+            if author and author not in (
+                catalog.text(offset + title_length, author_length).decode("utf-8").lower()
+            ):
+                continue
+            yield catalog.book(record)
+
+    def search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> List[Book]:
+        """
+        Search for books by title, author, or year.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :return: List of books matching the criteria, ordered by ID.
+        """
+        return list(self._matching(self._current(), title, author, year))
+
+    def iter_search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> Iterator[Book]:
+        """
+        Lazily iterate over books matching the search criteria.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :return: Iterator over matching books, ordered by ID.
+        """
+        return self._matching(self._current(), title, author, year)
+
+    def page_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+        order_by: str = "id",
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[Sequence] = None,
+    ) -> BookPage:
+        """
+        Get one page of books matching the search criteria in sort order.
+        Pages in ID order start at the cursor (found by binary search) and stop
+        as soon as the page is full; other orders scan the whole table.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :param order_by: Field to sort by ("id", "year" or "title").
+        :param limit: Maximum number of books on the page.
+        :param offset: Number of books to skip after the cursor.
+        :param after: Cursor returned with the previous page (optional).
+        :return: The requested page.
+        :raises ValueError: If the paging arguments are invalid.
+        """
+        if order_by != "id":
+            return super().page_books(title, author, year, order_by, limit, offset, after)
+        check_page_arguments(limit, offset)
+        catalog = self._current()
+        start = catalog.first_slot_after(tuple(after)[0]) if after is not None else 0
+        books = list(
+            islice(self._matching(catalog, title, author, year, start), offset, offset + limit + 1)
+        )
+        page = books[:limit]
+        next_cursor = (page[-1].id,) if page and len(books) > limit else None
+        return BookPage(page, next_cursor)
+
+    def add_book(self, book: Book) -> None:
+        """
+        Add a new book to the repository.
+        :param book: Book instance to add.
+        :raises ValueError: If a book with the same ID already exists.
+        """
+        self.add_books([book])
+
+    def add_books(self, books: List[Book]) -> None:
+        """
+        Add several books with a single commit.
+        Books with IDs above every stored ID are appended in place while free
+        slots remain; otherwise the file is rewritten once with the books merged in.
+        :param books: Book instances to add.
+        :raises ValueError: If a book ID is already in use.
+        """
+        if not books:
+            return
+        with self._write_lock:
+            catalog = self._current()
+            check_new_ids(catalog, books)
+            rows = sorted((encode_book(book) for book in books), key=lambda row: row[0])
+            count, capacity, live, heap_used, last_id = catalog.header()
+            highest = catalog.record(count - 1)[1] if count else 0
+            last_id = max(last_id, rows[-1][0])
+
+            if rows[0][0] > highest and count + len(rows) <= capacity:
+                for slot, row in enumerate(rows, count):
+                    heap_used = catalog.put(slot, row, heap_used)
+                catalog.commit(count + len(rows), live + len(rows), heap_used, last_id, self.fsync)
+                return
+
+            total = live + len(rows)
+            merged = heapq.merge(catalog.rows(), rows, key=lambda row: row[0])
+            self._rewrite(merged, total, capacity if total < capacity else total * 2, last_id)
+
+    def delete_book(self, book_id: int) -> bool:
+        """
+        Delete a book by leaving a tombstone in its record.
+        The file is compacted once tombstones outnumber the live books.
+        :param book_id: ID of the book to delete.
+        :return: True if the book was deleted, False otherwise.
+        """
+        with self._write_lock:
+            catalog = self._current()
+            slot = catalog.find_slot(book_id)
+            if slot is None or catalog.status_at(slot) == DELETED:
+                return False
+            count, capacity, live, heap_used, last_id = catalog.header()
+            catalog.set_status(slot, DELETED)
+            if count > MIN_CAPACITY and live - 1 < count // 2:
+                self._rewrite(catalog.rows(), live - 1, capacity, last_id)
+            else:
+                catalog.commit(count, live - 1, heap_used, last_id, self.fsync)
+        return True
+
+    def update_book_status(
+        self, book_id: int, new_status: str, loan: Optional[Loan] = None
+    ) -> bool:
+        """
+        Update the status of a book by rewriting its status byte in place.
+        :param book_id: ID of the book to update.
+        :param new_status: New status to set.
+        :param loan: Must be None; mapped catalogs have no room for loan records.
+        :return: True if the book was updated, False otherwise.
+        :raises InvalidBookStatusError: If the status is invalid.
+        :raises LoansNotSupportedError: If a loan is given.
+        """
+        if loan is not None:
+            raise LoansNotSupportedError("mapped catalog")
+        return self.update_books_status({book_id: new_status}) > 0
+
+    def update_books_status(self, updates: Mapping[int, str]) -> int:
+        """
+        Update the status of several books in place and flush them together.
+        :param updates: Mapping of book ID to new status.
+        :return: Number of books that were updated.
+        :raises InvalidBookStatusError: If a status is invalid.
+        """
+        codes = {book_id: _status_code(new_status) for book_id, new_status in updates.items()}
+        with self._write_lock:
+            catalog = self._current()
+            changed = []
+            for book_id, code in codes.items():
+                slot = catalog.find_slot(book_id)
+                if slot is not None and catalog.status_at(slot) != DELETED:
+                    catalog.set_status(slot, code)
+                    changed.append(slot)
+            if changed and self.fsync:
+                catalog.sync(changed)
+        return len(changed)
@@ -0,0 +1,99 @@
+import heapq
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from book_models import Book
+
+SortKey = Tuple[Any, ...]
+
+SORT_KEYS: Dict[str, Callable[[Book], SortKey]] = {
+    "id": lambda book: (book.id,),
+    "year": lambda book: (book.year, book.id),
+    "title": lambda book: (book.title.lower(), book.id),
+}
+
+DEFAULT_PAGE_SIZE = 20
+
+
+class BookPage:
+    """
+    One page of books together with the cursor of the following page.
+    """
+
+    def __init__(self, books: List[Book], next_cursor: Optional[SortKey] = None):
+        """
+        Initialize a page.
+        :param books: Books on this page.
+        :param next_cursor: Sort key of the last book, to pass as `after` for the next
+            page, or None if this is the last page.
+        """
+        self.books = books
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.books)
+
+    def __len__(self) -> int:
+        return len(self.books)
+
+    def __repr__(self) -> str:
+        return f"BookPage(books={self.books!r}, next_cursor={self.next_cursor!r})"
+
+
+def get_sort_key(order_by: str) -> Callable[[Book], SortKey]:
+    """
+    Get the key function for a sort order.
+    Every key ends with the book ID, so keys are unique and usable as cursors.
+    :param order_by: Field to sort by ("id", "year" or "title").
+    :return: Key function.
+    :raises ValueError: If the sort order is unknown.
+    """
+    try:
+        return SORT_KEYS[order_by]
+    except KeyError:
+        raise ValueError(
+            f"Invalid sort order '{order_by}'. Valid orders are: {', '.join(SORT_KEYS)}."
+        )
+
+
+def check_page_arguments(limit: int, offset: int) -> None:
+    """
+    Validate page size and offset.
+    :param limit: Maximum number of books on the page.
+    :param offset: Number of books to skip.
+    :raises ValueError: If the limit is not positive or the offset is negative.
+    """
+    if not isinstance(limit, int) or limit <= 0:
+        raise ValueError("Limit must be a positive integer.")
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("Offset must be a non-negative integer.")
+
+
+def paginate(
+    books: Iterable[Book],
+    order_by: str = "id",
+    limit: int = DEFAULT_PAGE_SIZE,
+    offset: int = 0,
+    after: Optional[Sequence] = None,
+) -> BookPage:
+    """
+    Select one page of books in sort order.
+    Keeps only the best offset + limit + 1 books in a heap, so a page costs
+    O(N log k) time and O(k) memory instead of sorting everything.
+    :param books: Books to page through, in any order.
+    :param order_by: Field to sort by ("id", "year" or "title").
+    :param limit: Maximum number of books on the page.
+    :param offset: Number of books to skip after the cursor.
+    :param after: Cursor returned with the previous page (optional).
+    :return: The requested page.
+    :raises ValueError: If the arguments are invalid.
+    """
+    key = get_sort_key(order_by)
+    check_page_arguments(limit, offset)
+    if after is not None:
+        cursor = tuple(after)
+        books = (book for book in books if key(book) > cursor)
+
+    top = heapq.nsmallest(offset + limit + 1, books, key=key)
+    page = top[offset:offset + limit]
+    next_cursor = key(page[-1]) if page and len(top) > offset + limit else None
+    return BookPage(page, next_cursor)
@@ -0,0 +1,229 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from book_models import Book
+from book_repository import matches_criteria
+
+# Above this many (book, entry) checks, adding books clears the cache instead.
+MAX_MATCH_CHECKS = 100000
+
+QueryKey = Tuple[Optional[str], Optional[str], Optional[int], Optional[int]]
+
+
+class CacheEntry(NamedTuple):
+    """
+    Cached result of one search.
+    """
+
+    books: Tuple[Book, ...]
+    ids: FrozenSet[int]
+    expires_at: Optional[float]
+
+
+class QueryCache:
+    """
+    LRU cache of search results keyed on normalized search criteria.
+    Writes made through BookService invalidate exactly the entries they can
+    affect: an added book drops the entries whose criteria it matches, and a
+    deleted or updated book drops the entries that contain it. Writes that
+    bypass the service (another process sharing the data file) are caught by
+    the repository's data signature: the service passes it with every lookup
+    and write, and a signature the cache has not seen clears it. Backends
+    without a signature (see BookRepositoryInterface.data_signature) need a
+    ttl to bound how long such results can be served.
+    A result computed while an invalidation ran is not stored, so a search
+    racing with a write cannot cache the pre-write result.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = None,
+        max_result_size: int = 10000,
+    ):
+        """
+        Initialize an empty cache.
+        :param max_entries: Maximum number of cached searches; the least recently
+            used one is evicted first.
+        :param ttl: Seconds after which an entry expires (None keeps entries until
+            they are evicted or invalidated).
+        :param max_result_size: Results with more books are not cached, which
+            bounds the memory of the cache to about max_entries * max_result_size books.
+        :raises ValueError: If a limit is not positive.
+        """
+        if not isinstance(max_entries, int) or max_entries <= 0:
+            raise ValueError("Cache size must be a positive integer.")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("TTL must be positive.")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_result_size = max_result_size
+        self._entries: "OrderedDict[QueryKey, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._signature: Any = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(
+        title: Optional[str], author: Optional[str], year: Optional[int], limit: Optional[int]
+    ) -> QueryKey:
+        """
+        Normalize search criteria into a cache key.
+        Title and author are matched case-insensitively and empty criteria are
+        ignored, so criteria that differ only in that way share an entry.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :param limit: Maximum number of results (optional).
+        :return: Cache key.
+        """
+        return (
+            title.lower() if title else None,
+            author.lower() if author else None,
+            year or None,
+            limit,
+        )
+
+    def lookup(self, key: QueryKey, signature: Any = None) -> Tuple[Optional[List[Book]], int]:
+        """
+        Look up a search.
+        :param key: Key from make_key.
+        :param signature: Current data signature of the repository; if it differs
+            from the last one seen, the cache is cleared first (None skips the check).
+        :return: Tuple of (copy of the cached books or None on a miss, generation
+            to pass to store).
+        """
+        with self._lock:
+            self._check_signature(signature)
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None:
+                if time.monotonic() >= entry.expires_at:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None, self._generation
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry.books), self._generation
+
+    def store(self, key: QueryKey, books: List[Book], generation: int) -> None:
+        """
+        Cache the result of a search.
+        :param key: Key from make_key.
+        :param books: Books found.
+        :param generation: Generation returned by the lookup that missed; the
+            result is dropped if an invalidation happened since.
+        """
+        if len(books) > self.max_result_size:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        entry = CacheEntry(tuple(books), frozenset(book.id for book in books), expires_at)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _check_signature(self, signature: Any) -> None:
+        """
+        Clear the cache if the repository changed since its signature was last seen.
+        Must be called with the lock held.
+        :param signature: Current data signature of the repository, or None.
+        """
+        if signature is not None and signature != self._signature:
+            self._drop(list(self._entries))
+            self._signature = signature
+
+    def validate(self, signature: Any) -> None:
+        """
+        Clear the cache if the repository changed since its signature was last
+        seen, e.g. before a write whose changes will be invalidated precisely.
+        :param signature: Current data signature of the repository (None does nothing).
+        """
+        with self._lock:
+            self._check_signature(signature)
+
+    def adopt(self, signature: Any) -> None:
+        """
+        Accept the data signature after writes whose entries were already
+        invalidated, so that they do not clear the whole cache.
+        :param signature: Data signature of the repository after the writes.
+        """
+        with self._lock:
+            self._signature = signature
+
+    def _drop(self, keys: List[QueryKey]) -> None:
+        """
+        Remove entries and start a new generation. Must be called with the lock held.
+        :param keys: Keys to remove.
+        """
+        self._generation += 1
+        for key in keys:
+            del self._entries[key]
+        self.invalidations += len(keys)
+
+    def invalidate_added(self, books: Iterable[Book]) -> None:
+        """
+        Drop the entries whose criteria match newly added books.
+        Large batches clear the whole cache, which is cheaper than matching
+        every book against every entry.
+        :param books: Added books.
+        """
+        books = list(books)
+        with self._lock:
+            if len(books) * len(self._entries) > MAX_MATCH_CHECKS:
+                self._drop(list(self._entries))
+                return
+            self._drop([
+                key
+                for key in self._entries
+                if any(matches_criteria(book, key[0], key[1], key[2]) for book in books)
+            ])
+
+    def invalidate_ids(self, book_ids: Iterable[int]) -> None:
+        """
+        Drop the entries containing deleted or modified books.
+        :param book_ids: IDs of the books.
+        """
+        ids = set(book_ids)
+        with self._lock:
+            self._drop(
+                [key for key, entry in self._entries.items() if not ids.isdisjoint(entry.ids)]
+            )
+
+    def clear(self) -> None:
+        """
+        Drop all entries.
+        """
+        with self._lock:
+            self._drop(list(self._entries))
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the cache statistics.
+        :return: Counters of hits, misses, evictions, expirations and
+            invalidations, the number of entries and the hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
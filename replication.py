@@ -0,0 +1,381 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+from typing import IO, Callable, Iterable, List, Mapping, Optional, Tuple, Union
+
+from book_models import Book, Loan
+from book_repository import CachedBookRepository
+from book_service import BookService
+from change_feed import Change, PublishingBookRepository, encode_record
+from exceptions import ChangesUnavailableError, ReadOnlyReplicaError, ReplicaOutOfSyncError
+
+# A Unix socket path, or a (host, port) tuple for TCP.
+Address = Union[str, Tuple[str, int]]
+
+# Number of changes sent to a follower at once.
+BATCH_SIZE = 1000
+# Seconds after which an idle follower connection gets a heartbeat.
+HEARTBEAT_INTERVAL = 5.0
+
+
+class ReplicaBookRepository(CachedBookRepository):
+    """
+    Read-only, in-memory copy of a catalog kept current by applying its change feed.
+    It starts from a snapshot and then applies the changes after the snapshot's
+    sequence number, updating the same indexes as CachedBookRepository, so
+    reads never need to reload the catalog. Changes must arrive in sequence
+    order; ones already applied are skipped.
+    """
+
+    def __init__(
+        self, search_index: bool = True, filter_indexes: bool = True, prefix_index: bool = True
+    ):
+        """
+        Initialize an empty replica that has not loaded a snapshot yet.
+        :param search_index: Whether to maintain a trigram index for search_books.
+        :param filter_indexes: Whether to maintain status and year indexes.
+        :param prefix_index: Whether to maintain a prefix index for autocomplete.
+        """
+        super().__init__(os.devnull, search_index, filter_indexes, prefix_index)
+        self.sequence: Optional[int] = None
+        self._applied = threading.Condition()
+        self._listeners: List[Callable[[Optional[List[Change]]], None]] = []
+
+    def _file_signature(self) -> None:
+        """
+        Replicas have no backing file.
+        :return: None.
+        """
+        return None
+
+    def _load(self) -> List[Book]:
+        """
+        Replicas start out empty until a snapshot is loaded.
+        :return: Empty list.
+        """
+        return []
+
+    def add_listener(self, listener: Callable[[Optional[List[Change]]], None]) -> None:
+        """
+        Register a callback for applied changes, e.g. to invalidate the cache of a
+        BookService reading from this replica (see cache_invalidator).
+        :param listener: Function called with every batch of applied changes, and
+            with None after a snapshot replaced the contents.
+        """
+        self._listeners.append(listener)
+
+    def load_snapshot(self, sequence: int, books: Iterable[Book]) -> None:
+        """
+        Replace the contents of the replica.
+        :param sequence: Sequence number of the last change the snapshot includes.
+        :param books: All books of the catalog.
+        """
+        with self._lock.write_locked():
+            self._reset(books)
+            self._loaded = True
+            self.sequence = sequence
+        with self._applied:
+            self._applied.notify_all()
+        for listener in self._listeners:
+            listener(None)
+
+    def apply(self, changes: Iterable[Change]) -> int:
+        """
+        Apply changes from the feed.
+        :param changes: Changes in sequence order.
+        :return: Number of changes applied (changes already applied are skipped).
+        :raises ReplicaOutOfSyncError: If no snapshot was loaded or a change is missing.
+        """
+        applied: List[Change] = []
+        try:
+            with self._lock.write_locked():
+                try:
+                    for change in changes:
+                        if self.sequence is None or change.sequence > self.sequence + 1:
+                            raise ReplicaOutOfSyncError((self.sequence or 0) + 1, change.sequence)
+                        if change.sequence <= self.sequence:
+                            continue
+                        self._apply_change(change)
+                        self.sequence = change.sequence
+                        applied.append(change)
+                finally:
+                    self._publish()
+        finally:
+            # Changes applied before a gap stay applied, so readers and listeners see them.
+            if applied:
+                with self._applied:
+                    self._applied.notify_all()
+                for listener in self._listeners:
+                    listener(applied)
+        return len(applied)
+
+    def _apply_change(self, change: Change) -> None:
+        """
+        Apply one change to the cache and the indexes. Must be called with the write lock held.
+        :param change: Change to apply.
+        """
+        old = self._books.get(change.book_id)
+        if change.op == "add":
+            new = change.book
+        elif change.op == "status" and old is not None:
+            new = old.with_status(change.status, change.loan)
+        else:
+            new = None
+        if old is not None and new is not None:
+            self._books[new.id] = new
+            for index in self._indexes:
+                index.replace(old, new)
+        elif new is not None:
+            self._books[new.id] = new
+            self._last_id = max(self._last_id, new.id)
+            for index in self._indexes:
+                index.add(new)
+        elif old is not None and change.op == "delete":
+            del self._books[old.id]
+            for index in self._indexes:
+                index.remove(old)
+
+    def wait_for(self, sequence: int, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the replica has applied a change, e.g. to read a write made on the primary.
+        :param sequence: Sequence number of the change.
+        :param timeout: Maximum number of seconds to wait (None waits indefinitely).
+        :return: True if the change was applied, False if the timeout expired.
+        """
+        with self._applied:
+            return self._applied.wait_for(
+                lambda: self.sequence is not None and self.sequence >= sequence, timeout
+            )
+
+    def add_book(self, book: Book) -> None:
+        raise ReadOnlyReplicaError()
+
+    def delete_book(self, book_id: int) -> bool:
+        raise ReadOnlyReplicaError()
+
+    def update_book_status(
+        self, book_id: int, new_status: str, loan: Optional[Loan] = None
+    ) -> bool:
+        raise ReadOnlyReplicaError()
+
+    def add_books(self, books: List[Book]) -> None:
+        raise ReadOnlyReplicaError()
+
+    def update_books_status(self, updates: Mapping[int, str]) -> int:
+        raise ReadOnlyReplicaError()
+
+
+def apply_stream(replica: ReplicaBookRepository, stream: IO[bytes]) -> None:
+    """
+    Apply a replication stream to a replica until the stream ends.
+    The stream is JSON lines: a {"op": "snapshot", "seq": ..., "count": ...}
+    header followed by that many books, change records, and heartbeats.
+    :param replica: Replica to update.
+    :param stream: Binary stream, e.g. a socket file or a pipe.
+    :raises ReplicaOutOfSyncError: If the stream skips a change.
+    """
+    for line in stream:
+        if not line.endswith(b"\n"):
+            return
+        record = json.loads(line)
+        op = record["op"]
+        if op == "heartbeat":
+            continue
+        if op == "snapshot":
+            books = [Book.from_dict(json.loads(stream.readline())) for _ in range(record["count"])]
+            replica.load_snapshot(record["seq"], books)
+        else:
+            replica.apply([Change.from_record(record)])
+
+
+def cache_invalidator(service: BookService) -> Callable[[Optional[List[Change]]], None]:
+    """
+    Create a replica listener that keeps the search cache of a service current.
+    :param service: BookService reading from the replica.
+    :return: Listener for ReplicaBookRepository.add_listener.
+    """
+
+    def invalidate(changes: Optional[List[Change]]) -> None:
+        if changes is None:
+            if service.query_cache is not None:
+                service.query_cache.clear()
+            return
+        service.books_added([change.book for change in changes if change.op == "add"])
+        service.books_changed([change.book_id for change in changes if change.op != "add"])
+
+    return invalidate
+
+
+class _FeedRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Streams the feed to one follower: a snapshot if the follower needs one,
+    then every change after the follower's sequence number as it is published.
+    """
+
+    def handle(self) -> None:
+        request = json.loads(self.rfile.readline() or b"{}")
+        since = request.get("since")
+        primary = self.server.repository
+        feed = primary.feed
+        try:
+            while not self.server.stopping.is_set():
+                if since is None or since > feed.last_sequence:
+                    since = self._send_snapshot(primary)
+                try:
+                    changes = feed.read(since, BATCH_SIZE)
+                except ChangesUnavailableError:
+                    since = None
+                    continue
+                if changes:
+                    self.wfile.write(
+                        b"".join(encode_record(change.to_record()) for change in changes)
+                    )
+                    since = changes[-1].sequence
+                elif not feed.wait(since, HEARTBEAT_INTERVAL):
+                    self.wfile.write(encode_record({"op": "heartbeat", "seq": since}))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_snapshot(self, primary: PublishingBookRepository) -> int:
+        """
+        Send all books of the primary.
+        :param primary: Publishing repository to copy.
+        :return: Sequence number the snapshot reflects.
+        """
+        sequence, books = primary.snapshot()
+        self.wfile.write(encode_record({"op": "snapshot", "seq": sequence, "count": len(books)}))
+        for book in books:
+            self.wfile.write(encode_record(book.to_dict()))
+        return sequence
+
+
+class _UnixFeedServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class _TcpFeedServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FeedServer:
+    """
+    Serves the change feed of a publishing repository to followers over a
+    Unix socket or TCP, one thread per follower.
+    """
+
+    def __init__(self, repository: PublishingBookRepository, address: Address):
+        """
+        Bind the server; call start() to accept followers.
+        :param repository: Publishing repository whose changes are served.
+        :param address: Unix socket path, or (host, port) for TCP (port 0 picks a free port).
+        """
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            self._server: socketserver.BaseServer = _UnixFeedServer(address, _FeedRequestHandler)
+        else:
+            self._server = _TcpFeedServer(address, _FeedRequestHandler)
+        self._server.repository = repository
+        self._server.stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Address:
+        """
+        Address the server is bound to.
+        :return: Unix socket path, or (host, port) for TCP.
+        """
+        return self._server.server_address
+
+    def start(self) -> None:
+        """
+        Accept followers on a background thread.
+        """
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="feed-server", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop accepting followers; open streams end within HEARTBEAT_INTERVAL.
+        """
+        self._server.stopping.set()
+        self._server.shutdown()
+        self._server.server_close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+class FeedFollower:
+    """
+    Keeps a replica current by following a FeedServer on a background thread.
+    The follower asks for the changes after the replica's sequence number and
+    for a snapshot when the replica has none or fell behind the feed.
+    Lost connections are re-established.
+    """
+
+    def __init__(
+        self, replica: ReplicaBookRepository, address: Address, retry_delay: float = 1.0
+    ):
+        """
+        Initialize the follower.
+        :param replica: Replica to keep current.
+        :param address: Address of the FeedServer.
+        :param retry_delay: Seconds to wait before reconnecting.
+        """
+        self.replica = replica
+        self.address = address
+        self.retry_delay = retry_delay
+        self._stopping = threading.Event()
+        self._socket: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Start following on a background thread.
+        """
+        self._thread = threading.Thread(target=self._run, name="feed-follower", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop following and close the connection.
+        """
+        self._stopping.set()
+        if self._socket is not None:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        """
+        Follow the server until stopped, reconnecting after errors.
+        """
+        resync = False
+        while not self._stopping.is_set():
+            family = socket.AF_UNIX if isinstance(self.address, str) else socket.AF_INET
+            try:
+                with socket.socket(family, socket.SOCK_STREAM) as connection:
+                    self._socket = connection
+                    connection.connect(self.address)
+                    since = None if resync else self.replica.sequence
+                    connection.sendall(encode_record({"since": since}))
+                    with connection.makefile("rb") as stream:
+                        apply_stream(self.replica, stream)
+                resync = False
+            except ReplicaOutOfSyncError:
+                resync = True
+                continue
+            except OSError:
+                pass
+            finally:
+                self._socket = None
+            self._stopping.wait(self.retry_delay)
@@ -0,0 +1,37 @@
+from book_repository import (
+    BookRepository,
+    BookRepositoryInterface,
+    CachedBookRepository,
+    CompactBookRepository,
+    ConcurrentBookRepository,
+)
+from journal_repository import JournalBookRepository
+from mmap_repository import MmapBookRepository
+from sharded_repository import ShardedBookRepository
+from sqlite_repository import SqliteBookRepository
+
+BACKENDS = {
+    "json": BookRepository,
+    "cached": CachedBookRepository,
+    "compact": CompactBookRepository,
+    "concurrent": ConcurrentBookRepository,
+    "journal": JournalBookRepository,
+    "mmap": MmapBookRepository,
+    "sharded": ShardedBookRepository,
+    "sqlite": SqliteBookRepository,
+}
+
+
+def create_repository(backend: str, path: str) -> BookRepositoryInterface:
+    """
+    Create a repository for the given storage backend.
+    :param backend: Name of the backend (one of BACKENDS).
+    :param path: Path to the data file.
+    :return: Repository instance.
+    :raises ValueError: If the backend is unknown.
+    """
+    try:
+        repository_class = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown backend '{backend}'. Valid backends are: {', '.join(BACKENDS)}.")
+    return repository_class(path)
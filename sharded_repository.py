@@ -0,0 +1,793 @@
+import heapq
+import json
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from book_index import AGGREGATE_VIEWS, autocomplete_key, book_key, due_key, normalize_prefix
+from book_models import Book, Loan
+from book_repository import BookRepositoryInterface, CachedBookRepository, check_new_ids
+from file_utils import atomic_write, save_books
+
+MANIFEST_FORMAT = "sharded"
+MANIFEST_VERSION = 1
+PARTITIONS = ("hash", "range")
+DEFAULT_SHARDS = 4
+DEFAULT_RANGE_SIZE = 100000
+
+# Sort keys results are merged by; shards return their results sorted the same way.
+ORDER_KEYS: Dict[str, Callable[[Book], Any]] = {
+    "id": attrgetter("id"),
+    "year": attrgetter("year", "id"),
+    "due": due_key,
+}
+
+ShardFactory = Callable[[str], BookRepositoryInterface]
+
+# Shards opened by this process when it serves as a worker of a process pool.
+_WORKER_SHARDS: Dict[str, BookRepositoryInterface] = {}
+
+
+def shard_path(file_path: str, index: int) -> str:
+    """
+    Get the path of a shard file: "data.json" keeps shard 2 in "data.002.json".
+    :param file_path: Path to the manifest.
+    :param index: Index of the shard.
+    :return: Path to the shard file.
+    """
+    root, extension = os.path.splitext(file_path)
+    return f"{root}.{index:03d}{extension}"
+
+
+def _call_shard(
+    shard: BookRepositoryInterface, method: str, args: Tuple, order: Optional[str]
+) -> Any:
+    """
+    Call a repository method on one shard.
+    Iterators are materialized so the result can cross a process boundary.
+    :param shard: Shard repository.
+    :param method: Name of the method.
+    :param args: Positional arguments.
+    :param order: Name of the ORDER_KEYS key to sort a list of books by (optional).
+    :return: Result of the call.
+    """
+    result = getattr(shard, method)(*args)
+    if isinstance(result, Iterator):
+        result = list(result)
+    if order is not None:
+        result.sort(key=ORDER_KEYS[order])
+    return result
+
+
+def _call_worker_shard(
+    factory: ShardFactory, path: str, method: str, args: Tuple, order: Optional[str]
+) -> Any:
+    """
+    Call a repository method on a shard opened in a pool worker.
+    The worker keeps the shard open between calls; cached backends reload it
+    when another process changed its file.
+    :param factory: Shard repository class.
+    :param path: Path to the shard file.
+    :param method: Name of the method.
+    :param args: Positional arguments.
+    :param order: Name of the ORDER_KEYS key to sort a list of books by (optional).
+    :return: Result of the call.
+    """
+    shard = _WORKER_SHARDS.get(path)
+    if shard is None:
+        shard = _WORKER_SHARDS[path] = factory(path)
+    return _call_shard(shard, method, args, order)
+
+
+def _sum_counts(results: Iterable[Mapping[Any, int]]) -> Dict[Any, int]:
+    """
+    Add up the counts returned by several shards.
+    :param results: Mappings of value to count, one per shard.
+    :return: Mapping of value to total count.
+    """
+    totals: Dict[Any, int] = {}
+    for counts in results:
+        for value, count in counts.items():
+            totals[value] = totals.get(value, 0) + count
+    return totals
+
+
+def _merge(results: Iterable[List[Book]], order: str) -> List[Book]:
+    """
+    Merge per-shard results that are each sorted by the same key.
+    :param results: Sorted lists of books.
+    :param order: Name of the ORDER_KEYS key the lists are sorted by.
+    :return: Merged list.
+    """
+    return list(_iter_merge(results, order))
+
+
+def _iter_merge(results: Iterable[List[Book]], order: str) -> Iterator[Book]:
+    """
+    Lazily merge per-shard results that are each sorted by the same key.
+    :param results: Sorted lists of books.
+    :param order: Name of the ORDER_KEYS key the lists are sorted by.
+    :return: Iterator over the merged books.
+    """
+    return heapq.merge(*results, key=ORDER_KEYS[order])
+
+
+def write_manifest(
+    file_path: str, partition: str, shards: int, range_size: int, last_id: int = 0
+) -> None:
+    """
+    Write the manifest describing a sharded catalog.
+    :param file_path: Path to the manifest.
+    :param partition: "hash" or "range".
+    :param shards: Number of shards.
+    :param range_size: Number of IDs per shard for range partitioning.
+    :param last_id: Highest ID handed out so far, the base of the catalog's ID sequence.
+    """
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "version": MANIFEST_VERSION,
+        "partition": partition,
+        "shards": shards,
+        "range_size": range_size,
+        "last_id": last_id,
+    }
+    with atomic_write(file_path) as file:
+        json.dump(manifest, file, indent=4)
+
+
+def read_manifest(file_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Read the manifest of a sharded catalog.
+    :param file_path: Path to the manifest.
+    :return: Manifest, or None if the file is missing or empty.
+    :raises ValueError: If the file is not a manifest.
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            content = file.read()
+    except FileNotFoundError:
+        return None
+    if not content.strip():
+        return None
+    try:
+        manifest = json.loads(content)
+    except ValueError:
+        manifest = None
+    if not isinstance(manifest, dict) or manifest.get("format") != MANIFEST_FORMAT:
+        raise ValueError(
+            f"{file_path} is not a sharded catalog manifest. Split a catalog into shards "
+            f"with: python bulk.py --data {file_path} shard"
+        )
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported sharded catalog version {manifest.get('version')}.")
+    return manifest
+
+
+def split_catalog(
+    file_path: str,
+    books: List[Book],
+    partition: str = "hash",
+    shards: int = DEFAULT_SHARDS,
+    range_size: int = DEFAULT_RANGE_SIZE,
+) -> int:
+    """
+    Write books as a sharded catalog: one catalog file per shard plus the
+    manifest at file_path, which is written last.
+    :param file_path: Path to the manifest.
+    :param books: Books to distribute.
+    :param partition: "hash" or "range".
+    :param shards: Number of shards for hash partitioning.
+    :param range_size: Number of IDs per shard for range partitioning.
+    :return: Number of shards written.
+    :raises ValueError: If the partitioning is invalid or a book ID is repeated.
+    """
+    check_new_ids((), books)
+    router = ShardRouter(partition, shards, range_size)
+    groups: Dict[int, List[Book]] = {}
+    for book in books:
+        groups.setdefault(router.shard_of(book.id), []).append(book)
+    count = max(groups, default=0) + 1 if partition == "range" else shards
+    for index in range(count):
+        shard_books = sorted(groups.get(index, []), key=ORDER_KEYS["id"])
+        save_books(shard_path(file_path, index), shard_books)
+    last_id = max((book.id for book in books), default=0)
+    write_manifest(file_path, partition, count, range_size, last_id)
+    return count
+
+
+class ShardRouter:
+    """
+    Maps book IDs to shards.
+    Hash partitioning spreads IDs evenly over a fixed number of shards by
+    taking them modulo the shard count. Range partitioning gives every shard a
+    block of range_size consecutive IDs, so new books with ascending IDs only
+    ever touch the last shard, and the shard count grows with the catalog.
+    """
+
+    def __init__(self, partition: str, shards: int, range_size: int):
+        """
+        Initialize the router.
+        :param partition: "hash" or "range".
+        :param shards: Number of shards (for range partitioning, the number created so far).
+        :param range_size: Number of IDs per shard for range partitioning.
+        :raises ValueError: If an argument is invalid.
+        """
+        if partition not in PARTITIONS:
+            raise ValueError(f"Unknown partitioning '{partition}'. Valid values are: hash, range.")
+        if not isinstance(shards, int) or shards <= 0:
+            raise ValueError("Shard count must be a positive integer.")
+        if not isinstance(range_size, int) or range_size <= 0:
+            raise ValueError("Range size must be a positive integer.")
+        self.partition = partition
+        self.shards = shards
+        self.range_size = range_size
+
+    def shard_of(self, book_id: int) -> int:
+        """
+        Get the shard a book belongs to.
+        For range partitioning the index can be beyond the existing shards.
+        :param book_id: ID of the book.
+        :return: Index of the shard.
+        """
+        if self.partition == "hash":
+            return book_id % self.shards
+        return max(book_id - 1, 0) // self.range_size
+
+
+class ShardedBookRepository(BookRepositoryInterface):
+    """
+    Repository that partitions the catalog over several shard repositories,
+    each with its own file, by ID hash or ID range (see ShardRouter).
+    A small JSON manifest at the repository path records the partitioning.
+    Searches, counts and other reads that need every shard are fanned out over
+    a pool and their results merged in ID order. Writes go only to the shards
+    that hold the affected books, so a change rewrites one shard file rather
+    than the whole catalog, and bulk writes update their shards in parallel.
+    With the default thread pool, the shards live in this process and a
+    search gains from the fan-out only where the shard backend releases the
+    GIL (I/O, SQLite). With processes=True, reads run in worker processes that
+    each keep their shards in memory and scan them on their own core; writes
+    still run in this process, and the workers pick them up as their shard
+    files change. One process at a time may write to a sharded catalog.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        shard_factory: ShardFactory = CachedBookRepository,
+        partition: str = "hash",
+        shards: int = DEFAULT_SHARDS,
+        range_size: int = DEFAULT_RANGE_SIZE,
+        processes: bool = False,
+        workers: Optional[int] = None,
+    ):
+        """
+        Open a sharded catalog, creating an empty one if the manifest is missing or empty.
+        :param file_path: Path to the manifest; shard files are named after it (see shard_path).
+        :param shard_factory: Repository class (or other callable taking a path) for the
+            shards; it must be picklable when processes is True.
+        :param partition: "hash" or "range" for a new catalog; an existing one keeps its own.
+        :param shards: Number of shards for a new hash-partitioned catalog.
+        :param range_size: Number of IDs per shard for a new range-partitioned catalog.
+        :param processes: Fan reads out to worker processes instead of threads.
+        :param workers: Number of pool workers (defaults to one per shard, capped by
+            the CPU count for processes).
+        :raises ValueError: If the file is not a manifest or an argument is invalid.
+        """
+        self.file_path = file_path
+        self.shard_factory = shard_factory
+        self.processes = processes
+        self.workers = workers
+        self._write_lock = threading.RLock()
+        self._pool_lock = threading.Lock()
+        self._shards: List[BookRepositoryInterface] = []
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pools: List[ProcessPoolExecutor] = []
+        manifest = read_manifest(file_path)
+        if manifest is None:
+            ShardRouter(partition, shards, range_size)
+            write_manifest(file_path, partition, 1 if partition == "range" else shards, range_size)
+            manifest = read_manifest(file_path)
+        self._apply_manifest(manifest)
+
+    def _manifest_signature(self) -> Optional[Tuple[int, int, int]]:
+        """
+        Get the inode, modification time and size of the manifest.
+        :return: Signature, or None if the manifest is missing.
+        """
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _apply_manifest(self, manifest: Dict[str, Any]) -> None:
+        """
+        Route by a manifest and open shards it lists that are not open yet.
+        :param manifest: Manifest read from the file.
+        """
+        self.router = ShardRouter(manifest["partition"], manifest["shards"], manifest["range_size"])
+        # Manifests written before the sequence was stored have no "last_id".
+        self._last_id: Optional[int] = manifest.get("last_id")
+        self._signature = self._manifest_signature()
+        for index in range(len(self._shards), self.router.shards):
+            self._shards.append(self.shard_factory(shard_path(self.file_path, index)))
+
+    def _sync_manifest(self) -> None:
+        """
+        Pick up shards that another process added to a range-partitioned catalog.
+        """
+        if self._manifest_signature() == self._signature:
+            return
+        with self._write_lock:
+            manifest = read_manifest(self.file_path)
+            if manifest is not None:
+                self._apply_manifest(manifest)
+
+    def _stored_last_id(self) -> int:
+        """
+        Get the highest ID handed out, as recorded in the manifest.
+        For manifests without a sequence it is taken from the shards instead.
+        :return: Highest ID handed out so far.
+        """
+        if self._last_id is not None:
+            return self._last_id
+        return max(self._fan_out("next_book_id"), default=1) - 1
+
+    def _grow(self, shard_count: int, last_id: int) -> None:
+        """
+        Add shards to a range-partitioned catalog and advance the ID sequence in
+        the manifest. Must be called with the write lock held, before the books
+        are written, so that a crash can leave a gap in the IDs but never hand
+        out an ID that is in use.
+        :param shard_count: Number of shards needed.
+        :param last_id: Highest ID of the books about to be written.
+        """
+        shard_count = max(shard_count, self.router.shards)
+        last_id = max(last_id, self._stored_last_id())
+        if shard_count == self.router.shards and last_id == self._last_id:
+            return
+        for index in range(self.router.shards, shard_count):
+            save_books(shard_path(self.file_path, index), [])
+        write_manifest(
+            self.file_path, self.router.partition, shard_count, self.router.range_size, last_id
+        )
+        self._apply_manifest(read_manifest(self.file_path))
+
+    def _pool_size(self) -> int:
+        """
+        Get the number of pool workers.
+        :return: Number of workers.
+        """
+        if self.workers is not None:
+            return max(self.workers, 1)
+        if self.processes:
+            return max(min(len(self._shards), os.cpu_count() or 1), 1)
+        return max(len(self._shards), 1)
+
+    def _executor(self, index: int) -> Executor:
+        """
+        Get the executor that serves reads from a shard.
+        In process mode every worker has its own single-process pool and a
+        fixed set of shards, so each shard is held in memory by one worker only.
+        :param index: Index of the shard.
+        :return: Executor.
+        """
+        if not self.processes:
+            return self._threads()
+        with self._pool_lock:
+            if not self._process_pools:
+                self._process_pools = [
+                    ProcessPoolExecutor(max_workers=1) for _ in range(self._pool_size())
+                ]
+            pools = self._process_pools
+        return pools[index % len(pools)]
+
+    def _threads(self) -> ThreadPoolExecutor:
+        """
+        Get the thread pool, creating it on first use.
+        Concurrent first calls create a single pool.
+        :return: Thread pool.
+        """
+        with self._pool_lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self._pool_size(), thread_name_prefix="book-shard"
+                )
+            return self._thread_pool
+
+    def _fan_out(
+        self,
+        method: str,
+        args: Tuple = (),
+        order: Optional[str] = None,
+        shard_args: Optional[Mapping[int, Tuple]] = None,
+    ) -> List[Any]:
+        """
+        Call a read method on several shards in parallel.
+        :param method: Name of the repository method.
+        :param args: Positional arguments for every shard.
+        :param order: Name of the ORDER_KEYS key to sort each list of books by (optional).
+        :param shard_args: Mapping of shard index to its own positional arguments, to
+            call only those shards (defaults to all shards with args).
+        :return: Results in shard index order.
+        """
+        self._sync_manifest()
+        if shard_args is None:
+            shard_args = dict.fromkeys(range(len(self._shards)), args)
+        calls = sorted(shard_args.items())
+        if len(calls) == 1 and not self.processes:
+            (index, args), = calls
+            return [_call_shard(self._shards[index], method, args, order)]
+        futures: List[Future] = []
+        for index, args in calls:
+            if self.processes:
+                path = shard_path(self.file_path, index)
+                future = self._executor(index).submit(
+                    _call_worker_shard, self.shard_factory, path, method, args, order
+                )
+            else:
+                future = self._executor(index).submit(
+                    _call_shard, self._shards[index], method, args, order
+                )
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _write_shards(self, method: str, groups: Mapping[int, Any]) -> List[Any]:
+        """
+        Call a write method on several shards in parallel, in this process.
+        :param method: Name of the repository method.
+        :param groups: Mapping of shard index to the argument for that shard.
+        :return: Results in shard order.
+        """
+        if len(groups) == 1:
+            (index, argument), = groups.items()
+            return [getattr(self._shards[index], method)(argument)]
+        pool = self._threads()
+        futures = [
+            pool.submit(getattr(self._shards[index], method), argument)
+            for index, argument in sorted(groups.items())
+        ]
+        return [future.result() for future in futures]
+
+    def _shard(self, book_id: int) -> Optional[BookRepositoryInterface]:
+        """
+        Get the shard a book belongs to.
+        :param book_id: ID of the book.
+        :return: Shard repository, or None if the shard does not exist yet.
+        """
+        self._sync_manifest()
+        index = self.router.shard_of(book_id)
+        return self._shards[index] if index < len(self._shards) else None
+
+    def _group(self, book_ids: Iterable[int]) -> Dict[int, Tuple[List[int]]]:
+        """
+        Group book IDs by existing shard, as arguments for _fan_out.
+        :param book_ids: IDs of the books.
+        :return: Mapping of shard index to a tuple holding the IDs.
+        """
+        self._sync_manifest()
+        groups: Dict[int, Tuple[List[int]]] = {}
+        for book_id in book_ids:
+            index = self.router.shard_of(book_id)
+            if index < len(self._shards):
+                groups.setdefault(index, ([],))[0].append(book_id)
+        return groups
+
+    @property
+    def shards(self) -> List[BookRepositoryInterface]:
+        """
+        Get the shard repositories.
+        :return: Shards in index order.
+        """
+        self._sync_manifest()
+        return list(self._shards)
+
+    def close(self) -> None:
+        """
+        Shut down the pools and close the shards.
+        """
+        with self._pool_lock:
+            thread_pool, self._thread_pool = self._thread_pool, None
+            process_pools, self._process_pools = self._process_pools, []
+        if thread_pool is not None:
+            thread_pool.shutdown()
+        for pool in process_pools:
+            pool.shutdown()
+        for shard in self._shards:
+            close = getattr(shard, "close", None)
+            if close is not None:
+                close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Hold the write lock for a group of operations.
+        :return: Context manager.
+        """
+        with self._write_lock:
+            yield
+
+    def data_signature(self) -> Any:
+        """
+        Combine the signatures of the manifest and of every shard.
+        :return: Tuple of signatures, or None if a shard cannot tell.
+        """
+        self._sync_manifest()
+        shards = tuple(shard.data_signature() for shard in self._shards)
+        if None in shards:
+            return None
+        return self._manifest_signature(), shards
+
+    def get_all_books(self) -> List[Book]:
+        """
+        Retrieve all books ordered by ID.
+        :return: List of books.
+        """
+        return _merge(self._fan_out("get_all_books", order="id"), "id")
+
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """
+        Retrieve a single book from its shard.
+        :param book_id: ID of the book.
+        :return: The book, or None if it does not exist.
+        """
+        shard = self._shard(book_id)
+        return shard.get_book(book_id) if shard is not None else None
+
+    def get_books(self, book_ids: Iterable[int]) -> Dict[int, Book]:
+        """
+        Retrieve several books, asking each shard only for its own.
+        :param book_ids: IDs of the books.
+        :return: Mapping of ID to book for the books that exist.
+        """
+        found: Dict[int, Book] = {}
+        for result in self._fan_out("get_books", shard_args=self._group(book_ids)):
+            found.update(result)
+        return found
+
+    def count_books(self) -> int:
+        """
+        Count the books in all shards.
+        :return: Number of books.
+        """
+        return sum(self._fan_out("count_books"))
+
+    def count_by_status(self) -> Dict[str, int]:
+        """
+        Count the books per status in all shards.
+        :return: Mapping of status value to count, including statuses without books.
+        """
+        return _sum_counts(self._fan_out("count_by_status"))
+
+    def count_by_author(self) -> Dict[str, int]:
+        """
+        Count the books per author in all shards.
+        :return: Mapping of author to count, for authors with books.
+        """
+        return _sum_counts(self._fan_out("count_by_author"))
+
+    def count_by_decade(self) -> Dict[int, int]:
+        """
+        Count the books per decade of publication in all shards.
+        :return: Mapping of the first year of a decade to count, ordered by decade.
+        """
+        return dict(sorted(_sum_counts(self._fan_out("count_by_decade")).items()))
+
+    def rebuild_aggregates(self) -> None:
+        """
+        Rebuild the aggregate views of every shard.
+        """
+        with self._write_lock:
+            self._sync_manifest()
+            for shard in self._shards:
+                shard.rebuild_aggregates()
+
+    def verify_aggregates(self) -> List[str]:
+        """
+        Check the aggregate views of every shard against a scan of the shard.
+        :return: Names of the views that differ in any shard; empty if all of them match.
+        """
+        with self._write_lock:
+            self._sync_manifest()
+            differing = {view for shard in self._shards for view in shard.verify_aggregates()}
+        return [view for view in AGGREGATE_VIEWS if view in differing]
+
+    def search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> List[Book]:
+        """
+        Search all shards in parallel for books by title, author, or year.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :return: List of books matching the criteria, ordered by ID.
+        """
+        return _merge(self._fan_out("search_books", (title, author, year), "id"), "id")
+
+    def iter_search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> Iterator[Book]:
+        """
+        Iterate over books matching the search criteria, ordered by ID.
+        The shards are searched in parallel and their sorted results merged
+        lazily, so a consumer that stops early does not pay for merging the rest.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :return: Iterator over matching books.
+        """
+        return _iter_merge(self._fan_out("iter_search_books", (title, author, year), "id"), "id")
+
+    def iter_books_by_status(self, status: str) -> Iterator[Book]:
+        """
+        Iterate over the books with a status.
+        :param status: Status value ("available" or "checked_out").
+        :return: Iterator over books, ordered by ID.
+        """
+        return _iter_merge(self._fan_out("iter_books_by_status", (status,), "id"), "id")
+
+    def iter_books_by_year_range(
+        self, start_year: Optional[int] = None, end_year: Optional[int] = None
+    ) -> Iterator[Book]:
+        """
+        Iterate over the books published in a range of years.
+        :param start_year: First year, inclusive (optional).
+        :param end_year: Last year, inclusive (optional).
+        :return: Iterator over books, ordered by year, then by ID.
+        """
+        results = self._fan_out("iter_books_by_year_range", (start_year, end_year), "year")
+        return _iter_merge(results, "year")
+
+    def iter_books_due(
+        self,
+        after: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Book]:
+        """
+        Iterate over the books on loan that are due in a range of times.
+        Every shard returns its own first books due, which are merged by due time.
+        :param after: Due times up to and including this one are skipped (optional).
+        :param until: Last due time, inclusive (optional).
+        :param limit: Maximum number of books (optional).
+        :return: Iterator over books, ordered by due time, then by ID.
+        """
+        results = self._fan_out("iter_books_due", (after, until, limit), "due")
+        return islice(_iter_merge(results, "due"), limit)
+
+    def autocomplete(
+        self, prefix: str, field: Optional[str] = None, limit: int = 10
+    ) -> List[Book]:
+        """
+        Find the best completions of a typed prefix in all shards in parallel.
+        Every shard returns its own top results, which are merged by rank.
+        :param prefix: Prefix as typed.
+        :param field: "title", "author", or None for both.
+        :param limit: Maximum number of results.
+        :return: Matching books in rank order (see book_index.autocomplete_key).
+        """
+        normalized = normalize_prefix(prefix)
+        if not normalized:
+            return []
+        results = self._fan_out("autocomplete", (prefix, field, limit))
+        merged = heapq.merge(*results, key=lambda book: autocomplete_key(book, normalized, field))
+        return list(islice(merged, limit))
+
+    def next_book_id(self) -> int:
+        """
+        Get the ID to assign to the next new book.
+        The sequence is kept in the manifest, so it never goes backwards, even
+        after the book with the highest ID was deleted.
+        :return: One more than the highest ID handed out so far.
+        """
+        self._sync_manifest()
+        return self._stored_last_id() + 1
+
+    def find_book_by_key(self, title: str, author: str, year: int) -> Optional[Book]:
+        """
+        Find a book with the same title, author and year in any shard.
+        :param title: Title of the book.
+        :param author: Author of the book.
+        :param year: Year of publication.
+        :return: The existing book, or None if there is none.
+        """
+        found = self._fan_out("find_book_by_key", (title, author, year))
+        return next((book for book in found if book is not None), None)
+
+    def find_books_by_keys(
+        self, keys: Iterable[Tuple[str, str, int]]
+    ) -> Dict[Tuple[str, str, int], Book]:
+        """
+        Find the existing books for several (title, author, year) keys, looking
+        up the whole batch in every shard in parallel.
+        :param keys: Keys of the books as (title, author, year).
+        :return: Mapping of the normalized key to the existing book, for the keys that have one.
+        """
+        wanted = list({book_key(*key) for key in keys})
+        if not wanted:
+            return {}
+        found: Dict[Tuple[str, str, int], Book] = {}
+        for shard_found in self._fan_out("find_books_by_keys", (wanted,)):
+            for key, book in shard_found.items():
+                if key not in found or book.id < found[key].id:
+                    found[key] = book
+        return found
+
+    def add_book(self, book: Book) -> None:
+        """
+        Add a book to its shard.
+        :param book: Book instance to add.
+        :raises ValueError: If the book ID is already in use.
+        """
+        self.add_books([book])
+
+    def add_books(self, books: List[Book]) -> None:
+        """
+        Add several books, writing each affected shard once and in parallel.
+        The whole batch is validated before any shard is written.
+        :param books: Book instances to add.
+        :raises ValueError: If a book ID is already in use.
+        """
+        if not books:
+            return
+        with self._write_lock:
+            self._sync_manifest()
+            existing = self.get_books(book.id for book in books)
+            check_new_ids(existing, books)
+            groups: Dict[int, List[Book]] = {}
+            for book in books:
+                groups.setdefault(self.router.shard_of(book.id), []).append(book)
+            self._grow(max(groups) + 1, max(book.id for book in books))
+            self._write_shards("add_books", groups)
+
+    def delete_book(self, book_id: int) -> bool:
+        """
+        Delete a book from its shard.
+        :param book_id: ID of the book to delete.
+        :return: True if the book was deleted, False otherwise.
+        """
+        with self._write_lock:
+            shard = self._shard(book_id)
+            return shard.delete_book(book_id) if shard is not None else False
+
+    def update_book_status(
+        self, book_id: int, new_status: str, loan: Optional[Loan] = None
+    ) -> bool:
+        """
+        Update the status and loan record of a book in its shard.
+        :param book_id: ID of the book to update.
+        :param new_status: New status to set.
+        :param loan: Loan record of a checked out book (optional).
+        :return: True if the book was updated, False otherwise.
+        """
+        with self._write_lock:
+            shard = self._shard(book_id)
+            if shard is None:
+                return False
+            return shard.update_book_status(book_id, new_status, loan)
+
+    def update_books_status(self, updates: Mapping[int, str]) -> int:
+        """
+        Update the status of several books, writing each affected shard once and in parallel.
+        :param updates: Mapping of book ID to new status.
+        :return: Number of books that were updated.
+        """
+        with self._write_lock:
+            groups: Dict[int, Dict[int, str]] = {}
+            for index, (ids,) in self._group(updates).items():
+                groups[index] = {book_id: updates[book_id] for book_id in ids}
+            if not groups:
+                return 0
+            return sum(self._write_shards("update_books_status", groups))
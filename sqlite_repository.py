@@ -0,0 +1,908 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from book_models import Book, BookStatus, Loan, from_micros, to_micros
+from book_index import book_key
+from book_repository import BookRepositoryInterface
+from exceptions import DuplicateBookError, InvalidBookStatusError
+from file_utils import file_signature, load_books
+from pagination import DEFAULT_PAGE_SIZE, BookPage, check_page_arguments, get_sort_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    borrower TEXT,
+    checked_out_at INTEGER,
+    due_at INTEGER,
+    UNIQUE (title, author, year)
+);
+CREATE INDEX IF NOT EXISTS idx_books_title ON books(title);
+CREATE INDEX IF NOT EXISTS idx_books_author ON books(author);
+CREATE INDEX IF NOT EXISTS idx_books_year ON books(year);
+CREATE INDEX IF NOT EXISTS idx_books_status ON books(status);
+CREATE TABLE IF NOT EXISTS id_sequence (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS books_id_sequence AFTER INSERT ON books BEGIN
+    INSERT INTO id_sequence(name, last_id) VALUES ('books', new.id)
+    ON CONFLICT(name) DO UPDATE SET last_id = MAX(last_id, excluded.last_id);
+END;
+"""
+
+# Databases created before the (title, author, year) key was unique have a plain
+# index on it instead, which is replaced by a unique one.
+UNIQUE_KEY_SCHEMA = """
+DROP INDEX IF EXISTS idx_books_key;
+CREATE UNIQUE INDEX idx_books_key ON books(title, author, year);
+"""
+
+# Loan columns added to databases created before loans were stored; times are
+# microseconds since the epoch, so they sort chronologically.
+LOAN_COLUMNS = {"borrower": "TEXT", "checked_out_at": "INTEGER", "due_at": "INTEGER"}
+LOAN_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_books_due ON books(due_at, id) WHERE due_at IS NOT NULL;
+"""
+
+# Aggregate views: the number of books per value of each expression, kept in
+# book_counts by triggers. Counts that drop to zero stay as rows and are skipped on reads.
+AGGREGATE_EXPRESSIONS = {"status": "status", "author": "author", "decade": "year - year % 10"}
+AGGREGATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS book_counts (
+    view TEXT NOT NULL,
+    value NOT NULL,
+    books INTEGER NOT NULL,
+    PRIMARY KEY (view, value)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS book_counts_insert AFTER INSERT ON books BEGIN
+    INSERT INTO book_counts(view, value, books)
+    VALUES ('status', new.status, 1), ('author', new.author, 1),
+        ('decade', new.year - new.year % 10, 1)
+    ON CONFLICT(view, value) DO UPDATE SET books = books + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS book_counts_delete AFTER DELETE ON books BEGIN
+    UPDATE book_counts SET books = books - 1 WHERE view = 'status' AND value = old.status;
+    UPDATE book_counts SET books = books - 1 WHERE view = 'author' AND value = old.author;
+    UPDATE book_counts SET books = books - 1
+    WHERE view = 'decade' AND value = old.year - old.year % 10;
+END;
+CREATE TRIGGER IF NOT EXISTS book_counts_status AFTER UPDATE OF status ON books
+WHEN old.status IS NOT new.status BEGIN
+    UPDATE book_counts SET books = books - 1 WHERE view = 'status' AND value = old.status;
+    INSERT INTO book_counts(view, value, books) VALUES ('status', new.status, 1)
+    ON CONFLICT(view, value) DO UPDATE SET books = books + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS book_counts_update AFTER UPDATE OF author, year ON books BEGIN
+    UPDATE book_counts SET books = books - 1 WHERE view = 'author' AND value = old.author;
+    UPDATE book_counts SET books = books - 1
+    WHERE view = 'decade' AND value = old.year - old.year % 10;
+    INSERT INTO book_counts(view, value, books)
+    VALUES ('author', new.author, 1), ('decade', new.year - new.year % 10, 1)
+    ON CONFLICT(view, value) DO UPDATE SET books = books + 1;
+END;
+"""
+REBUILD_AGGREGATES = "DELETE FROM book_counts;\n" + "".join(
+    f"INSERT INTO book_counts(view, value, books) "
+    f"SELECT '{view}', {expression}, COUNT(*) FROM books GROUP BY 2;\n"
+    for view, expression in AGGREGATE_EXPRESSIONS.items()
+)
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+    title, author, content='books', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+    INSERT INTO books_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+END;
+CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+    INSERT INTO books_fts(books_fts, rowid, title, author)
+    VALUES ('delete', old.id, old.title, old.author);
+END;
+CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN
+    INSERT INTO books_fts(books_fts, rowid, title, author)
+    VALUES ('delete', old.id, old.title, old.author);
+    INSERT INTO books_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+END;
+"""
+
+BOOK_COLUMNS = "id, title, author, year, status, borrower, checked_out_at, due_at"
+BOOK_PLACEHOLDERS = ", ".join("?" * len(BOOK_COLUMNS.split(", ")))
+ORDER_COLUMNS = {
+    "id": ["id"],
+    "year": ["year", "id"],
+    "title": ["py_lower(title)", "id"],
+}
+FETCH_SIZE = 1000
+# Host parameters per IN (...) list; older SQLite builds allow at most 999.
+IN_BATCH_SIZE = 500
+# Number of (title, author, year) keys looked up per query, three parameters each.
+KEY_BATCH_SIZE = 300
+
+
+def _contains_ci(text: str, needle: str) -> bool:
+    """
+    SQL function implementing the same case-insensitive substring match as the JSON repository.
+    :param text: Column value.
+    :param needle: Lower-cased search string.
+    :return: True if the needle occurs in the lower-cased text.
+    """
+    return needle in text.lower()
+
+
+def _row_to_book(row: Sequence) -> Book:
+    """
+    Create a book instance from a database row.
+    :param row: Row with the columns of BOOK_COLUMNS.
+    :return: A Book instance.
+    """
+    loan = None
+    if row[5] is not None:
+        loan = Loan(row[5], from_micros(row[6]), from_micros(row[7]))
+    return Book(row[0], row[1], row[2], row[3], row[4], loan)
+
+
+def _loan_values(loan: Optional[Loan]) -> Tuple[Any, Any, Any]:
+    """
+    Get the loan columns of a book.
+    :param loan: Loan record, or None.
+    :return: Values for borrower, checked_out_at and due_at.
+    """
+    if loan is None:
+        return None, None, None
+    return loan.borrower, to_micros(loan.checked_out_at), to_micros(loan.due_at)
+
+
+def _run_locked(conn: sqlite3.Connection, script: str) -> None:
+    """
+    Run SQL statements in one transaction that holds the database write lock throughout.
+    :param conn: Connection to use.
+    :param script: Statements separated by semicolons.
+    """
+    try:
+        conn.executescript(f"BEGIN IMMEDIATE;\n{script}COMMIT;")
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def _is_duplicate_key(error: sqlite3.IntegrityError) -> bool:
+    """
+    Tell whether an insert failed on the unique (title, author, year) key rather than the ID.
+    :param error: Error raised by the insert.
+    :return: True for a duplicate key.
+    """
+    return "books.title" in str(error)
+
+
+def _book_to_row(book: Book) -> Tuple[Any, ...]:
+    """
+    Get the values of a book in the order of BOOK_COLUMNS.
+    :param book: Book to store.
+    :return: Row tuple.
+    """
+    values = (book.id, book.title, book.author, book.year, book.status.value)
+    return values + _loan_values(book.loan)
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of SQLite connections shared between threads.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, timeout: float = 30.0):
+        """
+        Initialize the pool.
+        :param db_path: Path to the SQLite database file.
+        :param size: Maximum number of open connections.
+        :param timeout: Seconds to wait for a database lock before failing.
+        """
+        self.db_path = db_path
+        self.timeout = timeout
+        self._size = size
+        self._created = 0
+        self._lock = threading.Lock()
+        self._idle: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open and configure a new connection.
+        :return: SQLite connection in WAL mode.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.create_function("contains_ci", 2, _contains_ci, deterministic=True)
+        conn.create_function("py_lower", 1, str.lower, deterministic=True)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a connection from the pool.
+        :return: Context manager yielding a connection.
+        """
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self._size
+                if create:
+                    self._created += 1
+            conn = self._connect() if create else self._idle.get(timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        """
+        Close all idle connections.
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+
+class SqliteBookRepository(BookRepositoryInterface):
+    """
+    Implementation of the BookRepositoryInterface backed by SQLite.
+    Title and author searches are narrowed with an FTS5 trigram index when available.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = 4):
+        """
+        Initialize the repository and create the schema if needed.
+        :param db_path: Path to the SQLite database file.
+        :param pool_size: Number of pooled connections.
+        """
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, pool_size)
+        # Connection of the transaction() open in the current thread, if any.
+        self._local = threading.local()
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+            self._migrate_unique_key(conn)
+            self._migrate_loans(conn)
+            self._migrate_aggregates(conn)
+            try:
+                conn.executescript(FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError:
+                self.has_fts = False
+
+    @staticmethod
+    def _migrate_unique_key(conn: sqlite3.Connection) -> None:
+        """
+        Make the (title, author, year) key of a database created without the
+        constraint unique. Databases that already hold duplicate books keep the
+        plain index.
+        :param conn: Connection to use.
+        """
+        unique = conn.execute(
+            "SELECT 1 FROM pragma_index_list('books') WHERE \"unique\""
+        ).fetchone()
+        if unique is None:
+            try:
+                _run_locked(conn, UNIQUE_KEY_SCHEMA)
+            except sqlite3.IntegrityError:
+                pass
+
+    @staticmethod
+    def _migrate_loans(conn: sqlite3.Connection) -> None:
+        """
+        Add the loan columns and their index to a database created without them.
+        :param conn: Connection to use.
+        """
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(books)")}
+        with conn:
+            for column, kind in LOAN_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE books ADD COLUMN {column} {kind}")
+        conn.executescript(LOAN_SCHEMA)
+
+    @staticmethod
+    def _migrate_aggregates(conn: sqlite3.Connection) -> None:
+        """
+        Create the aggregate views of a database created without them, and fill
+        them from the books in the same transaction.
+        :param conn: Connection to use.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_counts'"
+        ).fetchone()
+        if exists is None:
+            _run_locked(conn, AGGREGATE_SCHEMA + REBUILD_AGGREGATES)
+
+    def close(self) -> None:
+        """
+        Close the pooled connections.
+        """
+        self.pool.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Run a group of operations in one SQLite transaction that takes the
+        database write lock up front (BEGIN IMMEDIATE), so that a duplicate check
+        and the insert after it cannot interleave with other connections or
+        processes. Repository calls made by the same thread inside it use the
+        transaction's connection; a nested call joins the open transaction.
+        :return: Context manager.
+        """
+        if getattr(self._local, "conn", None) is not None:
+            yield
+            return
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._local.conn = conn
+            try:
+                yield
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+            finally:
+                self._local.conn = None
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Get the connection of the open transaction, or borrow one from the pool.
+        :return: Context manager yielding a connection.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+        with self.pool.connection() as conn:
+            yield conn
+
+    @contextmanager
+    def _writing(self) -> Iterator[sqlite3.Connection]:
+        """
+        Get a connection for a write that is applied completely or not at all.
+        Outside a transaction the write commits on its own; inside one it runs in
+        a savepoint and commits with the transaction.
+        :return: Context manager yielding a connection.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self.pool.connection() as conn, conn:
+                yield conn
+            return
+        conn.execute("SAVEPOINT write")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK TO write")
+            raise
+        finally:
+            conn.execute("RELEASE write")
+
+    def data_signature(self) -> Any:
+        """
+        Get the signatures of the database file and its write-ahead log.
+        Every commit appends to the log and every checkpoint rewrites the
+        database, so a write by any connection or process changes one of them.
+        :return: Tuple of both file signatures.
+        """
+        return file_signature(self.db_path), file_signature(f"{self.db_path}-wal")
+
+    def get_all_books(self) -> List[Book]:
+        """
+        Retrieve all books ordered by ID.
+        :return: List of books.
+        """
+        with self._connection() as conn:
+            rows = conn.execute(f"SELECT {BOOK_COLUMNS} FROM books ORDER BY id").fetchall()
+        return [_row_to_book(row) for row in rows]
+
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """
+        Retrieve a single book by its ID.
+        :param book_id: ID of the book.
+        :return: The book, or None if it does not exist.
+        """
+        with self._connection() as conn:
+            row = conn.execute(
+                f"SELECT {BOOK_COLUMNS} FROM books WHERE id = ?", (book_id,)
+            ).fetchone()
+        return _row_to_book(row) if row else None
+
+    def get_books(self, book_ids: Iterable[int]) -> Dict[int, Book]:
+        """
+        Retrieve several books by ID at once, in chunks of IN_BATCH_SIZE IDs.
+        :param book_ids: IDs of the books.
+        :return: Mapping of ID to book for the books that exist.
+        """
+        ids = list(set(book_ids))
+        books = {}
+        with self._connection() as conn:
+            for start in range(0, len(ids), IN_BATCH_SIZE):
+                chunk = ids[start:start + IN_BATCH_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                for row in conn.execute(
+                    f"SELECT {BOOK_COLUMNS} FROM books WHERE id IN ({placeholders})", chunk
+                ):
+                    books[row[0]] = _row_to_book(row)
+        return books
+
+    def count_books(self) -> int:
+        """
+        Count the books in the repository.
+        :return: Number of books.
+        """
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+    def next_book_id(self) -> int:
+        """
+        Get the ID to assign to the next new book.
+        The highest ID ever inserted is stored in the id_sequence table, so IDs
+        of deleted books are not reused.
+        :return: Next ID in the sequence.
+        """
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT MAX(COALESCE((SELECT last_id FROM id_sequence WHERE name = 'books'), 0),"
+                " COALESCE((SELECT MAX(id) FROM books), 0))"
+            ).fetchone()
+        return row[0] + 1
+
+    def find_book_by_key(self, title: str, author: str, year: int) -> Optional[Book]:
+        """
+        Find a book with the same title, author and year.
+        :param title: Title of the book.
+        :param author: Author of the book.
+        :param year: Year of publication.
+        :return: The existing book, or None if there is none.
+        """
+        with self._connection() as conn:
+            row = conn.execute(
+                f"SELECT {BOOK_COLUMNS} FROM books WHERE title = ? AND author = ? AND year = ?",
+                book_key(title, author, year),
+            ).fetchone()
+        return _row_to_book(row) if row else None
+
+    def find_books_by_keys(
+        self, keys: Iterable[Tuple[str, str, int]]
+    ) -> Dict[Tuple[str, str, int], Book]:
+        """
+        Find the existing books for several (title, author, year) keys at once.
+        Each query joins KEY_BATCH_SIZE keys against the key index.
+        :param keys: Keys of the books as (title, author, year).
+        :return: Mapping of the normalized key to the existing book, for the keys that have one.
+        """
+        wanted = list({book_key(*key) for key in keys})
+        found: Dict[Tuple[str, str, int], Book] = {}
+        with self._connection() as conn:
+            for start in range(0, len(wanted), KEY_BATCH_SIZE):
+                chunk = wanted[start:start + KEY_BATCH_SIZE]
+                values = ", ".join(["(?, ?, ?)"] * len(chunk))
+                params = [value for key in chunk for value in key]
+                for row in conn.execute(
+                    f"SELECT {BOOK_COLUMNS} FROM (VALUES {values}) AS k JOIN books"
+                    " ON title = k.column1 AND author = k.column2 AND year = k.column3"
+                    " ORDER BY id",
+                    params,
+                ):
+                    found.setdefault((row[1], row[2], row[3]), _row_to_book(row))
+        return found
+
+    def add_book(self, book: Book) -> None:
+        """
+        Add a new book to the repository.
+        :param book: Book instance to add.
+        :raises DuplicateBookError: If a book with the same title, author and year already exists.
+        :raises ValueError: If a book with the same ID already exists.
+        """
+        try:
+            with self._writing() as conn:
+                conn.execute(
+                    f"INSERT INTO books ({BOOK_COLUMNS}) VALUES ({BOOK_PLACEHOLDERS})",
+                    _book_to_row(book),
+                )
+        except sqlite3.IntegrityError as e:
+            if _is_duplicate_key(e):
+                raise DuplicateBookError(book.title, book.author, book.year)
+            raise ValueError(f"Book with ID {book.id} already exists.")
+
+    def delete_book(self, book_id: int) -> bool:
+        """
+        Delete a book by its ID.
+        :param book_id: ID of the book to delete.
+        :return: True if the book was deleted, False otherwise.
+        """
+        with self._writing() as conn:
+            cursor = conn.execute("DELETE FROM books WHERE id = ?", (book_id,))
+        return cursor.rowcount > 0
+
+    def _fts_clause(self, column: str, text: str, params: List) -> Optional[str]:
+        """
+        Build an FTS5 pre-filter for a substring search.
+        The trigram index only narrows candidates; contains_ci still decides the match.
+        Queries shorter than three characters or containing non-ASCII characters
+        are not pre-filtered because FTS case folding may differ from str.lower().
+        :param column: Column to search ("title" or "author").
+        :param text: Search string.
+        :param params: Query parameters to extend.
+        :return: SQL condition, or None if the index cannot be used.
+        """
+        if not self.has_fts or len(text) < 3 or not text.isascii():
+            return None
+        phrase = text.replace('"', '""')
+        params.append(f'{column} : "{phrase}"')
+        return "id IN (SELECT rowid FROM books_fts WHERE books_fts MATCH ?)"
+
+    def _search_where(
+        self, title: Optional[str], author: Optional[str], year: Optional[int]
+    ) -> Tuple[str, List]:
+        """
+        Build the WHERE clause for search criteria.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :return: Tuple of (WHERE clause, query parameters).
+        """
+        conditions: List[str] = []
+        params: List = []
+        for column, text in (("title", title), ("author", author)):
+            if not text:
+                continue
+            fts = self._fts_clause(column, text, params)
+            if fts:
+                conditions.append(fts)
+            conditions.append(f"contains_ci({column}, ?)")
+            params.append(text.lower())
+        if year:
+            conditions.append("year = ?")
+            params.append(year)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, params
+
+    def _iter_query(self, sql: str, params: Sequence = ()) -> Iterator[Book]:
+        """
+        Stream the books returned by a query in batches.
+        :param sql: Query selecting BOOK_COLUMNS.
+        :param params: Query parameters.
+        :return: Iterator over books.
+        """
+        with self._connection() as conn:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _row_to_book(row)
+
+    def iter_books(self) -> Iterator[Book]:
+        """
+        Stream all books ordered by ID.
+        :return: Iterator over books.
+        """
+        return self._iter_query(f"SELECT {BOOK_COLUMNS} FROM books ORDER BY id")
+
+    def _aggregate(self, view: str) -> Dict[Any, int]:
+        """
+        Read an aggregate view.
+        :param view: Name of the view (see AGGREGATE_EXPRESSIONS).
+        :return: Mapping of value to count, for values with books, ordered by value.
+        """
+        with self._connection() as conn:
+            return dict(
+                conn.execute(
+                    "SELECT value, books FROM book_counts "
+                    "WHERE view = ? AND books > 0 ORDER BY value",
+                    (view,),
+                )
+            )
+
+    def count_by_status(self) -> Dict[str, int]:
+        """
+        Count the books per status from the aggregate views.
+        :return: Mapping of status value to count, including statuses without books.
+        """
+        counts = dict.fromkeys((status.value for status in BookStatus), 0)
+        counts.update(self._aggregate("status"))
+        return counts
+
+    def count_by_author(self) -> Dict[str, int]:
+        """
+        Count the books per author from the aggregate views.
+        :return: Mapping of author to count, for authors with books.
+        """
+        return self._aggregate("author")
+
+    def count_by_decade(self) -> Dict[int, int]:
+        """
+        Count the books per decade of publication from the aggregate views.
+        :return: Mapping of the first year of a decade to count, ordered by decade.
+        """
+        return self._aggregate("decade")
+
+    def rebuild_aggregates(self) -> None:
+        """
+        Recount the aggregate views from the books in one transaction.
+        """
+        with self.transaction(), self._writing() as conn:
+            for statement in REBUILD_AGGREGATES.splitlines():
+                conn.execute(statement)
+
+    def verify_aggregates(self) -> List[str]:
+        """
+        Check the aggregate views against GROUP BY queries over the books, all
+        read in one transaction, or in the open one.
+        :return: Names of the views whose counts differ; empty if all of them match.
+        """
+        differing = []
+        with self._connection() as conn:
+            nested = conn.in_transaction
+            if not nested:
+                conn.execute("BEGIN")
+            try:
+                for view, expression in AGGREGATE_EXPRESSIONS.items():
+                    kept = conn.execute(
+                        "SELECT value, books FROM book_counts WHERE view = ? AND books != 0",
+                        (view,),
+                    )
+                    scanned = conn.execute(
+                        f"SELECT {expression}, COUNT(*) FROM books GROUP BY 1"
+                    )
+                    if dict(kept) != dict(scanned):
+                        differing.append(view)
+            finally:
+                if not nested:
+                    conn.rollback()
+        return differing
+
+    def iter_books_by_status(self, status: str) -> Iterator[Book]:
+        """
+        Stream the books with a status, ordered by ID.
+        :param status: Status value ("available" or "checked_out").
+        :return: Iterator over books.
+        """
+        return self._iter_query(
+            f"SELECT {BOOK_COLUMNS} FROM books WHERE status = ? ORDER BY id", (status,)
+        )
+
+    def iter_books_by_year_range(
+        self, start_year: Optional[int] = None, end_year: Optional[int] = None
+    ) -> Iterator[Book]:
+        """
+        Stream the books published in a range of years, walking the year index.
+        :param start_year: First year, inclusive (optional).
+        :param end_year: Last year, inclusive (optional).
+        :return: Iterator over books, ordered by year, then by ID.
+        """
+        conditions = []
+        params = []
+        if start_year is not None:
+            conditions.append("year >= ?")
+            params.append(start_year)
+        if end_year is not None:
+            conditions.append("year <= ?")
+            params.append(end_year)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._iter_query(
+            f"SELECT {BOOK_COLUMNS} FROM books {where} ORDER BY year, id", params
+        )
+
+    def iter_books_due(
+        self,
+        after: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Book]:
+        """
+        Stream the checked-out books whose loans are due in a period, walking the due date index.
+        :param after: Start of the period, exclusive (optional).
+        :param until: End of the period, inclusive (optional), e.g. now for overdue loans.
+        :param limit: Maximum number of books (optional).
+        :return: Iterator over books, ordered by due date, then by ID.
+        """
+        conditions = ["due_at IS NOT NULL"]
+        params: List[Any] = []
+        if after is not None:
+            conditions.append("due_at > ?")
+            params.append(to_micros(after))
+        if until is not None:
+            conditions.append("due_at <= ?")
+            params.append(to_micros(until))
+        params.append(-1 if limit is None else limit)
+        return self._iter_query(
+            f"SELECT {BOOK_COLUMNS} FROM books WHERE {' AND '.join(conditions)}"
+            " ORDER BY due_at, id LIMIT ?",
+            params,
+        )
+
+    def search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> List[Book]:
+        """
+        Search for books by title, author, or year.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :return: List of books matching the criteria, ordered by ID.
+        """
+        where, params = self._search_where(title, author, year)
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT {BOOK_COLUMNS} FROM books {where} ORDER BY id", params
+            ).fetchall()
+        return [_row_to_book(row) for row in rows]
+
+    def iter_search_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> Iterator[Book]:
+        """
+        Stream books matching the search criteria, ordered by ID.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :return: Iterator over matching books.
+        """
+        where, params = self._search_where(title, author, year)
+        return self._iter_query(f"SELECT {BOOK_COLUMNS} FROM books {where} ORDER BY id", params)
+
+    def page_books(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[int] = None,
+        order_by: str = "id",
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0,
+        after: Optional[Sequence] = None,
+    ) -> BookPage:
+        """
+        Get one page of books matching the search criteria in sort order.
+        The cursor becomes a row-value comparison and the page a LIMIT, so SQLite
+        can walk the id and year indexes instead of sorting every match.
+        :param title: Title to search for (optional).
+        :param author: Author to search for (optional).
+        :param year: Year to search for (optional).
+        :param order_by: Field to sort by ("id", "year" or "title").
+        :param limit: Maximum number of books on the page.
+        :param offset: Number of books to skip after the cursor.
+        :param after: Cursor returned with the previous page (optional).
+        :return: The requested page.
+        :raises ValueError: If the paging arguments are invalid.
+        """
+        key = get_sort_key(order_by)
+        check_page_arguments(limit, offset)
+        columns = ORDER_COLUMNS[order_by]
+        where, params = self._search_where(title, author, year)
+        if after is not None:
+            cursor = list(after)
+            if len(cursor) != len(columns):
+                raise ValueError(f"Invalid cursor for sort order '{order_by}'.")
+            condition = f"({', '.join(columns)}) > ({', '.join('?' * len(columns))})"
+            where = f"{where} AND {condition}" if where else f"WHERE {condition}"
+            params.extend(cursor)
+        params.extend([limit + 1, offset])
+
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT {BOOK_COLUMNS} FROM books {where} "
+                f"ORDER BY {', '.join(columns)} LIMIT ? OFFSET ?",
+                params,
+            ).fetchall()
+        books = [_row_to_book(row) for row in rows[:limit]]
+        next_cursor = key(books[-1]) if len(rows) > limit else None
+        return BookPage(books, next_cursor)
+
+    def update_book_status(
+        self, book_id: int, new_status: str, loan: Optional[Loan] = None
+    ) -> bool:
+        """
+        Update the status of a book by its ID.
+        :param book_id: ID of the book to update.
+        :param new_status: New status to set.
+        :param loan: Loan record to store with the status, replacing the current one (optional).
+        :return: True if the book was updated, False otherwise.
+        :raises InvalidBookStatusError: If the status is invalid.
+        :raises ValueError: If a loan is given for a status other than checked out.
+        """
+        try:
+            status = BookStatus(new_status.lower())
+        except ValueError:
+            raise InvalidBookStatusError(new_status)
+        if loan is not None and status is not BookStatus.CHECKED_OUT:
+            raise ValueError("Only checked out books can have a loan.")
+        with self._writing() as conn:
+            cursor = conn.execute(
+                "UPDATE books SET status = ?, borrower = ?, checked_out_at = ?, due_at = ?"
+                " WHERE id = ?",
+                (status.value, *_loan_values(loan), book_id),
+            )
+        return cursor.rowcount > 0
+
+    def add_books(self, books: List[Book]) -> None:
+        """
+        Add several books in a single transaction.
+        :param books: Book instances to add.
+        :raises DuplicateBookError: If a book has the same title, author and year as
+            an existing book or an earlier book in the list.
+        :raises ValueError: If a book ID is already in use.
+        """
+        try:
+            with self._writing() as conn:
+                conn.executemany(
+                    f"INSERT INTO books ({BOOK_COLUMNS}) VALUES ({BOOK_PLACEHOLDERS})",
+                    (_book_to_row(book) for book in books),
+                )
+        except sqlite3.IntegrityError as e:
+            duplicate = self._find_duplicate(books) if _is_duplicate_key(e) else None
+            if duplicate is not None:
+                raise DuplicateBookError(duplicate.title, duplicate.author, duplicate.year)
+            raise ValueError(f"Cannot add books: {e}")
+
+    def _find_duplicate(self, books: List[Book]) -> Optional[Book]:
+        """
+        Find the first book of a batch whose key is taken, by a stored book or an
+        earlier book of the batch.
+        :param books: Books of the batch.
+        :return: The duplicate book, or None if there is none.
+        """
+        seen = set(self.find_books_by_keys((book.title, book.author, book.year) for book in books))
+        for book in books:
+            key = book_key(book.title, book.author, book.year)
+            if key in seen:
+                return book
+            seen.add(key)
+        return None
+
+    def update_books_status(self, updates: Mapping[int, str]) -> int:
+        """
+        Update the status of several books in a single transaction.
+        Statuses are set without loan records.
+        :param updates: Mapping of book ID to new status.
+        :return: Number of books that were updated.
+        :raises InvalidBookStatusError: If a status is invalid.
+        """
+        rows = []
+        for book_id, new_status in updates.items():
+            try:
+                rows.append((BookStatus(new_status.lower()).value, book_id))
+            except ValueError:
+                raise InvalidBookStatusError(new_status)
+        with self._writing() as conn:
+            cursor = conn.executemany(
+                "UPDATE books SET status = ?, borrower = NULL, checked_out_at = NULL,"
+                " due_at = NULL WHERE id = ?",
+                rows,
+            )
+        return cursor.rowcount
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        Import all books from a JSON file written by file_utils.save_books.
+        The import runs in a single transaction.
+        :param json_path: Path to the JSON file.
+        :return: Number of imported books.
+        :raises ValueError: If a book with the same ID already exists.
+        """
+        books = load_books(json_path)
+        self.add_books(books)
+        return len(books)
@@ -0,0 +1,35 @@
+from typing import Callable, List
+
+import pytest
+
+from book_models import Book
+
+
+def _make_books(count: int, start: int = 1) -> List[Book]:
+    """
+    Create distinct books with consecutive IDs.
+    :param count: Number of books.
+    :param start: ID of the first book.
+    :return: List of books.
+    """
+    return [
+        Book(book_id, f"Title {book_id}", f"Author {book_id % 7}", 1900 + book_id % 120)
+        for book_id in range(start, start + count)
+    ]
+
+
+@pytest.fixture
+def make_books() -> Callable[..., List[Book]]:
+    """
+    Factory for catalogs of distinct books.
+    """
+    return _make_books
+
+
+@pytest.fixture
+def catalog_path(tmp_path) -> str:
+    """
+    Path of a catalog file that does not exist yet.
+    """
+    return str(tmp_path / "data.json")
+
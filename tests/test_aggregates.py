@@ -0,0 +1,147 @@
+from collections import Counter
+
+import pytest
+
+from book_index import decade_of
+from book_models import Book
+from book_repository import CachedBookRepository
+from book_service import BookService
+from repository_factory import BACKENDS, create_repository
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def repository(backend, tmp_path, make_books):
+    repository = create_repository(backend, str(tmp_path / "catalog"))
+    repository.add_books(make_books(40))
+    repository.add_book(Book(41, "Dune", "Frank Herbert", 1965))
+    repository.delete_book(3)
+    repository.delete_book(10)
+    repository.update_book_status(5, "checked_out")
+    repository.update_books_status({6: "checked_out", 7: "checked_out", 99: "checked_out"})
+    repository.update_book_status(7, "available")
+    return repository
+
+
+def _scan(repository):
+    books = repository.get_all_books()
+    return {
+        "status": dict(Counter(book.status.value for book in books)),
+        "author": dict(Counter(book.author for book in books)),
+        "decade": dict(sorted(Counter(decade_of(book.year) for book in books).items())),
+    }
+
+
+def _views(repository):
+    return {
+        "status": repository.count_by_status(),
+        "author": repository.count_by_author(),
+        "decade": repository.count_by_decade(),
+    }
+
+
+def test_views_match_a_scan(repository):
+    assert _views(repository) == _scan(repository)
+    assert list(repository.count_by_decade()) == sorted(repository.count_by_decade())
+    assert repository.verify_aggregates() == []
+
+
+def test_views_drop_emptied_values(repository):
+    repository.delete_book(41)
+    views = _views(repository)
+
+    assert "Frank Herbert" not in views["author"]
+    assert 1960 not in views["decade"]
+    for book in repository.get_all_books():
+        repository.update_book_status(book.id, "checked_out")
+    assert repository.count_by_status() == {"available": 0, "checked_out": 38}
+
+
+def test_views_survive_a_reopen(repository, backend, tmp_path):
+    expected = _views(repository)
+    if hasattr(repository, "close"):
+        repository.close()
+
+    reopened = create_repository(backend, str(tmp_path / "catalog"))
+
+    assert _views(reopened) == expected
+    assert reopened.verify_aggregates() == []
+
+
+@pytest.mark.parametrize("backend", ["cached", "compact", "journal", "sharded", "sqlite"])
+def test_rebuild_repairs_damaged_views(tmp_path, make_books, backend):
+    repository = create_repository(backend, str(tmp_path / "catalog"))
+    repository.add_books(make_books(20))
+    expected = _views(repository)
+    stored = repository._shards[0] if backend == "sharded" else repository
+    if backend == "sqlite":
+        with stored.pool.connection() as conn:
+            conn.execute("UPDATE book_counts SET books = books + 5 WHERE view = 'author'")
+            conn.commit()
+        damaged = ["author"]
+    else:
+        stored.aggregate_index.add(Book(999, "Ghost", "Nobody", 1500))
+        damaged = ["author", "decade"]
+
+    assert repository.verify_aggregates() == damaged
+    repository.rebuild_aggregates()
+
+    assert repository.verify_aggregates() == []
+    assert _views(repository) == expected
+
+
+def test_cached_views_do_not_scan_the_catalog(catalog_path, make_books, monkeypatch):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(20))
+
+    def scan():
+        raise AssertionError("the catalog was scanned")
+
+    monkeypatch.setattr(repository, "iter_books", scan)
+    monkeypatch.setattr(repository, "get_all_books", scan)
+
+    assert sum(repository.count_by_author().values()) == 20
+    assert sum(repository.count_by_decade().values()) == 20
+    assert repository.count_by_status()["available"] == 20
+
+
+def test_sqlite_views_are_created_for_existing_databases(tmp_path, make_books):
+    path = str(tmp_path / "catalog")
+    repository = create_repository("sqlite", path)
+    repository.add_books(make_books(20))
+    expected = _views(repository)
+    with repository.pool.connection() as conn:
+        triggers = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'book_counts%'"
+        ).fetchall()
+        for (name,) in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.execute("DROP TABLE book_counts")
+        conn.commit()
+    repository.close()
+
+    reopened = create_repository("sqlite", path)
+
+    assert _views(reopened) == expected
+    reopened.add_book(Book(21, "Dune", "Frank Herbert", 1965))
+    assert reopened.count_by_author()["Frank Herbert"] == 1
+    assert reopened.verify_aggregates() == []
+
+
+def test_catalog_report(repository):
+    service = BookService(repository)
+    report = service.catalog_report(top_authors=2)
+
+    assert report["books"] == repository.count_books() == 39
+    assert report["status"] == {"available": 37, "checked_out": 2}
+    scanned = _scan(repository)
+    ranked = sorted(scanned["author"].items(), key=lambda item: (-item[1], item[0]))
+    assert list(report["authors"].items()) == ranked[:2]
+    assert report["decades"] == scanned["decade"]
+    assert service.count_books_by_author() == dict(ranked)
+    with pytest.raises(ValueError):
+        service.catalog_report(top_authors=0)
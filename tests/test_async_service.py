@@ -0,0 +1,121 @@
+import asyncio
+import json
+from http import HTTPStatus
+
+import pytest
+
+from api_server import BookApiServer
+from async_service import AsyncBookService, SnapshotBookRepository
+from book_models import Book
+from book_repository import BookRepository, CachedBookRepository
+from exceptions import BookAlreadyCheckedOutError, ReadOnlySnapshotError
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture(params=[CachedBookRepository, BookRepository])
+def repository(request, catalog_path, make_books):
+    repository = request.param(catalog_path)
+    repository.add_books(make_books(30))
+    return repository
+
+
+def test_snapshot_rejects_writes(make_books):
+    snapshot = SnapshotBookRepository(make_books(2))
+    with pytest.raises(ReadOnlySnapshotError):
+        snapshot.add_book(Book(3, "New", "Author", 2000))
+    with pytest.raises(ReadOnlySnapshotError):
+        snapshot.delete_book(1)
+    with pytest.raises(ReadOnlySnapshotError):
+        snapshot.update_book_status(1, "checked_out")
+
+
+def test_snapshot_pages_a_version_from_the_cursor(catalog_path, make_books):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(100))
+    repository.delete_book(50)
+    snapshot = SnapshotBookRepository(repository.snapshot(), repository)
+
+    page = snapshot.page_books(limit=10, after=(45,), offset=2)
+    assert [book.id for book in page] == [48, 49, 51, 52, 53, 54, 55, 56, 57, 58]
+    assert page.next_cursor == (58,)
+    assert snapshot.page_books(limit=10, after=(95,)).next_cursor is None
+    assert [book.id for book in snapshot.page_books(limit=3, offset=98)] == [100]
+
+
+def test_snapshot_uses_the_repository_indexes(catalog_path, make_books, monkeypatch):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(30))
+    snapshot = SnapshotBookRepository(repository.snapshot(), repository)
+    monkeypatch.setattr(snapshot, "iter_books", None)
+
+    assert [book.id for book in snapshot.search_books(title="title 2")] == [2] + list(
+        range(20, 30)
+    )
+    page = snapshot.page_books(title="title 2", order_by="title", limit=3)
+    assert [book.id for book in page] == [2, 20, 21]
+    assert snapshot.count_by_status()["available"] == 30
+    assert [book.id for book in snapshot.iter_books_by_year_range(1905, 1906)] == [5, 6]
+
+
+def test_service_reads_and_writes(repository):
+    async def scenario():
+        async with AsyncBookService(repository) as service:
+            book = await service.add_book("Dune", "Frank Herbert", 1965)
+            assert (await service.get_book(book.id)).title == "Dune"
+            await service.update_book_status(book.id, "checked_out")
+            with pytest.raises(BookAlreadyCheckedOutError):
+                await service.update_book_status(book.id, "checked_out")
+            page = await service.search_books_page(title="dune")
+            assert [found.status.value for found in page] == ["checked_out"]
+            await service.delete_book(1)
+            first = await service.list_books_page(limit=2)
+            assert [found.id for found in first] == [2, 3]
+
+    run(scenario())
+
+
+def test_concurrent_status_changes_are_batched(catalog_path, make_books, monkeypatch):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(40))
+    saves = []
+    original = repository._persist_status_many
+
+    def counting_persist(books):
+        saves.append(len(books))
+        original(books)
+
+    monkeypatch.setattr(repository, "_persist_status_many", counting_persist)
+
+    async def scenario():
+        async with AsyncBookService(repository) as service:
+            await asyncio.gather(
+                *(service.update_book_status(book_id, "checked_out") for book_id in range(1, 41))
+            )
+
+    run(scenario())
+    assert sum(saves) == 40 and len(saves) < 40
+    assert repository.count_by_status()["checked_out"] == 40
+
+
+def test_api_routes(catalog_path):
+    async def scenario():
+        async with AsyncBookService(CachedBookRepository(catalog_path)) as service:
+            api = BookApiServer(service)
+            body = json.dumps({"title": "Dune", "author": "Frank Herbert", "year": 1965})
+            status, book = await api._dispatch("POST", "/books", body.encode())
+            assert status == HTTPStatus.CREATED and book["id"] == 1
+
+            status, page = await api._dispatch("GET", "/books/search?title=dune&limit=5", b"")
+            assert status == HTTPStatus.OK and [found["id"] for found in page["books"]] == [1]
+
+            status, _ = await api._dispatch("PUT", "/books/1/status", b'{"status": "oops"}')
+            assert status == HTTPStatus.BAD_REQUEST
+            status, _ = await api._dispatch("GET", "/books/7", b"")
+            assert status == HTTPStatus.NOT_FOUND
+            status, _ = await api._dispatch("DELETE", "/books/1", b"")
+            assert status == HTTPStatus.NO_CONTENT
+
+    run(scenario())
@@ -0,0 +1,265 @@
+import json
+import os
+import zlib
+from datetime import timedelta
+
+import pytest
+
+import backup
+from backup import BackupManifest, BackupStore, ChunkRef
+from book_models import Book, BookStatus
+from book_repository import CachedBookRepository
+from change_feed import PublishingBookRepository
+from exceptions import BackupCorruptedError, BackupNotFoundError
+from repository_factory import BACKENDS, create_repository
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BackupStore(str(tmp_path / "backups"), chunk_size=10)
+
+
+@pytest.fixture
+def primary(catalog_path, make_books):
+    repository = PublishingBookRepository(CachedBookRepository(catalog_path))
+    repository.add_books(make_books(50))
+    return repository
+
+
+def _full_reads(monkeypatch, repository):
+    """
+    Count the full catalog reads of a repository.
+    """
+    reads = []
+    get_all_books = repository.get_all_books
+
+    def counting():
+        reads.append(1)
+        return get_all_books()
+
+    monkeypatch.setattr(repository, "get_all_books", counting)
+    return reads
+
+
+def _restored(store, tmp_path, name=None):
+    repository = CachedBookRepository(str(tmp_path / f"restored-{name}.json"))
+    store.restore(repository, name)
+    return {book.id: book.to_dict() for book in repository.get_all_books()}
+
+
+def test_backups_write_only_new_chunks(store, primary):
+    first = store.backup(primary)
+    assert first.count == 50
+    assert first.written == len(first.chunks) == 6
+    assert [chunk.index for chunk in first.chunks] == [0, 1, 2, 3, 4, 5]
+
+    assert store.backup(primary).written == 0
+
+    primary.update_book_status(23, "checked_out")
+    third = store.backup(primary)
+    assert third.written == 1
+    assert len(store.names()) == 3
+    assert set(third.chunks) - set(first.chunks) == {third.chunks[2]}
+
+
+def test_incremental_backup_reads_only_changed_chunks(
+    store, primary, tmp_path, monkeypatch, make_books
+):
+    store.backup(primary)
+    primary.update_book_status(23, "checked_out")
+    primary.delete_book(41)
+    primary.add_book(make_books(1, start=75)[0])
+    reads = _full_reads(monkeypatch, primary.repository)
+
+    manifest = store.backup(primary)
+
+    assert reads == []
+    assert manifest.sequence == primary.feed.last_sequence
+    expected = {book.id: book.to_dict() for book in primary.get_all_books()}
+    assert _restored(store, tmp_path, manifest.name) == expected
+
+
+def test_writes_that_bypass_the_feed_force_a_full_read(
+    store, primary, catalog_path, tmp_path, monkeypatch
+):
+    store.backup(primary)
+    primary.update_book_status(12, "checked_out")
+    # Written without publishing, e.g. by a script using the plain repository.
+    CachedBookRepository(catalog_path).update_book_status(3, "checked_out")
+    reads = _full_reads(monkeypatch, primary.repository)
+
+    manifest = store.backup(primary)
+
+    assert reads == [1]
+    restored = _restored(store, tmp_path, manifest.name)
+    assert restored[3]["status"] == BookStatus.CHECKED_OUT.value
+    assert restored[12]["status"] == BookStatus.CHECKED_OUT.value
+
+    # The next backup trusts the feed again.
+    primary.update_book_status(3, "available")
+    store.backup(primary)
+    assert reads == [1]
+
+
+def test_bypassing_write_without_published_changes_is_detected(
+    store, primary, catalog_path, tmp_path
+):
+    store.backup(primary)
+    CachedBookRepository(catalog_path).delete_book(7)
+
+    manifest = store.backup(primary)
+
+    assert 7 not in _restored(store, tmp_path, manifest.name)
+
+
+@pytest.mark.parametrize("change", ["prune", "chunk_size", "no_feed"])
+def test_full_read_when_the_feed_cannot_be_used(store, primary, tmp_path, monkeypatch, change):
+    store.backup(primary)
+    primary.update_book_status(5, "checked_out")
+    primary.update_book_status(6, "checked_out")
+    repository = primary
+    if change == "prune":
+        primary.feed.prune(primary.feed.last_sequence)
+    elif change == "chunk_size":
+        store = BackupStore(store.directory, chunk_size=20)
+    else:
+        repository = primary.repository
+    reads = _full_reads(monkeypatch, primary.repository)
+
+    manifest = store.backup(repository)
+
+    assert reads == [1]
+    assert _restored(store, tmp_path, manifest.name)[6]["status"] == "checked_out"
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_restore_into_every_backend(store, primary, tmp_path, backend):
+    primary.update_book_status(9, "checked_out")
+    manifest = store.backup(primary)
+    repository = create_repository(backend, str(tmp_path / "restored"))
+
+    assert store.restore(repository) == manifest
+
+    assert repository.count_books() == 50
+    assert repository.get_book(9).status is BookStatus.CHECKED_OUT
+    assert [book.id for book in repository.get_all_books()] == list(range(1, 51))
+    with pytest.raises(ValueError):
+        store.restore(repository)
+
+
+def test_restore_as_of_a_time(store, primary, tmp_path):
+    first = store.backup(primary)
+    primary.delete_book(1)
+    second = store.backup(primary)
+
+    assert store.find_backup(second.created_at - timedelta(microseconds=1)) == first
+    assert store.find_backup(second.created_at) == second
+    assert store.find_backup() == second
+    with pytest.raises(BackupNotFoundError):
+        store.find_backup(first.created_at - timedelta(seconds=1))
+    with pytest.raises(BackupNotFoundError):
+        store.load_manifest("19700101T000000000000Z")
+
+    repository = CachedBookRepository(str(tmp_path / "restored.json"))
+    store.restore(repository, at=first.created_at)
+    assert repository.count_books() == 50
+
+
+def test_diff(store, primary, make_books):
+    old = store.backup(primary)
+    primary.update_book_status(2, "checked_out")
+    primary.delete_book(44)
+    primary.add_book(make_books(1, start=51)[0])
+    new = store.backup(primary)
+
+    records = list(store.diff(old, new))
+
+    assert records == [
+        {"op": "update", "book": primary.get_book(2).to_dict()},
+        {"op": "delete", "id": 44},
+        {"op": "add", "book": primary.get_book(51).to_dict()},
+    ]
+    assert list(store.diff(new, new)) == []
+    resized = BackupStore(store.directory, chunk_size=7).backup(primary.repository)
+    assert list(store.diff(new, resized)) == []
+
+
+def test_damaged_chunks_are_detected(store, primary, tmp_path):
+    manifest = store.backup(primary)
+    chunk = manifest.chunks[1]
+    path = store._chunk_path(chunk.digest)
+    with open(path, "rb") as file:
+        data = zlib.decompress(file.read())
+    with open(path, "wb") as file:
+        file.write(zlib.compress(data.replace(b"Title 12", b"Title 99")))
+
+    with pytest.raises(BackupCorruptedError):
+        store.verify()
+    repository = CachedBookRepository(str(tmp_path / "restored.json"))
+    with pytest.raises(BackupCorruptedError):
+        store.restore(repository)
+    assert repository.count_books() == 0
+
+    os.unlink(path)
+    with pytest.raises(BackupCorruptedError):
+        store.read_chunk(manifest, chunk)
+
+
+def test_manifest_round_trip_and_damage(store, primary):
+    manifest = store.backup(primary)
+    assert manifest.signature is not None
+    assert store.load_manifest(manifest.name) == manifest
+
+    data = manifest.to_dict()
+    del data["signature"]
+    assert BackupManifest.from_dict(data).signature is None
+    assert BackupManifest.from_dict(data).chunks[0] == ChunkRef(*data["chunks"][0])
+
+    with open(store._manifest_path(manifest.name), "w", encoding="utf-8") as file:
+        json.dump({"format": "library-backup", "version": 99}, file)
+    with pytest.raises(BackupCorruptedError):
+        store.load_manifest(manifest.name)
+
+
+def test_prune_deletes_unreferenced_chunks(store, primary):
+    first = store.backup(primary)
+    primary.update_book_status(1, "checked_out")
+    store.backup(primary)
+    primary.update_book_status(1, "available")
+    primary.update_book_status(2, "checked_out")
+    latest = store.backup(primary)
+
+    assert store.prune(1) == 2
+    assert store.names() == [latest.name]
+    assert store.verify() == len(latest.chunks)
+    stored = sum(len(files) for _, _, files in os.walk(store.chunks_path))
+    assert stored == len(latest.chunks)
+    with pytest.raises(BackupNotFoundError):
+        store.load_manifest(first.name)
+    with pytest.raises(ValueError):
+        store.prune(0)
+
+
+def test_invalid_chunk_size(tmp_path):
+    with pytest.raises(ValueError):
+        BackupStore(str(tmp_path), chunk_size=0)
+
+
+def test_command_line(tmp_path, catalog_path, primary, capsys):
+    backups = str(tmp_path / "backups")
+    feed = primary.feed.file_path
+    backup.main([backups, "--data", catalog_path, "create", "--feed", feed, "--chunk-size", "10"])
+    primary.add_book(Book(51, "Dune", "Frank Herbert", 1965))
+    backup.main([backups, "--data", catalog_path, "create", "--feed", feed, "--chunk-size", "10"])
+    old, new = BackupStore(backups).names()
+    capsys.readouterr()
+
+    backup.main([backups, "diff", old, new])
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["op"] for line in lines] == ["add"]
+
+    restored = str(tmp_path / "restored.db")
+    backup.main([backups, "--backend", "sqlite", "--data", restored, "restore", old])
+    assert create_repository("sqlite", restored).count_books() == 50
+    with pytest.raises(SystemExit):
+        backup.main([backups, "--backend", "sqlite", "--data", restored, "restore"])
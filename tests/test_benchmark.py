@@ -0,0 +1,29 @@
+import pytest
+
+from benchmark import SCENARIOS, Workload, generate_catalog, percentile, run_scenario
+
+
+def test_generated_catalog_is_reproducible_and_unique():
+    first = list(generate_catalog(500, seed=3))
+    assert first == list(generate_catalog(500, seed=3))
+    assert len({(r["title"], r["author"], r["year"]) for r in first}) == 500
+
+
+def test_percentile():
+    assert percentile([], 0.5) == 0.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 2.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.99) == 4.0
+
+
+@pytest.mark.parametrize("backend", ["cached", "sqlite"])
+def test_workload_keeps_only_a_sample(tmp_path, backend):
+    workload = Workload(backend, str(tmp_path), 300, seed=0)
+    try:
+        assert not hasattr(workload, "books")
+        assert 0 < len(workload.sample) <= 300
+        assert workload.service.repository.get_book(300) is not None
+        for scenario in SCENARIOS:
+            result = run_scenario(workload, scenario, operations=5, time_limit=10)
+            assert result["operations"] == 5
+    finally:
+        workload.close()
@@ -0,0 +1,316 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from book_index import (
+    AggregateIndex,
+    LoanIndex,
+    PrefixIndex,
+    SearchIndex,
+    StatusCounter,
+    StatusIndex,
+    TextIndex,
+    YearIndex,
+    autocomplete_key,
+    decade_of,
+    normalize_prefix,
+    trigrams,
+)
+from book_models import Book, BookStatus, Loan
+from book_repository import CachedBookRepository, matches_criteria
+from repository_factory import BACKENDS, create_repository
+
+WORDS = ["Hobbit", "ring", "Dune", "war", "peace", "ÖL", "a", "ab", "Straße", "sea"]
+
+
+def random_books(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        Book(
+            book_id,
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))),
+            " ".join(rng.choice(WORDS) for _ in range(2)),
+            rng.randint(1990, 1995),
+        )
+        for book_id in range(1, count + 1)
+    ]
+
+
+def test_trigrams():
+    assert trigrams("dune") == {"dun", "une"}
+    assert trigrams("ab") == set()
+
+
+def test_text_index_lookup_matches_substring_scan():
+    index = TextIndex()
+    texts = {1: "The Hobbit", 2: "Hobbits and Rings", 3: "DUNE", 4: "ab"}
+    for book_id, text in texts.items():
+        index.add(book_id, text)
+
+    for query in ["hobbit", "HOB", "ne", "b", "ring", "xyz", "ab", "the hobbit"]:
+        expected = {book_id for book_id, text in texts.items() if query.lower() in text.lower()}
+        assert index.lookup(query) == expected, query
+
+
+def test_text_index_remove_drops_postings():
+    index = TextIndex()
+    index.add(1, "Dune")
+    index.add(2, "Dune Messiah")
+    index.remove(1)
+    index.remove(1)
+
+    assert index.lookup("dune") == {2}
+    index.remove(2)
+    assert index.lookup("dune") == set()
+    assert index._postings == {}
+
+
+def test_search_index_without_criteria_returns_none():
+    index = SearchIndex()
+    index.rebuild(random_books(10))
+    assert index.search(None, "", None) is None
+
+
+@pytest.mark.parametrize(
+    "criteria",
+    [
+        {"title": "hob"},
+        {"title": "ring", "author": "war"},
+        {"author": "a", "year": 1992},
+        {"year": 1993},
+        {"title": "straße"},
+        {"title": "öl"},
+        {"title": "missing"},
+        {"title": "ab", "year": 1800},
+    ],
+)
+def test_indexed_search_matches_scan(catalog_path, criteria):
+    books = random_books(300)
+    indexed = CachedBookRepository(catalog_path)
+    indexed.add_books(books)
+    scanning = CachedBookRepository(catalog_path, search_index=False)
+
+    expected = sorted(
+        book.id
+        for book in books
+        if matches_criteria(
+            book, criteria.get("title"), criteria.get("author"), criteria.get("year")
+        )
+    )
+    assert [book.id for book in indexed.search_books(**criteria)] == expected
+    assert sorted(book.id for book in scanning.search_books(**criteria)) == expected
+
+
+def test_index_follows_writes(catalog_path):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_book(Book(1, "Dune", "Frank Herbert", 1965))
+    repository.add_book(Book(2, "Dune Messiah", "Frank Herbert", 1969))
+    repository.delete_book(1)
+    repository.update_book_status(2, "checked_out")
+
+    assert [book.id for book in repository.search_books(title="dune")] == [2]
+    assert repository.search_books(year=1965) == []
+
+
+def test_status_index_counts_and_ids():
+    index = StatusIndex()
+    available = Book(1, "Dune", "Frank Herbert", 1965)
+    index.rebuild([available, Book(2, "Emma", "Jane Austen", 1815, "checked_out")])
+    returned = Book(2, "Emma", "Jane Austen", 1815)
+    index.replace(Book(2, "Emma", "Jane Austen", 1815, "checked_out"), returned)
+    index.replace(available, Book(1, "Dune", "F. Herbert", 1965))
+
+    assert index.counts() == {"available": 2, "checked_out": 0}
+    assert index.lookup(BookStatus.AVAILABLE) == {1, 2}
+    assert index.lookup(BookStatus.CHECKED_OUT) == set()
+    index.remove(returned)
+    assert index.counts()["available"] == 1
+
+    counter = StatusCounter()
+    counter.rebuild([available])
+    counter.clear()
+    assert counter.counts() == {"available": 0, "checked_out": 0}
+
+
+def test_year_index_ranges():
+    index = YearIndex()
+    index.rebuild([Book(3, "C", "A", 1990), Book(1, "A", "A", 1990), Book(2, "B", "A", 1985)])
+    index.add(Book(4, "D", "A", 2000))
+
+    assert list(index.between(None, None)) == [2, 1, 3, 4]
+    assert list(index.between(1986, 1999)) == [1, 3]
+    assert list(index.between(1990, 1990)) == [1, 3]
+    assert list(index.between(2001, None)) == []
+    assert list(index.between(None, 1984)) == []
+
+    index.replace(Book(2, "B", "A", 1985), Book(2, "B", "A", 2000))
+    index.remove(Book(9, "Unknown", "A", 1700))
+    assert index._years == [1990, 2000]
+    assert index.lookup(1985) == set()
+    assert list(index.between(1995, None)) == [2, 4]
+
+
+def test_aggregate_index_counts_authors_and_decades():
+    index = AggregateIndex()
+    dune = Book(1, "Dune", "Frank Herbert", 1965)
+    austen = [Book(2, "Emma", "Jane Austen", 1815), Book(3, "Persuasion", "Jane Austen", 1817)]
+    index.rebuild([dune] + austen)
+    index.add(Book(4, "Children of Dune", "Frank Herbert", 1976))
+
+    assert index.authors() == {"Frank Herbert": 2, "Jane Austen": 2}
+    assert list(index.decades().items()) == [(1810, 2), (1960, 1), (1970, 1)]
+
+    # A status change leaves the views alone; other changes move the counts.
+    index.replace(dune, dune.with_status("checked_out"))
+    index.replace(dune, Book(1, "Dune", "F. Herbert", 1966))
+    for book in austen:
+        index.remove(book)
+
+    assert index.authors() == {"Frank Herbert": 1, "F. Herbert": 1}
+    assert index.decades() == {1960: 1, 1970: 1}
+    index.clear()
+    assert index.authors() == {} and index.decades() == {}
+
+
+def test_decade_of():
+    assert [decade_of(year) for year in (1960, 1965, 1969, 2000, 5)] == [1960, 1960, 1960, 2000, 0]
+
+
+NOON = datetime(2026, 10, 1, 12, tzinfo=timezone.utc)
+
+
+def _on_loan(book_id: int, due_at: datetime) -> Book:
+    loan = Loan("reader", due_at - timedelta(days=14), due_at)
+    return Book(book_id, f"Title {book_id}", "Author", 2000, "checked_out", loan)
+
+
+def test_loan_index_orders_by_due_time_then_id():
+    index = LoanIndex()
+    index.rebuild(
+        [
+            _on_loan(3, NOON),
+            _on_loan(1, NOON),
+            _on_loan(2, NOON - timedelta(hours=1)),
+            _on_loan(4, NOON + timedelta(days=3)),
+            Book(5, "Dune", "Frank Herbert", 1965),
+            Book(6, "Emma", "Jane Austen", 1815, "checked_out"),
+        ]
+    )
+
+    assert list(index.due_between()) == [2, 1, 3, 4]
+    assert index._days == sorted(index._slots)
+    assert len(index._days) == 2
+
+
+def test_loan_index_period_bounds():
+    index = LoanIndex()
+    index.rebuild([_on_loan(1, NOON), _on_loan(2, NOON + timedelta(seconds=1))])
+
+    # after is exclusive and until is inclusive, so consecutive periods never overlap.
+    assert list(index.due_between(until=NOON)) == [1]
+    assert list(index.due_between(after=NOON)) == [2]
+    assert list(index.due_between(after=NOON, until=NOON)) == []
+    assert list(index.due_between(after=NOON - timedelta(days=2), until=NOON)) == [1]
+    assert list(index.due_between(after=NOON + timedelta(days=1))) == []
+    assert list(index.due_between(until=NOON - timedelta(days=1))) == []
+
+
+def test_loan_index_follows_loan_changes():
+    index = LoanIndex()
+    due = _on_loan(1, NOON)
+    index.rebuild([due, _on_loan(2, NOON + timedelta(days=1))])
+
+    index.replace(due, due.with_status("checked_out", due.loan))
+    assert list(index.due_between()) == [1, 2]
+
+    renewed = due.with_status("checked_out", due.loan._replace(due_at=NOON + timedelta(days=7)))
+    index.replace(due, renewed)
+    assert list(index.due_between()) == [2, 1]
+    assert list(index.due_between(until=NOON)) == []
+
+    # Removing the last loan of a day drops the day; unknown loans are ignored.
+    index.replace(renewed, renewed.with_status("available"))
+    index.remove(_on_loan(9, NOON))
+    index.remove(Book(2, "Title 2", "Author", 2000))
+    assert list(index.due_between()) == [2]
+    assert len(index._days) == 1
+
+    index.clear()
+    assert list(index.due_between()) == []
+
+
+def _complete(index, prefix, field=None, limit=10):
+    return index.complete(normalize_prefix(prefix), field, limit)
+
+
+def test_normalize_prefix():
+    assert normalize_prefix("  The   GREAT ") == "the great "
+    assert normalize_prefix("the great") == "the great"
+    assert normalize_prefix("   ") == ""
+
+
+def test_prefix_index_ranks_and_deduplicates():
+    books = [
+        Book(1, "Dune Messiah", "Frank Herbert", 1969),
+        Book(2, "Dune", "Frank Herbert", 1965),
+        Book(3, "The Dune Dune", "Dune Fan", 2001),
+        Book(4, "Children of Dune", "Frank Herbert", 1976),
+        Book(5, "Dune", "Brian Herbert", 1965),
+    ]
+    index = PrefixIndex()
+    index.rebuild(books)
+
+    # Whole-text matches first, alphabetically, then by year and ID; later words after.
+    assert _complete(index, "DUNE") == [2, 5, 3, 1, 4]
+    assert _complete(index, "dune ") == [3, 1]
+    assert _complete(index, "dune", field="author") == [3]
+    assert _complete(index, "herb", field="title") == []
+    assert _complete(index, "dune", limit=2) == [2, 5]
+    assert _complete(index, "of   dune") == [4]
+
+
+def test_prefix_index_follows_writes():
+    index = PrefixIndex()
+    dune = Book(1, "Dune", "Frank Herbert", 1965)
+    index.add(dune)
+    index.add(Book(2, "Emma", "Jane Austen", 1815))
+    index.replace(dune, Book(1, "Dune", "Frank Herbert", 1965, "checked_out"))
+    index.replace(dune, Book(1, "Arrakis", "Frank Herbert", 1965))
+    index.remove(Book(99, "Ghost", "Nobody", 2000))
+
+    assert _complete(index, "dune") == []
+    assert _complete(index, "arr") == [1]
+    index.remove(Book(1, "Arrakis", "Frank Herbert", 1965))
+    assert _complete(index, "frank") == []
+    assert index.titles._words == [] and len(index.authors._full) == 1
+
+
+@pytest.mark.parametrize("prefix", ["a", "ab", "Hobbit ", "ring", "war pe", "öl", "str", "s"])
+def test_prefix_index_matches_ranking_a_scan(prefix):
+    books = random_books(200)
+    incremental = PrefixIndex()
+    for book in books:
+        incremental.add(book)
+    bulk = PrefixIndex()
+    bulk.rebuild(books)
+
+    normalized = normalize_prefix(prefix)
+    for field in (None, "title", "author"):
+        keyed = [(autocomplete_key(book, normalized, field), book.id) for book in books]
+        expected = [book_id for key, book_id in sorted(k for k in keyed if k[0] is not None)]
+        assert incremental.complete(normalized, field, 15) == expected[:15]
+        assert bulk.complete(normalized, field, 15) == expected[:15]
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_autocomplete_agrees_across_backends(tmp_path, backend):
+    books = random_books(120)
+    repository = create_repository(backend, str(tmp_path / "catalog"))
+    repository.add_books(books)
+    reference = CachedBookRepository(str(tmp_path / "reference.json"), prefix_index=True)
+    reference.add_books(books)
+
+    for prefix, field in [("h", None), ("war ", "title"), ("se", "author"), ("  ", None)]:
+        expected = [book.id for book in reference.autocomplete(prefix, field, 7)]
+        assert [book.id for book in repository.autocomplete(prefix, field, 7)] == expected
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from book_models import Book, BookStatus
+from book_repository import BookRepository, CachedBookRepository
+from file_utils import load_books, save_books
+
+
+@pytest.fixture(params=[BookRepository, CachedBookRepository])
+def repository(request, catalog_path):
+    return request.param(catalog_path)
+
+
+def test_round_trip(repository, catalog_path, make_books):
+    books = make_books(5)
+    for book in books:
+        repository.add_book(book)
+
+    reloaded = BookRepository(catalog_path).get_all_books()
+    assert [book.to_dict() for book in reloaded] == [book.to_dict() for book in books]
+    assert repository.get_book(3).title == "Title 3"
+    assert repository.count_books() == 5
+
+
+def test_add_rejects_existing_id(repository, make_books):
+    repository.add_book(make_books(1)[0])
+    with pytest.raises(ValueError):
+        repository.add_book(Book(1, "Other", "Other", 2000))
+
+
+def test_delete_and_update_status(repository, make_books):
+    for book in make_books(3):
+        repository.add_book(book)
+
+    assert repository.delete_book(2)
+    assert not repository.delete_book(2)
+    assert repository.update_book_status(3, "checked_out")
+    assert not repository.update_book_status(99, "checked_out")
+    assert [book.id for book in repository.get_all_books()] == [1, 3]
+    assert repository.get_book(3).status is BookStatus.CHECKED_OUT
+
+
+def test_search(repository, make_books):
+    for book in make_books(10):
+        repository.add_book(book)
+
+    assert [book.id for book in repository.search_books(title="title 1")] == [1, 10]
+    assert [book.id for book in repository.search_books(author="Author 3", year=1903)] == [3]
+    assert repository.search_books(title="missing") == []
+
+
+def test_cache_writes_through(catalog_path, make_books):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(3))
+    repository.update_book_status(1, "checked_out")
+
+    stored = {book.id: book.status for book in load_books(catalog_path)}
+    assert stored == {1: BookStatus.CHECKED_OUT, 2: BookStatus.AVAILABLE, 3: BookStatus.AVAILABLE}
+
+
+def test_cache_reloads_changed_file(catalog_path, make_books):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(3))
+    assert repository.count_books() == 3
+
+    save_books(catalog_path, make_books(5, start=10))
+    assert sorted(book.id for book in repository.get_all_books()) == [10, 11, 12, 13, 14]
+    assert repository.search_books(title="title 12")[0].id == 12
+
+
+def test_cache_does_not_reload_unchanged_file(catalog_path, make_books, monkeypatch):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(3))
+    repository.count_books()
+
+    loads = []
+    original = repository._load
+
+    def counting_load():
+        loads.append(1)
+        return original()
+
+    monkeypatch.setattr(repository, "_load", counting_load)
+    repository.get_all_books()
+    repository.search_books(title="Title")
+    assert loads == []
+
+    os.remove(catalog_path)
+    assert repository.count_books() == 0
+    assert loads == [1]
+
+
+def test_returned_books_are_not_changed_by_later_writes(catalog_path, make_books):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(2))
+    listed = repository.get_all_books()
+
+    repository.update_book_status(1, "checked_out")
+    assert listed[0].status is BookStatus.AVAILABLE
+    assert repository.get_book(1).status is BookStatus.CHECKED_OUT
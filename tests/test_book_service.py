@@ -0,0 +1,65 @@
+import pytest
+
+from book_repository import (
+    BookRepository,
+    CachedBookRepository,
+    CompactBookRepository,
+    ConcurrentBookRepository,
+)
+from book_service import BookService
+from exceptions import DuplicateBookError
+from journal_repository import JournalBookRepository
+
+FILE_BACKENDS = [
+    BookRepository,
+    CachedBookRepository,
+    CompactBookRepository,
+    ConcurrentBookRepository,
+    JournalBookRepository,
+]
+
+
+@pytest.fixture(params=FILE_BACKENDS, ids=lambda backend: backend.__name__)
+def backend(request):
+    return request.param
+
+
+def test_ids_are_sequential(backend, catalog_path):
+    service = BookService(backend(catalog_path))
+    ids = [service.add_book(f"Title {n}", "Author", 2000).id for n in range(3)]
+    assert ids == [1, 2, 3]
+
+
+def test_duplicates_are_rejected_ignoring_surrounding_spaces(backend, catalog_path):
+    service = BookService(backend(catalog_path))
+    service.add_book("Dune", "Frank Herbert", 1965)
+    with pytest.raises(DuplicateBookError):
+        service.add_book(" Dune ", "Frank Herbert ", 1965)
+    assert service.add_book("Dune", "Frank Herbert", 1966).id == 2
+
+
+def test_deleted_ids_are_not_reused_after_reopening(backend, catalog_path):
+    service = BookService(backend(catalog_path))
+    for n in range(3):
+        service.add_book(f"Title {n}", "Author", 2000)
+    service.delete_book(3)
+    assert service.add_book("Next", "Author", 2000).id == 4
+    service.delete_book(4)
+
+    reopened = BookService(backend(catalog_path))
+    assert reopened.add_book("After restart", "Author", 2000).id == 5
+
+
+def test_deleting_every_book_keeps_the_sequence(backend, catalog_path):
+    service = BookService(backend(catalog_path))
+    service.add_book("Only", "Author", 2000)
+    service.delete_book(1)
+
+    assert BookService(backend(catalog_path)).add_book("Again", "Author", 2000).id == 2
+
+
+def test_duplicate_freed_by_delete_can_be_added_again(backend, catalog_path):
+    service = BookService(backend(catalog_path))
+    service.add_book("Dune", "Frank Herbert", 1965)
+    service.delete_book(1)
+    assert service.add_book("Dune", "Frank Herbert", 1965).id == 2
@@ -0,0 +1,118 @@
+from datetime import datetime
+
+import pytest
+
+from book_models import Book, BookStatus, Loan
+from book_repository import CompactBookRepository
+from book_service import BookService
+from book_table import BookTable, StringPool
+from exceptions import DuplicateBookError
+
+LOAN = Loan("ann", datetime(2024, 1, 1), datetime(2024, 1, 15))
+
+
+def test_string_pool_shares_and_frees_strings():
+    pool = StringPool()
+    first = pool.intern("Dune")
+    assert pool.intern("Dune") == first
+    other = pool.intern("Emma")
+    assert len(pool) == 2
+
+    pool.release(first)
+    assert pool[first] == "Dune"
+    pool.release(first)
+    assert len(pool) == 1
+    assert pool.intern("Ulysses") == first
+    assert pool[first] == "Ulysses"
+    assert pool[other] == "Emma"
+
+
+def test_table_behaves_like_a_dict(make_books):
+    books = make_books(5)
+    table = BookTable(books)
+
+    assert len(table) == 5
+    assert list(table) == [1, 2, 3, 4, 5]
+    assert table[3].to_dict() == books[2].to_dict()
+    assert 3 in table and 9 not in table and "3" not in table
+    del table[3]
+    assert 3 not in table and len(table) == 4
+    with pytest.raises(KeyError):
+        del table[3]
+    with pytest.raises(KeyError):
+        table[3]
+    with pytest.raises(ValueError):
+        table[1] = books[1]
+
+
+def test_table_accepts_ids_out_of_order(make_books):
+    table = BookTable(make_books(3, start=10))
+    table[2] = Book(2, "Early", "Author", 2000)
+    table[11] = Book(11, "Replaced", "Author", 2001)
+
+    assert sorted(table) == [2, 10, 11, 12]
+    assert table[2].title == "Early"
+    assert table[11].title == "Replaced"
+
+
+def test_table_keeps_status_and_loans():
+    table = BookTable([Book(1, "Dune", "Frank Herbert", 1965)])
+    table[1] = Book(1, "Dune", "Frank Herbert", 1965, "checked_out", LOAN)
+    assert table[1].status is BookStatus.CHECKED_OUT
+    assert table[1].loan == LOAN
+
+    table[1] = Book(1, "Dune", "Frank Herbert", 1965)
+    assert table[1].loan is None
+
+
+def test_table_releases_strings_of_replaced_and_deleted_rows():
+    table = BookTable(
+        [Book(1, "Dune", "Frank Herbert", 1965), Book(2, "Emma", "Jane Austen", 1815)]
+    )
+    table[1] = Book(1, "Dune", "Frank Herbert", 1965, "checked_out")
+    assert len(table._title_pool) == 2
+
+    table[1] = Book(1, "Dune Messiah", "Frank Herbert", 1969)
+    del table[2]
+    assert len(table._title_pool) == 1
+    assert len(table._author_pool) == 1
+    assert table[1].title == "Dune Messiah"
+
+
+def test_deleted_rows_are_compacted(make_books):
+    table = BookTable(make_books(3000))
+    for book_id in range(1, 2500):
+        del table[book_id]
+
+    assert len(table._ids) < 3000
+    assert list(table) == list(range(2500, 3001))
+    assert [book.id for book in table.values()][:2] == [2500, 2501]
+    assert table[2999].title == "Title 2999"
+    assert len(table._title_pool) == 501
+
+
+def test_compact_repository_round_trip(catalog_path, make_books):
+    repository = CompactBookRepository(catalog_path)
+    repository.add_books(make_books(20))
+    repository.delete_book(5)
+    repository.update_book_status(6, "checked_out", LOAN)
+
+    reopened = CompactBookRepository(catalog_path)
+    assert reopened.count_books() == 19
+    assert reopened.get_book(6).loan == LOAN
+    assert [book.id for book in reopened.search_books(title="title 1", year=1910)] == [10]
+    assert reopened.count_by_status() == {"available": 18, "checked_out": 1}
+
+
+@pytest.mark.parametrize("key_index", [False, True])
+def test_compact_repository_detects_duplicates(catalog_path, key_index):
+    repository = CompactBookRepository(catalog_path, key_index=key_index)
+    assert (repository.key_index is not None) == key_index
+    service = BookService(repository)
+    service.add_book("Dune", "Frank Herbert", 1965)
+
+    with pytest.raises(DuplicateBookError):
+        service.add_book("Dune", "Frank Herbert", 1965)
+    assert repository.find_books_by_keys([("Dune", "Frank Herbert", 1965)])
+    record = {"title": "Dune", "author": "Frank Herbert", "year": 1965}
+    assert service.bulk_add([record], skip_duplicates=True) == []
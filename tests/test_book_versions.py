@@ -0,0 +1,174 @@
+import random
+import threading
+
+import pytest
+
+from book_models import Book
+from book_repository import CachedBookRepository, CompactBookRepository
+from book_versions import BITS, BookVersion, VersionedBookMap
+
+
+def test_mapping_operations(make_books):
+    books = VersionedBookMap(make_books(3))
+
+    assert len(books) == 3
+    assert 2 in books and 4 not in books and "2" not in books
+    assert books[2].title == "Title 2"
+    assert books.get(4) is None
+    assert list(books) == [1, 2, 3]
+
+    del books[2]
+    books[5] = Book(5, "Dune", "Frank Herbert", 1965)
+    assert [book.id for book in books.values()] == [1, 3, 5]
+    with pytest.raises(KeyError):
+        del books[2]
+    with pytest.raises(KeyError):
+        books[-1] = Book(-1, "Dune", "Frank Herbert", 1965)
+    with pytest.raises(ValueError):
+        books[6] = Book(7, "Emma", "Jane Austen", 1815)
+
+
+def test_snapshots_are_isolated_from_later_writes(make_books):
+    books = VersionedBookMap(make_books(3))
+    first = books.snapshot()
+
+    books[4] = make_books(1, start=4)[0]
+    del books[1]
+    books[2] = books[2].with_status("checked_out")
+
+    assert books.snapshot() is first
+    assert [book.id for book in first.values()] == [1, 2, 3]
+    assert first[2].status.value == "available"
+
+    second = books.publish()
+    assert second.number == first.number + 1
+    assert isinstance(second, BookVersion)
+    assert list(second) == [2, 3, 4]
+    assert second[2].status.value == "checked_out"
+    assert [book.id for book in first.values()] == [1, 2, 3]
+    assert books.publish() is second
+
+
+def test_versions_share_unchanged_nodes(make_books):
+    books = VersionedBookMap(make_books(100))
+    first = books.snapshot()
+
+    books[99] = books[99].with_status("checked_out")
+    second = books.publish()
+
+    # IDs 0-31 live in the first leaf, which the write to ID 99 did not touch.
+    assert second._root is not first._root
+    assert second._root[0] is first._root[0]
+    assert second._root[3] is not first._root[3]
+
+
+def test_root_grows_for_large_ids(make_books):
+    books = VersionedBookMap(make_books(2))
+    before = books.snapshot()
+    large = 1 << (3 * BITS)
+    books[large] = Book(large, "Dune", "Frank Herbert", 1965)
+    after = books.publish()
+
+    assert list(after) == [1, 2, large]
+    assert after[large].title == "Dune"
+    assert large not in before
+    assert list(before) == [1, 2]
+
+
+def test_values_from(make_books):
+    books = VersionedBookMap(make_books(100, start=1))
+    del books[50]
+    version = books.publish()
+
+    assert [book.id for book in version.values_from(48)][:3] == [48, 49, 51]
+    assert [book.id for book in version.values_from(-5)][:2] == [1, 2]
+    assert [book.id for book in version.values_from(100)] == [100]
+    assert list(version.values_from(101)) == []
+    assert list(version.values_from(1 << 40)) == []
+
+
+def test_matches_a_dictionary_under_random_writes(make_books):
+    rng = random.Random(7)
+    books = VersionedBookMap()
+    expected = {}
+    versions = []
+    for _ in range(2000):
+        book_id = rng.randrange(3000)
+        if book_id in expected and rng.random() < 0.4:
+            del books[book_id]
+            del expected[book_id]
+        else:
+            books[book_id] = expected[book_id] = make_books(1, start=book_id)[0]
+        if rng.random() < 0.05:
+            versions.append((books.publish(), dict(expected)))
+
+    for version, books_then in versions:
+        assert len(version) == len(books_then)
+        assert list(version) == sorted(books_then)
+        assert all(version[book_id] is book for book_id, book in books_then.items())
+
+
+def test_repository_snapshot_ignores_later_writes(catalog_path, make_books):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(3))
+    snapshot = repository.snapshot()
+    listing = repository.iter_books()
+
+    repository.delete_book(1)
+    repository.add_book(make_books(1, start=4)[0])
+
+    assert list(snapshot) == [1, 2, 3]
+    assert [book.id for book in listing] == [1, 2, 3]
+    assert [book.id for book in repository.iter_books()] == [2, 3, 4]
+
+
+def test_failed_write_is_not_published(catalog_path, make_books, monkeypatch):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(2))
+
+    def fail(book):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(repository, "_persist_add", fail)
+    with pytest.raises(OSError):
+        repository.add_book(make_books(1, start=3)[0])
+
+    assert list(repository.snapshot()) == [1, 2]
+    assert repository.get_book(3) is None
+
+
+def test_readers_do_not_wait_for_a_writer(catalog_path, make_books):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(3))
+    writing = threading.Event()
+    release = threading.Event()
+
+    def write():
+        with repository.transaction():
+            repository.delete_book(1)
+            writing.set()
+            release.wait(10)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        assert writing.wait(10)
+        # Reads return the last completed write while the writer holds the lock.
+        assert [book.id for book in repository.get_all_books()] == [2, 3]
+        assert repository.get_book(1) is None
+        assert repository.count_books() == 2
+        assert [book.id for book in repository.iter_books()] == [2, 3]
+    finally:
+        release.set()
+        writer.join()
+
+
+def test_compact_snapshot_is_a_copy(catalog_path, make_books):
+    repository = CompactBookRepository(catalog_path)
+    repository.add_books(make_books(3))
+    snapshot = repository.snapshot()
+
+    repository.delete_book(2)
+
+    assert sorted(snapshot) == [1, 2, 3]
+    assert repository.get_book(2) is None
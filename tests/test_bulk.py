@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from book_io import iter_records, write_records
+from book_models import Book, BookStatus
+from book_service import BookService
+from bulk import export_books, import_books
+from exceptions import BookNotFoundError, DuplicateBookError
+from repository_factory import BACKENDS, create_repository
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def repository(request, tmp_path):
+    return create_repository(request.param, str(tmp_path / "catalog"))
+
+
+def test_find_books_by_keys(repository):
+    repository.add_books(
+        [
+            Book(1, "Dune", "Frank Herbert", 1965),
+            Book(2, "Emma", "Jane Austen", 1815),
+            Book(3, "Dune", "Frank Herbert", 1966),
+        ]
+    )
+
+    found = repository.find_books_by_keys(
+        [(" Dune", "Frank Herbert ", 1965), ("Emma", "Jane Austen", 1815), ("Emma", "Jane", 1815)]
+    )
+    assert {key: book.id for key, book in found.items()} == {
+        ("Dune", "Frank Herbert", 1965): 1,
+        ("Emma", "Jane Austen", 1815): 2,
+    }
+    assert repository.find_books_by_keys([]) == {}
+
+
+def test_bulk_add_assigns_ids_and_rejects_duplicates(repository):
+    service = BookService(repository)
+    service.add_book("Dune", "Frank Herbert", 1965)
+
+    records = [
+        {"title": "Emma", "author": "Jane Austen", "year": 1815},
+        {"title": "Dune", "author": "Frank Herbert", "year": 1965},
+    ]
+    with pytest.raises(DuplicateBookError):
+        service.bulk_add(records)
+    assert repository.count_books() == 1
+
+    added = service.bulk_add(records + [dict(records[0])], skip_duplicates=True)
+    assert [(book.id, book.title) for book in added] == [(2, "Emma")]
+    assert repository.count_books() == 2
+
+
+def test_bulk_add_looks_up_duplicates_once_per_batch(catalog_path, monkeypatch):
+    service = BookService(create_repository("cached", catalog_path))
+    calls = []
+    original = service.repository.find_books_by_keys
+
+    def counting_lookup(keys):
+        calls.append(list(keys))
+        return original(calls[-1])
+
+    monkeypatch.setattr(service.repository, "find_books_by_keys", counting_lookup)
+    monkeypatch.setattr(service.repository, "find_book_by_key", None)
+    records = [{"title": f"Title {n}", "author": "Author", "year": 2000} for n in range(50)]
+    assert len(service.bulk_add(records)) == 50
+    assert len(calls) == 1 and len(calls[0]) == 50
+
+
+def test_bulk_update_status(repository):
+    service = BookService(repository)
+    service.bulk_add([{"title": f"Title {n}", "author": "A", "year": 2000} for n in range(3)])
+
+    assert service.bulk_update_status([1, 2], "checked_out") == 2
+    assert service.bulk_update_status([1, 2, 3], "checked_out") == 1
+    with pytest.raises(BookNotFoundError):
+        service.bulk_update_status([1, 99], "available")
+    assert repository.get_book(1).status is BookStatus.CHECKED_OUT
+
+
+@pytest.mark.parametrize("name", ["books.csv", "books.jsonl"])
+def test_export_and_import_round_trip(tmp_path, name, make_books):
+    source = BookService(create_repository("cached", str(tmp_path / "source.json")))
+    source.repository.add_books(make_books(25))
+    source.repository.update_book_status(4, "checked_out")
+    path = str(tmp_path / name)
+
+    assert export_books(source, path) == 25
+    target = BookService(create_repository("cached", str(tmp_path / "target.json")))
+    assert import_books(target, path, batch_size=10, skip_duplicates=False) == 25
+
+    copied = target.repository.get_all_books()
+    assert [(book.title, book.author, book.year) for book in copied] == [
+        (book.title, book.author, book.year) for book in make_books(25)
+    ]
+    assert target.repository.get_book(4).status is BookStatus.CHECKED_OUT
+
+
+def test_export_streams_the_catalog(catalog_path, tmp_path, monkeypatch, make_books):
+    service = BookService(create_repository("cached", catalog_path))
+    service.repository.add_books(make_books(3))
+    monkeypatch.setattr(service.repository, "get_all_books", None)
+
+    assert export_books(service, str(tmp_path / "books.jsonl")) == 3
+
+
+def test_jsonl_records(tmp_path, make_books):
+    path = str(tmp_path / "books.jsonl")
+    write_records(path, make_books(2))
+    with open(path, encoding="utf-8") as file:
+        assert [json.loads(line)["id"] for line in file] == [1, 2]
+    assert [record["title"] for record in iter_records(path)] == ["Title 1", "Title 2"]
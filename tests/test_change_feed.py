@@ -0,0 +1,252 @@
+import io
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+import bulk
+from book_io import write_records
+from book_models import Book, Loan
+from book_repository import CachedBookRepository
+from change_feed import (
+    Change,
+    ChangeFeed,
+    PublishingBookRepository,
+    encode_record,
+    publish_to_existing_feed,
+)
+from exceptions import ChangesUnavailableError, ReadOnlyReplicaError, ReplicaOutOfSyncError
+from replication import FeedFollower, FeedServer, ReplicaBookRepository, apply_stream
+
+
+@pytest.fixture
+def primary(catalog_path):
+    return PublishingBookRepository(CachedBookRepository(catalog_path))
+
+
+def _loan() -> Loan:
+    start = datetime(2026, 10, 1)
+    return Loan("reader-1", start, start + timedelta(days=14))
+
+
+def test_publishes_writes_in_order(primary, make_books):
+    primary.add_books(make_books(3))
+    primary.add_book(Book(4, "Dune", "Frank Herbert", 1965))
+    primary.update_book_status(2, "checked_out", _loan())
+    primary.delete_book(1)
+    primary.delete_book(99)
+    primary.update_book_status(99, "available")
+
+    changes = primary.feed.read()
+    assert [(change.sequence, change.op, change.book_id) for change in changes] == [
+        (1, "add", 1),
+        (2, "add", 2),
+        (3, "add", 3),
+        (4, "add", 4),
+        (5, "status", 2),
+        (6, "delete", 1),
+    ]
+    assert changes[4].loan == _loan()
+    assert [change.sequence for change in primary.feed.read(since=4, limit=1)] == [5]
+    assert primary.feed.read(since=6) == []
+
+
+def test_batch_status_update_publishes_only_changed_books(primary, make_books):
+    primary.add_books(make_books(4))
+    primary.update_book_status(3, "checked_out", _loan())
+    since = primary.feed.last_sequence
+
+    updated = primary.update_books_status(
+        {1: "available", 2: "checked_out", 3: "checked_out", 99: "checked_out"}
+    )
+
+    assert updated == 3
+    changes = primary.feed.read(since)
+    # Book 1 keeps its status; book 3 keeps it too but loses its loan record.
+    assert [(change.book_id, change.status, change.loan) for change in changes] == [
+        (2, "checked_out", None),
+        (3, "checked_out", None),
+    ]
+
+
+def test_change_records_round_trip():
+    changes = [
+        Change(1, "add", 1, Book(1, "Dune", "Frank Herbert", 1965)),
+        Change(2, "status", 1, status="checked_out", loan=_loan()),
+        Change(3, "status", 1, status="available"),
+        Change(4, "delete", 1),
+    ]
+    for change in changes:
+        assert Change.from_record(change.to_record()).to_record() == change.to_record()
+    with pytest.raises(ValueError):
+        Change.from_record({"seq": 5, "op": "rename", "id": 1})
+
+
+def test_read_after_prune_reports_the_gap(primary, make_books):
+    primary.add_books(make_books(10))
+
+    assert primary.feed.prune(6) == 5
+    assert primary.feed.first_sequence == 6
+    assert [change.sequence for change in primary.feed.read(since=5)] == list(range(6, 11))
+    with pytest.raises(ChangesUnavailableError):
+        primary.feed.read(since=4)
+    with pytest.raises(ChangesUnavailableError):
+        next(primary.feed.follow(since=0))
+
+    # The newest change is kept, so numbering continues after pruning everything.
+    assert primary.feed.prune(100) == 4
+    primary.add_book(Book(11, "Dune", "Frank Herbert", 1965))
+    assert [change.sequence for change in primary.feed.read(since=10)] == [11]
+
+
+def test_other_feed_instances_see_appends_and_prunes(primary, make_books):
+    reader = ChangeFeed(primary.feed.file_path)
+    primary.add_books(make_books(3))
+
+    assert reader.last_sequence == 3
+    assert reader.wait(since=2, timeout=0)
+    assert not reader.wait(since=3, timeout=0.01)
+
+    primary.feed.prune(3)
+    assert reader.first_sequence == 3
+    with pytest.raises(ChangesUnavailableError):
+        reader.read(since=1)
+
+
+def test_torn_record_is_ignored_and_overwritten(primary, make_books):
+    primary.add_books(make_books(2))
+    with open(primary.feed.file_path, "ab") as file:
+        file.write(b'{"seq":3,"op":"del')
+
+    feed = ChangeFeed(primary.feed.file_path, fsync=False)
+    assert feed.last_sequence == 2
+    feed.publish([Change(0, "delete", 1)])
+
+    assert [(change.sequence, change.op) for change in feed.read()] == [
+        (1, "add"),
+        (2, "add"),
+        (3, "delete"),
+    ]
+
+
+def test_publish_to_existing_feed(catalog_path, make_books):
+    repository = CachedBookRepository(catalog_path)
+    assert publish_to_existing_feed(repository) is repository
+
+    open(f"{catalog_path}.changes", "wb").close()
+    publishing = publish_to_existing_feed(repository)
+    assert isinstance(publishing, PublishingBookRepository)
+    publishing.add_books(make_books(2))
+    assert ChangeFeed(f"{catalog_path}.changes").last_sequence == 2
+
+
+def test_bulk_import_publishes_to_an_existing_feed(tmp_path, catalog_path, make_books):
+    source = str(tmp_path / "books.jsonl")
+    write_records(source, make_books(3))
+    open(f"{catalog_path}.changes", "wb").close()
+
+    bulk.main(["--data", catalog_path, "import", source])
+
+    changes = ChangeFeed(f"{catalog_path}.changes").read()
+    assert [(change.op, change.book.title) for change in changes] == [
+        ("add", "Title 1"),
+        ("add", "Title 2"),
+        ("add", "Title 3"),
+    ]
+
+
+def test_replica_applies_changes_in_order(make_books):
+    replica = ReplicaBookRepository()
+    with pytest.raises(ReplicaOutOfSyncError):
+        replica.apply([Change(1, "delete", 1)])
+
+    replica.load_snapshot(2, make_books(2))
+    applied = replica.apply(
+        [
+            Change(2, "delete", 2),
+            Change(3, "add", 3, make_books(1, start=3)[0]),
+            Change(4, "status", 1, status="checked_out", loan=_loan()),
+            Change(5, "delete", 3),
+        ]
+    )
+
+    assert applied == 3
+    assert replica.sequence == 5
+    assert [book.id for book in replica.get_all_books()] == [1, 2]
+    assert replica.get_book(1).loan == _loan()
+    assert [book.id for book in replica.iter_books_by_status("checked_out")] == [1]
+    assert replica.search_books(title="Title 3") == []
+    assert replica.wait_for(5, timeout=0)
+
+
+def test_replica_keeps_the_changes_before_a_gap(make_books):
+    replica = ReplicaBookRepository()
+    replica.load_snapshot(2, make_books(2))
+    notified = []
+    replica.add_listener(notified.append)
+
+    with pytest.raises(ReplicaOutOfSyncError):
+        replica.apply([Change(3, "delete", 1), Change(5, "delete", 2)])
+
+    assert replica.sequence == 3
+    assert [book.id for book in replica.get_all_books()] == [2]
+    assert [[change.sequence for change in changes] for changes in notified] == [[3]]
+    assert not replica.wait_for(5, timeout=0)
+
+
+def test_replica_is_read_only(make_books):
+    replica = ReplicaBookRepository()
+    replica.load_snapshot(0, [])
+    with pytest.raises(ReadOnlyReplicaError):
+        replica.add_book(make_books(1)[0])
+    with pytest.raises(ReadOnlyReplicaError):
+        replica.update_books_status({1: "available"})
+
+
+def test_apply_stream(make_books):
+    books = make_books(2)
+    stream = io.BytesIO(
+        encode_record({"op": "snapshot", "seq": 4, "count": 2})
+        + b"".join(encode_record(book.to_dict()) for book in books)
+        + encode_record({"op": "heartbeat", "seq": 4})
+        + encode_record(Change(5, "delete", 1).to_record())
+        + b'{"seq":6,"op":"del'
+    )
+    replica = ReplicaBookRepository()
+    notified = []
+    replica.add_listener(notified.append)
+
+    apply_stream(replica, stream)
+
+    assert replica.sequence == 5
+    assert [book.id for book in replica.get_all_books()] == [2]
+    assert notified[0] is None
+    assert [[change.sequence for change in changes] for changes in notified[1:]] == [[5]]
+
+    gap = io.BytesIO(encode_record(Change(7, "delete", 2).to_record()))
+    with pytest.raises(ReplicaOutOfSyncError):
+        apply_stream(replica, gap)
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets are required")
+def test_follower_resyncs_from_a_snapshot_after_pruning(tmp_path, primary, make_books):
+    primary.add_books(make_books(3))
+    server = FeedServer(primary, str(tmp_path / "feed.sock"))
+    server.start()
+    replica = ReplicaBookRepository()
+    # The replica fell behind changes that were pruned since.
+    replica.load_snapshot(1, make_books(1))
+    primary.add_book(Book(4, "Dune", "Frank Herbert", 1965))
+    primary.feed.prune(4)
+    follower = FeedFollower(replica, server.address, retry_delay=0.05)
+    follower.start()
+    try:
+        assert replica.wait_for(4, timeout=10)
+        primary.update_book_status(2, "checked_out", _loan())
+        assert replica.wait_for(5, timeout=10)
+    finally:
+        follower.stop()
+        server.stop()
+
+    assert [book.id for book in replica.get_all_books()] == [1, 2, 3, 4]
+    assert replica.get_book(2).loan == _loan()
@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from book_repository import ConcurrentBookRepository
+from book_service import BookService
+from file_utils import atomic_write, load_books, save_books
+from locks import ReadWriteLock
+
+
+def add_books(catalog_path: str, worker: int, count: int) -> None:
+    service = BookService(ConcurrentBookRepository(catalog_path))
+    for n in range(count):
+        service.add_book(f"Worker {worker} book {n}", "Author", 2000)
+
+
+def test_threads_do_not_lose_writes(catalog_path):
+    service = BookService(ConcurrentBookRepository(catalog_path))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        books = list(pool.map(lambda n: service.add_book(f"Book {n}", "A", 2000), range(80)))
+
+    assert sorted(book.id for book in books) == list(range(1, 81))
+    assert len(load_books(catalog_path)) == 80
+
+
+def test_processes_do_not_lose_writes(catalog_path):
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=add_books, args=(catalog_path, worker, 15)) for worker in range(4)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    books = load_books(catalog_path)
+    assert len(books) == 60
+    assert sorted(book.id for book in books) == list(range(1, 61))
+
+
+def test_cache_picks_up_writes_of_other_processes(catalog_path, make_books):
+    first = ConcurrentBookRepository(catalog_path)
+    second = ConcurrentBookRepository(catalog_path)
+    first.add_books(make_books(2))
+    assert second.count_books() == 2
+
+    second.update_book_status(1, "checked_out")
+    first.update_book_status(2, "checked_out")
+    assert {book.status.value for book in load_books(catalog_path)} == {"checked_out"}
+
+
+def test_index_options_are_passed_on(catalog_path):
+    repository = ConcurrentBookRepository(
+        catalog_path, search_index=False, filter_indexes=False, prefix_index=False, key_index=False
+    )
+    assert repository.key_index is None
+    assert repository.loan_index is None
+    assert repository.prefix_index is None
+
+    service = BookService(repository)
+    service.add_book("Dune", "Frank Herbert", 1965)
+    assert [book.id for book in service.search_books(title="dune")] == [1]
+    assert ConcurrentBookRepository(catalog_path).key_index is not None
+
+
+def test_atomic_write_leaves_the_old_file_on_error(catalog_path, make_books):
+    save_books(catalog_path, make_books(2))
+    try:
+        with atomic_write(catalog_path) as file:
+            file.write("[")
+            raise RuntimeError("interrupted")
+    except RuntimeError:
+        pass
+
+    assert len(load_books(catalog_path)) == 2
+    assert os.listdir(os.path.dirname(catalog_path)) == ["data.json"]
+
+
+def test_read_write_lock_excludes_writers():
+    lock = ReadWriteLock()
+    events = []
+
+    def writer():
+        with lock.write_locked():
+            events.append("write")
+
+    with lock.read_locked():
+        thread = threading.Thread(target=writer)
+        thread.start()
+        thread.join(timeout=0.1)
+        assert events == []
+    thread.join(timeout=5)
+    assert events == ["write"]
+
+
+def test_write_lock_is_reentrant_for_reads():
+    lock = ReadWriteLock()
+    with lock.write_locked():
+        assert lock.is_writing()
+        with lock.read_locked():
+            with lock.write_locked():
+                pass
+    assert not lock.is_write_locked()
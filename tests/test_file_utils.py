@@ -0,0 +1,113 @@
+import gc
+import struct
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from book_models import Book, Loan
+from book_snapshot import HEADER, MAGIC, BookSnapshot
+from exceptions import CatalogCorruptedError
+from file_utils import (
+    CODECS,
+    BookCodec,
+    count_books,
+    detect_format,
+    find_book,
+    iter_books,
+    load_books,
+    save_books,
+)
+
+
+def _dicts(books):
+    return [book.to_dict() for book in books]
+
+
+def _catalog(make_books, loans=True):
+    books = make_books(50)
+    moment = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    loan = Loan("Reader", moment, moment + timedelta(days=14)) if loans else None
+    books[3] = Book(4, "Zoë's «Title»", "Author", 1999, "checked_out", loan)
+    return books
+
+
+@pytest.mark.parametrize("codec", sorted(CODECS))
+def test_codec_round_trip(catalog_path, make_books, codec):
+    # The mapped format has no room for loans (see MmapBookRepository).
+    books = _catalog(make_books, loans=codec != "mapped")
+    save_books(catalog_path, books, codec=codec)
+    assert _dicts(load_books(catalog_path)) == _dicts(books)
+    assert _dicts(iter_books(catalog_path)) == _dicts(books)
+    assert _dicts(
+        Book.from_dict(record) for record in CODECS[codec].records(catalog_path)
+    ) == _dicts(books)
+    assert count_books(catalog_path) == 50
+    assert find_book(catalog_path, 4).title == "Zoë's «Title»"
+    assert find_book(catalog_path, 999) is None
+
+
+def test_saves_keep_the_detected_format(catalog_path, make_books):
+    save_books(catalog_path, make_books(3), codec="binary")
+    save_books(catalog_path, make_books(5))
+    assert detect_format(catalog_path) == "binary"
+    assert count_books(catalog_path) == 5
+
+
+def test_every_codec_must_decode_records():
+    class WriteOnlyCodec(BookCodec):
+        def dump(self, books, file):
+            pass
+
+    with pytest.raises(TypeError):
+        WriteOnlyCodec()
+
+
+def test_snapshot_layout(catalog_path, make_books):
+    save_books(catalog_path, make_books(10), codec="binary")
+    with open(catalog_path, "rb") as file:
+        magic, version, flags, count, table = HEADER.unpack(file.read(HEADER.size))
+    assert (magic, count, flags & 1) == (MAGIC, 10, 1)
+
+    with BookSnapshot(catalog_path) as snapshot:
+        assert snapshot.sorted
+        assert snapshot.get(7).title == "Title 7"
+        assert [book.id for book in snapshot[-2:]] == [9, 10]
+        with pytest.raises(IndexError):
+            snapshot[10]
+
+
+def test_unsorted_snapshot_is_scanned(catalog_path, make_books):
+    save_books(catalog_path, list(reversed(make_books(10))), codec="binary")
+    with BookSnapshot(catalog_path) as snapshot:
+        assert not snapshot.sorted
+        assert snapshot.get(3).id == 3
+
+
+@pytest.mark.parametrize("cut", [4, HEADER.size + 5, -3])
+def test_truncated_snapshot_is_corrupted(catalog_path, make_books, cut):
+    save_books(catalog_path, make_books(10), codec="binary")
+    with open(catalog_path, "rb") as file:
+        data = file.read()
+    with open(catalog_path, "wb") as file:
+        file.write(data[:cut])
+    with pytest.raises(CatalogCorruptedError):
+        load_books(catalog_path)
+
+
+def test_unsupported_snapshot_version(catalog_path, make_books):
+    save_books(catalog_path, make_books(2), codec="binary")
+    with open(catalog_path, "r+b") as file:
+        file.seek(len(MAGIC))
+        file.write(struct.pack("<I", 99))
+    with pytest.raises(CatalogCorruptedError, match="version 99"):
+        load_books(catalog_path)
+
+
+def test_loading_leaves_the_garbage_collector_alone(catalog_path, make_books, monkeypatch):
+    save_books(catalog_path, make_books(10))
+
+    def forbidden():
+        raise AssertionError("load_books must not touch the process-wide collector")
+
+    monkeypatch.setattr(gc, "disable", forbidden)
+    assert len(load_books(catalog_path)) == 10
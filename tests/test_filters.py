@@ -0,0 +1,61 @@
+import pytest
+
+from book_repository import CompactBookRepository
+from book_service import BookService
+from exceptions import BookNotFoundError, EmptyLibraryError, InvalidBookStatusError
+from repository_factory import BACKENDS, create_repository
+
+
+@pytest.fixture(params=sorted(BACKENDS) + ["compact-indexed"])
+def repository(request, tmp_path, make_books):
+    path = str(tmp_path / "catalog")
+    if request.param == "compact-indexed":
+        repository = CompactBookRepository(path, filter_indexes=True)
+    else:
+        repository = create_repository(request.param, path)
+    repository.add_books(make_books(60))
+    repository.update_books_status({n: "checked_out" for n in range(1, 60, 3)})
+    repository.delete_book(4)
+    repository.delete_book(7)
+    return repository
+
+
+def test_status_counts_and_lists(repository):
+    checked_out = [n for n in range(1, 60, 3) if n not in (4, 7)]
+    assert repository.count_by_status() == {
+        "available": 58 - len(checked_out),
+        "checked_out": len(checked_out),
+    }
+    assert [book.id for book in repository.iter_books_by_status("checked_out")] == checked_out
+
+    repository.update_book_status(1, "available")
+    assert repository.count_by_status()["checked_out"] == len(checked_out) - 1
+    assert 1 in {book.id for book in repository.iter_books_by_status("available")}
+
+
+def test_year_ranges(repository):
+    books = list(repository.iter_books_by_year_range(1950, 1955))
+    assert [book.id for book in books] == list(range(50, 56))
+    assert [book.id for book in repository.iter_books_by_year_range(None, 1903)] == [1, 2, 3]
+    assert [book.id for book in repository.iter_books_by_year_range(1958, None)] == [58, 59, 60]
+    assert list(repository.iter_books_by_year_range(1907, 1907)) == []
+
+
+def test_service_validation(tmp_path, make_books):
+    service = BookService(create_repository("cached", str(tmp_path / "catalog")))
+    with pytest.raises(EmptyLibraryError):
+        service.list_books_by_status("available")
+
+    service.repository.add_books(make_books(5))
+    with pytest.raises(InvalidBookStatusError):
+        service.list_books_by_status("lost")
+    with pytest.raises(BookNotFoundError):
+        service.list_books_by_status("checked_out")
+    assert [book.id for book in service.list_books_by_status("available", limit=2)] == [1, 2]
+
+    with pytest.raises(ValueError):
+        service.search_books_by_year_range(1905, 1901)
+    with pytest.raises(BookNotFoundError):
+        service.search_books_by_year_range(2000)
+    assert [book.year for book in service.search_books_by_year_range(end_year=1902)] == [1901, 1902]
+    assert service.count_books_by_status() == {"available": 5, "checked_out": 0}
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from book_repository import CachedBookRepository
+from book_service import BookService
+from exceptions import (
+    BookAlreadyAvailableError,
+    BookNotFoundError,
+    EmptyLibraryError,
+    InvalidBookStatusError,
+)
+from group_commit import GroupCommitter, StatusChange, commit_status_changes
+
+
+@pytest.fixture
+def service(catalog_path, make_books):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(10))
+    return BookService(repository)
+
+
+def test_batch_is_validated_in_order(service):
+    results = commit_status_changes(
+        service,
+        [
+            StatusChange(1, "checked_out"),
+            StatusChange(1, "checked_out"),
+            StatusChange(1, "available"),
+            StatusChange(2, "available"),
+            StatusChange(99, "checked_out"),
+            StatusChange(3, "lost"),
+            StatusChange(4, "checked_out"),
+        ],
+    )
+
+    assert results[0] is None and results[2] is None and results[6] is None
+    assert isinstance(results[1], Exception)
+    assert isinstance(results[3], BookAlreadyAvailableError)
+    assert isinstance(results[4], BookNotFoundError)
+    assert isinstance(results[5], InvalidBookStatusError)
+    assert service.repository.get_book(1).status.value == "available"
+    assert service.repository.get_book(4).status.value == "checked_out"
+
+
+def test_batch_on_an_empty_library(catalog_path):
+    results = commit_status_changes(
+        BookService(CachedBookRepository(catalog_path)), [StatusChange(1, "checked_out")]
+    )
+    assert isinstance(results[0], EmptyLibraryError)
+
+
+def test_batch_is_persisted_with_one_write(service, monkeypatch):
+    writes = []
+    original = service.repository.update_books_status
+
+    def counting_update(updates):
+        writes.append(dict(updates))
+        return original(updates)
+
+    monkeypatch.setattr(service.repository, "update_books_status", counting_update)
+    commit_status_changes(service, [StatusChange(n, "checked_out") for n in range(1, 6)])
+    assert len(writes) == 1 and len(writes[0]) == 5
+
+
+def test_committer_batches_concurrent_requests(service):
+    with GroupCommitter(service, max_batch_size=64, max_latency=0.05) as committer:
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            list(pool.map(lambda n: committer.update_book_status(n, "checked_out"), range(1, 11)))
+        assert committer.committed == 10
+        assert committer.batches < 10
+
+        with pytest.raises(BookNotFoundError):
+            committer.update_book_status(42, "checked_out")
+
+    reopened = CachedBookRepository(service.repository.file_path)
+    assert reopened.count_by_status()["checked_out"] == 10
+
+
+def test_flush_and_close(service):
+    committer = GroupCommitter(service, max_batch_size=1000, max_latency=60)
+    futures = [committer.submit(n, "checked_out") for n in range(1, 4)]
+    committer.flush()
+    assert all(future.done() for future in futures)
+
+    committer.close()
+    with pytest.raises(RuntimeError):
+        committer.submit(1, "available")
+
+
+@pytest.mark.parametrize("batch_size, latency", [(0, 0.1), (10, -1)])
+def test_invalid_settings(service, batch_size, latency):
+    with pytest.raises(ValueError):
+        GroupCommitter(service, batch_size, latency)
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from book_repository import CachedBookRepository
+from exceptions import BookNotFoundError
+from file_utils import IO_OBSERVERS, save_books
+from instrumentation import (
+    Histogram,
+    InstrumentedBookRepository,
+    InstrumentedBookService,
+    MetricsRegistry,
+)
+
+
+@pytest.fixture
+def metrics():
+    return MetricsRegistry()
+
+
+@pytest.fixture
+def repository(catalog_path, make_books, metrics):
+    inner = CachedBookRepository(catalog_path)
+    inner.add_books(make_books(20))
+    return InstrumentedBookRepository(inner, metrics)
+
+
+def _counter(metrics, name, **labels):
+    for counter in metrics.to_dict()["counters"]:
+        if counter["name"] == f"library_{name}" and counter["labels"] == labels:
+            return counter["value"]
+    return 0
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram([1, 2])
+    for value in (0.5, 1, 1.5, 3):
+        histogram.observe(value)
+    assert histogram.cumulative() == [("1", 2), ("2", 3), ("+Inf", 4)]
+    assert histogram.count == 4 and histogram.sum == 6
+
+
+def test_repository_calls_count_outcomes_and_books(repository, metrics):
+    repository.get_book(1)
+    repository.get_all_books()
+    assert list(repository.iter_books())[-1].id == 20
+    repository.get_book(999)
+
+    labels = {"component": "repository"}
+    assert _counter(metrics, "operations_total", operation="get_book", outcome="ok", **labels) == 2
+    assert _counter(metrics, "objects_total", operation="get_book", **labels) == 1
+    assert _counter(metrics, "objects_total", operation="get_all_books", **labels) == 20
+    assert _counter(metrics, "objects_total", operation="iter_books", **labels) == 20
+
+
+def test_partially_consumed_iterator_counts_what_was_read(repository, metrics):
+    books = repository.iter_books()
+    next(books)
+    next(books)
+    books.close()
+    assert _counter(
+        metrics, "objects_total", component="repository", operation="iter_books"
+    ) == 2
+
+
+def test_service_errors_are_counted(repository, metrics):
+    service = InstrumentedBookService(repository, metrics)
+    with pytest.raises(BookNotFoundError):
+        service.delete_book(999)
+    service.search_books(author="Author 3")
+    assert _counter(
+        metrics, "operations_total", component="service", operation="delete_book", outcome="error"
+    ) == 1
+    assert _counter(
+        metrics, "operations_total", component="service", operation="search_books", outcome="ok"
+    ) == 1
+
+
+def test_file_io_is_recorded_while_watched(metrics, tmp_path, make_books):
+    metrics.watch_file_io()
+    metrics.watch_file_io()
+    try:
+        assert IO_OBSERVERS.count(metrics.observe_io) == 1
+        save_books(str(tmp_path / "watched.json"), make_books(5))
+    finally:
+        metrics.unwatch_file_io()
+    save_books(str(tmp_path / "unwatched.json"), make_books(5))
+    assert metrics.observe_io not in IO_OBSERVERS
+    assert _counter(metrics, "io_objects_total", direction="write") == 5
+    assert _counter(metrics, "io_bytes_total", direction="write") > 0
+
+
+def test_profiling(repository, metrics):
+    with pytest.raises(ValueError):
+        metrics.enable_profiling("repository.get_book", mode="perf")
+
+    metrics.enable_profiling("repository.search_books")
+    repository.search_books(title="Title 1")
+    metrics.disable_profiling("repository.search_books")
+    assert "search_books" in metrics.profile_report("repository.search_books")
+    assert metrics.profile_report("repository.get_book") == ""
+
+    metrics.enable_profiling("repository.get_all_books", mode="tracemalloc")
+    repository.get_all_books()
+    metrics.disable_profiling("repository.get_all_books")
+    histograms = {h["name"]: h for h in metrics.to_dict()["histograms"]}
+    assert histograms["library_memory_peak_bytes"]["count"] == 1
+
+
+def test_exports(repository, metrics):
+    repository.get_book(1)
+    text = metrics.to_prometheus()
+    assert "# TYPE library_operations_total counter" in text
+    labels = 'component="repository",operation="get_book"'
+    assert f'library_operation_seconds_bucket{{{labels},le="+Inf"}} 1' in text
+    assert json.loads(metrics.to_json()) == metrics.to_dict()
+
+    metrics.reset()
+    assert metrics.to_dict() == {"counters": [], "histograms": []}
+
+
+def test_label_values_are_escaped(metrics):
+    metrics.inc("custom_total", path='a"b\\c')
+    assert 'library_custom_total{path="a\\"b\\\\c"} 1' in metrics.to_prometheus()
+
+
+def test_proxy_passes_other_attributes_through(repository):
+    assert repository.file_path == repository.repository.file_path
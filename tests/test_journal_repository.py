@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from book_models import BookStatus
+from exceptions import CatalogCorruptedError
+from file_utils import load_books
+from journal_repository import JournalBookRepository
+
+
+def reopen(catalog_path):
+    repository = JournalBookRepository(catalog_path)
+    books = repository.get_all_books()
+    return repository, books
+
+
+def test_round_trip_through_journal(catalog_path, make_books):
+    repository = JournalBookRepository(catalog_path, fsync=False)
+    repository.add_books(make_books(4))
+    repository.delete_book(2)
+    repository.update_book_status(3, "checked_out")
+
+    assert load_books(catalog_path) == []
+    assert repository.journal_records == 6
+    _, books = reopen(catalog_path)
+    assert [(book.id, book.status) for book in books] == [
+        (1, BookStatus.AVAILABLE),
+        (3, BookStatus.CHECKED_OUT),
+        (4, BookStatus.AVAILABLE),
+    ]
+
+
+def test_compaction_folds_journal_into_snapshot(catalog_path, make_books):
+    repository = JournalBookRepository(catalog_path, compact_threshold=3, fsync=False)
+    repository.add_books(make_books(3))
+
+    assert repository.journal_records == 0
+    assert [book.id for book in load_books(catalog_path)] == [1, 2, 3]
+    with open(repository.journal_path) as file:
+        assert file.read() == ""
+
+
+def test_torn_tail_is_discarded(catalog_path, make_books):
+    repository = JournalBookRepository(catalog_path, fsync=False)
+    repository.add_books(make_books(2))
+    with open(repository.journal_path, "a") as file:
+        file.write('{"op": "delete", "id": 1')
+
+    reopened, books = reopen(catalog_path)
+    assert [book.id for book in books] == [1, 2]
+    assert reopened.discarded_tail == len('{"op": "delete", "id": 1')
+    with open(repository.journal_path, "rb") as file:
+        assert file.read().endswith(b"\n")
+
+    reopened.delete_book(2)
+    assert [book.id for book in reopen(catalog_path)[1]] == [1]
+
+
+def test_complete_record_without_newline_is_treated_as_torn(catalog_path, make_books):
+    repository = JournalBookRepository(catalog_path, fsync=False)
+    repository.add_books(make_books(2))
+    with open(repository.journal_path, "a") as file:
+        file.write(json.dumps({"op": "delete", "id": 1}))
+
+    reopened, books = reopen(catalog_path)
+    assert [book.id for book in books] == [1, 2]
+    assert reopened.discarded_tail > 0
+
+
+@pytest.mark.parametrize(
+    "record",
+    ['{"op": "delete", "id"', '{"op": "rename", "id": 1}', '{"op": "status", "id": 1}'],
+)
+def test_damaged_record_before_the_tail_raises(catalog_path, make_books, record):
+    repository = JournalBookRepository(catalog_path, fsync=False)
+    repository.add_books(make_books(2))
+    with open(repository.journal_path, "a") as file:
+        file.write(record + "\n")
+        file.write(json.dumps({"op": "delete", "id": 2}) + "\n")
+    with open(repository.journal_path, "rb") as file:
+        journal = file.read()
+
+    with pytest.raises(CatalogCorruptedError):
+        JournalBookRepository(catalog_path).get_all_books()
+    with open(repository.journal_path, "rb") as file:
+        assert file.read() == journal
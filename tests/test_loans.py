@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from book_models import Book, BookStatus, Loan
+from book_service import BookService
+from exceptions import (
+    BookAlreadyAvailableError,
+    BookAlreadyCheckedOutError,
+    BookNotFoundError,
+    EmptyLibraryError,
+    LoansNotSupportedError,
+)
+from repository_factory import BACKENDS, create_repository
+
+NOW = datetime(2026, 10, 1, 9, tzinfo=timezone.utc)
+LOAN_BACKENDS = sorted(set(BACKENDS) - {"mmap"})
+
+
+@pytest.fixture(params=LOAN_BACKENDS)
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def service(backend, tmp_path, make_books):
+    repository = create_repository(backend, str(tmp_path / "catalog"))
+    repository.add_books(make_books(6))
+    return BookService(repository)
+
+
+def test_checkout_records_and_persists_the_loan(service, backend, tmp_path):
+    loan = service.checkout_book(2, "  reader-1 ", loan_days=7, now=NOW)
+
+    assert loan == Loan("reader-1", NOW, NOW + timedelta(days=7))
+    book = service.repository.get_book(2)
+    assert book.status is BookStatus.CHECKED_OUT
+    assert book.loan == loan
+
+    reopened = create_repository(backend, str(tmp_path / "catalog"))
+    assert reopened.get_book(2).loan == loan
+
+
+def test_return_ends_the_loan(service):
+    loan = service.checkout_book(2, "reader-1", now=NOW)
+
+    assert service.return_book(2) == loan
+    book = service.repository.get_book(2)
+    assert book.status is BookStatus.AVAILABLE
+    assert book.loan is None
+    assert service.overdue_books(now=NOW + timedelta(days=365)) == []
+
+    service.update_book_status(3, "checked_out")
+    assert service.return_book(3) is None
+
+
+def test_overdue_books_longest_overdue_first(service):
+    service.checkout_book(4, "reader-1", loan_days=3, now=NOW)
+    service.checkout_book(2, "reader-2", loan_days=1, now=NOW)
+    service.checkout_book(5, "reader-3", loan_days=1, now=NOW)
+    service.checkout_book(1, "reader-4", loan_days=30, now=NOW)
+
+    overdue = service.overdue_books(now=NOW + timedelta(days=5))
+    assert [book.id for book in overdue] == [2, 5, 4]
+    assert [book.id for book in service.overdue_books(limit=1, now=NOW + timedelta(days=5))] == [2]
+    # A loan is overdue from its due time on.
+    assert [book.id for book in service.overdue_books(now=NOW + timedelta(days=1))] == [2, 5]
+    assert service.overdue_books(now=NOW) == []
+
+
+def test_loans_due_reports_each_loan_once(service):
+    for book_id, days in [(1, 1), (2, 2), (3, 2), (4, 4)]:
+        service.checkout_book(book_id, "reader", loan_days=days, now=NOW)
+
+    reported = []
+    previous = None
+    for day in range(1, 6):
+        until = NOW + timedelta(days=day)
+        reported.append([book.id for book in service.loans_due(after=previous, until=until)])
+        previous = until
+
+    assert reported == [[1], [2, 3], [], [4], []]
+    assert [book.id for book in service.loans_due(limit=2)] == [1, 2]
+
+
+def test_batch_status_update_clears_loans(service):
+    service.checkout_book(1, "reader", now=NOW)
+    service.checkout_book(2, "reader", now=NOW)
+
+    service.repository.update_books_status({1: "checked_out", 2: "available"})
+
+    assert service.repository.get_book(1).loan is None
+    assert service.repository.get_book(1).status is BookStatus.CHECKED_OUT
+    assert list(service.loans_due()) == []
+
+
+def test_checkout_errors(service, tmp_path):
+    service.checkout_book(1, "reader", now=NOW)
+
+    with pytest.raises(BookAlreadyCheckedOutError):
+        service.checkout_book(1, "reader", now=NOW)
+    with pytest.raises(BookNotFoundError):
+        service.checkout_book(99, "reader", now=NOW)
+    with pytest.raises(BookAlreadyAvailableError):
+        service.return_book(2)
+    with pytest.raises(ValueError):
+        service.checkout_book(2, "  ", now=NOW)
+    with pytest.raises(ValueError):
+        service.checkout_book(2, "reader", loan_days=0, now=NOW)
+    with pytest.raises(ValueError):
+        service.overdue_books(limit=0)
+    assert service.repository.get_book(2).loan is None
+
+    empty = BookService(create_repository("json", str(tmp_path / "empty")))
+    with pytest.raises(EmptyLibraryError):
+        empty.checkout_book(1, "reader", now=NOW)
+
+
+@pytest.mark.parametrize("backend", ["cached", "sqlite"])
+def test_naive_times_are_rejected(service):
+    naive = NOW.replace(tzinfo=None)
+
+    with pytest.raises(ValueError, match="timezone-aware"):
+        service.checkout_book(1, "reader", now=naive)
+    with pytest.raises(ValueError, match="timezone-aware"):
+        service.overdue_books(now=naive)
+    with pytest.raises(ValueError, match="timezone-aware"):
+        service.loans_due(after=naive)
+    assert service.repository.get_book(1).status is BookStatus.AVAILABLE
+
+    local = timezone(timedelta(hours=2))
+    service.checkout_book(1, "reader", loan_days=1, now=NOW.astimezone(local))
+    assert [book.id for book in service.overdue_books(now=NOW + timedelta(days=1))] == [1]
+
+
+def test_loan_requires_checked_out_status():
+    book = Book(1, "Dune", "Frank Herbert", 1965)
+    with pytest.raises(ValueError):
+        book.set_loan(Loan("reader", NOW, NOW + timedelta(days=1)))
+    loan = Loan("reader", NOW, NOW + timedelta(days=1))
+    assert Loan.from_dict(loan.to_dict()) == loan
+    assert loan.is_overdue(NOW + timedelta(days=1))
+    assert not loan.is_overdue(NOW)
+
+
+def test_mapped_catalog_rejects_loans(tmp_path, make_books):
+    repository = create_repository("mmap", str(tmp_path / "catalog"))
+    repository.add_books(make_books(2))
+    service = BookService(repository)
+
+    with pytest.raises(LoansNotSupportedError):
+        service.checkout_book(1, "reader", now=NOW)
+    assert repository.get_book(1).status is BookStatus.AVAILABLE
+    service.update_book_status(1, "checked_out")
+    assert repository.get_book(1).status is BookStatus.CHECKED_OUT
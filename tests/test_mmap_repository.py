@@ -0,0 +1,160 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from book_mmap import HEADER, MAGIC, MIN_CAPACITY, RECORD, MappedCatalog, heap_start, write_table
+from book_models import Book, Loan
+from book_snapshot import SnapshotError
+from exceptions import InvalidBookStatusError, LoansNotSupportedError
+from file_utils import save_books
+from mmap_repository import MmapBookRepository
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "data.mmap")
+
+
+@pytest.fixture
+def repository(path, make_books):
+    repository = MmapBookRepository(path, fsync=False)
+    repository.add_books(make_books(100))
+    yield repository
+    repository.close()
+
+
+def test_round_trip_survives_reopening(repository, path):
+    repository.update_book_status(5, "checked_out")
+    repository.close()
+    reopened = MmapBookRepository(path)
+    try:
+        assert reopened.count_books() == 100
+        assert reopened.get_book(5).status.value == "checked_out"
+        assert [book.id for book in reopened.iter_books()] == list(range(1, 101))
+        assert reopened.get_book(101) is None
+    finally:
+        reopened.close()
+
+
+def test_file_layout(repository, path):
+    with open(path, "rb") as file:
+        magic, version, count, capacity, live, heap_used, last_id = HEADER.unpack(
+            file.read(HEADER.size)
+        )
+    assert (magic, version, count, live, last_id) == (MAGIC, 1, 100, 100, 100)
+    assert capacity >= MIN_CAPACITY
+    assert os.path.getsize(path) >= heap_start(capacity) + heap_used
+    assert RECORD.size % 8 == 0
+
+
+def test_ascending_ids_are_appended_in_place(repository, path):
+    inode = os.stat(path).st_ino
+    repository.add_book(Book(150, "Appended", "Author", 2001))
+    assert os.stat(path).st_ino == inode
+    assert repository.get_book(150).title == "Appended"
+
+
+def test_lower_id_rewrites_in_order(repository, path):
+    repository.delete_book(50)
+    inode = os.stat(path).st_ino
+    repository.add_book(Book(50, "Inserted", "Author", 2001))
+    assert os.stat(path).st_ino != inode
+    assert [book.id for book in repository.iter_books()] == list(range(1, 101))
+    with pytest.raises(ValueError):
+        repository.add_book(Book(50, "Again", "Author", 2001))
+
+
+def test_full_table_grows(path, make_books):
+    repository = MmapBookRepository(path, fsync=False)
+    try:
+        repository.add_books(make_books(MIN_CAPACITY))
+        repository.add_book(Book(MIN_CAPACITY + 1, "Overflow", "Author", 2001))
+        count, capacity = repository._current().header()[:2]
+        assert count == MIN_CAPACITY + 1 and capacity >= count
+        assert repository.count_books() == MIN_CAPACITY + 1
+    finally:
+        repository.close()
+
+
+def test_deletes_leave_tombstones_and_keep_the_sequence(repository):
+    assert repository.delete_book(100)
+    assert not repository.delete_book(100)
+    assert repository.get_book(100) is None
+    assert repository.count_books() == 99
+    assert repository.count_by_status()["available"] == 99
+    assert repository.next_book_id() == 101
+
+
+def test_tombstones_are_compacted(path, make_books):
+    repository = MmapBookRepository(path, fsync=False)
+    try:
+        repository.add_books(make_books(MIN_CAPACITY * 2))
+        for book_id in range(1, MIN_CAPACITY + 2):
+            repository.delete_book(book_id)
+        count, _, live = repository._current().header()[:3]
+        assert count == live == MIN_CAPACITY - 1
+        assert repository.next_book_id() == MIN_CAPACITY * 2 + 1
+    finally:
+        repository.close()
+
+
+def test_writes_are_visible_to_another_mapping(repository, path):
+    other = MmapBookRepository(path, fsync=False)
+    try:
+        repository.update_books_status({1: "checked_out", 2: "checked_out", 999: "available"})
+        assert other.get_book(1).status.value == "checked_out"
+        repository.add_book(Book(101, "Appended", "Author", 2000))
+        assert other.get_book(101).title == "Appended"
+        repository.add_book(Book(0, "Rewritten", "Author", 2000))
+        assert other.get_book(0).title == "Rewritten"
+    finally:
+        other.close()
+
+
+def test_reads(repository):
+    assert [book.id for book in repository.search_books(title="title 1", year=1910)] == [10]
+    assert repository.find_book_by_key("Title 7", "Author 0", 1907).id == 7
+    assert repository.find_books_by_keys([("Title 8", "Author 1", 1908)]).keys() == {
+        ("Title 8", "Author 1", 1908)
+    }
+    assert sum(repository.count_by_author().values()) == 100
+    assert repository.count_by_decade()[1900] == 9
+    assert [book.year for book in repository.iter_books_by_year_range(1995, 1996)] == [1995, 1996]
+
+    page = repository.page_books(limit=30)
+    assert [book.id for book in page.books] == list(range(1, 31))
+    rest = repository.page_books(limit=80, after=page.next_cursor)
+    assert rest.books[0].id == 31 and rest.next_cursor is None
+
+
+def test_loans_and_bad_statuses_are_rejected(repository):
+    moment = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    loan = Loan("Reader", moment, moment + timedelta(days=7))
+    with pytest.raises(LoansNotSupportedError):
+        repository.update_book_status(1, "checked_out", loan)
+    with pytest.raises(LoansNotSupportedError):
+        repository.add_book(Book(200, "Lent", "Author", 2000, "checked_out", loan))
+    with pytest.raises(InvalidBookStatusError):
+        repository.update_book_status(1, "lost")
+
+
+def test_other_formats_and_truncated_files_are_rejected(path, make_books):
+    save_books(path, make_books(3))
+    with pytest.raises(ValueError, match="convert mapped"):
+        MmapBookRepository(path)
+
+    save_books(path, make_books(3), codec="mapped")
+    with open(path, "r+b") as file:
+        file.truncate(HEADER.size + 10)
+    with pytest.raises(SnapshotError):
+        MappedCatalog(path)
+
+
+def test_write_table_checks_rows(tmp_path):
+    rows = [(2, 2000, 0, b"B", b"A"), (1, 2000, 0, b"A", b"A")]
+    with open(tmp_path / "table", "wb") as file:
+        with pytest.raises(ValueError):
+            write_table(file, iter(rows), 2, 2)
+        with pytest.raises(ValueError):
+            write_table(file, iter(rows[:1]), 2, 2)
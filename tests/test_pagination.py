@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from book_models import Book
+from book_service import BookService
+from exceptions import BookNotFoundError, EmptyLibraryError
+from pagination import get_sort_key, paginate
+from repository_factory import BACKENDS, create_repository
+
+
+def shuffled_books(count: int):
+    rng = random.Random(3)
+    titles = ["apple", "Banana", "cherry", "Apple", "banana", "Date"]
+    books = [
+        Book(
+            book_id,
+            f"{rng.choice(titles)} {rng.randint(1, 3)}",
+            # Titles and years repeat to exercise ties; the author keeps each key unique.
+            f"Author {book_id}",
+            rng.randint(1990, 1994),
+        )
+        for book_id in range(1, count + 1)
+    ]
+    rng.shuffle(books)
+    return books
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def repository(request, tmp_path):
+    repository = create_repository(request.param, str(tmp_path / "catalog"))
+    repository.add_books(sorted(shuffled_books(47), key=lambda book: book.id))
+    return repository
+
+
+def walk(repository, order_by, limit, **criteria):
+    pages, after = [], None
+    while True:
+        page = repository.page_books(order_by=order_by, limit=limit, after=after, **criteria)
+        pages.append([book.id for book in page])
+        if page.next_cursor is None:
+            return pages
+        after = page.next_cursor
+
+
+@pytest.mark.parametrize("order_by", ["id", "year", "title"])
+def test_keyset_pages_cover_the_catalog_in_order(repository, order_by):
+    key = get_sort_key(order_by)
+    expected = [book.id for book in sorted(repository.get_all_books(), key=key)]
+
+    pages = walk(repository, order_by, 10)
+    assert [len(page) for page in pages] == [10, 10, 10, 10, 7]
+    assert [book_id for page in pages for book_id in page] == expected
+
+
+@pytest.mark.parametrize("order_by", ["id", "year", "title"])
+def test_keyset_pages_of_search_results(repository, order_by):
+    key = get_sort_key(order_by)
+    matching = [book for book in repository.get_all_books() if "apple" in book.title.lower()]
+    expected = [book.id for book in sorted(matching, key=key)]
+
+    pages = walk(repository, order_by, 4, title="APPLE")
+    assert [book_id for page in pages for book_id in page] == expected
+
+
+def test_offset_and_limit(repository):
+    page = repository.page_books(order_by="year", limit=5, offset=10)
+    key = get_sort_key("year")
+    expected = sorted(repository.get_all_books(), key=key)[10:15]
+    assert [book.id for book in page] == [book.id for book in expected]
+    assert page.next_cursor == key(expected[-1])
+
+    assert list(repository.page_books(limit=5, offset=100)) == []
+
+
+def test_exact_last_page_has_no_cursor(repository):
+    page = repository.page_books(limit=47)
+    assert len(page) == 47 and page.next_cursor is None
+
+
+def test_cursor_is_stable_under_inserts_and_deletes(repository):
+    first = repository.page_books(limit=10)
+    repository.delete_book(first.books[0].id)
+    repository.add_book(Book(1000, "apple 1", "Author", 1990))
+
+    second = repository.page_books(limit=10, after=first.next_cursor)
+    assert [book.id for book in second] == list(range(11, 21))
+
+
+@pytest.mark.parametrize("limit, offset", [(0, 0), (-1, 0), (5, -1), ("5", 0)])
+def test_invalid_arguments(limit, offset):
+    with pytest.raises(ValueError):
+        paginate([], limit=limit, offset=offset)
+    with pytest.raises(ValueError):
+        paginate([], order_by="author")
+
+
+def test_service_pages(catalog_path):
+    service = BookService(create_repository("cached", catalog_path))
+    with pytest.raises(EmptyLibraryError):
+        service.list_books_page()
+    service.add_book("Dune", "Frank Herbert", 1965)
+    with pytest.raises(BookNotFoundError):
+        service.search_books_page(title="Emma")
+
+    page = service.list_books_page(limit=1)
+    assert [book.id for book in page] == [1] and page.next_cursor is None
+    assert list(service.list_books_page(after=(1,))) == []
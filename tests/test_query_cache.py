@@ -0,0 +1,115 @@
+import pytest
+
+import query_cache
+from book_models import Book
+from book_service import BookService
+from mmap_repository import MmapBookRepository
+from query_cache import QueryCache
+from repository_factory import create_repository
+
+
+@pytest.fixture
+def service(catalog_path, make_books):
+    service = BookService(create_repository("cached", catalog_path), QueryCache())
+    service.repository.add_books(make_books(30))
+    return service
+
+
+def test_writes_through_the_service_invalidate_precisely(service):
+    cache = service.query_cache
+    service.search_books(author="Author 1")
+    service.search_books(author="Author 2")
+    service.search_books(title="Title 3")
+
+    service.add_book("Title 300", "Someone", 1999)
+    assert cache.stats()["entries"] == 2
+    service.update_book_status(2, "checked_out")
+    assert cache.stats()["entries"] == 1
+    service.search_books(author="Author 1")
+    assert cache.stats()["hits"] == 1
+
+    assert service.search_books(title="Title 3")[-1].title == "Title 300"
+
+
+@pytest.mark.parametrize("backend", ["json", "cached", "journal", "sqlite", "sharded"])
+def test_writes_by_another_process_clear_the_cache(tmp_path, make_books, backend):
+    path = str(tmp_path / "catalog")
+    service = BookService(create_repository(backend, path), QueryCache())
+    service.repository.add_books(make_books(10))
+    assert service.search_books(author="Author 3")[0].status.value == "available"
+
+    other = create_repository(backend, path)
+    other.update_book_status(3, "checked_out")
+    other.add_book(Book(11, "Title 11", "Author 3", 2000))
+
+    books = service.search_books(author="Author 3")
+    assert [(book.id, book.status.value) for book in books] == [
+        (3, "checked_out"),
+        (10, "available"),
+        (11, "available"),
+    ]
+    assert service.query_cache.stats()["hits"] == 0
+
+
+def test_backends_without_a_signature_rely_on_the_ttl(tmp_path, make_books, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: clock[0])
+    repository = MmapBookRepository(str(tmp_path / "data.mmap"), fsync=False)
+    assert repository.data_signature() is None
+    repository.add_books(make_books(10))
+    service = BookService(repository, QueryCache(ttl=5))
+
+    service.search_books(author="Author 3")
+    repository.update_book_status(3, "checked_out")
+    assert service.search_books(author="Author 3")[0].status.value == "available"
+    clock[0] += 5
+    assert service.search_books(author="Author 3")[0].status.value == "checked_out"
+    assert service.query_cache.stats()["expirations"] == 1
+    repository.close()
+
+
+def test_results_computed_across_an_invalidation_are_not_stored(make_books):
+    cache = QueryCache()
+    key = cache.make_key("Title", None, None, None)
+    _, generation = cache.lookup(key)
+    cache.invalidate_ids([1])
+    cache.store(key, make_books(2), generation)
+    assert cache.lookup(key)[0] is None
+
+    _, generation = cache.lookup(key, signature="v1")
+    cache.validate("v2")
+    cache.store(key, make_books(2), generation)
+    assert cache.lookup(key, signature="v2")[0] is None
+
+
+def test_signature_changes_clear_all_entries(make_books):
+    cache = QueryCache()
+    for title in ("a", "b"):
+        key = cache.make_key(title, None, None, None)
+        cache.store(key, make_books(1), cache.lookup(key, signature="v1")[1])
+    cache.adopt("v2")
+    assert cache.lookup(cache.make_key("a", None, None, None), signature="v2")[0] is not None
+    assert cache.lookup(cache.make_key("a", None, None, None), signature="v3")[0] is None
+    assert cache.stats()["entries"] == 0
+    assert cache.lookup(cache.make_key("a", None, None, None))[0] is None
+
+
+def test_keys_limits_and_eviction(make_books):
+    assert QueryCache.make_key("Dune", "", 0, None) == QueryCache.make_key("dUNE", None, None, None)
+    cache = QueryCache(max_entries=2, max_result_size=3)
+    for title in ("a", "b", "c"):
+        key = cache.make_key(title, None, None, None)
+        cache.store(key, make_books(1), cache.lookup(key)[1])
+    big = cache.make_key("big", None, None, None)
+    cache.store(big, make_books(4), cache.lookup(big)[1])
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.lookup(cache.make_key("a", None, None, None))[0] is None
+    assert cache.lookup(big)[0] is None
+
+
+@pytest.mark.parametrize("arguments", [{"max_entries": 0}, {"ttl": 0}, {"max_entries": 1.5}])
+def test_invalid_settings(arguments):
+    with pytest.raises(ValueError):
+        QueryCache(**arguments)
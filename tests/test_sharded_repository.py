@@ -0,0 +1,116 @@
+import json
+import threading
+
+import pytest
+
+from book_models import Book
+from book_service import BookService
+from file_utils import save_books
+from sharded_repository import ShardedBookRepository, read_manifest, shard_path, split_catalog
+
+
+@pytest.fixture(params=["hash", "range"])
+def repository(request, catalog_path, make_books):
+    repository = ShardedBookRepository(catalog_path, partition=request.param, range_size=10)
+    repository.add_books(make_books(35))
+    yield repository
+    repository.close()
+
+
+def test_round_trip_across_shards(repository, catalog_path):
+    assert len(repository.shards) == 4
+    assert [book.id for book in repository.get_all_books()] == list(range(1, 36))
+    reopened = ShardedBookRepository(catalog_path)
+    try:
+        assert reopened.get_book(27).title == "Title 27"
+        assert reopened.count_books() == 35
+    finally:
+        reopened.close()
+
+
+def test_iterating_reads_merge_lazily(repository):
+    books = repository.iter_search_books(author="Author 1")
+    assert not isinstance(books, list)
+    assert next(books).id == 1
+    assert [book.id for book in books] == [8, 15, 22, 29]
+    years = repository.iter_books_by_year_range(1930, 1935)
+    assert [book.id for book in years] == list(range(30, 36))
+
+
+def test_sequence_is_kept_in_the_manifest(repository, catalog_path):
+    assert read_manifest(catalog_path)["last_id"] == 35
+    assert repository.next_book_id() == 36
+    repository.delete_book(35)
+    assert repository.next_book_id() == 36
+
+    reopened = ShardedBookRepository(catalog_path)
+    try:
+        assert reopened.next_book_id() == 36
+        book = BookService(reopened).add_book("New", "Author", 2000)
+        assert book.id == 36
+    finally:
+        reopened.close()
+    assert read_manifest(catalog_path)["last_id"] == 36
+
+
+def test_manifests_without_a_sequence_fall_back_to_the_shards(catalog_path, make_books):
+    split_catalog(catalog_path, make_books(12), "hash", 3)
+    with open(catalog_path, encoding="utf-8") as file:
+        manifest = json.load(file)
+    del manifest["last_id"]
+    with open(catalog_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+
+    repository = ShardedBookRepository(catalog_path)
+    try:
+        assert repository.next_book_id() == 13
+        repository.add_book(Book(13, "New", "Author", 2000))
+        assert read_manifest(catalog_path)["last_id"] == 13
+    finally:
+        repository.close()
+
+
+def test_range_partitioning_grows(catalog_path, make_books):
+    repository = ShardedBookRepository(catalog_path, partition="range", range_size=10)
+    try:
+        repository.add_books(make_books(5))
+        assert len(repository.shards) == 1
+        repository.add_book(Book(45, "Far", "Author", 2000))
+        assert len(repository.shards) == 5
+        assert read_manifest(catalog_path)["shards"] == 5
+        assert repository.get_book(45).title == "Far"
+    finally:
+        repository.close()
+
+
+def test_concurrent_first_reads_create_one_pool(repository):
+    repository.close()
+    barrier = threading.Barrier(8)
+    pools = set()
+
+    def read():
+        barrier.wait()
+        repository.count_books()
+        pools.add(id(repository._thread_pool))
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(pools) == 1
+
+
+def test_split_catalog_writes_shards_and_manifest(catalog_path, make_books):
+    assert split_catalog(catalog_path, make_books(20), "range", range_size=8) == 3
+    assert read_manifest(catalog_path)["last_id"] == 20
+    with open(shard_path(catalog_path, 2), encoding="utf-8") as file:
+        assert [record["id"] for record in json.load(file)] == [17, 18, 19, 20]
+    with pytest.raises(ValueError):
+        split_catalog(catalog_path, make_books(2) + make_books(1), "hash", 2)
+
+
+def test_not_a_manifest(catalog_path, make_books):
+    save_books(catalog_path, make_books(2))
+    with pytest.raises(ValueError, match="bulk.py"):
+        ShardedBookRepository(catalog_path)
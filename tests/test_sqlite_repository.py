@@ -0,0 +1,175 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from book_models import Book, BookStatus
+from book_service import BookService
+from exceptions import DuplicateBookError
+from file_utils import save_books
+from sqlite_repository import SqliteBookRepository
+
+
+@pytest.fixture
+def repository(tmp_path):
+    repository = SqliteBookRepository(str(tmp_path / "library.db"))
+    yield repository
+    repository.close()
+
+
+def test_round_trip(repository, tmp_path, make_books):
+    books = make_books(5)
+    repository.add_books(books[:3])
+    repository.add_book(books[3])
+    repository.add_book(books[4])
+    repository.update_book_status(2, "checked_out")
+    repository.close()
+
+    reopened = SqliteBookRepository(repository.db_path)
+    try:
+        stored = reopened.get_all_books()
+        assert [book.id for book in stored] == [1, 2, 3, 4, 5]
+        assert stored[0].to_dict() == books[0].to_dict()
+        assert reopened.get_book(2).status is BookStatus.CHECKED_OUT
+        assert reopened.count_books() == 5
+    finally:
+        reopened.close()
+
+
+def test_duplicate_id_is_rejected(repository, make_books):
+    repository.add_book(make_books(1)[0])
+    with pytest.raises(ValueError):
+        repository.add_book(Book(1, "Other", "Other", 2000))
+    with pytest.raises(ValueError):
+        repository.add_books(make_books(2))
+    assert repository.count_books() == 1
+
+
+def test_duplicate_key_is_rejected(repository, make_books):
+    repository.add_books(make_books(2))
+    with pytest.raises(DuplicateBookError):
+        repository.add_book(Book(10, " Title 1 ", "Author 1", 1901))
+    with pytest.raises(DuplicateBookError, match="Title 4"):
+        repository.add_books(make_books(2, start=3) + [Book(11, "Title 4", "Author 4", 1904)])
+    assert repository.count_books() == 2
+
+
+def test_services_on_separate_instances_do_not_add_duplicates(tmp_path):
+    path = str(tmp_path / "library.db")
+    SqliteBookRepository(path).close()
+    barrier = threading.Barrier(8)
+
+    def add_titles(worker):
+        repository = SqliteBookRepository(path)
+        service = BookService(repository)
+        added = 0
+        barrier.wait()
+        try:
+            for n in range(50):
+                try:
+                    service.add_book(f"Book {n}", "Author", 2000)
+                    added += 1
+                except DuplicateBookError:
+                    pass
+        finally:
+            repository.close()
+        return added
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        added = list(pool.map(add_titles, range(8)))
+
+    assert sum(added) == 50
+    repository = SqliteBookRepository(path)
+    try:
+        books = repository.get_all_books()
+        assert [book.id for book in books] == list(range(1, 51))
+        assert len({book.title for book in books}) == 50
+    finally:
+        repository.close()
+
+
+def test_transaction_commits_or_rolls_back_as_one(repository, make_books):
+    with repository.transaction():
+        repository.add_books(make_books(2))
+        with repository.transaction():
+            repository.update_book_status(1, "checked_out")
+        with pytest.raises(DuplicateBookError):
+            repository.add_book(Book(3, "Title 2", "Author 2", 1902))
+        # The failed insert is undone on its own; the transaction goes on.
+        assert repository.count_books() == 2
+    assert repository.get_book(1).status is BookStatus.CHECKED_OUT
+
+    with pytest.raises(RuntimeError):
+        with repository.transaction():
+            repository.delete_book(1)
+            repository.rebuild_aggregates()
+            assert repository.verify_aggregates() == []
+            raise RuntimeError("interrupted")
+    assert repository.count_books() == 2
+    assert repository.verify_aggregates() == []
+
+
+def test_key_becomes_unique_in_existing_databases(tmp_path):
+    path = str(tmp_path / "library.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE books (id INTEGER PRIMARY KEY, title TEXT NOT NULL,"
+        " author TEXT NOT NULL, year INTEGER NOT NULL, status TEXT NOT NULL);"
+        "CREATE INDEX idx_books_key ON books(title, author, year);"
+        "INSERT INTO books VALUES (1, 'Dune', 'Frank Herbert', 1965, 'available');"
+    )
+    conn.close()
+
+    repository = SqliteBookRepository(path)
+    try:
+        with pytest.raises(DuplicateBookError):
+            repository.add_book(Book(2, "Dune", "Frank Herbert", 1965))
+        assert repository.count_books() == 1
+    finally:
+        repository.close()
+
+
+def test_search_matches_substrings_case_insensitively(repository):
+    repository.add_books(
+        [
+            Book(1, "The Hobbit", "J. R. R. Tolkien", 1937),
+            Book(2, "Hobbit Lore", "Someone Else", 2001),
+            Book(3, "Dune", "Frank Herbert", 1965),
+            Book(4, "Öl und Wasser", "Ärger", 1990),
+        ]
+    )
+
+    assert [book.id for book in repository.search_books(title="HOBBIT")] == [1, 2]
+    assert [book.id for book in repository.search_books(title="ob")] == [1, 2]
+    assert [book.id for book in repository.search_books(author="tolk", year=1937)] == [1]
+    assert [book.id for book in repository.search_books(title="öl")] == [4]
+    assert repository.search_books(title="hobbit", year=1965) == []
+
+
+def test_next_book_id_does_not_reuse_deleted_ids(repository, make_books):
+    repository.add_books(make_books(3))
+    repository.delete_book(3)
+    assert repository.next_book_id() == 4
+
+
+def test_find_book_by_key(repository):
+    repository.add_book(Book(1, "Dune", "Frank Herbert", 1965))
+    assert repository.find_book_by_key(" Dune ", "Frank Herbert", 1965).id == 1
+    assert repository.find_book_by_key("Dune", "Frank Herbert", 1966) is None
+
+
+def test_migrate_from_json(repository, catalog_path, make_books):
+    save_books(catalog_path, make_books(10))
+    assert repository.migrate_from_json(catalog_path) == 10
+    assert repository.count_books() == 10
+    with pytest.raises(ValueError):
+        repository.migrate_from_json(catalog_path)
+    assert repository.count_books() == 10
+
+
+def test_indexes_exist(repository):
+    with repository.pool.connection() as conn:
+        rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+    indexes = {row[0] for row in rows}
+    assert {"idx_books_title", "idx_books_author", "idx_books_year", "idx_books_status"} <= indexes
@@ -0,0 +1,76 @@
+import io
+import json
+import types
+
+import pytest
+
+from book_repository import BookRepository, CachedBookRepository
+from exceptions import CatalogCorruptedError
+from file_utils import iter_books, iter_json_array, load_books, save_books
+
+VALUES = [1, -2.5e3, "a, ] b", {"x": [1, 2]}, [], None, True, "é中", 12345678901234567890]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_iter_json_array_across_chunk_boundaries(chunk_size):
+    text = json.dumps(VALUES, indent=2)
+    assert list(iter_json_array(io.StringIO(text), chunk_size)) == VALUES
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ ]  \n", "[1]\n\n"])
+def test_iter_json_array_accepts_whitespace(text):
+    assert len(list(iter_json_array(io.StringIO(text), 2))) == len(json.loads(text))
+
+
+@pytest.mark.parametrize("text", ["", "{}", "[1, 2", "[1 2]", "[1,]", "[1] x", "[1]]", "[] []"])
+def test_iter_json_array_rejects_invalid_json(text):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.StringIO(text), 2))
+
+
+def test_trailing_garbage_is_reported_as_corruption(catalog_path, make_books):
+    save_books(catalog_path, make_books(3))
+    with open(catalog_path, "a", encoding="utf-8") as file:
+        file.write("\n]")
+
+    with pytest.raises(CatalogCorruptedError):
+        load_books(catalog_path)
+    with pytest.raises(CatalogCorruptedError):
+        list(iter_books(catalog_path))
+
+
+def test_iter_books_streams(catalog_path, make_books):
+    save_books(catalog_path, make_books(5))
+    books = iter_books(catalog_path)
+    assert isinstance(books, types.GeneratorType)
+    assert next(books).id == 1
+    assert [book.id for book in BookRepository(catalog_path).iter_books()] == [1, 2, 3, 4, 5]
+
+
+def test_missing_and_blank_catalogs_are_empty(catalog_path):
+    assert load_books(catalog_path) == []
+    with open(catalog_path, "w") as file:
+        file.write("  \n")
+    assert list(iter_books(catalog_path)) == []
+
+
+def test_iter_search_books_is_lazy_and_ordered(catalog_path, make_books):
+    repository = CachedBookRepository(catalog_path)
+    repository.add_books(make_books(30))
+
+    results = repository.iter_search_books(title="title 2")
+    assert isinstance(results, types.GeneratorType)
+    repository.delete_book(20)
+    repository.update_book_status(21, "checked_out")
+
+    books = list(results)
+    assert [book.id for book in books] == [2] + list(range(20, 30))
+    assert books[2].status.value == "available"
+    assert [book.id for book in repository.iter_search_books(title="title 2")][:3] == [2, 21, 22]
+
+
+def test_iter_search_books_without_index(catalog_path, make_books):
+    repository = CachedBookRepository(catalog_path, search_index=False)
+    repository.add_books(make_books(30))
+    assert [book.id for book in repository.iter_search_books(author="author 3", year=1903)] == [3]
+    assert len(list(repository.iter_search_books())) == 30